@@ -0,0 +1,49 @@
+"""Session counters and keyset index
+
+Revision ID: 5b8e76a8ccd3
+Revises: 678e5c0abf31
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '5b8e76a8ccd3'
+down_revision: Union[str, Sequence[str], None] = '678e5c0abf31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat_sessions', sa.Column('message_count', sa.Integer(), server_default=sa.text('0'), nullable=False, comment='消息总数'))
+    op.add_column('chat_sessions', sa.Column('total_tokens', sa.BigInteger(), server_default=sa.text('0'), nullable=False, comment='会话累计 Token 数'))
+
+    # 回填历史数据，之后由应用层在写消息时维护
+    op.execute(
+        """
+        UPDATE chat_sessions AS s
+        SET message_count = agg.message_count,
+            total_tokens = agg.total_tokens
+        FROM (
+            SELECT session_id,
+                   count(*) AS message_count,
+                   coalesce(sum(tokens_input + tokens_output), 0) AS total_tokens
+            FROM chat_messages
+            GROUP BY session_id
+        ) AS agg
+        WHERE s.id = agg.session_id
+        """
+    )
+
+    op.create_index('idx_sessions_user_updated_id', 'chat_sessions', ['user_id', 'updated_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_sessions_user_updated_id', table_name='chat_sessions')
+    op.drop_column('chat_sessions', 'total_tokens')
+    op.drop_column('chat_sessions', 'message_count')
@@ -0,0 +1,29 @@
+"""Message keyset index
+
+Revision ID: 0ff3a031d6dd
+Revises: 5b8e76a8ccd3
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0ff3a031d6dd'
+down_revision: Union[str, Sequence[str], None] = '5b8e76a8ccd3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('idx_msgs_session_created_id', 'chat_messages', ['session_id', 'created_at', 'id'], unique=False)
+    op.drop_index('idx_msgs_session_created', table_name='chat_messages')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('idx_msgs_session_created', 'chat_messages', ['session_id', 'created_at'], unique=False)
+    op.drop_index('idx_msgs_session_created_id', table_name='chat_messages')
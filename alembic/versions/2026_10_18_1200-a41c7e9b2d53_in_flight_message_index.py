@@ -0,0 +1,27 @@
+"""In-flight message partial index
+
+Revision ID: a41c7e9b2d53
+Revises: 0ff3a031d6dd
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'a41c7e9b2d53'
+down_revision: Union[str, Sequence[str], None] = '0ff3a031d6dd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('idx_msgs_in_flight_updated', 'chat_messages', ['updated_at'], unique=False, postgresql_where=sa.text("status IN ('thinking', 'streaming')"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_msgs_in_flight_updated', table_name='chat_messages', postgresql_where=sa.text("status IN ('thinking', 'streaming')"))
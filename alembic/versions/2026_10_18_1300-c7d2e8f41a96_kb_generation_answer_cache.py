@@ -0,0 +1,29 @@
+"""KB generation and answer cache flag
+
+Revision ID: c7d2e8f41a96
+Revises: a41c7e9b2d53
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d2e8f41a96'
+down_revision: Union[str, Sequence[str], None] = 'a41c7e9b2d53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('knowledge_bases', sa.Column('generation', sa.BigInteger(), server_default=sa.text('0'), nullable=False, comment='内容版本号'))
+    op.add_column('knowledge_bases', sa.Column('answer_cache_enabled', sa.Boolean(), server_default=sa.text('false'), nullable=False, comment='是否对该知识库的首轮问答启用答案缓存'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('knowledge_bases', 'answer_cache_enabled')
+    op.drop_column('knowledge_bases', 'generation')
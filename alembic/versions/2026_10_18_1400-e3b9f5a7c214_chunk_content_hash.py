@@ -0,0 +1,33 @@
+"""document chunk content hash
+
+Revision ID: e3b9f5a7c214
+Revises: c7d2e8f41a96
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3b9f5a7c214'
+down_revision: Union[str, Sequence[str], None] = 'c7d2e8f41a96'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('document_chunks', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    # 回填存量切片，与应用层 hashlib.sha256(content.encode("utf-8")).hexdigest() 一致
+    op.execute(
+        "UPDATE document_chunks "
+        "SET content_hash = encode(sha256(convert_to(content, 'UTF8')), 'hex') "
+        "WHERE content_hash IS NULL"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('document_chunks', 'content_hash')
@@ -0,0 +1,32 @@
+"""knowledge file content hash and ingest fingerprint
+
+Revision ID: f4c1a8d9e6b2
+Revises: e3b9f5a7c214
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4c1a8d9e6b2'
+down_revision: Union[str, Sequence[str], None] = 'e3b9f5a7c214'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 存量文件不回填：content_hash 为空的文件照常解析入库，不参与切片复用
+    op.add_column('knowledge_files', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.add_column('knowledge_files', sa.Column('ingest_fingerprint', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_knowledge_files_content_hash'), 'knowledge_files', ['content_hash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_knowledge_files_content_hash'), table_name='knowledge_files')
+    op.drop_column('knowledge_files', 'ingest_fingerprint')
+    op.drop_column('knowledge_files', 'content_hash')
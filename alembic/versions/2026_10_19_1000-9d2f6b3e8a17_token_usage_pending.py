@@ -0,0 +1,37 @@
+"""token usage pending deltas
+
+Revision ID: 9d2f6b3e8a17
+Revises: f4c1a8d9e6b2
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '9d2f6b3e8a17'
+down_revision: Union[str, Sequence[str], None] = 'f4c1a8d9e6b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'token_usage_pending',
+        sa.Column('user_id', sa.UUID(), nullable=False),
+        sa.Column('tokens', sa.Integer(), nullable=False, comment='本次结算的 Token 数'),
+        sa.Column('id', sa.UUID(), server_default=sa.text('gen_random_uuid()'), nullable=False, comment='基于ULID生成的唯一标识'),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False, comment='创建时间'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], name=op.f('fk_token_usage_pending_user_id_users'), ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id', name=op.f('token_usage_pending_pkey')),
+    )
+    op.create_index(op.f('ix_token_usage_pending_user_id'), 'token_usage_pending', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_token_usage_pending_user_id'), table_name='token_usage_pending')
+    op.drop_table('token_usage_pending')
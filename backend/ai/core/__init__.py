@@ -6,16 +6,19 @@ LLM Core — 对话能力核心模块
 - AssembledPrompt: 组装结果数据类
 - render_system_prompt: Jinja2 模板渲染工具
 - count_tokens / count_messages_tokens: Token 计算工具
+- pack_context_chunks: 按 Token 预算挑选 RAG 片段
 - 模板对象
 """
 
 from backend.ai.core.chat_context_builder import ChatContextBuilder, PreparedChatContext
+from backend.ai.core.context_packer import PackedContext, pack_context_chunks
 from backend.ai.core.prompt_manager import AssembledPrompt, PromptManager
 from backend.ai.core.prompt_templates import (
     DEFAULT_SYSTEM_TEMPLATE,
     RAG_SYSTEM_TEMPLATE,
     SUMMARIZE_TEMPLATE,
     render_system_prompt,
+    template_fingerprint,
 )
 from backend.ai.core.token_counter import count_messages_tokens, count_tokens
 
@@ -24,7 +27,10 @@ __all__ = [
     "AssembledPrompt",
     "ChatContextBuilder",
     "PreparedChatContext",
+    "PackedContext",
+    "pack_context_chunks",
     "render_system_prompt",
+    "template_fingerprint",
     "count_tokens",
     "count_messages_tokens",
     "DEFAULT_SYSTEM_TEMPLATE",
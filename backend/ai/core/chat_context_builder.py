@@ -2,6 +2,7 @@ import logging
 import uuid
 from dataclasses import dataclass
 
+from backend.ai.core.context_packer import pack_context_chunks
 from backend.ai.core.prompt_manager import AssembledPrompt, PromptManager
 from backend.ai.core.prompt_templates import RAG_SYSTEM_TEMPLATE
 from backend.core.config import settings
@@ -15,6 +16,8 @@ logger = logging.getLogger(__name__)
 class PreparedChatContext:
     assembled_prompt: AssembledPrompt
     search_context: dict | None
+    # 检索时算出的查询向量，供语义答案缓存复用；未检索时为 None
+    query_embedding: list[float] | None = None
 
 
 class ChatContextBuilder:
@@ -43,15 +46,18 @@ class ChatContextBuilder:
             history_dicts,
             current_query,
         )
-        rag_chunks = await self._retrieve_rag_chunks(query_text=current_query, kb_id=kb_id)
-        search_context = self._build_search_context(kb_id=kb_id, rag_chunks=rag_chunks)
+        rag_chunks, query_embedding = await self._retrieve_rag_chunks(
+            query_text=current_query, kb_id=kb_id
+        )
+        packed = pack_context_chunks(rag_chunks)
+        search_context = self._build_search_context(kb_id=kb_id, rag_chunks=packed.sources)
 
-        if rag_chunks:
+        if packed.contents:
             assembled = self.rag_prompt_manager.assemble(
                 memory_history,
                 current_query,
                 extra_vars={
-                    "context_chunks": [chunk["content"] for chunk in rag_chunks],
+                    "context_chunks": packed.contents,
                     "conversation_summary": memory_summary,
                 },
             )
@@ -65,6 +71,7 @@ class ChatContextBuilder:
         return PreparedChatContext(
             assembled_prompt=assembled,
             search_context=search_context,
+            query_embedding=query_embedding,
         )
 
     @staticmethod
@@ -201,19 +208,23 @@ class ChatContextBuilder:
         self,
         query_text: str,
         kb_id: uuid.UUID | None,
-    ) -> list[dict]:
+    ) -> tuple[list[dict], list[float] | None]:
         if not self.rag_service or kb_id is None:
-            return []
+            return [], None
         try:
             uow = getattr(self.rag_service, "uow", None)
             if uow is None or getattr(uow, "_session", None) is not None:
-                return await self.rag_service.retrieve(query_text=query_text, kb_id=kb_id)
+                return await self.rag_service.retrieve_with_embedding(
+                    query_text=query_text, kb_id=kb_id
+                )
 
             async with uow:
-                return await self.rag_service.retrieve(query_text=query_text, kb_id=kb_id)
+                return await self.rag_service.retrieve_with_embedding(
+                    query_text=query_text, kb_id=kb_id
+                )
         except Exception as exc:
             logger.warning("RAG 检索失败，降级为普通对话: %s", exc)
-            return []
+            return [], None
 
     @staticmethod
     def _build_search_context(
@@ -0,0 +1,155 @@
+"""
+Context Packer — 按 Token 预算挑选 RAG 片段
+
+检索结果原先按 top_k 原样塞进 RAG 模板，片段一长就挤掉历史轮次，
+甚至触发 TokenLimitExceeded。这里在组装 Prompt 之前先做一次装箱：
+1. 合并同一文件内 chunk_index 连续的命中（去掉切片重叠部分），减少重复与碎片；
+2. 按「得分 / Token 数」从高到低贪心选择，直到用完 RAG_CONTEXT_TOKEN_BUDGET；
+   合并后的整段放不下时收缩为去掉首 / 尾切片的子段继续参与挑选，
+   只要有单个切片放得下就不会整组丢弃、返回空上下文；
+3. 选中的片段按得分从高到低输出，保持模板里"越靠前越相关"的顺序。
+"""
+
+from dataclasses import dataclass, field
+
+from backend.ai.core.token_counter import count_tokens
+from backend.core.config import settings
+
+# 相邻切片首尾重叠少于该长度时不认为是切片重叠，直接换行拼接
+_MIN_OVERLAP_CHARS = 8
+
+
+@dataclass
+class PackedContext:
+    """装箱结果：contents 注入模板，sources 为被选中的原始命中（用于 search_context）"""
+
+    contents: list[str] = field(default_factory=list)
+    sources: list[dict] = field(default_factory=list)
+    total_tokens: int = 0
+    dropped: int = 0  # 未被选中的命中数
+
+
+def _chunk_tokens(chunk: dict, model: str) -> int:
+    token_count = chunk.get("token_count")
+    if isinstance(token_count, int) and token_count > 0:
+        return token_count
+    return max(1, count_tokens(chunk["content"], model))
+
+
+def _join_overlapping(left: str, right: str, max_overlap: int) -> str:
+    """拼接相邻切片，去掉 left 结尾与 right 开头重复的切片重叠部分"""
+    for size in range(
+        min(len(left), len(right), max_overlap), _MIN_OVERLAP_CHARS - 1, -1
+    ):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return f"{left}\n{right}"
+
+
+def _merge_adjacent(chunks: list[dict]) -> list[list[dict]]:
+    """把同一文件内 chunk_index 连续的命中归为一组；无法定位的命中各自成组"""
+    groups: list[list[dict]] = []
+    by_file: dict[str, list[dict]] = {}
+    for chunk in chunks:
+        if chunk.get("file_id") is None or chunk.get("chunk_index") is None:
+            groups.append([chunk])
+            continue
+        by_file.setdefault(chunk["file_id"], []).append(chunk)
+
+    for file_chunks in by_file.values():
+        file_chunks.sort(key=lambda item: item["chunk_index"])
+        run = [file_chunks[0]]
+        for chunk in file_chunks[1:]:
+            if chunk["chunk_index"] == run[-1]["chunk_index"] + 1:
+                run.append(chunk)
+            else:
+                groups.append(run)
+                run = [chunk]
+        groups.append(run)
+    return groups
+
+
+def _make_candidate(
+    group: list[dict], model: str
+) -> tuple[float, float, int, str, list[dict]]:
+    """一组相邻命中 -> (得分/Token, 得分, Token 数, 拼接内容, 原始命中)"""
+    content = group[0]["content"]
+    for chunk in group[1:]:
+        content = _join_overlapping(
+            content, chunk["content"], settings.KNOWLEDGE_CHUNK_OVERLAP
+        )
+    if len(group) == 1:
+        tokens = _chunk_tokens(group[0], model)
+    else:
+        tokens = max(1, count_tokens(content, model))
+    score = max(float(chunk.get("score") or 0.0) for chunk in group)
+    return score / tokens, score, tokens, content, group
+
+
+def _run_key(group: list[dict]) -> tuple[int, ...]:
+    return tuple(id(chunk) for chunk in group)
+
+
+def pack_context_chunks(
+    chunks: list[dict],
+    token_budget: int | None = None,
+    *,
+    merge_adjacent: bool | None = None,
+    model: str | None = None,
+) -> PackedContext:
+    """
+    在 Token 预算内挑选检索片段。
+
+    Args:
+        chunks: RAGService 返回的命中（需含 content / score，可选 token_count、
+            file_id、chunk_index）
+        token_budget: 片段总 Token 上限；<= 0 表示不限
+        merge_adjacent: 是否合并相邻切片，默认读取 RAG_CONTEXT_MERGE_ADJACENT
+        model: 计数所用模型名，默认 LLM_MODEL_NAME
+    """
+    if not chunks:
+        return PackedContext()
+
+    budget = settings.RAG_CONTEXT_TOKEN_BUDGET if token_budget is None else token_budget
+    if merge_adjacent is None:
+        merge_adjacent = settings.RAG_CONTEXT_MERGE_ADJACENT
+    model = model or settings.LLM_MODEL_NAME
+
+    if merge_adjacent:
+        groups = _merge_adjacent(chunks)
+    else:
+        groups = [[chunk] for chunk in chunks]
+
+    pool = [_make_candidate(group, model) for group in groups]
+    if budget > 0:
+        pool.sort(key=lambda item: item[0], reverse=True)
+
+    seen = {_run_key(item[4]) for item in pool}
+    taken: set[int] = set()
+    selected: list[tuple[float, float, int, str, list[dict]]] = []
+    used = 0
+    while pool:
+        candidate = pool.pop(0)
+        group = candidate[4]
+        if any(id(chunk) in taken for chunk in group):
+            continue
+        if budget > 0 and used + candidate[2] > budget:
+            if len(group) > 1:
+                # 整段超出剩余预算：收缩为去掉首 / 尾切片的子段，最终退化为单个切片
+                for sub in (group[:-1], group[1:]):
+                    if _run_key(sub) not in seen:
+                        seen.add(_run_key(sub))
+                        pool.append(_make_candidate(sub, model))
+                pool.sort(key=lambda item: item[0], reverse=True)
+            continue
+        selected.append(candidate)
+        taken.update(id(chunk) for chunk in group)
+        used += candidate[2]
+
+    selected.sort(key=lambda item: item[1], reverse=True)
+    return PackedContext(
+        contents=[item[3] for item in selected],
+        sources=[chunk for item in selected for chunk in item[4]],
+        total_tokens=used,
+        dropped=len(chunks) - len(taken),
+    )
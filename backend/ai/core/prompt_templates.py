@@ -7,7 +7,10 @@ Prompt 模板管理 (Jinja2)
 - 模板继承与复用
 """
 
-from jinja2 import BaseLoader, Environment
+import hashlib
+import json
+
+from jinja2 import BaseLoader, Environment, Template
 
 # ============================================================
 # Jinja2 环境（全局单例，字符串模板模式）
@@ -117,3 +120,20 @@ def render_system_prompt(
     tpl = template or DEFAULT_SYSTEM_TEMPLATE
     variables = {**DEFAULT_TEMPLATE_VARS, **kwargs}
     return tpl.render(**variables)
+
+
+def _fingerprint(source: str) -> str:
+    payload = source + json.dumps(DEFAULT_TEMPLATE_VARS, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+# 模板指纹：模板文本或默认变量一改就变化，用作答案缓存键的一部分
+_TEMPLATE_FINGERPRINTS = {
+    id(DEFAULT_SYSTEM_TEMPLATE): _fingerprint(_DEFAULT_SYSTEM_TEMPLATE),
+    id(RAG_SYSTEM_TEMPLATE): _fingerprint(_RAG_SYSTEM_TEMPLATE),
+}
+
+
+def template_fingerprint(template: Template) -> str | None:
+    """返回内置模板的指纹；外部传入的自定义模板无法确认内容，返回 None。"""
+    return _TEMPLATE_FINGERPRINTS.get(id(template))
@@ -38,7 +38,19 @@ class OpenAICompatibleEmbedder(AbstractRAGEmbedder):
         payload = text.strip()
         if not payload:
             raise ServiceError("RAG embedding 输入不能为空")
+        return self._create_embeddings(payload)[0]
 
+    def encode_batch(self, texts: list[str]) -> list[list[float]]:
+        """一次请求编码多条文本（入库按批调用，减少 HTTP 往返）"""
+        payloads = [text.strip() for text in texts]
+        if not payloads:
+            return []
+        if not all(payloads):
+            raise ServiceError("RAG embedding 输入不能为空")
+        return self._create_embeddings(payloads)
+
+    def _create_embeddings(self, payload: str | list[str]) -> list[list[float]]:
+        expected = 1 if isinstance(payload, str) else len(payload)
         request_kwargs: dict = {}
         if self.dimensions is not None:
             request_kwargs["dimensions"] = self.dimensions
@@ -49,20 +61,23 @@ class OpenAICompatibleEmbedder(AbstractRAGEmbedder):
                 input=payload,
                 **request_kwargs,
             )
-            if not response.data:
+            if not response.data or len(response.data) != expected:
                 raise ServiceError("RAG embedding 服务未返回向量数据")
 
-            embedding = response.data[0].embedding
-            if self.dimensions is not None and len(embedding) != self.dimensions:
-                raise ServiceError(
-                    "RAG embedding 维度不匹配",
-                    details={
-                        "expected_dim": self.dimensions,
-                        "actual_dim": len(embedding),
-                        "model": self.model_name,
-                    },
-                )
-            return [float(value) for value in embedding]
+            embeddings: list[list[float]] = []
+            for item in sorted(response.data, key=lambda d: getattr(d, "index", 0)):
+                embedding = item.embedding
+                if self.dimensions is not None and len(embedding) != self.dimensions:
+                    raise ServiceError(
+                        "RAG embedding 维度不匹配",
+                        details={
+                            "expected_dim": self.dimensions,
+                            "actual_dim": len(embedding),
+                            "model": self.model_name,
+                        },
+                    )
+                embeddings.append([float(value) for value in embedding])
+            return embeddings
         except ServiceError:
             raise
         except Exception as exc:
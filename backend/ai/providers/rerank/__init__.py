@@ -0,0 +1,6 @@
+from backend.ai.providers.rerank.cross_encoder import (
+    OnnxCrossEncoderReranker,
+    RerankerFactory,
+)
+
+__all__ = ["OnnxCrossEncoderReranker", "RerankerFactory"]
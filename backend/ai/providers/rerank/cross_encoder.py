@@ -0,0 +1,110 @@
+import logging
+from pathlib import Path
+
+import numpy as np
+
+from backend.core.config import settings
+from backend.core.exceptions import DependencyUnavailable, ServiceError
+from backend.domain.interfaces import AbstractReranker
+
+logger = logging.getLogger(__name__)
+
+
+class OnnxCrossEncoderReranker(AbstractReranker):
+    """
+    本地 ONNX cross-encoder 重排器（CPU）。
+
+    模型目录需包含 model.onnx（可为量化版本）与 HuggingFace tokenizer.json；
+    (query, passage) 成对编码后按 batch_size 分批推理，取最后一维 logit 作为分数。
+    """
+
+    def __init__(
+        self,
+        model_dir: Path,
+        *,
+        batch_size: int = 16,
+        max_length: int = 512,
+        threads: int = 2,
+    ):
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError as exc:
+            raise DependencyUnavailable(
+                "ONNX 重排依赖未安装（需要 rerank 可选依赖：onnxruntime 与 tokenizers）",
+                details={"error": str(exc)},
+            ) from exc
+
+        model_path = model_dir / "model.onnx"
+        tokenizer_path = model_dir / "tokenizer.json"
+        if not model_path.is_file() or not tokenizer_path.is_file():
+            raise ServiceError(
+                "重排模型目录缺少 model.onnx 或 tokenizer.json",
+                details={"model_dir": str(model_dir)},
+            )
+
+        self.batch_size = batch_size
+        self.tokenizer = Tokenizer.from_file(str(tokenizer_path))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            str(model_path),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        self._input_names = {item.name for item in self.session.get_inputs()}
+        logger.info("ONNX 重排模型加载完成: %s", model_dir)
+
+    def _score_batch(self, query: str, passages: list[str]) -> list[float]:
+        encodings = self.tokenizer.encode_batch([(query, text) for text in passages])
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array(
+                [e.attention_mask for e in encodings], dtype=np.int64
+            ),
+        }
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.array(
+                [e.type_ids for e in encodings], dtype=np.int64
+            )
+        (logits,) = self.session.run(None, feeds)
+        logits = np.asarray(logits, dtype=np.float32)
+        if logits.ndim == 2:
+            logits = logits[:, -1]
+        return [float(value) for value in logits]
+
+    def score(self, query: str, passages: list[str]) -> list[float]:
+        scores: list[float] = []
+        for start in range(0, len(passages), self.batch_size):
+            scores.extend(
+                self._score_batch(query, passages[start : start + self.batch_size])
+            )
+        return scores
+
+
+class RerankerFactory:
+    """负责按配置构建重排器；未启用时返回 None。"""
+
+    @staticmethod
+    def create(
+        provider: str | None = None,
+        model_path: Path | None = None,
+    ) -> AbstractReranker | None:
+        normalized = (provider or settings.RAG_RERANK_PROVIDER).strip().lower()
+        if normalized in {"", "none", "off"}:
+            return None
+        if normalized == "onnx":
+            resolved_path = model_path or settings.RAG_RERANK_MODEL_PATH
+            if resolved_path is None:
+                raise ValueError("RAG_RERANK_MODEL_PATH 未配置")
+            return OnnxCrossEncoderReranker(
+                Path(resolved_path),
+                batch_size=settings.RAG_RERANK_BATCH_SIZE,
+                max_length=settings.RAG_RERANK_MAX_LENGTH,
+                threads=settings.RAG_RERANK_THREADS,
+            )
+        raise ValueError(f"Unsupported RAG rerank provider: {provider}")
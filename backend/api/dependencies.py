@@ -32,6 +32,7 @@ from backend.api.deps.workflows import (
     get_chat_workflow,
     get_knowledge_rag_workflow,
     get_knowledge_upload_workflow,
+    get_user_import_workflow,
 )
 
 __all__ = [
@@ -51,6 +52,7 @@ __all__ = [
     "get_knowledge_service",
     "get_knowledge_upload_workflow",
     "get_knowledge_rag_workflow",
+    "get_user_import_workflow",
     "get_task_service",
     "get_session_query_service",
     "get_user_service",
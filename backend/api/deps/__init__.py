@@ -24,6 +24,7 @@ from backend.api.deps.workflows import (
     get_chat_workflow,
     get_knowledge_rag_workflow,
     get_knowledge_upload_workflow,
+    get_user_import_workflow,
 )
 
 __all__ = [
@@ -46,4 +47,5 @@ __all__ = [
     "get_chat_workflow",
     "get_knowledge_upload_workflow",
     "get_knowledge_rag_workflow",
+    "get_user_import_workflow",
 ]
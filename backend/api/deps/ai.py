@@ -1,19 +1,25 @@
-from fastapi import Depends
+import logging
+
+from fastapi import Depends, Request
 
 from backend.ai.providers.embedding.rag_embedding import RAGEmbedderFactory
 from backend.ai.providers.llm.factory import LLMProviderFactory
+from backend.ai.providers.rerank import RerankerFactory
 from backend.api.deps.uow import get_uow
 from backend.core.config import settings
 from backend.domain.interfaces import (
     AbstractLLMService,
     AbstractRAGEmbedder,
     AbstractRAGService,
+    AbstractReranker,
     AbstractUnitOfWork,
 )
 from backend.services.chunking_service import ChunkingService
 from backend.services.rag_service import RAGService
 from backend.services.vector_index_service import VectorIndexService
 
+logger = logging.getLogger(__name__)
+
 
 def get_llm_service() -> AbstractLLMService:
     return LLMProviderFactory.create(provider=settings.LLM_PROVIDER)
@@ -30,11 +36,37 @@ def get_rag_embedder() -> AbstractRAGEmbedder:
     )
 
 
+def get_reranker(request: Request) -> AbstractReranker | None:
+    # 模型在应用启动时构建一次（见 load_reranker）；加载失败时为 None，检索退回融合顺序
+    return getattr(request.app.state, "reranker", None)
+
+
+def load_reranker() -> AbstractReranker | None:
+    """
+    按配置构建重排器（应用启动时调用一次）。
+    依赖缺失、模型目录不完整或配置错误只记录日志并返回 None，不让每个 RAG 请求都失败。
+    """
+    try:
+        return RerankerFactory.create()
+    except Exception:
+        logger.exception(
+            "重排模型加载失败，检索退回融合排序: provider=%s",
+            settings.RAG_RERANK_PROVIDER,
+        )
+        return None
+
+
 def get_rag_service(
     uow: AbstractUnitOfWork = Depends(get_uow),
     embedder: AbstractRAGEmbedder = Depends(get_rag_embedder),
+    reranker: AbstractReranker | None = Depends(get_reranker),
 ) -> AbstractRAGService:
-    return RAGService(uow=uow, embedder=embedder, top_k=settings.RAG_TOP_K)
+    return RAGService(
+        uow=uow,
+        embedder=embedder,
+        top_k=settings.RAG_TOP_K,
+        reranker=reranker,
+    )
 
 
 def get_chunking_service() -> ChunkingService:
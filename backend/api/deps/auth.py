@@ -9,8 +9,8 @@ from pydantic import ValidationError as PydanticValidationError
 from backend.api.deps.uow import get_uow
 from backend.core.config import settings
 from backend.domain.interfaces import AbstractUnitOfWork
-from backend.models.orm.user import User
 from backend.models.schemas.user_schema import UserLogin
+from backend.services.principal_cache_service import AuthPrincipal, principal_cache
 from backend.services.user_service import UserService
 
 reusable_oauth2 = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
@@ -35,7 +35,7 @@ def get_login_data(
 async def get_current_user(
     uow: AbstractUnitOfWork = Depends(get_uow),
     token: str = Depends(reusable_oauth2),
-) -> User:
+) -> AuthPrincipal:
     try:
         payload = jwt.decode(
             token,
@@ -54,19 +54,26 @@ async def get_current_user(
             detail="Token 无效或已过期",
         ) from e
 
-    logger.debug("Current value of x: %s, type: %s", user_id, type(user_id))
+    # 同一 Token 的重复请求直接命中缓存，不开 UoW、不查库
+    iat = str(payload.get("iat", ""))
+    principal = await principal_cache.get(user_id, iat)
+    if principal is not None:
+        return principal
 
     async with uow:
         user = await UserService(uow).get_by_id(user_id)
 
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="用户不存在")
-    return user
+
+    principal = AuthPrincipal.from_user(user)
+    await principal_cache.set(user_id, iat, principal)
+    return principal
 
 
 def get_current_active_user(
-    current_user: User = Depends(get_current_user),
-) -> User:
+    current_user: AuthPrincipal = Depends(get_current_user),
+) -> AuthPrincipal:
     if not current_user.is_active:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -76,8 +83,8 @@ def get_current_active_user(
 
 
 def get_current_superuser(
-    current_user: User = Depends(get_current_active_user),
-) -> User:
+    current_user: AuthPrincipal = Depends(get_current_active_user),
+) -> AuthPrincipal:
     if not current_user.is_superuser:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="权限不足")
     return current_user
@@ -17,6 +17,7 @@ def get_knowledge_service(
         uow=uow,
         storage_root=settings.KNOWLEDGE_STORAGE_ROOT,
         max_upload_size_mb=settings.KNOWLEDGE_MAX_UPLOAD_SIZE_MB,
+        max_batch_files=settings.KNOWLEDGE_BATCH_MAX_FILES,
     )
 
 
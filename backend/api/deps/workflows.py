@@ -1,4 +1,4 @@
-from fastapi import Depends
+from fastapi import Depends, Request
 
 from backend.api.deps.ai import (
     get_chunking_service,
@@ -6,7 +6,11 @@ from backend.api.deps.ai import (
     get_rag_service,
     get_vector_index_service,
 )
-from backend.api.deps.services import get_knowledge_service, get_task_service
+from backend.api.deps.services import (
+    get_knowledge_service,
+    get_task_service,
+    get_user_import_service,
+)
 from backend.api.deps.uow import get_uow
 from backend.domain.interfaces import (
     AbstractLLMService,
@@ -16,19 +20,28 @@ from backend.domain.interfaces import (
 from backend.services.chunking_service import ChunkingService
 from backend.services.knowledge_service import KnowledgeService
 from backend.services.task_service import TaskService
+from backend.services.unit_of_work import SQLAlchemyUnitOfWork
+from backend.services.user_import_service import UserImportService
 from backend.services.vector_index_service import VectorIndexService
 from backend.workflow.chat_nonstream_workflow import ChatNonStreamWorkflow
 from backend.workflow.chat_workflow import ChatWorkflow
 from backend.workflow.knowledge_rag_workflow import KnowledgeRAGWorkflow
 from backend.workflow.knowledge_upload_workflow import KnowledgeUploadWorkflow
+from backend.workflow.user_import_workflow import UserImportWorkflow
 
 
 def get_chat_workflow(
+    request: Request,
     uow: AbstractUnitOfWork = Depends(get_uow),
     llm_service: AbstractLLMService = Depends(get_llm_service),
     rag_service: AbstractRAGService = Depends(get_rag_service),
 ) -> ChatWorkflow:
-    return ChatWorkflow(uow, llm_service, rag_service=rag_service)
+    return ChatWorkflow(
+        uow,
+        llm_service,
+        rag_service=rag_service,
+        checkpoint_uow=SQLAlchemyUnitOfWork(request.app.state.session_factory),
+    )
 
 
 def get_chat_nonstream_workflow(
@@ -59,3 +72,13 @@ def get_knowledge_upload_workflow(
         knowledge_service=knowledge_service,
         task_service=task_service,
     )
+
+
+def get_user_import_workflow(
+    import_service: UserImportService = Depends(get_user_import_service),
+    task_service: TaskService = Depends(get_task_service),
+) -> UserImportWorkflow:
+    return UserImportWorkflow(
+        import_service=import_service,
+        task_service=task_service,
+    )
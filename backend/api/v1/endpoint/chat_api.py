@@ -11,7 +11,7 @@ import uuid
 from typing import Annotated
 
 from fastapi import APIRouter, Depends, Query
-from fastapi.responses import StreamingResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
 
 from backend.api.dependencies import (
     get_chat_nonstream_workflow,
@@ -20,13 +20,13 @@ from backend.api.dependencies import (
     get_session_query_service,
 )
 from backend.middleware.rate_limit import RateLimiter
-from backend.models.orm.user import User
 from backend.models.schemas.chat_schema import (
     ChatQueryResponse,
     QuerySentRequest,
     SessionDetailResponse,
     SessionListResponse,
 )
+from backend.services.principal_cache_service import AuthPrincipal
 from backend.services.session_query_service import SessionQueryService
 from backend.workflow.chat_nonstream_workflow import ChatNonStreamWorkflow
 from backend.workflow.chat_workflow import ChatWorkflow
@@ -36,7 +36,7 @@ chat_limiter = RateLimiter(times=100000, seconds=60)
 
 router = APIRouter()
 
-CurrentUser = Annotated[User, Depends(get_current_active_user)]
+CurrentUser = Annotated[AuthPrincipal, Depends(get_current_active_user)]
 SessionQueryServiceDep = Annotated[
     SessionQueryService, Depends(get_session_query_service)
 ]
@@ -45,7 +45,9 @@ NonStreamWorkflowDep = Annotated[
 ]
 StreamWorkflowDep = Annotated[ChatWorkflow, Depends(get_chat_workflow)]
 ChatRateLimitDep = Annotated[None, Depends(chat_limiter)]
-SessionSkipParam = Annotated[int, Query(ge=0, description="跳过的记录数")]
+SessionCursorParam = Annotated[
+    str | None, Query(description="上一页返回的 next_cursor，首页留空")
+]
 SessionListLimitParam = Annotated[int, Query(ge=1, le=100, description="每页记录数")]
 SessionDetailLimitParam = Annotated[int, Query(ge=1, le=500)]
 
@@ -106,14 +108,14 @@ async def query_stream(
 async def get_sessions(
     current_user: CurrentUser,
     session_query_service: SessionQueryServiceDep,
-    skip: SessionSkipParam = 0,
+    cursor: SessionCursorParam = None,
     limit: SessionListLimitParam = 20,
 ) -> SessionListResponse:
-    """获取当前用户的会话列表（侧边栏）"""
+    """获取当前用户的会话列表（侧边栏，keyset 游标分页）"""
     async with session_query_service.uow:
         return await session_query_service.list_user_sessions(
             user_id=current_user.id,
-            skip=skip,
+            cursor=cursor,
             limit=limit,
         )
 
@@ -123,14 +125,15 @@ async def get_session_detail(
     session_id: uuid.UUID,
     current_user: CurrentUser,
     session_query_service: SessionQueryServiceDep,
-    skip: SessionSkipParam = 0,
+    cursor: SessionCursorParam = None,
     limit: SessionDetailLimitParam = 100,
-) -> SessionDetailResponse:
-    """获取会话详情及历史消息"""
+) -> ORJSONResponse:
+    """获取会话详情及历史消息（单条 SQL + orjson 直出，绕过逐条 Pydantic 校验）"""
     async with session_query_service.uow:
-        return await session_query_service.get_user_session_detail(
+        payload = await session_query_service.get_user_session_detail(
             user_id=current_user.id,
             session_id=session_id,
-            skip=skip,
+            cursor=cursor,
             limit=limit,
         )
+    return ORJSONResponse(payload)
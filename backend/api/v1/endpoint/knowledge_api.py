@@ -9,19 +9,24 @@ from backend.api.dependencies import (
     get_knowledge_upload_workflow,
     get_task_service,
 )
-from backend.models.orm.user import User
+from backend.middleware.upload_limit import UploadLimitRoute
 from backend.models.schemas.knowledge_schema import (
+    KnowledgeBatchUploadResponse,
     KnowledgeFileResponse,
     KnowledgeUploadResponse,
 )
 from backend.models.schemas.task_schema import TaskResponse
 from backend.services.knowledge_service import KnowledgeService
+from backend.services.principal_cache_service import AuthPrincipal
 from backend.services.task_service import TaskService
 from backend.workflow.knowledge_upload_workflow import KnowledgeUploadWorkflow
 
 router = APIRouter()
+# 单文件上传在解析表单前按请求体大小拦截，超限请求不会被完整接收
+upload_router = APIRouter(route_class=UploadLimitRoute)
 UpFile = Annotated[UploadFile, File()]
-CurrentUser = Annotated[User, Depends(get_current_active_user)]
+UpFiles = Annotated[list[UploadFile], File()]
+CurrentUser = Annotated[AuthPrincipal, Depends(get_current_active_user)]
 KnowledgeUploadWorkflowDep = Annotated[
     KnowledgeUploadWorkflow, Depends(get_knowledge_upload_workflow)
 ]
@@ -29,7 +34,7 @@ TaskServiceDep = Annotated[TaskService, Depends(get_task_service)]
 KnowledgeServiceDep = Annotated[KnowledgeService, Depends(get_knowledge_service)]
 
 
-@router.post(
+@upload_router.post(
     "/bases/{kb_id}/upload",
     response_model=KnowledgeUploadResponse,
     status_code=status.HTTP_202_ACCEPTED,
@@ -47,10 +52,11 @@ async def upload_file(
     )
 
 
-@router.post(
+@upload_router.post(
     "/bases/{kb_id}/upload-stream",
     response_model=KnowledgeUploadResponse,
     status_code=status.HTTP_202_ACCEPTED,
+    deprecated=True,
 )
 async def upload_file_stream(
     kb_id: uuid.UUID,
@@ -58,13 +64,33 @@ async def upload_file_stream(
     current_user: CurrentUser,
     upload_workflow: KnowledgeUploadWorkflowDep,
 ) -> KnowledgeUploadResponse:
-    return await upload_workflow.submit_stream_ingestion(
+    # /upload 已默认流式保存，保留该路由仅为兼容旧客户端
+    return await upload_workflow.submit_ingestion(
         kb_id=kb_id,
         user_id=current_user.id,
         upload_file=file,
     )
 
 
+@router.post(
+    "/bases/{kb_id}/upload-batch",
+    response_model=KnowledgeBatchUploadResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def upload_files_batch(
+    kb_id: uuid.UUID,
+    files: UpFiles,
+    current_user: CurrentUser,
+    upload_workflow: KnowledgeUploadWorkflowDep,
+) -> KnowledgeBatchUploadResponse:
+    # 多文件表单与 zip / tar 压缩包共用该入口，压缩包在服务端逐条解出
+    return await upload_workflow.submit_batch_ingestion(
+        kb_id=kb_id,
+        user_id=current_user.id,
+        upload_files=files,
+    )
+
+
 @router.get("/tasks/{task_id}", response_model=TaskResponse)
 async def get_task_status(
     task_id: uuid.UUID,
@@ -74,7 +100,9 @@ async def get_task_status(
     async with task_service.uow:
         task = await task_service.get_by_id(task_id=task_id)
         if not task:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="任务不存在")
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="任务不存在"
+            )
 
         await task_service.ensure_user_access(task=task, user_id=current_user.id)
     return TaskResponse.model_validate(task)
@@ -89,7 +117,12 @@ async def get_file_status(
     async with service.uow:
         file_obj = await service.get_file(file_id=file_id)
         if not file_obj:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="文件不存在")
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="文件不存在"
+            )
 
         await service.ensure_kb_access(kb_id=file_obj.kb_id, user_id=current_user.id)
     return KnowledgeFileResponse.model_validate(file_obj)
+
+
+router.include_router(upload_router)
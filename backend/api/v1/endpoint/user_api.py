@@ -6,34 +6,42 @@ from fastapi import APIRouter, Depends, File, HTTPException, Path, UploadFile, s
 from backend.api.dependencies import (
     get_current_active_user,
     get_current_superuser,
-    get_user_import_service,
+    get_user_import_workflow,
     get_user_service,
 )
-from backend.models.orm.user import User
 from backend.models.schemas.user_schema import (
     UserCreate,
-    UserImportResponse,
+    UserImportSubmitResponse,
     UserResponse,
     UserSearch,
     UserUpdate,
 )
-from backend.services.user_import_service import UserImportService
+from backend.services.principal_cache_service import AuthPrincipal
 from backend.services.user_service import UserService
+from backend.workflow.user_import_workflow import UserImportWorkflow
 
 router = APIRouter()
 
-CurrentUser = Annotated[User, Depends(get_current_active_user)]
-SuperUser = Annotated[User, Depends(get_current_superuser)]
+CurrentUser = Annotated[AuthPrincipal, Depends(get_current_active_user)]
+SuperUser = Annotated[AuthPrincipal, Depends(get_current_superuser)]
 UpFile = Annotated[UploadFile, File()]
 UserServiceDep = Annotated[UserService, Depends(get_user_service)]
-UserImportServiceDep = Annotated[UserImportService, Depends(get_user_import_service)]
+UserImportWorkflowDep = Annotated[
+    UserImportWorkflow, Depends(get_user_import_workflow)
+]
 
 
 @router.get("/me", response_model=UserResponse)
 async def read_users_me(
     current_user: CurrentUser,
+    user_service: UserServiceDep,
 ):
-    user_resp_data = UserResponse.model_validate(current_user)
+    # 认证依赖只返回缓存的精简主体，完整资料在这里按需查库
+    async with user_service.uow:
+        user = await user_service.get_by_id(current_user.id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        user_resp_data = UserResponse.model_validate(user)
 
     # 复杂的、变动的、关联的字段，手动覆盖
     # user_resp_data.org_name = current_user.organization.name if current_user.organization else "独立用户"
@@ -99,12 +107,18 @@ async def create_user(
         return UserResponse.model_validate(user)
 
 
-# 接口：通过文件上传批量插入客户
-@router.post("/csv_upload", response_model=UserImportResponse)
+# 接口：通过文件上传批量插入客户（后台任务执行，通过 /knowledge/tasks/{task_id} 查询进度）
+@router.post(
+    "/csv_upload",
+    response_model=UserImportSubmitResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
 async def csv_balk_insert_users(
     file: UpFile,
-    _: SuperUser,
-    import_service: UserImportServiceDep,
-) -> UserImportResponse:
-    async with import_service.uow:
-        return await import_service.import_from_upload(file)
+    current_user: SuperUser,
+    import_workflow: UserImportWorkflowDep,
+) -> UserImportSubmitResponse:
+    return await import_workflow.submit_import(
+        user_id=current_user.id,
+        upload_file=file,
+    )
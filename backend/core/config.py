@@ -31,6 +31,9 @@ class Settings(BaseSettings):
     POSTGRES_MAX_OVERFLOW: int = 20
 
     BATCH_SIZE: int = 500
+    # API 保存上传表格、worker 读取导入，部署时两者必须挂载同一目录
+    USER_IMPORT_STORAGE_ROOT: Path = Path(".files/user_imports")
+    USER_IMPORT_HASH_WORKERS: int = Field(default=4, ge=1)
 
     # --- LLM & AI 配置 ---
     OPENAI_API_KEY: str | None = None
@@ -42,6 +45,53 @@ class Settings(BaseSettings):
     KNOWLEDGE_CHUNK_SIZE: int = 800
     KNOWLEDGE_CHUNK_OVERLAP: int = 120
 
+    # --- 知识库流式入库 ---
+    # 每批向量化 / 写库的切片数；阶段间队列最多缓存 QUEUE_SIZE 批，
+    # 在途切片不超过 (QUEUE_SIZE + 3) * EMBED_BATCH_SIZE + WRITE_BATCH_SIZE 个，
+    # 入库峰值内存与文档大小无关
+    KNOWLEDGE_INGEST_EMBED_BATCH_SIZE: int = Field(default=32, ge=1)
+    KNOWLEDGE_INGEST_QUEUE_SIZE: int = Field(default=4, ge=1)
+    # 写库阶段攒够该行数再提交一次；COPY 关闭时退回多 VALUES INSERT
+    KNOWLEDGE_INGEST_WRITE_BATCH_SIZE: int = Field(default=256, ge=1)
+    KNOWLEDGE_INGEST_COPY_ENABLED: bool = True
+
+    # --- 知识库批量 / 压缩包上传 ---
+    # 单次批量上传（含压缩包内条目）最多入库的文件数；单文件仍受 KNOWLEDGE_MAX_UPLOAD_SIZE_MB 限制
+    KNOWLEDGE_BATCH_MAX_FILES: int = Field(default=1000, ge=1)
+    # 同一批次同时在途的入库子任务数
+    KNOWLEDGE_BATCH_PARALLELISM: int = Field(default=8, ge=1)
+    # 批次内已投递的文件超过该时长没有心跳（子任务每隔三分之一该时长刷新一次），
+    # 视为随 worker 丢失，标记失败
+    KNOWLEDGE_BATCH_FILE_TIMEOUT_SECONDS: float = Field(default=900.0, gt=0)
+    # 批次未结束时分发任务重新投递自身的间隔（回收超时文件的看门狗）
+    KNOWLEDGE_BATCH_WATCHDOG_SECONDS: float = Field(default=60.0, gt=0)
+
+    # --- Docling 解析进程池 ---
+    # process: 独立进程池（绕过 GIL）；thread: 当前进程线程池，便于调试
+    DOCLING_PARSE_POOL_KIND: str = "process"
+    # 解析进程数，也是超大 PDF 页段的并行度（为 1 时页段只能顺序解析）。
+    # 未配置时取 CPU 核数的一半（1~4）；每个 worker 常驻一份 Docling 模型，内存紧张时显式调小
+    DOCLING_PARSE_WORKERS: int | None = Field(default=None, ge=1)
+    # 每个 worker 处理该数量文档后重建，封顶内存泄漏
+    DOCLING_PARSE_MAX_TASKS_PER_CHILD: int = Field(default=20, ge=1)
+    # 单个解析任务（整篇或一个页段）自 worker 开始处理起的超时，排队时间不计入
+    DOCLING_PARSE_TIMEOUT_SECONDS: float = Field(default=300.0, gt=0)
+    # Taskiq worker 启动时预热进程池（预加载 Docling 模型）
+    DOCLING_PARSE_WARMUP: bool = False
+    # 达到该页数的 PDF 按页段拆分并行解析，每段 DOCLING_PARSE_RANGE_PAGES 页
+    DOCLING_PARSE_SPLIT_MIN_PAGES: int = Field(default=200, ge=1)
+    DOCLING_PARSE_RANGE_PAGES: int = Field(default=50, ge=1)
+
+    # --- PDF 分层抽取 ---
+    # 先读 PDF 文本层（pypdfium2），只有不合格的页才交给 Docling 完整流水线
+    PDF_TEXT_LAYER_ENABLED: bool = True
+    # 低于该字符数且页面含图片时视为扫描页
+    PDF_TEXT_LAYER_MIN_CHARS_PER_PAGE: int = Field(default=80, ge=0)
+    # 乱码字符（替换符 / 控制字符 / 私有区）占比上限
+    PDF_TEXT_LAYER_MAX_GARBAGE_RATIO: float = Field(default=0.05, ge=0, le=1)
+    # 不合格页占比超过该值时整篇交给 Docling
+    PDF_TEXT_LAYER_MAX_FALLBACK_RATIO: float = Field(default=0.5, ge=0, le=1)
+
     # --- Redis 配置 ---
     REDIS_URL: str | None = None
     TASKIQ_REDIS_URL: str | None = None
@@ -53,6 +103,57 @@ class Settings(BaseSettings):
     LLM_MAX_CONCURRENCY: int = 5
     DB_MAX_CONCURRENCY: int = 10
     RATE_LIMIT_TRUSTED_PROXY_CIDRS: str = ""
+    # 密码哈希专用执行器（process: 进程池绕过 GIL；thread: 线程池，便于调试）
+    PASSWORD_HASH_POOL_KIND: str = "process"
+    PASSWORD_HASH_MAX_WORKERS: int = Field(default=2, ge=1)
+    PASSWORD_HASH_MAX_QUEUE: int = Field(default=32, ge=0)
+
+    # --- Token 额度账本 (Redis) ---
+    TOKEN_QUOTA_LEDGER_ENABLED: bool = True
+    TOKEN_QUOTA_KEY_TTL_SECONDS: int = 86400
+    TOKEN_QUOTA_FLUSH_INTERVAL_SECONDS: float = 2.0
+    TOKEN_QUOTA_FLUSH_BATCH_SIZE: int = 500
+
+    # --- 消息终态写缓冲 (write-behind) ---
+    CHAT_WRITE_BEHIND_ENABLED: bool = False
+    CHAT_WRITE_BEHIND_FLUSH_INTERVAL_MS: int = Field(default=200, ge=10)
+    CHAT_WRITE_BEHIND_MAX_BATCH: int = Field(default=200, ge=1, le=2000)
+    CHAT_WRITE_BEHIND_SPILL_KEY: str = "chat:finalize:spill"
+    # 每个进程一份溢出日志，租约过期（进程已退出）后才允许其他副本接管重放
+    CHAT_WRITE_BEHIND_LEASE_SECONDS: int = Field(default=30, ge=5)
+
+    # --- 流式检查点 (部分回答落盘) ---
+    CHAT_STREAM_CHECKPOINT_ENABLED: bool = True
+    CHAT_STREAM_CHECKPOINT_EVERY_CHUNKS: int = Field(default=64, ge=1)
+    CHAT_STREAM_CHECKPOINT_INTERVAL_SECONDS: float = Field(default=2.0, gt=0)
+    # 终态写入前等待在途检查点的上限，超时的检查点留在后台完成而不取消
+    CHAT_STREAM_CHECKPOINT_CLOSE_TIMEOUT_SECONDS: float = Field(default=1.0, gt=0)
+    # 超过该时长未刷新的 THINKING / STREAMING 消息视为孤儿，启动时收尾为 FAILED
+    CHAT_STREAM_ORPHAN_AFTER_SECONDS: int = Field(default=600, ge=60)
+
+    # --- 对话幂等 (client_request_id) ---
+    CHAT_IDEMPOTENCY_LOCK_TTL_SECONDS: int = Field(default=300, ge=10)
+    CHAT_IDEMPOTENCY_RESULT_TTL_SECONDS: int = Field(default=3600, ge=60)
+    # 重复请求挂靠在途结果的最长等待时间
+    CHAT_IDEMPOTENCY_WAIT_TIMEOUT_SECONDS: float = Field(default=120.0, gt=0)
+    CHAT_IDEMPOTENCY_EVENTS_MAXLEN: int = Field(default=20000, ge=100)
+
+    # --- 知识库首轮问答答案缓存 (需同时打开知识库的 answer_cache_enabled) ---
+    CHAT_ANSWER_CACHE_ENABLED: bool = False
+    CHAT_ANSWER_CACHE_MAX_ENTRIES: int = Field(default=2048, ge=1)
+    CHAT_ANSWER_CACHE_TTL_SECONDS: int = Field(default=3600, ge=1)
+    # 命中时模拟流式回放的分片长度（字符）
+    CHAT_ANSWER_CACHE_REPLAY_CHUNK_CHARS: int = Field(default=32, ge=1)
+    # 语义缓存：精确未命中时按查询向量余弦相似度找近邻（复用检索已算出的向量）
+    CHAT_SEMANTIC_CACHE_ENABLED: bool = False
+    CHAT_SEMANTIC_CACHE_THRESHOLD: float = Field(default=0.95, gt=0, le=1)
+    CHAT_SEMANTIC_CACHE_MAX_ENTRIES_PER_KB: int = Field(default=512, ge=1)
+
+    # --- 认证主体缓存 ---
+    AUTH_PRINCIPAL_CACHE_ENABLED: bool = True
+    AUTH_PRINCIPAL_LOCAL_TTL_SECONDS: float = 5.0
+    AUTH_PRINCIPAL_REDIS_TTL_SECONDS: int = 60
+    AUTH_PRINCIPAL_LOCAL_MAX_ENTRIES: int = 10000
 
     # --- LLM 对话配置 ---
     LLM_PROVIDER: str = "mock"
@@ -68,6 +169,26 @@ class Settings(BaseSettings):
     CHAT_MEMORY_SNIPPET_CHARS: int = 120
     CHAT_MEMORY_FETCH_LIMIT: int = 2000
     RAG_TOP_K: int = 4
+    # 注入 RAG 模板的片段总 Token 上限（按得分/Token 贪心装箱，0 表示不限）
+    RAG_CONTEXT_TOKEN_BUDGET: int = Field(default=1200, ge=0)
+    RAG_CONTEXT_MERGE_ADJACENT: bool = True
+    # MMR 多样性重排：取 top_k × 倍数的候选，按 λ·相关度 − (1−λ)·冗余度 选出 top_k
+    RAG_MMR_ENABLED: bool = False
+    RAG_MMR_LAMBDA: float = Field(default=0.7, ge=0, le=1)
+    RAG_MMR_CANDIDATE_MULTIPLIER: int = Field(default=4, ge=1)
+    # 重排超出该耗时后剩余名额按原相关度顺序补齐
+    RAG_MMR_LATENCY_BUDGET_MS: float = Field(default=20.0, gt=0)
+    # Cross-encoder 重排（none | onnx）；onnx 需安装 rerank 可选依赖（onnxruntime、tokenizers），
+    # 模型目录内放 model.onnx 与 tokenizer.json。启用后优先于 MMR；启动时加载失败则不重排。
+    RAG_RERANK_PROVIDER: str = "none"
+    RAG_RERANK_MODEL_PATH: Path | None = None
+    RAG_RERANK_CANDIDATES: int = Field(default=20, ge=1)
+    RAG_RERANK_BATCH_SIZE: int = Field(default=16, ge=1)
+    RAG_RERANK_MAX_LENGTH: int = Field(default=512, ge=16)
+    RAG_RERANK_THREADS: int = Field(default=2, ge=1)
+    # 重排硬超时：超时后退回融合/向量检索原顺序
+    RAG_RERANK_TIMEOUT_MS: float = Field(default=300.0, gt=0)
+    RAG_RERANK_CACHE_MAX_ENTRIES: int = Field(default=10000, ge=0)
     RAG_EMBED_PROVIDER: str = "openai-compatible"
     RAG_EMBED_MODEL_NAME: str = "text-embedding-3-small"
     RAG_EMBED_BASE_URL: str | None = None
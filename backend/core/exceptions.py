@@ -99,6 +99,12 @@ class DependencyUnavailable(AppError):
     status_code = 503
 
 
+class TooManyRequests(AppError):
+    """服务端资源排队过深，快速失败让客户端稍后重试"""
+
+    status_code = 429
+
+
 class LLMError(ServiceError):
     """LLM 相关错误的基类"""
 
@@ -0,0 +1,156 @@
+"""
+Password Hash Executor — 密码哈希专用执行器
+
+设计要点：
+- Argon2 是 CPU + 内存密集型计算，原先借用 Starlette 共享线程池，
+  登录/注册风暴时会把线程池占满，连带 embedding、文件写入等 to_thread 调用一起饿死。
+- 这里使用独立的进程池（绕过 GIL），并发上限 = PASSWORD_HASH_MAX_WORKERS。
+- 进程池之外再限制排队长度：在途任务超过 workers + PASSWORD_HASH_MAX_QUEUE 时
+  直接抛 TooManyRequests (429)，而不是让请求无限堆积直到超时。
+- 暴露 Prometheus 指标：在途 / 排队深度 / 拒绝次数，随 /metrics 一起输出。
+"""
+
+import asyncio
+import functools
+import logging
+import multiprocessing
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, TypeVar
+
+from prometheus_client import Counter, Gauge
+from pwdlib import PasswordHash
+from pwdlib.exceptions import PwdlibError
+
+from backend.core.config import settings
+from backend.core.exceptions import TooManyRequests
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+HASH_IN_FLIGHT = Gauge(
+    "password_hash_in_flight",
+    "正在执行或排队中的密码哈希任务数",
+)
+HASH_QUEUE_DEPTH = Gauge(
+    "password_hash_queue_depth",
+    "超出 worker 数、正在排队等待的密码哈希任务数",
+)
+HASH_REJECTED = Counter(
+    "password_hash_rejected_total",
+    "因排队过深被拒绝 (429) 的密码哈希任务数",
+)
+
+# 每个 worker 进程各自持有一个实例，避免每次调用都重新构造
+_worker_hasher: PasswordHash | None = None
+
+
+def _get_worker_hasher() -> PasswordHash:
+    global _worker_hasher
+    if _worker_hasher is None:
+        _worker_hasher = PasswordHash.recommended()
+    return _worker_hasher
+
+
+def hash_password_sync(password: str) -> str:
+    """在 worker 中执行：生成哈希（必须是模块级函数才能被 pickle）"""
+    return _get_worker_hasher().hash(password)
+
+
+def hash_passwords_sync(passwords: list[str]) -> list[str]:
+    """在 worker 中执行：批量生成哈希，摊薄跨进程传参开销（批量导入用）"""
+    hasher = _get_worker_hasher()
+    return [hasher.hash(password) for password in passwords]
+
+
+def verify_password_sync(plain_password: str, hashed_password: str) -> bool:
+    """在 worker 中执行：校验密码，非法哈希格式视为校验失败"""
+    try:
+        return _get_worker_hasher().verify(plain_password, hashed_password)
+    except PwdlibError:
+        return False
+
+
+class PasswordHashExecutor:
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        max_queue: int | None = None,
+        kind: str | None = None,
+    ):
+        self.max_workers = max_workers or settings.PASSWORD_HASH_MAX_WORKERS
+        self.max_queue = (
+            max_queue if max_queue is not None else settings.PASSWORD_HASH_MAX_QUEUE
+        )
+        self.kind = kind or settings.PASSWORD_HASH_POOL_KIND
+        self._pool: Executor | None = None
+        self._in_flight = 0
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self._in_flight - self.max_workers)
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.kind == "thread":
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="password-hash",
+                )
+            else:
+                # 服务进程本身是多线程的，fork 可能继承锁导致死锁，改用 spawn
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+        return self._pool
+
+    def _update_metrics(self) -> None:
+        HASH_IN_FLIGHT.set(self._in_flight)
+        HASH_QUEUE_DEPTH.set(self.queue_depth)
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        # 事件循环单线程，计数无需加锁
+        if self._in_flight >= self.max_workers + self.max_queue:
+            HASH_REJECTED.inc()
+            raise TooManyRequests(
+                "认证请求过多，请稍后重试",
+                details={"in_flight": self._in_flight},
+            )
+
+        self._in_flight += 1
+        self._update_metrics()
+        try:
+            loop = asyncio.get_running_loop()
+            call = functools.partial(fn, *args)
+            pool = self._get_pool()
+            try:
+                return await loop.run_in_executor(pool, call)
+            except BrokenProcessPool:
+                # worker 被 OOM killer 等杀掉后进程池不可再用，重建后重试一次
+                logger.warning("密码哈希进程池已损坏，重建后重试")
+                self._reset_pool(pool)
+                return await loop.run_in_executor(self._get_pool(), call)
+        finally:
+            self._in_flight -= 1
+            self._update_metrics()
+
+    def _reset_pool(self, pool: Executor) -> None:
+        # 多个哈希同时遇到损坏的池时，后到者不能关掉先到者已重建的新池（会撤销其重试）
+        if self._pool is pool:
+            self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+
+password_hash_executor = PasswordHashExecutor()
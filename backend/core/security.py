@@ -2,33 +2,30 @@ from datetime import UTC, datetime, timedelta
 from typing import Any
 
 import jwt
-from fastapi.concurrency import run_in_threadpool
-from pwdlib import PasswordHash
-from pwdlib.exceptions import PwdlibError
 
 from backend.core.config import settings
-
-password_hasher = PasswordHash.recommended()
+from backend.core.hash_executor import (
+    hash_password_sync,
+    password_hash_executor,
+    verify_password_sync,
+)
 
 
 async def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     异步校验密码：防止计算阻塞事件循环。
-    Argon2 相比 Bcrypt 更消耗 CPU/内存，因此 run_in_threadpool 是必须的。
+    Argon2 相比 Bcrypt 更消耗 CPU/内存，放到专用进程池执行，
+    不占用 Starlette 共享线程池；排队过深时抛 TooManyRequests (429)。
     """
-    try:
-        return await run_in_threadpool(
-            password_hasher.verify, plain_password, hashed_password
-        )
-    except PwdlibError:
-        # 处理可能的解码错误或非法哈希格式
-        return False
+    return await password_hash_executor.run(
+        verify_password_sync, plain_password, hashed_password
+    )
 
 
 async def get_password_hash(password: str) -> str:
     """异步生成哈希密码"""
 
-    return await run_in_threadpool(password_hasher.hash, password)
+    return await password_hash_executor.run(hash_password_sync, password)
 
 
 def create_access_token(
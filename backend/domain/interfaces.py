@@ -1,6 +1,7 @@
+import logging
 import uuid
 from abc import ABC, abstractmethod
-from collections.abc import AsyncGenerator
+from collections.abc import AsyncGenerator, Awaitable, Callable
 
 from backend.models.schemas.chat_schema import LLMQueryDTO, LLMResultDTO
 from backend.repositories.chat_repo import ChatRepository
@@ -8,6 +9,8 @@ from backend.repositories.knowledge_repo import KnowledgeRepository
 from backend.repositories.task_repo import TaskRepository
 from backend.repositories.user_repo import UserRepository
 
+logger = logging.getLogger(__name__)
+
 
 class AbstractUnitOfWork(ABC):
     user_repo: UserRepository
@@ -16,13 +19,29 @@ class AbstractUnitOfWork(ABC):
     task_repo: TaskRepository
 
     async def __aenter__(self):
+        self._after_commit: list[Callable[[], Awaitable[None]]] = []
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
+        callbacks, self._after_commit = getattr(self, "_after_commit", []), []
         if exc_type is None:
             await self.commit()
         else:
             await self.rollback()
+            return
+        # 事务已提交，回调失败只记录日志，不能让调用方误以为写入失败
+        for callback in callbacks:
+            try:
+                await callback()
+            except Exception:
+                logger.exception("UnitOfWork 提交后回调执行失败")
+
+    def after_commit(self, callback: Callable[[], Awaitable[None]]) -> None:
+        """
+        注册事务提交成功后才执行的回调（Redis 账本结算、缓存失效等）。
+        回滚时回调被丢弃，避免外部状态先于 DB 生效。
+        """
+        self._after_commit.append(callback)
 
     @abstractmethod
     async def commit(self): ...
@@ -67,6 +86,15 @@ class AbstractRAGService(ABC):
         """返回检索命中的上下文片段"""
         ...
 
+    async def retrieve_with_embedding(
+        self,
+        query_text: str,
+        kb_id: uuid.UUID | None,
+        top_k: int | None = None,
+    ) -> tuple[list[dict], list[float] | None]:
+        """返回 (检索片段, 查询向量)；实现不暴露查询向量时为 None"""
+        return await self.retrieve(query_text=query_text, kb_id=kb_id, top_k=top_k), None
+
     @abstractmethod
     async def retrieve_fulltext(
         self,
@@ -95,3 +123,16 @@ class AbstractRAGEmbedder(ABC):
     def encode_query(self, text: str) -> list[float]:
         """将查询文本编码为向量"""
         ...
+
+    def encode_batch(self, texts: list[str]) -> list[list[float]]:
+        """批量编码；默认逐条调用，支持批量接口的实现应覆盖以减少往返"""
+        return [self.encode_query(text) for text in texts]
+
+
+class AbstractReranker(ABC):
+    """Cross-encoder 重排器抽象接口"""
+
+    @abstractmethod
+    def score(self, query: str, passages: list[str]) -> list[float]:
+        """逐对打分 (query, passage)，分数越高越相关；CPU 密集，调用方负责放到线程中执行"""
+        ...
@@ -5,13 +5,19 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from prometheus_fastapi_instrumentator import Instrumentator
 
+from backend.api.deps.ai import load_reranker
 from backend.api.v1.api import api_router
 from backend.core.config import settings
 from backend.core.database import init_db
 from backend.core.exceptions import setup_exception_handlers
+from backend.core.hash_executor import password_hash_executor
 from backend.core.logger import setup_logging
 from backend.core.redis import redis_client
 from backend.middleware.tracing import setup_tracing
+from backend.services.chat_service import ChatMessageUpdater
+from backend.services.message_write_buffer import message_write_buffer
+from backend.services.token_quota_service import TokenQuotaReconciler
+from backend.services.unit_of_work import SQLAlchemyUnitOfWork
 
 # 1. 初始化
 setup_logging()
@@ -23,6 +29,17 @@ logger = logging.getLogger(__name__)
 logger.info("系统初始化完成")
 
 
+async def _fail_orphaned_messages(app: FastAPI) -> None:
+    try:
+        async with SQLAlchemyUnitOfWork(app.state.session_factory) as uow:
+            await ChatMessageUpdater(uow).fail_orphaned_messages(
+                settings.CHAT_STREAM_ORPHAN_AFTER_SECONDS
+            )
+    except Exception:
+        # 回收失败不阻塞启动，下次启动再扫
+        logger.exception("孤儿消息回收失败")
+
+
 # 1. 定义生命周期（DBA 关心的资源管理）
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -32,9 +49,26 @@ async def lifespan(app: FastAPI):
     async with init_db(app):
         # 初始化 Redis
         await redis_client.init()
+        # Cross-encoder 重排模型只加载一次，失败时退回融合排序
+        app.state.reranker = load_reranker()
+        # Token 额度账本后台对账（token_usage_pending → users.used_tokens）
+        quota_reconciler = TokenQuotaReconciler(app.state.session_factory)
+        quota_reconciler.start()
+        # 消息终态写缓冲：先接管已退出进程残留的溢出日志（租约过期的才接管）
+        if settings.CHAT_WRITE_BEHIND_ENABLED:
+            message_write_buffer.start(app.state.session_factory)
+            await message_write_buffer.recover()
+        # 收尾上次崩溃遗留的生成中消息（须在写缓冲重放之后）
+        await _fail_orphaned_messages(app)
         yield
+        # 停机前先刷写缓冲，再把未回写的额度增量刷回 DB
+        if message_write_buffer.running:
+            await message_write_buffer.stop()
+        await quota_reconciler.stop()
         # 关闭 Redis
         await redis_client.close()
+        # 回收密码哈希进程池
+        password_hash_executor.shutdown()
     logger.info("系统已关闭")
 
 
@@ -0,0 +1,69 @@
+"""
+Upload Limit — 上传请求体大小限制
+
+FastAPI 在调用端点（及其依赖）之前就会把 multipart 表单整体解析并落到临时文件，
+服务层的大小校验要等整段上传收完才生效，超大请求依然会被完整接收一遍。
+这里在路由层提前拦截：
+- 声明了 Content-Length 且超过上限的请求直接 413，不读取请求体；
+- 分块传输等未声明长度的请求，接收过程中累计字节数，超限立即中止解析。
+上限 = 单文件上限 + multipart 边界与表单头的余量；精确的文件大小仍由服务层校验。
+"""
+
+from collections.abc import Callable, Coroutine
+from typing import Any
+
+from fastapi import HTTPException, Request, Response, status
+from fastapi.routing import APIRoute
+from starlette.types import Message, Receive
+
+from backend.core.config import settings
+
+# multipart 边界、各部分头与非文件字段的余量
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+def max_upload_body_bytes() -> int:
+    return (
+        settings.KNOWLEDGE_MAX_UPLOAD_SIZE_MB * 1024 * 1024 + MULTIPART_OVERHEAD_BYTES
+    )
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+        detail=f"上传文件超过大小限制（最大 {settings.KNOWLEDGE_MAX_UPLOAD_SIZE_MB}MB）",
+    )
+
+
+def _limited_receive(receive: Receive, limit: int) -> Receive:
+    received = 0
+
+    async def receive_within_limit() -> Message:
+        nonlocal received
+        message = await receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > limit:
+                # HTTPException 会穿过 FastAPI 的表单解析原样抛出
+                raise _too_large()
+        return message
+
+    return receive_within_limit
+
+
+class UploadLimitRoute(APIRoute):
+    """单文件上传路由：在解析 multipart 之前 / 之中按请求体大小拒绝超限上传"""
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+
+        async def limited_handler(request: Request) -> Response:
+            limit = max_upload_body_bytes()
+            declared = request.headers.get("content-length", "")
+            if declared.isdigit() and int(declared) > limit:
+                raise _too_large()
+            return await handler(
+                Request(request.scope, _limited_receive(request.receive, limit))
+            )
+
+        return limited_handler
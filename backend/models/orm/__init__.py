@@ -3,11 +3,12 @@ from .chat import ChatMessage, ChatSession
 from .chunk import ChunkSourceType, DocumentChunk
 from .knowledge import File, FileStatus, KnowledgeBase
 from .task import TaskJob
-from .user import User
+from .user import TokenUsagePending, User
 
 __all__ = [
     "Base",
     "User",
+    "TokenUsagePending",
     "ChatMessage",
     "ChatSession",
     "File",
@@ -4,7 +4,7 @@ import uuid
 from enum import StrEnum
 from typing import TYPE_CHECKING
 
-from sqlalchemy import ForeignKey, Index, Integer, String, Text, text
+from sqlalchemy import BigInteger, ForeignKey, Index, Integer, String, Text, text
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -31,6 +31,19 @@ class ChatSession(Base, BaseIdModel, AuditMixin):
     # 扩展配置：如温度、模型选择
     llm_config: Mapped[dict] = mapped_column(JSONB, server_default=text("'{}'"))
 
+    # 冗余计数：随消息写入原子递增，侧边栏 / 详情无需再聚合 chat_messages
+    message_count: Mapped[int] = mapped_column(
+        default=0, server_default=text("0"), comment="消息总数"
+    )
+    total_tokens: Mapped[int] = mapped_column(
+        BigInteger, default=0, server_default=text("0"), comment="会话累计 Token 数"
+    )
+
+    # 侧边栏按 (updated_at, id) 做 keyset 分页，倒序扫描同一索引即可
+    __table_args__ = (
+        Index("idx_sessions_user_updated_id", "user_id", "updated_at", "id"),
+    )
+
     # 双向关联
     user: Mapped[User] = relationship(back_populates="sessions")
     messages: Mapped[list[ChatMessage]] = relationship(
@@ -86,9 +99,16 @@ class ChatMessage(Base, BaseIdModel, AuditMixin):
 
     # 核心索引：确保按会话查询消息时，顺序是直接从索引读取的，无需内存排序
     __table_args__ = (
-        Index("idx_msgs_session_created", "session_id", "created_at"),
+        # 带上 id 作为决胜列，支撑 (created_at, id) keyset 翻页
+        Index("idx_msgs_session_created_id", "session_id", "created_at", "id"),
         # 增加 client_request_id 的唯一索引
         Index("idx_msgs_client_req_id", "client_request_id", unique=True),
+        # 生成中消息的部分索引：只含少量在途行，供孤儿消息回收按 updated_at 扫描
+        Index(
+            "idx_msgs_in_flight_updated",
+            "updated_at",
+            postgresql_where=text("status IN ('thinking', 'streaming')"),
+        ),
     )
 
     chunks: Mapped[list[DocumentChunk]] = relationship(
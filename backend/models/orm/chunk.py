@@ -38,6 +38,8 @@ class DocumentChunk(Base, BaseIdModel):
     token_count: Mapped[int] = mapped_column(Integer)
     # 序列号，用于拼接上下文
     chunk_index: Mapped[int] = mapped_column(Integer)
+    # 内容 SHA-256（hex），重新入库时按它做差量，未变化的切片沿用旧向量
+    content_hash: Mapped[str | None] = mapped_column(String(64))
     # 元数据：存储如 {"page_label": "12", "header": "Chapter 1"} 或 {"session_id": "..."}
     meta_info: Mapped[dict] = mapped_column(JSONB, server_default=text("'{}'"))
 
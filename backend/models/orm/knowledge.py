@@ -4,7 +4,7 @@ import uuid
 from enum import StrEnum
 from typing import TYPE_CHECKING
 
-from sqlalchemy import ForeignKey, Integer, String, Text
+from sqlalchemy import BigInteger, Boolean, ForeignKey, Integer, String, Text, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from backend.models.orm.base import AuditMixin, Base, BaseIdModel
@@ -32,6 +32,16 @@ class KnowledgeBase(Base, BaseIdModel, AuditMixin):
     user_id: Mapped[uuid.UUID] = mapped_column(
         ForeignKey("users.id", ondelete="CASCADE"), index=True
     )
+    # 内容版本：分块每次增删都递增，答案缓存键包含它，知识库一变旧答案即失效
+    generation: Mapped[int] = mapped_column(
+        BigInteger, default=0, server_default=text("0"), comment="内容版本号"
+    )
+    answer_cache_enabled: Mapped[bool] = mapped_column(
+        Boolean,
+        default=False,
+        server_default=text("false"),
+        comment="是否对该知识库的首轮问答启用答案缓存",
+    )
 
     # 关联
     user: Mapped[User] = relationship(back_populates="knowledge_bases")
@@ -56,6 +66,10 @@ class File(Base, BaseIdModel, AuditMixin):
     file_path: Mapped[str] = mapped_column(String(512), nullable=False)
     file_size: Mapped[int] = mapped_column(Integer, default=0)
     status: Mapped[FileStatus] = mapped_column(String(20), default=FileStatus.UPLOADED)
+    # 文件内容 SHA-256（hex），存储按它寻址；同内容文件可直接复用已入库的切片
+    content_hash: Mapped[str | None] = mapped_column(String(64), index=True)
+    # 最近一次成功入库时的切片 / 向量化配置指纹，配置一致才允许复用切片
+    ingest_fingerprint: Mapped[str | None] = mapped_column(String(64))
 
     kb: Mapped[KnowledgeBase] = relationship(back_populates="files")
     chunks: Mapped[list[DocumentChunk]] = relationship(
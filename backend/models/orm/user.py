@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+import uuid
+from datetime import datetime
 from typing import TYPE_CHECKING
 
-from sqlalchemy import Boolean, String, text
+from sqlalchemy import Boolean, DateTime, ForeignKey, String, func, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from backend.models.orm.base import AuditMixin, Base, BaseIdModel
@@ -43,3 +45,22 @@ class User(Base, BaseIdModel, AuditMixin):
     # 反向关联
     sessions: Mapped[list[ChatSession]] = relationship(back_populates="user")
     knowledge_bases: Mapped[list[KnowledgeBase]] = relationship(back_populates="user")
+
+
+class TokenUsagePending(Base, BaseIdModel):
+    """
+    额度账本的待回写增量：结算时与业务写入同一事务落库，
+    对账器按批取走并累加到 users.used_tokens，Redis 丢失或进程崩溃都不会丢账。
+    """
+
+    __tablename__ = "token_usage_pending"
+
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), index=True
+    )
+    tokens: Mapped[int] = mapped_column(comment="本次结算的 Token 数")
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        comment="创建时间",
+    )
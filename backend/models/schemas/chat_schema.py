@@ -12,7 +12,7 @@ Chat Schema 层 — 企业级 Pydantic 模型
 import uuid
 from datetime import datetime
 from enum import StrEnum
-from typing import Annotated, Literal, TypedDict
+from typing import Annotated, Any, Literal, TypedDict
 
 from pydantic import BaseModel, ConfigDict, Field, field_validator
 
@@ -89,7 +89,7 @@ class QuerySentRequest(BaseModel):
 class SessionListRequest(BaseModel):
     """获取会话列表的查询参数"""
 
-    skip: int = Field(default=0, ge=0, description="跳过的记录数")
+    cursor: str | None = Field(default=None, description="上一页返回的 next_cursor")
     limit: int = Field(default=20, ge=1, le=100, description="每页记录数")
 
 
@@ -97,7 +97,7 @@ class SessionHistoryRequest(BaseModel):
     """获取会话历史消息的请求参数"""
 
     session_id: uuid.UUID = Field(..., description="会话 ID")
-    skip: int = Field(default=0, ge=0, description="跳过的记录数")
+    cursor: str | None = Field(default=None, description="上一页返回的 next_cursor")
     limit: int = Field(default=100, ge=1, le=500, description="每页记录数")
 
 
@@ -141,6 +141,7 @@ class SessionResponse(BaseModel):
     user_id: uuid.UUID
     kb_id: uuid.UUID | None = None
     llm_config: dict = Field(default_factory=dict)
+    message_count: int = 0
     total_tokens: int = 0
     created_at: datetime
     updated_at: datetime
@@ -149,12 +150,12 @@ class SessionResponse(BaseModel):
 
 
 class SessionListResponse(BaseModel):
-    """会话列表的分页响应"""
+    """会话列表的 keyset 分页响应"""
 
     items: list[SessionResponse]
-    total: int = Field(..., ge=0, description="总记录数")
-    skip: int
     limit: int
+    next_cursor: str | None = Field(None, description="下一页游标，为空表示没有更多")
+    has_more: bool = False
 
 
 class ChatQueryResponse(BaseModel):
@@ -176,6 +177,8 @@ class SessionDetailResponse(BaseModel):
     session: SessionResponse
     messages: list[MessageResponse]
     total_messages: int
+    next_cursor: str | None = Field(None, description="下一页消息游标，为空表示没有更多")
+    has_more: bool = False
 
 
 # ============================================================
@@ -183,6 +186,16 @@ class SessionDetailResponse(BaseModel):
 # ============================================================
 
 
+class SessionDetailPayload(TypedDict):
+    """会话详情的纯 dict 形态，结构与 SessionDetailResponse 一致，供 orjson 直出"""
+
+    session: dict[str, Any]
+    messages: list[dict[str, Any]]
+    total_messages: int
+    next_cursor: str | None
+    has_more: bool
+
+
 class LLMQueryDTO(BaseModel):
     """传递给 LLMService 的查询参数"""
 
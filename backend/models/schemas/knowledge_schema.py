@@ -11,6 +11,20 @@ class KnowledgeUploadResponse(BaseModel):
     task_status: str = Field(description="任务状态")
 
 
+class KnowledgeBatchSkippedFile(BaseModel):
+    filename: str = Field(description="被跳过的文件名或压缩包条目名")
+    reason: str = Field(description="跳过原因")
+
+
+class KnowledgeBatchUploadResponse(BaseModel):
+    task_id: uuid.UUID = Field(description="批量入库父任务 ID")
+    task_status: str = Field(description="任务状态")
+    file_ids: list[uuid.UUID] = Field(description="已保存的知识库文件 ID 列表")
+    skipped: list[KnowledgeBatchSkippedFile] = Field(
+        default_factory=list, description="未入库的文件及原因"
+    )
+
+
 class KnowledgeFileResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
@@ -139,6 +139,14 @@ class UserImportResponse(BaseModel):
     message: str
 
 
+class UserImportSubmitResponse(BaseModel):
+    """批量导入任务已受理（导入在后台任务中执行，结果写入任务 payload.result）"""
+
+    task_id: uuid.UUID
+    filename: str
+    task_status: str
+
+
 # --- Auth Schemas ---
 
 
@@ -2,7 +2,7 @@ from collections.abc import Sequence
 from typing import Any, TypeVar
 
 from pydantic import BaseModel
-from sqlalchemy import select
+from sqlalchemy import CTE, insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 ModelType = TypeVar("ModelType")
@@ -78,19 +78,9 @@ class CRUDBase[ModelType, CreateSchemaType: BaseModel, UpdateSchemaType: BaseMod
         else:
             create_data = obj_in.model_dump()
 
-        # 2. 实例化 SQLAlchemy 模型
-        # 等同于: db_obj = User(name="...", age=...)
-        # 这里用 **create_data 语法糖解包字典
-        db_obj = self.model(**create_data)
-
-        # 3. 添加到 Session 并提交
-        self.session.add(db_obj)
-        await self.session.flush()  # flush 获取 ID，但不提交事务
-        await self.session.refresh(
-            db_obj
-        )  # 如果数据库有默认值生成（如 created_at），需要 refresh 拿回来
-
-        return db_obj
+        # 2. INSERT ... RETURNING：一次往返同时拿回服务端默认值（created_at 等），
+        #    取代 add + flush + refresh 两次往返
+        return await self.insert_returning(create_data)
 
     # -----------------------------------------------------------
     # 5. UPDATE: (你之前提供的那个，为了完整性我放这里)
@@ -117,13 +107,49 @@ class CRUDBase[ModelType, CreateSchemaType: BaseModel, UpdateSchemaType: BaseMod
                 f"Unknown fields for {type(db_obj).__name__} update: {field_text}"
             )
 
-        for field, value in update_data.items():
-            setattr(db_obj, field, value)
+        if not update_data:
+            return db_obj
+
+        # UPDATE ... RETURNING 直接刷新 db_obj（populate_existing），不再 flush + refresh
+        updated = await self.update_returning(db_obj.id, update_data)
+        return updated if updated is not None else db_obj
+
+    # -----------------------------------------------------------
+    # 5.1 单语句写原语：INSERT / UPDATE ... RETURNING
+    # -----------------------------------------------------------
+    async def insert_returning(
+        self,
+        values: dict[str, Any],
+        *,
+        ctes: Sequence[CTE] = (),
+    ) -> ModelType:
+        """
+        单条 INSERT ... RETURNING，返回的 ORM 对象已进入 identity map。
+        ctes: 附带的 WITH 子句（如计数器递增），与本次写入同一条语句执行。
+        """
+        stmt = insert(self.model).values(**values)
+        for cte in ctes:
+            stmt = stmt.add_cte(cte)
+        result = await self.session.execute(stmt.returning(self.model))
+        return result.scalar_one()
 
-        self.session.add(db_obj)
-        await self.session.flush()
-        await self.session.refresh(db_obj)
-        return db_obj
+    async def update_returning(
+        self,
+        id: Any,
+        values: dict[str, Any],
+        *,
+        ctes: Sequence[CTE] = (),
+    ) -> ModelType | None:
+        """
+        按主键单条 UPDATE ... WHERE id = :id RETURNING，无需先 get。
+        行不存在时返回 None；已加载的同一对象会被返回值覆盖刷新。
+        """
+        stmt = update(self.model).where(self.model.id == id).values(**values)
+        for cte in ctes:
+            stmt = stmt.add_cte(cte)
+        stmt = stmt.returning(self.model).execution_options(populate_existing=True)
+        result = await self.session.execute(stmt)
+        return result.scalar_one_or_none()
 
     # -----------------------------------------------------------
     # 6. DELETE: 删除记录
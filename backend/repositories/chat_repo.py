@@ -1,12 +1,67 @@
 import uuid
 from collections.abc import Sequence
+from datetime import datetime
+from typing import Any
 
 from pydantic import BaseModel
-from sqlalchemy import func, select
+from sqlalchemy import (
+    CTE,
+    Integer,
+    String,
+    Text,
+    case,
+    cast,
+    column,
+    func,
+    insert,
+    literal,
+    select,
+    true,
+    tuple_,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.models.orm.chat import ChatMessage, ChatSession, MessageStatus
+from backend.models.orm.user import TokenUsagePending
 from backend.repositories.base import CRUDBase
+from backend.utils.pagination import KeysetCursor
+
+# 仍在生成中的消息状态：检查点只覆盖这些状态，孤儿回收也只扫描这些状态
+IN_FLIGHT_STATUSES = (MessageStatus.THINKING, MessageStatus.STREAMING)
+
+# 详情查询的列顺序即响应字段顺序，按位置 zip 成 dict，省去逐行 model_validate
+SESSION_DETAIL_FIELDS = (
+    "id",
+    "title",
+    "user_id",
+    "kb_id",
+    "llm_config",
+    "message_count",
+    "total_tokens",
+    "created_at",
+    "updated_at",
+)
+MESSAGE_DETAIL_FIELDS = (
+    "id",
+    "session_id",
+    "role",
+    "content",
+    "status",
+    "latency_ms",
+    "search_context",
+    "created_at",
+    "updated_at",
+)
+SESSION_DETAIL_COLUMNS = tuple(
+    getattr(ChatSession, name).label(f"s_{name}") for name in SESSION_DETAIL_FIELDS
+)
+MESSAGE_DETAIL_COLUMNS = tuple(
+    getattr(ChatMessage, name) for name in MESSAGE_DETAIL_FIELDS
+)
 
 
 class ChatRepository:
@@ -60,57 +115,92 @@ class ChatRepository:
         result = await self.session.execute(stmt)
         return result.scalars().all()
 
-    async def get_user_sessions_with_total_tokens(
+    async def get_user_sessions_page(
         self,
         user_id: uuid.UUID,
-        skip: int = 0,
         limit: int = 20,
-    ) -> list[tuple[ChatSession, int]]:
-        """获取用户会话列表并附带每个会话的总 token（避免 N+1 查询）。"""
-        total_tokens_expr = func.coalesce(
-            func.sum(ChatMessage.tokens_input + ChatMessage.tokens_output),
-            0,
-        ).label("total_tokens")
-
-        stmt = (
-            select(ChatSession, total_tokens_expr)
-            .outerjoin(ChatMessage, ChatMessage.session_id == ChatSession.id)
-            .where(ChatSession.user_id == user_id)
-            .group_by(ChatSession.id)
-            .order_by(ChatSession.updated_at.desc())
-            .offset(skip)
-            .limit(limit)
-        )
+        before: KeysetCursor | None = None,
+    ) -> Sequence[ChatSession]:
+        """
+        keyset 分页获取会话列表：WHERE (updated_at, id) < cursor，
+        走 idx_sessions_user_updated_id，翻到第几页代价都只与 limit 有关。
+        """
+        stmt = select(ChatSession).where(ChatSession.user_id == user_id)
+        if before is not None:
+            stmt = stmt.where(
+                tuple_(ChatSession.updated_at, ChatSession.id)
+                < tuple_(literal(before[0]), literal(before[1]))
+            )
+        stmt = stmt.order_by(
+            ChatSession.updated_at.desc(), ChatSession.id.desc()
+        ).limit(limit)
         result = await self.session.execute(stmt)
-        return [(row[0], int(row[1] or 0)) for row in result.all()]
+        return result.scalars().all()
 
-    async def count_user_sessions(self, user_id: uuid.UUID) -> int:
-        """统计用户会话总数（分页总量）。"""
-        stmt = (
-            select(func.count())
-            .select_from(ChatSession)
-            .where(ChatSession.user_id == user_id)
+    @staticmethod
+    def _session_counters_cte(
+        session_id: Any,
+        *,
+        messages: int = 0,
+        tokens: Any = 0,
+        name: str = "bump_session",
+    ) -> CTE:
+        """
+        会话冗余计数的原子递增（updated_at 由 onupdate 一并刷新）。
+        以 WITH 子句挂在消息写入语句上，与消息写入合并成一次往返。
+        """
+        return (
+            update(ChatSession)
+            .where(ChatSession.id == session_id)
+            .values(
+                message_count=ChatSession.message_count + messages,
+                total_tokens=ChatSession.total_tokens + tokens,
+            )
+            .cte(name)
         )
-        result = await self.session.execute(stmt)
-        return int(result.scalar() or 0)
 
-    async def get_session_total_tokens(self, session_id: uuid.UUID) -> int:
-        """计算会话消耗的总 Token 数"""
-        stmt = select(func.sum(ChatMessage.tokens_input + ChatMessage.tokens_output)).where(
-            ChatMessage.session_id == session_id
+    async def get_session_detail_rows(
+        self,
+        session_id: uuid.UUID,
+        limit: int = 100,
+        after: KeysetCursor | None = None,
+    ) -> tuple[dict[str, Any] | None, list[dict[str, Any]]]:
+        """
+        一条 SQL 取回会话详情：会话行 LEFT JOIN LATERAL 一页消息（keyset 正序）。
+        返回纯 dict（字段与 SessionResponse / MessageResponse 对齐），不构造 ORM 对象。
+        """
+        msg_stmt = select(*MESSAGE_DETAIL_COLUMNS).where(
+            ChatMessage.session_id == ChatSession.id
+        )
+        if after is not None:
+            msg_stmt = msg_stmt.where(
+                tuple_(ChatMessage.created_at, ChatMessage.id)
+                > tuple_(literal(after[0]), literal(after[1]))
+            )
+        page = (
+            msg_stmt.order_by(ChatMessage.created_at.asc(), ChatMessage.id.asc())
+            .limit(limit)
+            .lateral("page")
         )
-        result = await self.session.execute(stmt)
-        return result.scalar() or 0
 
-    async def count_session_messages(self, session_id: uuid.UUID) -> int:
-        """统计会话消息总数（分页总量）。"""
         stmt = (
-            select(func.count())
-            .select_from(ChatMessage)
-            .where(ChatMessage.session_id == session_id)
+            select(*SESSION_DETAIL_COLUMNS, *page.c)
+            .select_from(ChatSession)
+            .outerjoin(page, true())
+            .where(ChatSession.id == session_id)
         )
-        result = await self.session.execute(stmt)
-        return int(result.scalar() or 0)
+        rows = (await self.session.execute(stmt)).all()
+        if not rows:
+            return None, []
+
+        split = len(SESSION_DETAIL_FIELDS)
+        session = dict(zip(SESSION_DETAIL_FIELDS, rows[0][:split], strict=True))
+        messages = [
+            dict(zip(MESSAGE_DETAIL_FIELDS, row[split:], strict=True))
+            for row in rows
+            if row[split] is not None
+        ]
+        return session, messages
 
     # ========== ChatMessage 操作 ==========
 
@@ -142,7 +232,11 @@ class ChatRepository:
             "client_request_id": client_request_id,
             "search_context": search_context,
         }
-        return await self.message_crud.create(obj_in=data)
+        # WITH bump AS (UPDATE chat_sessions ...) INSERT ... RETURNING：一条语句
+        counters = self._session_counters_cte(
+            session_id, messages=1, tokens=tokens_input + tokens_output
+        )
+        return await self.message_crud.insert_returning(data, ctes=[counters])
 
     async def get_session_messages(
         self,
@@ -171,11 +265,10 @@ class ChatRepository:
         tokens_output: int | None = None,
         search_context: dict | None = None,
     ) -> ChatMessage | None:
-        """更新消息状态和内容"""
-        message = await self.get_message(message_id)
-        if not message:
-            return None
-
+        """
+        更新消息状态和内容：单条 UPDATE ... WHERE id RETURNING，不再先 get。
+        涉及 token 时用 WITH 子句读取旧值并把差额累加到会话计数，仍是一次往返。
+        """
         update_data = {"status": status}
         if content is not None:
             update_data["content"] = content
@@ -188,7 +281,191 @@ class ChatRepository:
         if search_context is not None:
             update_data["search_context"] = search_context
 
-        return await self.message_crud.update(db_obj=message, obj_in=update_data)
+        if tokens_input is None and tokens_output is None:
+            return await self.message_crud.update_returning(message_id, update_data)
+
+        # 同一语句内所有 CTE 共享快照，old 读到的是本次 UPDATE 之前的值
+        old = (
+            select(
+                ChatMessage.session_id,
+                ChatMessage.tokens_input,
+                ChatMessage.tokens_output,
+            )
+            .where(ChatMessage.id == message_id)
+            .cte("old_message")
+        )
+        new_input = (
+            literal(tokens_input) if tokens_input is not None else old.c.tokens_input
+        )
+        new_output = (
+            literal(tokens_output) if tokens_output is not None else old.c.tokens_output
+        )
+        delta = select(
+            new_input + new_output - old.c.tokens_input - old.c.tokens_output
+        ).scalar_subquery()
+        counters = self._session_counters_cte(
+            select(old.c.session_id).scalar_subquery(), tokens=delta
+        )
+        return await self.message_crud.update_returning(
+            message_id, update_data, ctes=[old, counters]
+        )
+
+    async def finalize_messages_batch(self, rows: Sequence[dict[str, Any]]) -> int:
+        """
+        批量写入消息终态（写缓冲刷盘用），返回命中的消息数。
+        单条 UPDATE ... FROM (VALUES ...)，并以 CTE 按会话汇总 token 差额回写计数，
+        带 user_id 的行按同一差额插入额度待回写增量；
+        重放同一批数据时差额为 0，可安全重复执行。
+        rows: id / status / content / tokens_input / tokens_output /
+              latency_ms / search_context（后两者为 None 时保留原值）/
+              user_id（可选，为 None 时不记额度）
+        """
+        if not rows:
+            return 0
+
+        data = select(
+            values(
+                column("id", PG_UUID(as_uuid=True)),
+                column("status", String),
+                column("content", Text),
+                column("tokens_input", Integer),
+                column("tokens_output", Integer),
+                column("latency_ms", Integer),
+                column("search_context", JSONB(none_as_null=True)),
+                column("user_id", PG_UUID(as_uuid=True)),
+                name="finalized_values",
+            ).data(
+                [
+                    (
+                        row["id"],
+                        str(row["status"]),
+                        row["content"],
+                        int(row["tokens_input"] or 0),
+                        int(row["tokens_output"] or 0),
+                        row.get("latency_ms"),
+                        row.get("search_context"),
+                        row.get("user_id"),
+                    )
+                    for row in rows
+                ]
+            )
+        ).cte("finalized")
+        old = (
+            select(
+                ChatMessage.id,
+                ChatMessage.session_id,
+                ChatMessage.tokens_input,
+                ChatMessage.tokens_output,
+            )
+            .join(data, ChatMessage.id == data.c.id)
+            .cte("old_messages")
+        )
+        deltas = (
+            select(
+                old.c.session_id,
+                func.sum(
+                    data.c.tokens_input
+                    + data.c.tokens_output
+                    - old.c.tokens_input
+                    - old.c.tokens_output
+                ).label("delta"),
+            )
+            .join_from(old, data, old.c.id == data.c.id)
+            .group_by(old.c.session_id)
+            .subquery("deltas")
+        )
+        counters = (
+            update(ChatSession)
+            .where(ChatSession.id == deltas.c.session_id, deltas.c.delta != 0)
+            .values(total_tokens=ChatSession.total_tokens + deltas.c.delta)
+            .cte("bump_sessions")
+        )
+        message_delta = (
+            data.c.tokens_input
+            + data.c.tokens_output
+            - old.c.tokens_input
+            - old.c.tokens_output
+        )
+        charge_user = cast(data.c.user_id, PG_UUID(as_uuid=True))
+        charges = (
+            insert(TokenUsagePending)
+            .from_select(
+                # 批量插入不能用应用层生成的单个 ID，交给库端逐行生成
+                ["id", "user_id", "tokens"],
+                select(func.gen_random_uuid(), charge_user, message_delta)
+                .join_from(old, data, old.c.id == data.c.id)
+                .where(charge_user.is_not(None), message_delta > 0),
+            )
+            .cte("charge_quota")
+        )
+
+        stmt = (
+            update(ChatMessage)
+            .where(ChatMessage.id == data.c.id)
+            .values(
+                status=data.c.status,
+                content=data.c.content,
+                tokens_input=data.c.tokens_input,
+                tokens_output=data.c.tokens_output,
+                # 全为 NULL 的 VALUES 列会被推断为 text，显式 CAST 回列类型
+                latency_ms=func.coalesce(
+                    cast(data.c.latency_ms, Integer), ChatMessage.latency_ms
+                ),
+                search_context=func.coalesce(
+                    cast(data.c.search_context, JSONB), ChatMessage.search_context
+                ),
+            )
+            .add_cte(old)
+            .add_cte(counters)
+            .add_cte(charges)
+            .execution_options(synchronize_session=False)
+        )
+        result = await self.session.execute(stmt)
+        return int(result.rowcount or 0)
+
+    async def checkpoint_message_content(
+        self, message_id: uuid.UUID, content: str
+    ) -> bool:
+        """
+        流式过程中落盘已累积内容并置为 STREAMING。
+        仅命中仍处于生成中的消息：迟到的检查点不会覆盖已写入的终态。
+        """
+        stmt = (
+            update(ChatMessage)
+            .where(
+                ChatMessage.id == message_id,
+                ChatMessage.status.in_(IN_FLIGHT_STATUSES),
+            )
+            .values(status=MessageStatus.STREAMING, content=content)
+            .execution_options(synchronize_session=False)
+        )
+        result = await self.session.execute(stmt)
+        return bool(result.rowcount)
+
+    async def fail_orphaned_messages(
+        self, stale_before: datetime, error_content: str
+    ) -> int:
+        """
+        把 updated_at 早于 stale_before 仍在生成中的消息收尾为 FAILED，返回条数。
+        已有检查点内容的保留部分回答，空内容的写入 error_content；token 不变。
+        """
+        stmt = (
+            update(ChatMessage)
+            .where(
+                ChatMessage.status.in_(IN_FLIGHT_STATUSES),
+                ChatMessage.updated_at < stale_before,
+            )
+            .values(
+                status=MessageStatus.FAILED,
+                content=case(
+                    (ChatMessage.content == "", error_content),
+                    else_=ChatMessage.content,
+                ),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        result = await self.session.execute(stmt)
+        return int(result.rowcount or 0)
 
     async def create_thinking_message(
         self,
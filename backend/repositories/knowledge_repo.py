@@ -1,11 +1,85 @@
+import json
+import struct
 import uuid
+from collections.abc import Sequence
+from datetime import timedelta
 
-from sqlalchemy import delete, func, insert, select
+from pgvector import Vector
+from sqlalchemy import (
+    any_,
+    bindparam,
+    delete,
+    func,
+    insert,
+    literal,
+    select,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer
 
+from backend.models.orm.base import IDGenerator
 from backend.models.orm.chunk import DocumentChunk
 from backend.models.orm.knowledge import File, FileStatus, KnowledgeBase
 
+CHUNK_COPY_COLUMNS = (
+    "id",
+    "source_type",
+    "file_id",
+    "message_id",
+    "content",
+    "token_count",
+    "chunk_index",
+    "content_hash",
+    "meta_info",
+    "embedding",
+)
+
+# PGCOPY 二进制格式：签名 + flags(int32) + 头扩展长度(int32)；结尾为 int16 -1
+_PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+_PGCOPY_TRAILER = struct.pack(">h", -1)
+_NULL_FIELD = struct.pack(">i", -1)
+# jsonb 二进制格式首字节为版本号 1
+_JSONB_VERSION = b"\x01"
+
+
+def _copy_field(payload: bytes | None) -> bytes:
+    if payload is None:
+        return _NULL_FIELD
+    return struct.pack(">i", len(payload)) + payload
+
+
+def _encode_uuid(value: uuid.UUID | None) -> bytes | None:
+    return None if value is None else value.bytes
+
+
+def encode_chunk_copy_payload(chunks_data: Sequence[dict]) -> bytes:
+    """
+    把切片记录编码为 PGCOPY 二进制流（列顺序见 CHUNK_COPY_COLUMNS）。
+    向量使用 pgvector 的二进制格式，避免 768 维浮点数逐个渲染成文本参数。
+    """
+    parts = [_PGCOPY_HEADER]
+    field_count = struct.pack(">h", len(CHUNK_COPY_COLUMNS))
+    for record in chunks_data:
+        chunk_id = record.get("id") or IDGenerator.new_ulid_as_uuid()
+        parts.append(field_count)
+        parts.append(_copy_field(chunk_id.bytes))
+        parts.append(_copy_field(str(record["source_type"]).encode()))
+        parts.append(_copy_field(_encode_uuid(record.get("file_id"))))
+        parts.append(_copy_field(_encode_uuid(record.get("message_id"))))
+        parts.append(_copy_field(record["content"].encode()))
+        parts.append(_copy_field(struct.pack(">i", record["token_count"])))
+        parts.append(_copy_field(struct.pack(">i", record["chunk_index"])))
+        content_hash = record.get("content_hash")
+        parts.append(_copy_field(content_hash.encode() if content_hash else None))
+        meta_info = json.dumps(record.get("meta_info") or {}, ensure_ascii=False)
+        parts.append(_copy_field(_JSONB_VERSION + meta_info.encode()))
+        parts.append(_copy_field(Vector(record["embedding"]).to_binary()))
+    parts.append(_PGCOPY_TRAILER)
+    return b"".join(parts)
+
 
 class KnowledgeRepository:
     """知识库聚合仓储（多模型组合，不继承 CRUDBase）。"""
@@ -35,18 +109,37 @@ class KnowledgeRepository:
         file_path: str,
         file_size: int,
         status: FileStatus = FileStatus.UPLOADED,
+        content_hash: str | None = None,
     ) -> File:
-        file_obj = File(
-            kb_id=kb_id,
-            filename=filename,
-            file_path=file_path,
-            file_size=file_size,
-            status=status,
-        )
-        self.session.add(file_obj)
-        await self.session.flush()
-        await self.session.refresh(file_obj)
-        return file_obj
+        stmt = (
+            insert(File)
+            .values(
+                kb_id=kb_id,
+                filename=filename,
+                file_path=file_path,
+                file_size=file_size,
+                status=status,
+                content_hash=content_hash,
+            )
+            .returning(File)
+        )
+        result = await self.session.execute(stmt)
+        return result.scalar_one()
+
+    async def create_files(self, kb_id: uuid.UUID, files: Sequence[dict]) -> list[File]:
+        """
+        批量上传的文件记录一次性写入（insertmanyvalues + RETURNING），返回顺序与入参一致。
+        files: [{"filename", "file_path", "file_size", "content_hash"}]
+        """
+        if not files:
+            return []
+        rows = [
+            {**item, "kb_id": kb_id, "status": FileStatus.UPLOADED} for item in files
+        ]
+        result = await self.session.scalars(
+            insert(File).returning(File, sort_by_parameter_order=True), rows
+        )
+        return list(result.all())
 
     async def get_file(self, file_id: uuid.UUID) -> File | None:
         return await self.session.get(File, file_id)
@@ -55,20 +148,256 @@ class KnowledgeRepository:
         self,
         file_id: uuid.UUID,
         status: FileStatus,
+        ingest_fingerprint: str | None = None,
     ) -> File | None:
-        file_obj = await self.get_file(file_id)
-        if not file_obj:
-            return None
-        file_obj.status = status
-        self.session.add(file_obj)
-        await self.session.flush()
-        await self.session.refresh(file_obj)
-        return file_obj
+        # 单条 UPDATE ... RETURNING，替代 get + flush + refresh
+        values: dict = {"status": status}
+        if ingest_fingerprint is not None:
+            values["ingest_fingerprint"] = ingest_fingerprint
+        stmt = (
+            update(File)
+            .where(File.id == file_id)
+            .values(**values)
+            .returning(File)
+            .execution_options(populate_existing=True)
+        )
+        result = await self.session.execute(stmt)
+        return result.scalar_one_or_none()
+
+    async def find_ingested_duplicate(
+        self,
+        *,
+        content_hash: str,
+        ingest_fingerprint: str,
+        exclude_file_id: uuid.UUID,
+    ) -> File | None:
+        """查找内容相同、以相同配置入库完成的其它文件（作为切片复制来源）"""
+        stmt = (
+            select(File)
+            .where(
+                File.content_hash == content_hash,
+                File.ingest_fingerprint == ingest_fingerprint,
+                File.status == FileStatus.READY,
+                File.id != exclude_file_id,
+            )
+            .order_by(File.created_at.desc())
+            .limit(1)
+        )
+        result = await self.session.execute(stmt)
+        return result.scalars().first()
+
+    async def clone_chunks_from_file(
+        self,
+        *,
+        source_file_id: uuid.UUID,
+        target_file_id: uuid.UUID,
+        meta_info: dict,
+    ) -> int:
+        """
+        INSERT ... SELECT 在库内复制源文件的全部切片（含向量），返回复制行数。
+        只把切片 id 取回应用层生成新的 ULID，内容与向量不出数据库；
+        meta_info 与源切片合并（覆盖 filename / path 等文件级字段）。
+        """
+        source_ids = list(
+            await self.session.scalars(
+                select(DocumentChunk.id).where(DocumentChunk.file_id == source_file_id)
+            )
+        )
+        if not source_ids:
+            return 0
+        id_type = ARRAY(PG_UUID(as_uuid=True))
+        id_map = func.unnest(
+            bindparam("source_ids", source_ids, type_=id_type),
+            bindparam(
+                "clone_ids",
+                [IDGenerator.new_ulid_as_uuid() for _ in source_ids],
+                type_=id_type,
+            ),
+        ).table_valued("source_id", "clone_id")
+        selected = select(
+            id_map.c.clone_id,
+            DocumentChunk.source_type,
+            literal(target_file_id, PG_UUID(as_uuid=True)),
+            DocumentChunk.content,
+            DocumentChunk.token_count,
+            DocumentChunk.chunk_index,
+            DocumentChunk.content_hash,
+            DocumentChunk.meta_info.op("||")(literal(meta_info, JSONB)),
+            DocumentChunk.embedding,
+        ).join(id_map, DocumentChunk.id == id_map.c.source_id)
+        stmt = insert(DocumentChunk).from_select(
+            [
+                "id",
+                "source_type",
+                "file_id",
+                "content",
+                "token_count",
+                "chunk_index",
+                "content_hash",
+                "meta_info",
+                "embedding",
+            ],
+            selected,
+        )
+        result = await self.session.execute(stmt)
+        return result.rowcount or 0
+
+    async def update_files_status(
+        self, file_ids: Sequence[uuid.UUID], status: FileStatus
+    ) -> None:
+        if not file_ids:
+            return
+        ids_param = bindparam(
+            "file_ids", list(file_ids), type_=ARRAY(PG_UUID(as_uuid=True))
+        )
+        stmt = (
+            update(File)
+            .where(File.id == any_(ids_param))
+            .values(status=status)
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.execute(stmt)
+
+    async def count_files_by_status(
+        self, file_ids: Sequence[uuid.UUID]
+    ) -> dict[str, int]:
+        if not file_ids:
+            return {}
+        ids_param = bindparam(
+            "file_ids", list(file_ids), type_=ARRAY(PG_UUID(as_uuid=True))
+        )
+        stmt = (
+            select(File.status, func.count())
+            .where(File.id == any_(ids_param))
+            .group_by(File.status)
+        )
+        rows = (await self.session.execute(stmt)).all()
+        return {str(status): int(count) for status, count in rows}
+
+    async def fail_stale_files(
+        self,
+        file_ids: Sequence[uuid.UUID],
+        *,
+        statuses: Sequence[FileStatus],
+        older_than_seconds: float,
+    ) -> list[uuid.UUID]:
+        """处于 statuses 且超过 older_than_seconds 未更新的文件标记为 FAILED，返回其 id"""
+        if not file_ids or not statuses:
+            return []
+        ids_param = bindparam(
+            "file_ids", list(file_ids), type_=ARRAY(PG_UUID(as_uuid=True))
+        )
+        stmt = (
+            update(File)
+            .where(
+                File.id == any_(ids_param),
+                File.status.in_(list(statuses)),
+                File.updated_at < func.now() - timedelta(seconds=older_than_seconds),
+            )
+            .values(status=FileStatus.FAILED)
+            .returning(File.id)
+            .execution_options(synchronize_session=False)
+        )
+        return list((await self.session.execute(stmt)).scalars().all())
+
+    async def touch_files(
+        self, file_ids: Sequence[uuid.UUID], *, statuses: Sequence[FileStatus]
+    ) -> None:
+        """刷新仍处于 statuses 的文件的 updated_at（子任务心跳）"""
+        if not file_ids:
+            return
+        ids_param = bindparam(
+            "file_ids", list(file_ids), type_=ARRAY(PG_UUID(as_uuid=True))
+        )
+        stmt = (
+            update(File)
+            .where(File.id == any_(ids_param), File.status.in_(list(statuses)))
+            .values(updated_at=func.now())
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.execute(stmt)
+
+    async def claim_uploaded_files(
+        self, file_ids: Sequence[uuid.UUID], *, limit: int
+    ) -> list[uuid.UUID]:
+        """把至多 limit 个 UPLOADED 文件置为 PARSING（批量分发认领并发名额），返回其 id"""
+        if not file_ids or limit <= 0:
+            return []
+        ids_param = bindparam(
+            "file_ids", list(file_ids), type_=ARRAY(PG_UUID(as_uuid=True))
+        )
+        pending = (
+            select(File.id)
+            .where(File.id == any_(ids_param), File.status == FileStatus.UPLOADED)
+            .order_by(File.created_at, File.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        stmt = (
+            update(File)
+            .where(File.id.in_(pending))
+            .values(status=FileStatus.PARSING)
+            .returning(File.id)
+            .execution_options(synchronize_session=False)
+        )
+        return list((await self.session.execute(stmt)).scalars().all())
 
     async def delete_chunks_for_file(self, file_id: uuid.UUID) -> None:
         stmt = delete(DocumentChunk).where(DocumentChunk.file_id == file_id)
         await self.session.execute(stmt)
 
+    async def list_chunk_hashes_for_file(
+        self, file_id: uuid.UUID
+    ) -> list[tuple[uuid.UUID, str | None, int]]:
+        """返回文件现有切片的 (id, content_hash, chunk_index)，不加载内容与向量。"""
+        stmt = (
+            select(
+                DocumentChunk.id, DocumentChunk.content_hash, DocumentChunk.chunk_index
+            )
+            .where(DocumentChunk.file_id == file_id)
+            .order_by(DocumentChunk.chunk_index)
+        )
+        rows = (await self.session.execute(stmt)).all()
+        return [(row[0], row[1], row[2]) for row in rows]
+
+    async def update_chunk_indexes(self, updates: Sequence[dict]) -> None:
+        """按主键批量改写 chunk_index（updates: [{"id": ..., "chunk_index": ...}]）"""
+        if not updates:
+            return
+        await self.session.execute(update(DocumentChunk), list(updates))
+
+    async def delete_chunks_by_ids(self, chunk_ids: Sequence[uuid.UUID]) -> int:
+        # 整个 id 数组作为单个参数绑定，不受 IN 列表参数个数上限影响
+        if not chunk_ids:
+            return 0
+        ids_param = bindparam(
+            "chunk_ids", list(chunk_ids), type_=ARRAY(PG_UUID(as_uuid=True))
+        )
+        stmt = delete(DocumentChunk).where(DocumentChunk.id == any_(ids_param))
+        result = await self.session.execute(stmt)
+        return result.rowcount or 0
+
+    async def bump_kb_generation_for_file(self, file_id: uuid.UUID) -> None:
+        """文件分块变更后递增所属知识库的内容版本（与分块写入同一事务）。"""
+        kb_id = select(File.kb_id).where(File.id == file_id).scalar_subquery()
+        stmt = (
+            update(KnowledgeBase)
+            .where(KnowledgeBase.id == kb_id)
+            .values(generation=KnowledgeBase.generation + 1)
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.execute(stmt)
+
+    async def get_kb_cache_state(self, kb_id: uuid.UUID) -> tuple[int, bool] | None:
+        """返回 (内容版本, 是否启用答案缓存)；知识库不存在时返回 None。"""
+        stmt = select(
+            KnowledgeBase.generation, KnowledgeBase.answer_cache_enabled
+        ).where(KnowledgeBase.id == kb_id)
+        row = (await self.session.execute(stmt)).first()
+        if row is None:
+            return None
+        return int(row[0]), bool(row[1])
+
     async def add_chunks(self, chunks_data: list[dict]):
         # chunks_data 包含 content 和 embedding(list)
         if not chunks_data:
@@ -76,6 +405,24 @@ class KnowledgeRepository:
         stmt = insert(DocumentChunk).values(chunks_data)
         await self.session.execute(stmt)
 
+    async def copy_chunks(self, chunks_data: Sequence[dict]) -> int:
+        """
+        通过 asyncpg 二进制 COPY 批量写入切片，返回写入行数。
+        与 Session 共用同一条连接/事务，可与之前的 delete_chunks_for_file 一起提交或回滚；
+        没有多 VALUES INSERT 的参数个数上限，也省去大语句的解析与规划。
+        """
+        if not chunks_data:
+            return 0
+        conn = await self.session.connection()
+        raw_conn = await conn.get_raw_connection()
+        await raw_conn.driver_connection.copy_to_table(
+            DocumentChunk.__tablename__,
+            source=encode_chunk_copy_payload(chunks_data),
+            columns=CHUNK_COPY_COLUMNS,
+            format="binary",
+        )
+        return len(chunks_data)
+
     async def vector_search(self, query_vector: list[float], limit=5):
         # 利用 pgvector 的 <=> 符号进行余弦相似度搜索
         from sqlalchemy import select
@@ -93,8 +440,12 @@ class KnowledgeRepository:
         query_vector: list[float],
         kb_id: uuid.UUID,
         limit: int = 5,
+        with_embeddings: bool = False,
     ) -> list[tuple[DocumentChunk, float]]:
-        """在指定知识库内做向量检索，返回 (chunk, distance)。"""
+        """
+        在指定知识库内做向量检索，返回 (chunk, distance)。
+        向量列默认不回传（每行约 3KB），只有 MMR 重排需要时才随候选一起取。
+        """
         from sqlalchemy import select
 
         distance = DocumentChunk.embedding.cosine_distance(query_vector).label(
@@ -107,6 +458,8 @@ class KnowledgeRepository:
             .order_by(distance)
             .limit(limit)
         )
+        if not with_embeddings:
+            stmt = stmt.options(defer(DocumentChunk.embedding, raiseload=True))
         result = await self.session.execute(stmt)
         return [(row[0], float(row[1])) for row in result.all()]
 
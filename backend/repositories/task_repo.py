@@ -2,7 +2,8 @@ import uuid
 from collections.abc import Sequence
 
 from pydantic import BaseModel
-from sqlalchemy import select
+from sqlalchemy import func, literal, select
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.models.orm.task import TaskJob, TaskStatus
@@ -20,6 +21,17 @@ class TaskRepository:
         """根据 ID 获取任务"""
         return await self.crud.get(task_id)
 
+    async def get_for_update(self, task_id: uuid.UUID) -> TaskJob | None:
+        """行锁读取任务（同一父任务的进度汇总串行执行，避免并发回写覆盖）"""
+        stmt = (
+            select(TaskJob)
+            .where(TaskJob.id == task_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        result = await self.session.execute(stmt)
+        return result.scalars().first()
+
     async def create(
         self,
         action_type: str,
@@ -42,19 +54,23 @@ class TaskRepository:
         status: TaskStatus,
         progress: int | None = None,
         error_log: str | None = None,
+        result: dict | None = None,
     ) -> TaskJob | None:
-        """更新任务状态和进度"""
-        task = await self.get(task_id)
-        if not task:
-            return None
-
-        update_data = {"status": status}
+        """
+        更新任务状态和进度（result 合并写入 payload["result"]）。
+        单条 UPDATE ... RETURNING，payload 在库内用 jsonb || 合并，无需先读。
+        """
+        update_data: dict = {"status": status}
         if progress is not None:
             update_data["progress"] = progress
         if error_log is not None:
             update_data["error_log"] = error_log
+        if result is not None:
+            update_data["payload"] = func.coalesce(
+                TaskJob.payload, literal({}, JSONB)
+            ).op("||", return_type=JSONB)(literal({"result": result}, JSONB))
 
-        return await self.crud.update(db_obj=task, obj_in=update_data)
+        return await self.crud.update_returning(task_id, update_data)
 
     async def get_by_status(
         self,
@@ -93,12 +109,14 @@ class TaskRepository:
         self,
         task_id: uuid.UUID,
         progress: int = 100,
+        result: dict | None = None,
     ) -> TaskJob | None:
         """标记任务为完成状态"""
         return await self.update_status(
             task_id=task_id,
             status=TaskStatus.COMPLETED,
             progress=progress,
+            result=result,
         )
 
     async def mark_failed(
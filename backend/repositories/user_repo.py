@@ -2,14 +2,18 @@ import uuid
 from collections.abc import Sequence
 from typing import Any
 
-from sqlalchemy import select, update
+from sqlalchemy import func, insert, select, text, update
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from backend.models.orm.user import User  # 你的 SQLAlchemy 模型
+from backend.models.orm.user import TokenUsagePending, User  # 你的 SQLAlchemy 模型
 from backend.models.schemas.user_schema import UserCreate, UserUpdate
 from backend.repositories.base import CRUDBase
 
+# 批量导入用的临时表：事务提交/回滚时自动删除，不同会话互不可见
+IMPORT_STAGING_TABLE = "user_import_staging"
+IMPORT_STAGING_COLUMNS = ("id", "username", "email", "hashed_password", "row_no")
+
 
 class UserRepository:
     def __init__(self, session: AsyncSession):
@@ -83,6 +87,55 @@ class UserRepository:
         )
         await self.session.execute(stmt)
 
+    async def create_import_staging(self) -> None:
+        """在当前事务内创建导入暂存表（ON COMMIT DROP）"""
+        await self.session.execute(
+            text(
+                f"CREATE TEMP TABLE IF NOT EXISTS {IMPORT_STAGING_TABLE} ("
+                "id uuid NOT NULL, "
+                "username varchar(50) NOT NULL, "
+                "email varchar(255) NOT NULL, "
+                "hashed_password varchar(255) NOT NULL, "
+                "row_no bigint NOT NULL"
+                ") ON COMMIT DROP"
+            )
+        )
+
+    async def copy_into_import_staging(
+        self, records: Sequence[tuple[uuid.UUID, str, str, str, int]]
+    ) -> None:
+        """
+        通过 asyncpg COPY 协议把一批记录写入暂存表。
+        与 Session 共用同一条连接/事务，比多 VALUES INSERT 少了 SQL 解析与参数绑定开销。
+        """
+        if not records:
+            return
+        conn = await self.session.connection()
+        raw_conn = await conn.get_raw_connection()
+        await raw_conn.driver_connection.copy_records_to_table(
+            IMPORT_STAGING_TABLE,
+            records=records,
+            columns=IMPORT_STAGING_COLUMNS,
+        )
+
+    async def merge_import_staging(self) -> int:
+        """
+        一条 INSERT ... SELECT ... ON CONFLICT 把暂存表合并进 users，返回影响行数。
+        同一文件内重复邮箱只保留最后一条（按文件行序 row_no，ULID 在同一毫秒内不保证单调），
+        避免 ON CONFLICT 同一行被更新两次。
+        """
+        result = await self.session.execute(
+            text(
+                "INSERT INTO users (id, username, email, hashed_password) "
+                "SELECT DISTINCT ON (email) id, username, email, hashed_password "
+                f"FROM {IMPORT_STAGING_TABLE} "
+                "ORDER BY email, row_no DESC "
+                "ON CONFLICT (email) DO UPDATE "
+                "SET username = EXCLUDED.username, updated_at = now()"
+            )
+        )
+        return result.rowcount or 0
+
     async def increment_used_tokens(self, user_id: uuid.UUID, amount: int):
         """
         原子增加用户的已用 Token 数。
@@ -95,3 +148,61 @@ class UserRepository:
             .values(used_tokens=User.used_tokens + amount)
         )
         await self.session.execute(stmt)
+
+    async def add_pending_tokens(self, user_id: uuid.UUID, amount: int) -> None:
+        """记录一笔待回写的 Token 消耗（只插入，不触碰 users 热点行）"""
+        await self.session.execute(
+            insert(TokenUsagePending).values(user_id=user_id, tokens=int(amount))
+        )
+
+    async def get_quota_snapshot(self, user_id: uuid.UUID) -> tuple[int, int] | None:
+        """
+        返回 (max_tokens, 已用 + 待回写)；单条语句读取，
+        与对账器的「取走增量并累加」事务之间不会重复计数或漏计。
+        """
+        pending = (
+            select(func.coalesce(func.sum(TokenUsagePending.tokens), 0))
+            .where(TokenUsagePending.user_id == User.id)
+            .scalar_subquery()
+        )
+        stmt = select(User.max_tokens, User.used_tokens + pending).where(
+            User.id == user_id
+        )
+        row = (await self.session.execute(stmt)).first()
+        return (int(row[0]), int(row[1])) if row else None
+
+    async def apply_pending_tokens(self, limit: int) -> tuple[int, int]:
+        """
+        取走至多 limit 条待回写增量并按用户累加到 users.used_tokens，
+        删除与累加在同一语句内完成；SKIP LOCKED 让多个进程并行对账互不阻塞。
+        返回 (取走的增量条数, 更新的用户数)。
+        """
+        stmt = text(
+            """
+            WITH taken AS (
+                DELETE FROM token_usage_pending
+                WHERE id IN (
+                    SELECT id FROM token_usage_pending
+                    ORDER BY id
+                    LIMIT :limit
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING user_id, tokens
+            ),
+            deltas AS (
+                SELECT user_id, sum(tokens)::int AS delta
+                FROM taken
+                GROUP BY user_id
+            ),
+            applied AS (
+                UPDATE users
+                SET used_tokens = users.used_tokens + deltas.delta
+                FROM deltas
+                WHERE users.id = deltas.user_id
+                RETURNING users.id
+            )
+            SELECT (SELECT count(*) FROM taken), (SELECT count(*) FROM applied)
+            """
+        )
+        row = (await self.session.execute(stmt, {"limit": int(limit)})).one()
+        return int(row[0]), int(row[1])
@@ -0,0 +1,315 @@
+"""
+Answer Cache — 知识库首轮问答的精确匹配答案缓存
+
+设计要点：
+- 大量流量是针对共享知识库、没有会话历史的首轮提问，且经常逐字重复；
+  命中即省掉一次完整的 LLM 生成（以及检索）。
+- 缓存键 = (归一化问题, kb_id, 知识库内容版本, 模型名, 系统模板指纹)：
+  知识库分块一变（generation 递增）、换模型或改模板，旧答案自然不再命中。
+- 仅首轮（新会话）且全局开关 CHAT_ANSWER_CACHE_ENABLED 与知识库
+  answer_cache_enabled 同时打开时参与；有历史的对话答案依赖上下文，不缓存。
+- 进程内 LRU + TTL：超过 MAX_ENTRIES 淘汰最久未用，过期条目在读取时清除。
+- 流式客户端命中时按固定长度分片模拟流式回放，前端无需区分。
+- 语义层（SemanticAnswerCache）：精确未命中时，用 RAG 检索已算出的查询向量
+  在同一知识库的缓存问题里找余弦相似度最高的近邻，超过阈值即复用其答案；
+  未命中只多一次小矩阵乘法，不额外调用 embedding 模型。
+"""
+
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+import numpy as np
+from prometheus_client import Counter, Gauge, Histogram
+
+from backend.core.config import settings
+from backend.domain.interfaces import AbstractUnitOfWork
+
+ANSWER_CACHE_LOOKUPS = Counter(
+    "chat_answer_cache_lookups_total",
+    "答案缓存查询次数",
+    ["result"],
+)
+ANSWER_CACHE_EVICTIONS = Counter(
+    "chat_answer_cache_evictions_total",
+    "答案缓存淘汰次数",
+    ["reason"],
+)
+ANSWER_CACHE_ENTRIES = Gauge(
+    "chat_answer_cache_entries",
+    "答案缓存当前条目数",
+)
+SEMANTIC_CACHE_LOOKUPS = Counter(
+    "chat_semantic_cache_lookups_total",
+    "语义答案缓存查询次数",
+    ["result"],
+)
+SEMANTIC_CACHE_SIMILARITY = Histogram(
+    "chat_semantic_cache_best_similarity",
+    "语义答案缓存最近邻的余弦相似度（用于调阈值）",
+    buckets=(0.5, 0.7, 0.8, 0.85, 0.9, 0.92, 0.94, 0.96, 0.98, 0.99, 1.0),
+)
+
+
+def normalize_query(text: str) -> str:
+    """大小写与空白差异不影响命中"""
+    return " ".join((text or "").split()).casefold()
+
+
+@dataclass(frozen=True, slots=True)
+class AnswerCacheKey:
+    query: str
+    kb_id: uuid.UUID
+    generation: int
+    model: str
+    template: str
+
+    @classmethod
+    def build(
+        cls,
+        *,
+        query_text: str,
+        kb_id: uuid.UUID,
+        generation: int,
+        template: str,
+        model: str | None = None,
+    ) -> "AnswerCacheKey":
+        return cls(
+            query=normalize_query(query_text),
+            kb_id=kb_id,
+            generation=generation,
+            model=model or settings.LLM_MODEL_NAME,
+            template=template,
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class CachedAnswer:
+    content: str
+    search_context: dict | None = None
+
+
+def replay_chunks(content: str, size: int | None = None) -> list[str]:
+    """把缓存答案切成固定长度的分片，供 SSE 模拟流式输出"""
+    size = size or settings.CHAT_ANSWER_CACHE_REPLAY_CHUNK_CHARS
+    return [content[i : i + size] for i in range(0, len(content), size)] or [""]
+
+
+class AnswerCache:
+    def __init__(
+        self,
+        max_entries: int | None = None,
+        ttl_seconds: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries or settings.CHAT_ANSWER_CACHE_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds or settings.CHAT_ANSWER_CACHE_TTL_SECONDS
+        self._clock = clock
+        # key -> (过期时间, 答案)；OrderedDict 尾部为最近使用
+        self._entries: OrderedDict[AnswerCacheKey, tuple[float, CachedAnswer]] = (
+            OrderedDict()
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return settings.CHAT_ANSWER_CACHE_ENABLED
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def resolve_key(
+        self,
+        uow: AbstractUnitOfWork,
+        *,
+        query_text: str,
+        kb_id: uuid.UUID | None,
+        session_id: uuid.UUID | None,
+        template: str | None,
+    ) -> AnswerCacheKey | None:
+        """
+        判断本轮是否可走缓存并生成缓存键（需在已进入的 uow 内调用）。
+        只有新会话的知识库提问、内置模板、且知识库开启缓存时返回键。
+        """
+        if not self.enabled or kb_id is None or session_id is not None:
+            return None
+        if template is None:
+            return None
+        state = await uow.knowledge_repo.get_kb_cache_state(kb_id)
+        if state is None:
+            return None
+        generation, kb_enabled = state
+        if not kb_enabled:
+            ANSWER_CACHE_LOOKUPS.labels(result="disabled").inc()
+            return None
+        return AnswerCacheKey.build(
+            query_text=query_text,
+            kb_id=kb_id,
+            generation=generation,
+            template=template,
+        )
+
+    def get(self, key: AnswerCacheKey) -> CachedAnswer | None:
+        item = self._entries.get(key)
+        if item is None:
+            ANSWER_CACHE_LOOKUPS.labels(result="miss").inc()
+            return None
+        expires_at, answer = item
+        if expires_at <= self._clock():
+            del self._entries[key]
+            ANSWER_CACHE_EVICTIONS.labels(reason="ttl").inc()
+            ANSWER_CACHE_ENTRIES.set(len(self._entries))
+            ANSWER_CACHE_LOOKUPS.labels(result="miss").inc()
+            return None
+        self._entries.move_to_end(key)
+        ANSWER_CACHE_LOOKUPS.labels(result="hit").inc()
+        return answer
+
+    def put(self, key: AnswerCacheKey, answer: CachedAnswer) -> None:
+        if not answer.content:
+            return
+        self._entries[key] = (self._clock() + self.ttl_seconds, answer)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            ANSWER_CACHE_EVICTIONS.labels(reason="lru").inc()
+        ANSWER_CACHE_ENTRIES.set(len(self._entries))
+
+    def clear(self) -> None:
+        self._entries.clear()
+        ANSWER_CACHE_ENTRIES.set(0)
+
+
+def _unit_vector(embedding: list[float]) -> np.ndarray | None:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    if vector.ndim != 1 or norm == 0.0:
+        return None
+    return vector / norm
+
+
+@dataclass(slots=True)
+class _SemanticBucket:
+    """单个知识库（同模型、同模板）的缓存问题向量，按插入顺序排列"""
+
+    generation: int
+    vectors: np.ndarray
+    answers: list[CachedAnswer] = field(default_factory=list)
+    expires_at: list[float] = field(default_factory=list)
+
+    def drop_first(self, count: int) -> None:
+        self.vectors = self.vectors[count:]
+        del self.answers[:count]
+        del self.expires_at[:count]
+
+
+class SemanticAnswerCache:
+    """
+    进程内按知识库分桶的向量近邻缓存。
+    桶内条目按插入顺序淘汰（超过 MAX_ENTRIES_PER_KB 丢最旧的），
+    知识库 generation 变化时整桶作废。
+    """
+
+    def __init__(
+        self,
+        threshold: float | None = None,
+        max_entries_per_kb: int | None = None,
+        ttl_seconds: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.threshold = threshold or settings.CHAT_SEMANTIC_CACHE_THRESHOLD
+        self.max_entries_per_kb = (
+            max_entries_per_kb or settings.CHAT_SEMANTIC_CACHE_MAX_ENTRIES_PER_KB
+        )
+        self.ttl_seconds = ttl_seconds or settings.CHAT_ANSWER_CACHE_TTL_SECONDS
+        self._clock = clock
+        self._buckets: dict[tuple[uuid.UUID, str, str], _SemanticBucket] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return settings.CHAT_SEMANTIC_CACHE_ENABLED
+
+    def __len__(self) -> int:
+        return sum(len(bucket.answers) for bucket in self._buckets.values())
+
+    @staticmethod
+    def _bucket_key(key: AnswerCacheKey) -> tuple[uuid.UUID, str, str]:
+        return key.kb_id, key.model, key.template
+
+    def _live_bucket(self, key: AnswerCacheKey) -> _SemanticBucket | None:
+        bucket_key = self._bucket_key(key)
+        bucket = self._buckets.get(bucket_key)
+        if bucket is None:
+            return None
+        if bucket.generation != key.generation:
+            # 知识库内容已变更，旧答案全部作废
+            del self._buckets[bucket_key]
+            return None
+        # 条目按插入顺序排列且 TTL 相同，过期的一定在队首
+        now = self._clock()
+        expired = 0
+        while expired < len(bucket.expires_at) and bucket.expires_at[expired] <= now:
+            expired += 1
+        if expired:
+            bucket.drop_first(expired)
+            ANSWER_CACHE_EVICTIONS.labels(reason="ttl").inc(expired)
+        return bucket
+
+    def get(self, key: AnswerCacheKey, embedding: list[float]) -> CachedAnswer | None:
+        if not self.enabled:
+            return None
+        bucket = self._live_bucket(key)
+        query = _unit_vector(embedding)
+        if (
+            bucket is None
+            or not bucket.answers
+            or query is None
+            or query.shape[0] != bucket.vectors.shape[1]
+        ):
+            SEMANTIC_CACHE_LOOKUPS.labels(result="miss").inc()
+            return None
+
+        similarities = bucket.vectors @ query
+        best = int(np.argmax(similarities))
+        similarity = float(similarities[best])
+        SEMANTIC_CACHE_SIMILARITY.observe(similarity)
+        if similarity < self.threshold:
+            SEMANTIC_CACHE_LOOKUPS.labels(result="miss").inc()
+            return None
+        SEMANTIC_CACHE_LOOKUPS.labels(result="hit").inc()
+        return bucket.answers[best]
+
+    def put(
+        self,
+        key: AnswerCacheKey,
+        embedding: list[float],
+        answer: CachedAnswer,
+    ) -> None:
+        if not self.enabled or not answer.content:
+            return
+        vector = _unit_vector(embedding)
+        if vector is None:
+            return
+        bucket = self._live_bucket(key)
+        if bucket is None or bucket.vectors.shape[1] != vector.shape[0]:
+            bucket = _SemanticBucket(
+                generation=key.generation,
+                vectors=np.empty((0, vector.shape[0]), dtype=np.float32),
+            )
+            self._buckets[self._bucket_key(key)] = bucket
+
+        bucket.vectors = np.vstack([bucket.vectors, vector])
+        bucket.answers.append(answer)
+        bucket.expires_at.append(self._clock() + self.ttl_seconds)
+        overflow = len(bucket.answers) - self.max_entries_per_kb
+        if overflow > 0:
+            bucket.drop_first(overflow)
+            ANSWER_CACHE_EVICTIONS.labels(reason="capacity").inc(overflow)
+
+    def clear(self) -> None:
+        self._buckets.clear()
+
+
+answer_cache = AnswerCache()
+semantic_answer_cache = SemanticAnswerCache()
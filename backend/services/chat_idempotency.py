@@ -0,0 +1,237 @@
+"""
+Chat Idempotency — client_request_id 幂等：重复请求挂靠在途结果
+
+设计要点：
+- 锁键 idempotency:chat:{user_id}:{client_request_id}：PROCESSING 表示在途，
+  完成后改写为 message_id。原先重复请求在途时直接拒绝，客户端只能循环重试；
+  现在重复请求等待并复用首个请求的结果。
+- 结果键 {锁键}:result：完成时写入序列化的 ChatQueryResponse，
+  之后的重复请求直接反序列化返回，不再查 DB。
+- 事件流 {锁键}:events（Redis Stream）：流式主请求把每个 SSE 事件追加进来，
+  重复的流式请求从头 XREAD 重放并跟随，相当于订阅同一条 token 流。
+- 完成通知 {锁键}:done（Pub/Sub）：非流式重复请求先订阅再查结果键，不会错过通知；
+  另按秒轮询锁状态兜底，整体受 CHAT_IDEMPOTENCY_WAIT_TIMEOUT_SECONDS 限制。
+- 主请求失败（含客户端断开）时释放锁并发通知，等待者随即返回错误，
+  客户端可用同一 client_request_id 重试。
+"""
+
+import asyncio
+import json
+import logging
+import uuid
+from collections.abc import AsyncIterator
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from backend.core.config import settings
+from backend.core.exceptions import ServiceError
+from backend.models.schemas.chat_schema import ChatQueryResponse
+
+logger = logging.getLogger(__name__)
+
+PROCESSING = "PROCESSING"
+DONE_EVENT = "data: [DONE]\n\n"
+# 等待者单次阻塞的最长时长；超时后检查锁状态，发现主请求已失败可及时返回
+_WAIT_SLICE_SECONDS = 1.0
+# 完成/失败后事件流保留的宽限期，供仍在跟随的等待者读完
+_EVENTS_GRACE_SECONDS = 60
+
+
+def sse_replay(response: ChatQueryResponse) -> list[str]:
+    """把已完成的结果还原为一次性的 SSE 序列：meta → 全文 chunk → [DONE]"""
+    meta = {
+        "type": "meta",
+        "session_id": str(response.session_id),
+        "session_title": response.session_title,
+        "message_id": str(response.answer.id),
+    }
+    chunk = {"type": "chunk", "content": response.answer.content}
+    return [
+        f"data: {json.dumps(meta)}\n\n",
+        f"data: {json.dumps(chunk)}\n\n",
+        DONE_EVENT,
+    ]
+
+
+class ChatIdempotency:
+    """单个 client_request_id 的幂等状态（每次请求一个实例）"""
+
+    def __init__(self, redis: Redis, user_id: uuid.UUID, client_request_id: str):
+        self.redis = redis
+        self.client_request_id = client_request_id
+        self.lock_key = f"idempotency:chat:{user_id}:{client_request_id}"
+        self.result_key = f"{self.lock_key}:result"
+        self.events_key = f"{self.lock_key}:events"
+        self.done_channel = f"{self.lock_key}:done"
+        self._settled = False
+        self._events_started = False
+        self._mirror_broken = False
+
+    async def acquire(self) -> bool:
+        """抢占在途锁；成功即为主请求，并清掉同一 ID 上次失败遗留的事件流。"""
+        acquired = await self.redis.set(
+            self.lock_key,
+            PROCESSING,
+            nx=True,
+            ex=settings.CHAT_IDEMPOTENCY_LOCK_TTL_SECONDS,
+        )
+        if acquired:
+            await self.redis.delete(self.events_key)
+        return bool(acquired)
+
+    async def cached_result(self) -> ChatQueryResponse | None:
+        raw = await self.redis.get(self.result_key)
+        if raw is None:
+            return None
+        return ChatQueryResponse.model_validate_json(raw)
+
+    async def append_event(self, event: str) -> None:
+        """流式主请求镜像一条 SSE 事件；Redis 故障只停止镜像，不影响主请求推流。"""
+        if self._mirror_broken:
+            return
+        try:
+            if self._events_started:
+                await self.redis.xadd(
+                    self.events_key,
+                    {"sse": event},
+                    maxlen=settings.CHAT_IDEMPOTENCY_EVENTS_MAXLEN,
+                    approximate=True,
+                )
+                return
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.xadd(
+                    self.events_key,
+                    {"sse": event},
+                    maxlen=settings.CHAT_IDEMPOTENCY_EVENTS_MAXLEN,
+                    approximate=True,
+                )
+                pipe.expire(self.events_key, settings.CHAT_IDEMPOTENCY_LOCK_TTL_SECONDS)
+                await pipe.execute()
+            self._events_started = True
+        except RedisError:
+            self._mirror_broken = True
+            logger.warning(
+                "幂等事件流写入失败，停止镜像: client_request_id=%s",
+                self.client_request_id,
+                exc_info=True,
+            )
+
+    async def complete(self, response: ChatQueryResponse) -> None:
+        """缓存成功结果、锁改写为 message_id，并通知等待者。"""
+        ttl = settings.CHAT_IDEMPOTENCY_RESULT_TTL_SECONDS
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(self.result_key, response.model_dump_json(), ex=ttl)
+            pipe.set(self.lock_key, str(response.answer.id), ex=ttl)
+            pipe.expire(self.events_key, _EVENTS_GRACE_SECONDS)
+            pipe.publish(self.done_channel, "ok")
+            await pipe.execute()
+        self._settled = True
+
+    async def fail(self) -> None:
+        """主请求未完成时释放锁并通知等待者；已完成或已释放时为空操作。"""
+        if self._settled:
+            return
+        self._settled = True
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.delete(self.lock_key)
+                pipe.expire(self.events_key, _EVENTS_GRACE_SECONDS)
+                pipe.publish(self.done_channel, "failed")
+                await pipe.execute()
+        except RedisError:
+            # 锁最终由 TTL 回收
+            logger.warning(
+                "幂等锁释放失败: client_request_id=%s",
+                self.client_request_id,
+                exc_info=True,
+            )
+
+    async def wait_result(self, timeout: float) -> ChatQueryResponse | None:
+        """
+        非流式等待者：等到结果缓存或主请求失败。
+        返回 None 表示锁已不在 PROCESSING（主请求失败，或结果缓存已过期）。
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        pubsub = self.redis.pubsub()
+        try:
+            # 先订阅再查状态，避免查完到订阅之间的完成通知丢失
+            await pubsub.subscribe(self.done_channel)
+            while True:
+                # 先读锁再读结果：完成时结果先于锁改写，不会误判为失败
+                state = await self.redis.get(self.lock_key)
+                result = await self.cached_result()
+                if result is not None:
+                    return result
+                if state != PROCESSING:
+                    return None
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise ServiceError(
+                        "等待原请求结果超时，请稍后重试",
+                        details={"client_request_id": self.client_request_id},
+                    )
+                await pubsub.get_message(
+                    ignore_subscribe_messages=True,
+                    timeout=min(remaining, _WAIT_SLICE_SECONDS),
+                )
+        finally:
+            await pubsub.unsubscribe(self.done_channel)
+            await pubsub.aclose()
+
+    async def follow_events(self, timeout: float) -> AsyncIterator[str]:
+        """
+        流式等待者：从头重放主请求的 SSE 事件并跟随到 [DONE]。
+        主请求已完成时直接用结果缓存合成回放；主请求是非流式时同样等结果。
+        """
+        result = await self.cached_result()
+        if result is not None:
+            for event in sse_replay(result):
+                yield event
+            return
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        last_id = "0-0"
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise ServiceError(
+                    "等待原请求结果超时，请稍后重试",
+                    details={"client_request_id": self.client_request_id},
+                )
+            entries = await self.redis.xread(
+                {self.events_key: last_id},
+                count=256,
+                block=int(min(remaining, _WAIT_SLICE_SECONDS) * 1000),
+            )
+            if entries:
+                for _, items in entries:
+                    for entry_id, fields in items:
+                        last_id = entry_id
+                        event = fields["sse"]
+                        yield event
+                        if event == DONE_EVENT:
+                            return
+                continue
+
+            # 一个等待片内无新事件：核对主请求状态（先读锁再读结果）
+            state = await self.redis.get(self.lock_key)
+            if last_id == "0-0":
+                result = await self.cached_result()
+                if result is not None:
+                    for event in sse_replay(result):
+                        yield event
+                    return
+            if state is None:
+                raise ServiceError(
+                    "原请求处理失败，请重试",
+                    details={"client_request_id": self.client_request_id},
+                )
+            if state != PROCESSING and last_id == "0-0":
+                # 已完成但结果缓存与事件流都已过期
+                raise ServiceError(
+                    "该请求已完成，请刷新页面",
+                    details={"client_request_id": self.client_request_id},
+                )
@@ -9,6 +9,7 @@ Chat Service — 会话管理与消息更新
 import logging
 import time
 import uuid
+from datetime import UTC, datetime, timedelta
 
 from backend.core.exceptions import ResourceNotFound, ValidationError
 from backend.domain.interfaces import AbstractUnitOfWork
@@ -266,19 +267,39 @@ class ChatMessageUpdater(BaseService[AbstractUnitOfWork]):
         self,
         message_id: uuid.UUID,
         content: str,
-    ) -> ChatMessage | None:
+    ) -> bool:
         """
-        更新消息为流式输出中状态
+        流式检查点：写入当前累积内容并置为 STREAMING
 
         Args:
             message_id: 消息 ID
             content: 当前累积的内容
 
         Returns:
-            更新后的 ChatMessage 对象
+            是否命中；消息已进入终态（或不存在）时返回 False，不会回退终态
         """
-        return await self.uow.chat_repo.update_message_status(
+        return await self.uow.chat_repo.checkpoint_message_content(
             message_id=message_id,
-            status=MessageStatus.STREAMING,
             content=content,
         )
+
+    async def fail_orphaned_messages(
+        self,
+        stale_after_seconds: int,
+        error_content: str = "抱歉，回答生成被中断，请重新提问。",
+    ) -> int:
+        """
+        收尾孤儿消息：超过 stale_after_seconds 未刷新的 THINKING / STREAMING 消息
+        （生成它的进程已退出）统一置为 FAILED，已落盘的部分回答保留。
+
+        Returns:
+            收尾的消息条数
+        """
+        stale_before = datetime.now(UTC) - timedelta(seconds=stale_after_seconds)
+        count = await self.uow.chat_repo.fail_orphaned_messages(
+            stale_before=stale_before,
+            error_content=error_content,
+        )
+        if count:
+            logger.warning("已收尾孤儿消息: count=%d, stale_before=%s", count, stale_before)
+        return count
@@ -1,40 +1,87 @@
+from collections.abc import Iterable, Iterator
+from typing import NamedTuple
+
+
+class ParsedChunk(NamedTuple):
+    """带附加元数据的切片（如 PDF 抽取层级、页码范围），写库时并入 meta_info"""
+
+    text: str
+    meta_info: dict
+
+
 class ChunkingService:
     def __init__(self, chunk_size: int = 800, chunk_overlap: int = 120):
         self.chunk_size = max(200, chunk_size)
         self.chunk_overlap = max(0, min(chunk_overlap, self.chunk_size // 2))
 
     def split_text(self, text: str) -> list[str]:
-        normalized = text.replace("\r\n", "\n").strip()
-        if not normalized:
-            return []
+        return list(self.iter_split_text(text))
+
+    def iter_split_text(self, text: str) -> Iterator[str]:
+        """逐个产出切片，供流式入库管道按需消费"""
+        yield from self.iter_split_stream((text,))
 
-        chunks: list[str] = []
+    def iter_split_stream(self, blocks: Iterable[str]) -> Iterator[str]:
+        """
+        增量切分：按块读入文本，只缓冲「当前窗口 + 最近一块」，
+        产出与对整段文本调用 iter_split_text 完全相同的切片（含换行归一与首尾去空白）。
+        """
+        blocks = iter(blocks)
+        buffer = ""
         start = 0
-        text_len = len(normalized)
+        # buffer[:content_end] 之后只剩空白，相当于整段文本 rstrip 后的长度
+        content_end = 0
+        leading = True
+        pending_cr = False
+        exhausted = False
 
-        while start < text_len:
+        while True:
+            # 窗口之后仍有正文才能确定本片不是最后一片；否则继续读块
+            while not exhausted and content_end <= start + self.chunk_size:
+                block = next(blocks, None)
+                if block is None:
+                    exhausted = True
+                    break
+                if pending_cr:
+                    block = "\r" + block
+                pending_cr = block.endswith("\r")
+                if pending_cr:
+                    # \r\n 可能跨块，留到下一块一起归一
+                    block = block[:-1]
+                block = block.replace("\r\n", "\n")
+                if leading:
+                    block = block.lstrip()
+                    leading = not block
+                buffer = buffer[start:] + block
+                content_end -= start
+                start = 0
+                stripped_len = len(block.rstrip())
+                if stripped_len:
+                    content_end = len(buffer) - len(block) + stripped_len
+
+            text_len = content_end
+            if start >= text_len:
+                return
             end = min(start + self.chunk_size, text_len)
             if end < text_len:
                 candidates = [
-                    normalized.rfind("\n\n", start, end),
-                    normalized.rfind("\n", start, end),
-                    normalized.rfind("。", start, end),
-                    normalized.rfind(".", start, end),
-                    normalized.rfind(" ", start, end),
+                    buffer.rfind("\n\n", start, end),
+                    buffer.rfind("\n", start, end),
+                    buffer.rfind("。", start, end),
+                    buffer.rfind(".", start, end),
+                    buffer.rfind(" ", start, end),
                 ]
                 boundary = max(candidates)
                 if boundary > start + self.chunk_size // 2:
                     end = boundary + 1
 
-            piece = normalized[start:end].strip()
+            piece = buffer[start:end].strip()
             if piece:
-                chunks.append(piece)
+                yield piece
 
             if end >= text_len:
-                break
+                return
             next_start = max(0, end - self.chunk_overlap)
             if next_start <= start:
                 next_start = end
             start = next_start
-
-        return chunks
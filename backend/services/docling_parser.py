@@ -0,0 +1,624 @@
+"""
+Docling Parser — 结构化文档（PDF / DOCX / PPTX）解析与专用进程池
+
+设计要点：
+- PDF 分层抽取：先用 pypdfium2 逐页读取文本层并做质量判定（每页字符数、乱码占比），
+  原生数字 PDF 直接走文本层切片；只有不合格的页（扫描页、乱码页）按连续页段交给
+  Docling 完整流水线。不合格页占比过高时整篇交给 Docling。
+  每个切片的 meta_info 记录 extract_tier（text_layer / docling）与页码范围。
+- Docling 的版面分析 / OCR 是 CPU 密集型计算，原先在 Taskiq worker 内 to_thread 执行，
+  受 GIL 限制会拖慢同进程的其它任务，且模型在第一份文件到来时才懒加载。
+- 这里使用独立进程池：worker 启动时（initializer）即预加载 converter 与 chunker，
+  解析结果只把切片文本经 IPC 传回，DoclingDocument 不跨进程。
+- max_tasks_per_child 让 worker 处理一定数量文档后自动重建，封顶 Docling 的内存泄漏。
+- 解析超时 DOCLING_PARSE_TIMEOUT_SECONDS 按单个解析任务（整篇或一个页段）计，
+  从 worker 真正开始处理时起算，在进程池里排队的时间不计入。worker 开始处理时经队列上报
+  开始时间，并在进程内用 SIGALRM 给自己设截止时间，超时只中断这一个任务，进程池与池内
+  其它文档的解析不受影响。只有 worker 卡在无法被信号打断的原生代码里、超过宽限期仍未
+  返回时，才终止这一个 worker 进程（池内其它文档会收到 BrokenProcessPool 并重试一次）。
+- 超大 PDF（≥ DOCLING_PARSE_SPLIT_MIN_PAGES 页）按 DOCLING_PARSE_RANGE_PAGES 页一段拆成
+  多个子任务，在进程池内并行解析后按页段顺序合并；每完成一个页段回调一次进度。
+  并行度即进程池大小 DOCLING_PARSE_WORKERS（未配置时按 CPU 核数推导），为 1 时页段顺序执行。
+"""
+
+import logging
+import multiprocessing
+import multiprocessing.queues
+import os
+import queue
+import signal
+import threading
+import time
+import unicodedata
+import uuid
+from collections.abc import Callable, Iterator
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from pathlib import Path
+from typing import NamedTuple
+
+from docling_core.types.doc import DoclingDocument
+from prometheus_client import Counter, Histogram
+
+from backend.core.config import settings
+from backend.core.docling_models import DoclingModelFactory
+from backend.core.exceptions import AppError, ValidationError
+from backend.services.chunking_service import ChunkingService, ParsedChunk
+
+logger = logging.getLogger(__name__)
+
+DOCLING_PARSE_SECONDS = Histogram(
+    "docling_parse_seconds",
+    "单个文档 Docling 解析耗时（含排队）",
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+DOCLING_PARSE_TIMEOUTS = Counter(
+    "docling_parse_timeouts_total",
+    "Docling 解析任务超时次数",
+)
+PDF_EXTRACT_PAGES = Counter(
+    "pdf_extract_pages_total",
+    "PDF 各抽取层级处理的页数",
+    ["tier"],
+)
+PDF_EXTRACT_DOCUMENTS = Counter(
+    "pdf_extract_documents_total",
+    "结构化文档按抽取层级统计的文档数（text_layer / mixed / docling）",
+    ["tier"],
+)
+
+TIER_TEXT_LAYER = "text_layer"
+TIER_DOCLING = "docling"
+# worker 自身的截止时间未能打断解析时，主进程再等待的宽限期，之后终止该 worker
+_WORKER_KILL_GRACE_SECONDS = 30.0
+# 主进程检查任务超时的轮询间隔上限
+_WATCHDOG_POLL_SECONDS = 0.5
+# 乱码字符：替换符、控制字符、私有区（缺 ToUnicode 映射的字体常见）、未分配码位
+_GARBAGE_CATEGORIES = {"Cc", "Co", "Cn", "Cs"}
+
+
+class ParsedDocument(NamedTuple):
+    """解析结果：切片 + 各抽取层级处理的页数（worker 中无法上报指标，随结果带回）"""
+
+    chunks: list[ParsedChunk]
+    tier_pages: dict[str, int]
+
+
+def _export_docling_document(document: DoclingDocument) -> str:
+    markdown = document.export_to_markdown()
+    if markdown:
+        return markdown
+    return document.export_to_text()
+
+
+def iter_docling_chunks(
+    file_path: Path,
+    chunking_service: ChunkingService,
+    page_range: tuple[int, int] | None = None,
+) -> Iterator[str]:
+    """
+    解析结构化文档并按层级切片；超长结构块二次切分，无结构块时退回整篇导出文本。
+    page_range 为 1 起始的闭区间，只转换这些页。
+    """
+    try:
+        converter = DoclingModelFactory.get_converter()
+        chunker = DoclingModelFactory.get_hierarchical_chunker()
+
+        if page_range is None:
+            result = converter.convert(str(file_path))
+        else:
+            result = converter.convert(str(file_path), page_range=page_range)
+        produced = False
+
+        for chunk in chunker.chunk(dl_doc=result.document):
+            text = chunker.contextualize(chunk).strip()
+            if not text:
+                continue
+
+            produced = True
+            # 对超长结构块做二次切分，避免向量块过大
+            if len(text) > chunking_service.chunk_size:
+                yield from chunking_service.iter_split_text(text)
+            else:
+                yield text
+
+        if produced:
+            return
+
+        fallback_text = _export_docling_document(result.document)
+        yield from chunking_service.iter_split_text(fallback_text)
+    except AppError:
+        raise
+    except Exception as exc:
+        raise ValidationError(f"文件解析失败: {file_path.name}") from exc
+
+
+def garbage_ratio(text: str) -> float:
+    chars = [char for char in text if not char.isspace()]
+    if not chars:
+        return 0.0
+    garbage = sum(
+        1
+        for char in chars
+        if char == "\ufffd" or unicodedata.category(char) in _GARBAGE_CATEGORIES
+    )
+    return garbage / len(chars)
+
+
+def is_text_layer_usable(text: str, *, has_images: bool) -> bool:
+    """单页文本层质量判定"""
+    stripped = text.strip()
+    if len(stripped) < settings.PDF_TEXT_LAYER_MIN_CHARS_PER_PAGE:
+        # 字很少且页面有图片：多半是扫描页，需要 OCR；否则视为本来就稀疏的页面
+        return not has_images
+    return garbage_ratio(stripped) <= settings.PDF_TEXT_LAYER_MAX_GARBAGE_RATIO
+
+
+def _open_pdf(file_path: Path):
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        logger.warning("pypdfium2 未安装，PDF 直接走 Docling 解析")
+        return None, None
+
+    try:
+        return pdfium, pdfium.PdfDocument(str(file_path))
+    except Exception as exc:
+        logger.warning("PDF 读取失败，改走 Docling: %s (%s)", file_path.name, exc)
+        return pdfium, None
+
+
+def count_pdf_pages(file_path: Path) -> int | None:
+    _, pdf = _open_pdf(file_path)
+    if pdf is None:
+        return None
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def read_pdf_text_layer(
+    file_path: Path, page_range: tuple[int, int] | None = None
+) -> list[tuple[str, bool]] | None:
+    """
+    逐页读取 (文本层, 是否含图片)，page_range 为 1 起始闭区间；
+    pypdfium2 不可用或文件无法打开时返回 None
+    """
+    pdfium, pdf = _open_pdf(file_path)
+    if pdf is None:
+        return None
+
+    pages: list[tuple[str, bool]] = []
+    try:
+        first, last = page_range or (1, len(pdf))
+        for index in range(first - 1, min(last, len(pdf))):
+            page = pdf[index]
+            textpage = page.get_textpage()
+            try:
+                text = textpage.get_text_range()
+                has_images = any(
+                    True
+                    for _ in page.get_objects(
+                        filter=[pdfium.raw.FPDF_PAGEOBJ_IMAGE], max_depth=1
+                    )
+                )
+            finally:
+                textpage.close()
+                page.close()
+            pages.append((text, has_images))
+    finally:
+        pdf.close()
+    return pages
+
+
+def _split_page_runs(
+    usable: list[bool], first_page: int = 1
+) -> list[tuple[bool, int, int]]:
+    """把逐页判定结果合并成连续页段 (是否可用文本层, 起始页, 结束页)"""
+    runs: list[tuple[bool, int, int]] = []
+    for page_no, ok in enumerate(usable, start=first_page):
+        if runs and runs[-1][0] == ok:
+            runs[-1] = (ok, runs[-1][1], page_no)
+        else:
+            runs.append((ok, page_no, page_no))
+    return runs
+
+
+def _docling_document(
+    file_path: Path,
+    chunking_service: ChunkingService,
+    page_range: tuple[int, int] | None = None,
+) -> ParsedDocument:
+    meta: dict = {"extract_tier": TIER_DOCLING}
+    if page_range is not None:
+        meta.update(page_start=page_range[0], page_end=page_range[1])
+    chunks = [
+        ParsedChunk(text, dict(meta))
+        for text in iter_docling_chunks(file_path, chunking_service, page_range)
+    ]
+    return ParsedDocument(chunks=chunks, tier_pages={})
+
+
+def parse_pdf_tiered(
+    file_path: Path,
+    chunking_service: ChunkingService,
+    page_range: tuple[int, int] | None = None,
+) -> ParsedDocument:
+    """PDF 分层抽取：合格页走文本层，不合格页段回退 Docling；page_range 限定处理的页段"""
+    pages = (
+        read_pdf_text_layer(file_path, page_range)
+        if settings.PDF_TEXT_LAYER_ENABLED
+        else None
+    )
+    if not pages:
+        return _docling_document(file_path, chunking_service, page_range)
+
+    first_page = page_range[0] if page_range else 1
+    usable = [is_text_layer_usable(text, has_images=img) for text, img in pages]
+    fallback_pages = usable.count(False)
+    if fallback_pages / len(pages) > settings.PDF_TEXT_LAYER_MAX_FALLBACK_RATIO:
+        document = _docling_document(file_path, chunking_service, page_range)
+        return document._replace(tier_pages={TIER_DOCLING: len(pages)})
+
+    chunks: list[ParsedChunk] = []
+    for ok, start, end in _split_page_runs(usable, first_page):
+        if ok:
+            tier = TIER_TEXT_LAYER
+            text = "\n\n".join(
+                pages[no - first_page][0].strip() for no in range(start, end + 1)
+            )
+            texts = chunking_service.iter_split_text(text)
+        else:
+            tier = TIER_DOCLING
+            texts = iter_docling_chunks(
+                file_path, chunking_service, page_range=(start, end)
+            )
+        meta = {"extract_tier": tier, "page_start": start, "page_end": end}
+        chunks.extend(ParsedChunk(chunk_text, dict(meta)) for chunk_text in texts)
+
+    tier_pages = {TIER_TEXT_LAYER: len(pages) - fallback_pages}
+    if fallback_pages:
+        tier_pages[TIER_DOCLING] = fallback_pages
+    return ParsedDocument(chunks=chunks, tier_pages=tier_pages)
+
+
+def parse_structured_document(
+    file_path: Path,
+    chunking_service: ChunkingService,
+    page_range: tuple[int, int] | None = None,
+) -> ParsedDocument:
+    if file_path.suffix.lower() == ".pdf":
+        return parse_pdf_tiered(file_path, chunking_service, page_range)
+    return _docling_document(file_path, chunking_service)
+
+
+def plan_page_ranges(page_count: int) -> list[tuple[int, int]]:
+    """超过 DOCLING_PARSE_SPLIT_MIN_PAGES 页的 PDF 按固定页数切成若干页段"""
+    if page_count < settings.DOCLING_PARSE_SPLIT_MIN_PAGES:
+        return []
+    step = settings.DOCLING_PARSE_RANGE_PAGES
+    return [
+        (start, min(start + step - 1, page_count))
+        for start in range(1, page_count + 1, step)
+    ]
+
+
+def merge_parsed_documents(documents: list[ParsedDocument]) -> ParsedDocument:
+    """按页段顺序合并，切片顺序（即 chunk_index）与整篇解析一致"""
+    chunks: list[ParsedChunk] = []
+    tier_pages: dict[str, int] = {}
+    for document in documents:
+        chunks.extend(document.chunks)
+        for tier, count in document.tier_pages.items():
+            tier_pages[tier] = tier_pages.get(tier, 0) + count
+    return ParsedDocument(chunks=chunks, tier_pages=tier_pages)
+
+
+def record_parse_metrics(document: ParsedDocument) -> None:
+    """在主进程中上报抽取层级指标"""
+    for tier, count in document.tier_pages.items():
+        PDF_EXTRACT_PAGES.labels(tier=tier).inc(count)
+    tiers = {tier for tier, count in document.tier_pages.items() if count}
+    if tiers == {TIER_TEXT_LAYER}:
+        PDF_EXTRACT_DOCUMENTS.labels(tier=TIER_TEXT_LAYER).inc()
+    elif len(tiers) > 1:
+        PDF_EXTRACT_DOCUMENTS.labels(tier="mixed").inc()
+    else:
+        PDF_EXTRACT_DOCUMENTS.labels(tier=TIER_DOCLING).inc()
+
+
+# worker 开始处理任务时经此队列上报 (token, pid, 开始时间)
+StartQueue = queue.SimpleQueue | multiprocessing.queues.SimpleQueue
+_worker_state = threading.local()
+
+
+class ParseDeadlineExceeded(BaseException):
+    """
+    worker 内单个解析任务超过截止时间。
+    继承 BaseException：解析链路上各处 except Exception（读取失败改走 Docling、
+    包装为"文件解析失败"等）不会吞掉它，超时能原样传回主进程。
+    """
+
+
+def _bind_start_queue(started: StartQueue | None) -> None:
+    _worker_state.started = started
+
+
+def _init_worker(started: StartQueue | None = None) -> None:
+    """在 worker 中执行：进程启动即加载模型，首个文档不再承担冷启动"""
+    _bind_start_queue(started)
+    DoclingModelFactory.get_converter()
+    DoclingModelFactory.get_hierarchical_chunker()
+
+
+def _ping_worker() -> bool:
+    return True
+
+
+@contextmanager
+def _worker_deadline(seconds: float) -> Iterator[None]:
+    """
+    在 worker 进程的主线程内用 SIGALRM 设截止时间，超时抛 ParseDeadlineExceeded。
+    线程池 worker（非主线程）或不支持 setitimer 的平台上不生效，由主进程侧按开始时间判定超时。
+    """
+    if (
+        not hasattr(signal, "setitimer")
+        or threading.current_thread() is not threading.main_thread()
+    ):
+        yield
+        return
+
+    def expire(signum, frame):
+        raise ParseDeadlineExceeded(f"解析超过 {seconds:.0f}s")
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _parse_task(
+    token: str,
+    timeout_seconds: float,
+    file_path: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    page_range: tuple[int, int] | None = None,
+) -> ParsedDocument:
+    """在 worker 中执行：上报开始时间后在截止时间内解析，超时计时不含排队时间"""
+    started = getattr(_worker_state, "started", None)
+    if started is not None:
+        started.put((token, os.getpid(), time.monotonic()))
+    with _worker_deadline(timeout_seconds):
+        return parse_structured_document_sync(
+            file_path, chunk_size, chunk_overlap, page_range
+        )
+
+
+def parse_structured_document_sync(
+    file_path: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    page_range: tuple[int, int] | None = None,
+) -> ParsedDocument:
+    """在 worker 中执行：解析并切片，只返回切片文本与元数据（必须是模块级函数才能被 pickle）"""
+    chunking_service = ChunkingService(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap
+    )
+    return parse_structured_document(Path(file_path), chunking_service, page_range)
+
+
+def default_parse_workers() -> int:
+    """未配置 DOCLING_PARSE_WORKERS 时的进程数：CPU 核数的一半，限制在 1~4 以控制模型内存"""
+    return max(1, min(4, (os.cpu_count() or 1) // 2))
+
+
+class DoclingParseExecutor:
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        max_tasks_per_child: int | None = None,
+        timeout_seconds: float | None = None,
+        kind: str | None = None,
+    ):
+        self.max_workers = (
+            max_workers or settings.DOCLING_PARSE_WORKERS or default_parse_workers()
+        )
+        self.max_tasks_per_child = (
+            max_tasks_per_child or settings.DOCLING_PARSE_MAX_TASKS_PER_CHILD
+        )
+        self.timeout_seconds = timeout_seconds or settings.DOCLING_PARSE_TIMEOUT_SECONDS
+        self.kind = kind or settings.DOCLING_PARSE_POOL_KIND
+        self._pool: Executor | None = None
+        self._started_queue: StartQueue | None = None
+        # 在途任务 token -> (worker pid, 开始时间)；尚未开始的任务为 None，
+        # 由各解析线程从 _started_queue 搬运过来
+        self._started: dict[str, tuple[int, float] | None] = {}
+        # parse 由多个入库任务的解析线程并发调用，进程池的创建 / 重建需要加锁
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> Executor:
+        with self._lock:
+            if self._pool is None:
+                if self.kind == "thread":
+                    self._started_queue = queue.SimpleQueue()
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix="docling-parse",
+                        initializer=_bind_start_queue,
+                        initargs=(self._started_queue,),
+                    )
+                else:
+                    # 服务进程本身是多线程的，fork 可能继承锁导致死锁，改用 spawn
+                    mp_context = multiprocessing.get_context("spawn")
+                    self._started_queue = mp_context.SimpleQueue()
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=mp_context,
+                        initializer=_init_worker,
+                        initargs=(self._started_queue,),
+                        max_tasks_per_child=self.max_tasks_per_child,
+                    )
+            return self._pool
+
+    def warm_up(self) -> None:
+        """拉起全部 worker 并等待模型加载完成（Taskiq worker 启动阶段调用）"""
+        pool = self._get_pool()
+        futures = [pool.submit(_ping_worker) for _ in range(self.max_workers)]
+        for future in futures:
+            future.result()
+        logger.info("Docling 解析进程池预热完成: workers=%d", self.max_workers)
+
+    def parse(
+        self,
+        file_path: Path,
+        *,
+        chunk_size: int,
+        chunk_overlap: int,
+        on_progress: Callable[[int, int], None] | None = None,
+    ) -> ParsedDocument:
+        """
+        同步提交并等待解析结果（在入库流水线的解析线程中调用）。
+
+        超大 PDF 按页段拆成多个子任务并行解析，按页段顺序合并，chunk_index 与整篇解析一致；
+        每完成一个页段回调 on_progress(已完成页段数, 页段总数)。
+        任一子任务自 worker 开始处理起超过 timeout_seconds 抛 ValidationError，进程池保持可用；
+        worker 被杀导致进程池损坏时重建后重试一次（只重跑未完成的页段）。
+        """
+        started = time.perf_counter()
+        ranges: list[tuple[int, int] | None] = [None]
+        if file_path.suffix.lower() == ".pdf":
+            page_count = count_pdf_pages(file_path)
+            ranges = plan_page_ranges(page_count or 0) or ranges
+        results: dict[int, ParsedDocument] = {}
+        args = (str(file_path), chunk_size, chunk_overlap)
+        pool = self._get_pool()
+        try:
+            try:
+                self._run_ranges(pool, args, ranges, results, on_progress)
+            except BrokenProcessPool:
+                logger.warning(
+                    "Docling 解析进程池已损坏，重建后重试: %s", file_path.name
+                )
+                self._reset_pool(pool)
+                pool = self._get_pool()
+                self._run_ranges(pool, args, ranges, results, on_progress)
+        except (FuturesTimeoutError, ParseDeadlineExceeded) as exc:
+            DOCLING_PARSE_TIMEOUTS.inc()
+            logger.warning(
+                "Docling 解析超时: file=%s timeout=%.0fs",
+                file_path.name,
+                self.timeout_seconds,
+            )
+            raise ValidationError(
+                f"文件解析超时: {file_path.name}",
+                details={"timeout_seconds": self.timeout_seconds},
+            ) from exc
+        finally:
+            DOCLING_PARSE_SECONDS.observe(time.perf_counter() - started)
+
+        document = merge_parsed_documents([results[idx] for idx in range(len(ranges))])
+        record_parse_metrics(document)
+        return document
+
+    def _run_ranges(
+        self,
+        pool: Executor,
+        args: tuple[str, int, int],
+        ranges: list[tuple[int, int] | None],
+        results: dict[int, ParsedDocument],
+        on_progress: Callable[[int, int], None] | None,
+    ) -> None:
+        futures: dict[Future, tuple[int, str]] = {}
+        # 进程池 worker 自带截止时间，主进程额外等一个宽限期；线程池无法打断，到点即放弃等待
+        grace = 0.0 if self.kind == "thread" else _WORKER_KILL_GRACE_SECONDS
+        poll = min(_WATCHDOG_POLL_SECONDS, self.timeout_seconds / 5)
+        try:
+            for idx, page_range in enumerate(ranges):
+                if idx not in results:
+                    token = uuid.uuid4().hex
+                    with self._lock:
+                        self._started[token] = None
+                    future = pool.submit(
+                        _parse_task, token, self.timeout_seconds, *args, page_range
+                    )
+                    futures[future] = (idx, token)
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=poll, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[futures[future][0]] = future.result()
+                    if on_progress is not None and len(ranges) > 1:
+                        on_progress(len(results), len(ranges))
+                overdue = self._overdue_worker(
+                    [futures[future][1] for future in pending], grace
+                )
+                if overdue is not None:
+                    self._kill_worker(pool, overdue)
+                    raise FuturesTimeoutError()
+        finally:
+            # 任一页段失败时撤销尚未开始的页段
+            for future in futures:
+                future.cancel()
+            with self._lock:
+                for _, token in futures.values():
+                    self._started.pop(token, None)
+
+    def _overdue_worker(self, tokens: list[str], grace: float) -> int | None:
+        """返回已开始且超过截止时间（含宽限期）的任务所在 worker pid；尚在排队的任务不计时"""
+        now = time.monotonic()
+        with self._lock:
+            started_queue = self._started_queue
+            # 只有各解析线程在锁内消费该队列，empty() 后的 get() 不会阻塞
+            while started_queue is not None and not started_queue.empty():
+                token, pid, started_at = started_queue.get()
+                # 已结束（超时放弃）的任务迟到的上报直接丢弃
+                if token in self._started:
+                    self._started[token] = (pid, started_at)
+            for token in tokens:
+                if (started := self._started.get(token)) is not None:
+                    pid, started_at = started
+                    if now - started_at >= self.timeout_seconds + grace:
+                        return pid
+        return None
+
+    def _kill_worker(self, pool: Executor, pid: int) -> None:
+        if not isinstance(pool, ProcessPoolExecutor):
+            # 线程无法强杀，超时的解析在后台跑完后自然释放线程
+            return
+        # worker 的截止时间没能打断解析（卡在原生代码里），只能终止这一个 worker；
+        # ProcessPoolExecutor 会因此整体损坏，池内其它文档收到 BrokenProcessPool 后重建重试
+        process = getattr(pool, "_processes", {}).get(pid)
+        if process is not None:
+            logger.warning("Docling 解析 worker 未响应截止时间，终止: pid=%d", pid)
+            process.terminate()
+        self._reset_pool(pool)
+
+    def _reset_pool(self, pool: Executor) -> None:
+        # 多个解析线程可能同时发现同一个池损坏，只摘除仍在使用的那个，不误伤已重建的新池
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+docling_parse_executor = DoclingParseExecutor()
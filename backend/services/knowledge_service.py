@@ -1,6 +1,13 @@
 import asyncio
+import hashlib
+import tarfile
 import uuid
-from pathlib import Path
+import zipfile
+import zlib
+from collections.abc import Collection, Iterator
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO
 
 from fastapi import UploadFile
 
@@ -13,6 +20,37 @@ from backend.core.exceptions import (
 from backend.domain.interfaces import AbstractUnitOfWork
 from backend.models.orm.knowledge import File, FileStatus
 
+# 上传拷贝缓冲区大小：单个上传任意时刻只占用这一块内存
+UPLOAD_BUFFER_SIZE = 1024 * 1024
+
+ZIP_SUFFIXES = (".zip",)
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+
+
+@dataclass
+class _StoredObject:
+    filename: str
+    path: Path
+    size: int
+    content_hash: str
+    owned: bool
+
+
+@dataclass
+class StagedUploadBatch:
+    """已落盘、尚未建档的批量上传条目"""
+
+    objects: list[_StoredObject] = field(default_factory=list)
+    skipped: list[dict] = field(default_factory=list)
+
+
+@dataclass
+class BatchUploadResult:
+    """批量上传结果：已建档的文件 + 跳过的条目（{"filename", "reason"}）"""
+
+    files: list[File]
+    skipped: list[dict] = field(default_factory=list)
+
 
 class KnowledgeService:
     def __init__(
@@ -20,11 +58,13 @@ class KnowledgeService:
         uow: AbstractUnitOfWork,
         storage_root: Path,
         max_upload_size_mb: int = 20,
+        max_batch_files: int = 1000,
     ):
         self.uow = uow
         self.storage_root = storage_root
         self.max_upload_size_mb = max(1, max_upload_size_mb)
         self.max_upload_size_bytes = self.max_upload_size_mb * 1024 * 1024
+        self.max_batch_files = max(1, max_batch_files)
 
     async def save_upload_file(
         self,
@@ -33,57 +73,99 @@ class KnowledgeService:
         user_id: uuid.UUID,
         upload_file: UploadFile,
     ) -> File:
+        """
+        流式保存上传文件：固定大小缓冲区逐块拷入临时文件，同时计算 SHA-256 并检查大小上限，
+        完成后 os.replace 原子落到内容寻址路径。任意时刻只占用一个缓冲区的内存。
+        超限请求已在路由层（UploadLimitRoute）接收阶段被拦截，这里按文件本身精确校验。
+        """
         safe_filename = self._validate_upload_file(upload_file)
-        content = await self._read_upload_content(upload_file)
-        if not content:
-            raise ValidationError("上传文件为空")
-
         await self._ensure_kb_access(kb_id=kb_id, user_id=user_id)
 
-        target_path = self._build_storage_path(kb_id=kb_id, filename=safe_filename)
-        await asyncio.to_thread(self._write_file, target_path, content)
+        temp_path = self._build_temp_storage_path(filename=safe_filename)
+
+        try:
+            file_size, content_hash = await asyncio.to_thread(
+                self._copy_upload_to_file, upload_file.file, temp_path
+            )
+            if file_size <= 0:
+                raise ValidationError("上传文件为空")
+
+            target_path = self._build_storage_path(
+                content_hash=content_hash, filename=safe_filename
+            )
+            created = await asyncio.to_thread(self._move_file, temp_path, target_path)
+        except AppError:
+            self._cleanup_file(temp_path)
+            raise
+        except Exception as exc:
+            self._cleanup_file(temp_path)
+            raise ServiceError("上传文件保存失败，请稍后重试") from exc
 
         return await self._create_file_record(
             kb_id=kb_id,
             filename=safe_filename,
             file_path=target_path,
-            file_size=len(content),
+            file_size=file_size,
+            content_hash=content_hash,
+            owns_file=created,
         )
 
-    async def save_upload_file_streaming(
+    async def stage_upload_batch(
         self,
         *,
-        kb_id: uuid.UUID,
-        user_id: uuid.UUID,
-        upload_file: UploadFile,
-    ) -> File:
-        safe_filename = self._validate_upload_file(upload_file)
-        await self._ensure_kb_access(kb_id=kb_id, user_id=user_id)
-
-        target_path = self._build_storage_path(kb_id=kb_id, filename=safe_filename)
-        temp_path = self._build_temp_storage_path(kb_id=kb_id, filename=safe_filename)
-        moved_to_target = False
-
+        upload_files: list[UploadFile],
+        allowed_suffixes: Collection[str],
+    ) -> StagedUploadBatch:
+        """
+        批量展开多文件表单 / 压缩包（zip、tar 系列）：条目逐个流式解出到内容寻址存储。
+        不访问数据库，调用方应在事务外执行，避免解压期间占住连接。
+        不支持的类型、超限或空文件记为跳过，不影响其余条目。
+        """
+        if not upload_files:
+            raise ValidationError("未选择上传文件")
+
+        staged = StagedUploadBatch()
         try:
-            file_size = await self._stream_upload_to_file(upload_file, temp_path)
-            if file_size <= 0:
-                raise ValidationError("上传文件为空")
-
-            await asyncio.to_thread(self._move_file, temp_path, target_path)
-            moved_to_target = True
-
-            return await self._create_file_record(
-                kb_id=kb_id,
-                filename=safe_filename,
-                file_path=target_path,
-                file_size=file_size,
-            )
+            for upload_file in upload_files:
+                await asyncio.to_thread(
+                    self._store_upload_entries,
+                    upload_file,
+                    allowed_suffixes,
+                    staged.objects,
+                    staged.skipped,
+                )
+            if not staged.objects:
+                raise ValidationError(
+                    "批量上传中没有可入库的文件", details={"skipped": staged.skipped}
+                )
         except AppError:
-            self._cleanup_file(target_path if moved_to_target else temp_path)
+            self.discard_staged_batch(staged)
             raise
         except Exception as exc:
-            self._cleanup_file(target_path if moved_to_target else temp_path)
-            raise ServiceError("上传文件保存失败，请稍后重试") from exc
+            self.discard_staged_batch(staged)
+            raise ServiceError("批量上传保存失败，请稍后重试") from exc
+        return staged
+
+    async def record_upload_batch(
+        self, *, kb_id: uuid.UUID, staged: StagedUploadBatch
+    ) -> BatchUploadResult:
+        """已落盘的批量文件一次性建档；失败时由调用方 discard_staged_batch 清理"""
+        files = await self.uow.knowledge_repo.create_files(
+            kb_id=kb_id,
+            files=[
+                {
+                    "filename": item.filename,
+                    "file_path": str(item.path),
+                    "file_size": item.size,
+                    "content_hash": item.content_hash,
+                }
+                for item in staged.objects
+            ],
+        )
+        return BatchUploadResult(files=files, skipped=staged.skipped)
+
+    def discard_staged_batch(self, staged: StagedUploadBatch) -> None:
+        self._cleanup_owned(staged.objects)
 
     async def get_file(self, file_id: uuid.UUID) -> File | None:
         return await self.uow.knowledge_repo.get_file(file_id)
@@ -98,17 +180,32 @@ class KnowledgeService:
         *,
         file_id: uuid.UUID,
         status: FileStatus,
+        ingest_fingerprint: str | None = None,
     ) -> File | None:
-        return await self.uow.knowledge_repo.update_file_status(file_id=file_id, status=status)
-
-    def _build_storage_path(self, *, kb_id: uuid.UUID, filename: str) -> Path:
-        kb_dir = self.storage_root / str(kb_id)
-        kb_dir.mkdir(parents=True, exist_ok=True)
-        unique_name = f"{uuid.uuid4().hex}_{filename}"
-        return kb_dir / unique_name
+        return await self.uow.knowledge_repo.update_file_status(
+            file_id=file_id, status=status, ingest_fingerprint=ingest_fingerprint
+        )
 
-    def _build_temp_storage_path(self, *, kb_id: uuid.UUID, filename: str) -> Path:
-        tmp_dir = self.storage_root / str(kb_id) / ".tmp"
+    async def set_files_status(
+        self,
+        *,
+        file_ids: list[uuid.UUID],
+        status: FileStatus,
+    ) -> None:
+        await self.uow.knowledge_repo.update_files_status(file_ids, status)
+
+    def _build_storage_path(self, *, content_hash: str, filename: str) -> Path:
+        """
+        内容寻址存储：objects/<哈希前两位>/<哈希><扩展名>。
+        同一内容无论上传到哪个知识库、上传几次都只存一份；保留扩展名以便按类型选择解析通道。
+        """
+        object_dir = self.storage_root / "objects" / content_hash[:2]
+        object_dir.mkdir(parents=True, exist_ok=True)
+        return object_dir / f"{content_hash}{Path(filename).suffix.lower()}"
+
+    def _build_temp_storage_path(self, *, filename: str) -> Path:
+        # 与内容寻址目录同在 storage_root 下，保证 os.replace 不跨文件系统
+        tmp_dir = self.storage_root / ".tmp"
         tmp_dir.mkdir(parents=True, exist_ok=True)
         unique_name = f"{uuid.uuid4().hex}_{filename}.part"
         return tmp_dir / unique_name
@@ -122,15 +219,14 @@ class KnowledgeService:
         return base
 
     @staticmethod
-    def _write_file(path: Path, content: bytes) -> None:
-        path.parent.mkdir(parents=True, exist_ok=True)
-        with path.open("wb") as f:
-            f.write(content)
-
-    @staticmethod
-    def _move_file(src: Path, dst: Path) -> None:
+    def _move_file(src: Path, dst: Path) -> bool:
+        """把临时文件落到内容寻址对象；对象已存在时丢弃临时文件，返回是否新建"""
+        if dst.exists():
+            src.unlink(missing_ok=True)
+            return False
         dst.parent.mkdir(parents=True, exist_ok=True)
         src.replace(dst)
+        return True
 
     @staticmethod
     def _cleanup_file(path: Path) -> None:
@@ -159,7 +255,10 @@ class KnowledgeService:
         filename: str,
         file_path: Path,
         file_size: int,
+        content_hash: str,
+        owns_file: bool,
     ) -> File:
+        # 内容寻址对象可能被其它文件记录共用，只清理本次新建的对象
         try:
             return await self.uow.knowledge_repo.create_file(
                 kb_id=kb_id,
@@ -167,47 +266,142 @@ class KnowledgeService:
                 file_path=str(file_path),
                 file_size=file_size,
                 status=FileStatus.UPLOADED,
+                content_hash=content_hash,
             )
         except AppError:
-            self._cleanup_file(file_path)
+            if owns_file:
+                self._cleanup_file(file_path)
             raise
         except Exception as exc:
-            self._cleanup_file(file_path)
+            if owns_file:
+                self._cleanup_file(file_path)
             raise ServiceError("上传文件保存失败，请稍后重试") from exc
 
-    async def _stream_upload_to_file(self, upload_file: UploadFile, path: Path) -> int:
+    def _copy_upload_to_file(self, source: BinaryIO, path: Path) -> tuple[int, str]:
+        """
+        在工作线程中执行：复用同一个缓冲区 readinto -> 哈希 -> 写盘，
+        返回 (文件大小, 内容哈希)；超过大小上限立即中止。
+        """
         total_size = 0
-        chunk_size = 1024 * 1024
+        digest = hashlib.sha256()
+        buffer = bytearray(UPLOAD_BUFFER_SIZE)
+        view = memoryview(buffer)
 
         path.parent.mkdir(parents=True, exist_ok=True)
         with path.open("wb") as f:
-            while True:
-                chunk = await upload_file.read(chunk_size)
-                if not chunk:
-                    break
-                total_size += len(chunk)
+            while read := source.readinto(view):
+                total_size += read
                 if total_size > self.max_upload_size_bytes:
                     raise ValidationError(
                         f"上传文件超过大小限制（最大 {self.max_upload_size_mb}MB）"
                     )
-                await asyncio.to_thread(f.write, chunk)
+                digest.update(view[:read])
+                f.write(view[:read])
 
-        return total_size
+        return total_size, digest.hexdigest()
 
-    async def _read_upload_content(self, upload_file: UploadFile) -> bytes:
-        chunks: list[bytes] = []
-        total_size = 0
-        chunk_size = 1024 * 1024
-
-        while True:
-            chunk = await upload_file.read(chunk_size)
-            if not chunk:
-                break
-            total_size += len(chunk)
-            if total_size > self.max_upload_size_bytes:
+    def _store_upload_entries(
+        self,
+        upload_file: UploadFile,
+        allowed_suffixes: Collection[str],
+        stored: list[_StoredObject],
+        skipped: list[dict],
+    ) -> None:
+        """在工作线程中执行：展开一个表单文件（压缩包则逐条目）并落盘"""
+        for filename, source in self._iter_upload_entries(upload_file, skipped):
+            if len(stored) >= self.max_batch_files:
                 raise ValidationError(
-                    f"上传文件超过大小限制（最大 {self.max_upload_size_mb}MB）"
+                    f"批量上传文件数超过上限（最多 {self.max_batch_files} 个）"
                 )
-            chunks.append(chunk)
+            if Path(filename).suffix.lower() not in allowed_suffixes:
+                skipped.append({"filename": filename, "reason": "不支持的文件类型"})
+                continue
+
+            temp_path = self._build_temp_storage_path(filename=filename)
+            try:
+                size, content_hash = self._copy_upload_to_file(source, temp_path)
+            except ValidationError as exc:
+                self._cleanup_file(temp_path)
+                skipped.append({"filename": filename, "reason": exc.message})
+                continue
+            except (zipfile.BadZipFile, tarfile.TarError, zlib.error, EOFError):
+                # 单个条目损坏（CRC 校验失败、数据截断）只跳过该条目
+                self._cleanup_file(temp_path)
+                skipped.append({"filename": filename, "reason": "条目解压失败"})
+                continue
+            except BaseException:
+                self._cleanup_file(temp_path)
+                raise
+            if size <= 0:
+                self._cleanup_file(temp_path)
+                skipped.append({"filename": filename, "reason": "上传文件为空"})
+                continue
+
+            target_path = self._build_storage_path(
+                content_hash=content_hash, filename=filename
+            )
+            owned = self._move_file(temp_path, target_path)
+            stored.append(
+                _StoredObject(filename, target_path, size, content_hash, owned)
+            )
 
-        return b"".join(chunks)
+    def _iter_upload_entries(
+        self, upload_file: UploadFile, skipped: list[dict]
+    ) -> Iterator[tuple[str, BinaryIO]]:
+        """产出 (文件名, 可读流)；压缩包按条目顺序流式解出，不整体解压到磁盘"""
+        if not upload_file.filename:
+            raise ValidationError("上传文件名不能为空")
+        archive_name = self._sanitize_filename(upload_file.filename)
+        lowered = archive_name.lower()
+        try:
+            if lowered.endswith(ZIP_SUFFIXES):
+                with zipfile.ZipFile(upload_file.file) as archive:
+                    for info in archive.infolist():
+                        name = self._archive_entry_name(info.filename, info.is_dir())
+                        if name is None:
+                            continue
+                        try:
+                            source = archive.open(info)
+                        except RuntimeError:
+                            skipped.append(
+                                {"filename": name, "reason": "加密条目无法解压"}
+                            )
+                            continue
+                        with source:
+                            yield name, source
+                return
+            if lowered.endswith(TAR_SUFFIXES):
+                # 流模式 r|*：顺序读取，不需要回溯整个压缩包
+                with tarfile.open(fileobj=upload_file.file, mode="r|*") as archive:
+                    for member in archive:
+                        name = self._archive_entry_name(
+                            member.name, not member.isfile()
+                        )
+                        if name is None:
+                            continue
+                        source = archive.extractfile(member)
+                        if source is not None:
+                            yield name, source
+                return
+        except (zipfile.BadZipFile, tarfile.TarError) as exc:
+            skipped.append(
+                {"filename": archive_name, "reason": f"压缩包无法解压: {exc}"}
+            )
+            return
+
+        yield archive_name, upload_file.file
+
+    def _archive_entry_name(self, entry_path: str, is_dir: bool) -> str | None:
+        """压缩包条目只取文件名（不信任条目路径）；目录与隐藏 / 系统元数据条目忽略"""
+        parts = PurePosixPath(entry_path.replace("\\", "/")).parts
+        if is_dir or not parts:
+            return None
+        if any(part.startswith(".") or part == "__MACOSX" for part in parts):
+            return None
+        return self._sanitize_filename(parts[-1])
+
+    def _cleanup_owned(self, stored: list[_StoredObject]) -> None:
+        # 内容寻址对象可能被其它文件记录共用，只清理本次新建的对象
+        for item in stored:
+            if item.owned:
+                self._cleanup_file(item.path)
@@ -0,0 +1,330 @@
+"""
+Message Write Buffer — 消息终态写缓冲 (write-behind)
+
+设计要点：
+- 每轮对话结束原本要单独开事务写 chat_messages，高 QPS 下是大量小事务；
+  开启后流式热路径只把终态记录交给缓冲，不再等待 DB 提交。
+- 后台每 CHAT_WRITE_BEHIND_FLUSH_INTERVAL_MS 毫秒（或攒满 MAX_BATCH 条）
+  用一条 UPDATE ... FROM (VALUES ...) 批量落库，会话 token 计数在同一语句内回写；
+  带 user_id 的记录同时插入额度待回写增量（token_usage_pending），
+  热路径不再为额度结算单独开事务。
+- 持久性：提交前先写入 Redis 溢出日志（Hash，field 为 message_id），
+  落库成功后再删除；溢出日志写不进去时退回同步落库，宁可慢也不丢。
+- 溢出日志按进程隔离（{SPILL_KEY}:{instance_id}），进程通过租约心跳声明存活；
+  recover() 只接管租约已过期的日志（以 SET NX 抢占，多副本不会重复接管），
+  启动时与运行中周期性执行，因此不会删掉仍在运行的副本内存中持有的记录。
+- 停机时 stop() 会把内存中剩余记录全部刷盘。
+- 代价：刷盘前读取会话详情可能短暂看到 THINKING 状态（最长一个刷盘周期）。
+"""
+
+import asyncio
+import logging
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Any
+
+import orjson
+from prometheus_client import Counter, Gauge
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from backend.core.config import settings
+from backend.core.redis import redis_client
+from backend.models.orm.chat import MessageStatus
+from backend.services.unit_of_work import SQLAlchemyUnitOfWork
+
+logger = logging.getLogger(__name__)
+
+WRITE_BUFFER_PENDING = Gauge(
+    "chat_write_buffer_pending",
+    "写缓冲中等待落库的消息终态记录数",
+)
+WRITE_BUFFER_FLUSHED = Counter(
+    "chat_write_buffer_flushed_total",
+    "写缓冲批量落库的消息终态记录数",
+)
+WRITE_BUFFER_SYNC_FALLBACK = Counter(
+    "chat_write_buffer_sync_fallback_total",
+    "因溢出日志不可用而退回同步落库的记录数",
+)
+
+
+@dataclass(slots=True)
+class MessageFinalization:
+    """一条消息的终态（对应一次 update_message_status）"""
+
+    message_id: uuid.UUID
+    content: str
+    status: MessageStatus = MessageStatus.SUCCESS
+    tokens_input: int = 0
+    tokens_output: int = 0
+    latency_ms: int | None = None
+    search_context: dict | None = None
+    # 本轮消耗计入的用户；None 表示不记额度
+    user_id: uuid.UUID | None = None
+
+    def to_row(self) -> dict[str, Any]:
+        row = asdict(self)
+        row["id"] = row.pop("message_id")
+        return row
+
+    def to_json(self) -> bytes:
+        return orjson.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, raw: str | bytes) -> "MessageFinalization":
+        data = orjson.loads(raw)
+        data["message_id"] = uuid.UUID(data["message_id"])
+        data["status"] = MessageStatus(data["status"])
+        if data.get("user_id"):
+            data["user_id"] = uuid.UUID(data["user_id"])
+        return cls(**data)
+
+
+class MessageWriteBuffer:
+    def __init__(
+        self,
+        flush_interval_ms: int | None = None,
+        max_batch: int | None = None,
+        spill_key: str | None = None,
+        lease_seconds: int | None = None,
+    ):
+        self.flush_interval = (
+            flush_interval_ms or settings.CHAT_WRITE_BEHIND_FLUSH_INTERVAL_MS
+        ) / 1000
+        self.max_batch = max_batch or settings.CHAT_WRITE_BEHIND_MAX_BATCH
+        self.spill_prefix = spill_key or settings.CHAT_WRITE_BEHIND_SPILL_KEY
+        self.instance_id = uuid.uuid4().hex
+        self.spill_key = self._spill_key_of(self.instance_id)
+        self.registry_key = f"{self.spill_prefix}:instances"
+        self.lease_seconds = lease_seconds or settings.CHAT_WRITE_BEHIND_LEASE_SECONDS
+        self._registered = False
+        self._lease_renewed_at = 0.0
+        self._recovered_at = 0.0
+        self._session_factory: async_sessionmaker | None = None
+        # 同一消息只保留最后一次终态；dict 保持插入顺序即提交顺序
+        self._pending: dict[uuid.UUID, MessageFinalization] = {}
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def start(self, session_factory: async_sessionmaker) -> None:
+        if self._task is None:
+            self._session_factory = session_factory
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run(), name="chat-write-buffer")
+
+    async def stop(self) -> None:
+        """停止后台循环并把剩余记录全部刷盘；刷不进去的仍留在溢出日志里。"""
+        if self._task is not None:
+            self._stopping.set()
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        while self._pending:
+            if not await self.flush_once():
+                logger.error(
+                    "停机刷盘失败，剩余记录保留在溢出日志: count=%d",
+                    len(self._pending),
+                )
+                # 不释放租约：过期后由其他副本接管重放
+                return
+        await self._release_lease()
+
+    async def submit(self, record: MessageFinalization) -> None:
+        """提交一条终态：写入溢出日志后即返回，不等待 DB 提交。"""
+        if not self.running:
+            raise RuntimeError("MessageWriteBuffer 未启动")
+
+        try:
+            if not self._registered:
+                # 先声明租约再写日志，保证每份日志都能在进程崩溃后被发现
+                await self._heartbeat()
+            redis = await redis_client.init()
+            await redis.hset(self.spill_key, str(record.message_id), record.to_json())
+        except RedisError:
+            logger.warning(
+                "写缓冲溢出日志不可用，退回同步落库: message_id=%s",
+                record.message_id,
+                exc_info=True,
+            )
+            WRITE_BUFFER_SYNC_FALLBACK.inc()
+            await self._write_batch([record])
+            return
+
+        self._pending[record.message_id] = record
+        WRITE_BUFFER_PENDING.set(len(self._pending))
+        if len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+
+    async def flush_once(self) -> int:
+        """取出至多 max_batch 条记录落库，返回写入条数；失败时记录放回缓冲。"""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch_ids = list(self._pending)[: self.max_batch]
+            batch = [self._pending.pop(message_id) for message_id in batch_ids]
+            WRITE_BUFFER_PENDING.set(len(self._pending))
+
+            try:
+                await self._write_batch(batch)
+            except Exception:
+                logger.exception("写缓冲落库失败，下一轮重试: count=%d", len(batch))
+                for record in batch:
+                    # 刷盘期间同一消息若有更新的终态，以新的为准
+                    self._pending.setdefault(record.message_id, record)
+                WRITE_BUFFER_PENDING.set(len(self._pending))
+                return 0
+
+            WRITE_BUFFER_FLUSHED.inc(len(batch))
+            # 刷盘期间被再次提交的消息，其溢出记录已是新值，不能删
+            await self._unspill(
+                [str(r.message_id) for r in batch if r.message_id not in self._pending]
+            )
+            return len(batch)
+
+    async def recover(self) -> int:
+        """
+        接管租约已过期（进程已退出 / 崩溃）的溢出日志并重放，返回重放条数。
+        启动时调用一次，运行中每个租约周期再扫一次。
+        """
+        self._recovered_at = asyncio.get_running_loop().time()
+        replayed = 0
+        try:
+            redis = await redis_client.init()
+            for raw_owner in await redis.smembers(self.registry_key):
+                owner = (
+                    raw_owner.decode() if isinstance(raw_owner, bytes) else raw_owner
+                )
+                if owner == self.instance_id:
+                    continue
+                # 存活副本的租约仍在，NX 抢占失败即跳过；多个副本同时恢复也只有一个能拿到
+                claimed = await redis.set(
+                    self._lease_key(owner),
+                    f"recovering:{self.instance_id}",
+                    nx=True,
+                    ex=self.lease_seconds,
+                )
+                if claimed:
+                    replayed += await self._recover_log(redis, owner)
+        except RedisError:
+            logger.warning("写缓冲溢出日志读取失败，跳过恢复", exc_info=True)
+        except Exception:
+            # 恢复失败不阻塞启动，残留记录留待下次重放
+            logger.exception("写缓冲溢出记录重放失败")
+        if replayed:
+            logger.info("写缓冲已重放溢出记录: count=%d", replayed)
+        return replayed
+
+    async def _recover_log(self, redis, owner: str) -> int:
+        spill_key = self._spill_key_of(owner)
+        replayed = 0
+        batch: list[MessageFinalization] = []
+        async for _, raw in redis.hscan_iter(spill_key, count=self.max_batch):
+            try:
+                batch.append(MessageFinalization.from_json(raw))
+            except (orjson.JSONDecodeError, KeyError, TypeError, ValueError):
+                logger.warning("写缓冲溢出记录无法解析，已跳过: %r", raw)
+                continue
+            if len(batch) >= self.max_batch:
+                replayed += await self._replay(batch, spill_key)
+                batch = []
+        if batch:
+            replayed += await self._replay(batch, spill_key)
+
+        if not await redis.hlen(spill_key):
+            await redis.srem(self.registry_key, owner)
+            await redis.delete(self._lease_key(owner))
+        logger.info(
+            "写缓冲已接管失效副本的溢出日志: owner=%s count=%d", owner, replayed
+        )
+        return replayed
+
+    async def _replay(self, batch: list[MessageFinalization], spill_key: str) -> int:
+        # 批量 UPDATE 幂等：重复写同样的终态，token 差额为 0
+        await self._write_batch(batch)
+        await self._unspill([str(r.message_id) for r in batch], spill_key)
+        return len(batch)
+
+    def _spill_key_of(self, owner: str) -> str:
+        return f"{self.spill_prefix}:{owner}"
+
+    def _lease_key(self, owner: str) -> str:
+        return f"{self.spill_prefix}:lease:{owner}"
+
+    async def _heartbeat(self) -> None:
+        """续租并登记本进程的溢出日志（租约在前，登记在后）"""
+        redis = await redis_client.init()
+        await redis.set(
+            self._lease_key(self.instance_id), "alive", ex=self.lease_seconds
+        )
+        await redis.sadd(self.registry_key, self.instance_id)
+        self._registered = True
+        self._lease_renewed_at = asyncio.get_running_loop().time()
+
+    async def _release_lease(self) -> None:
+        """正常停机且记录已全部落库：注销本进程的日志与租约"""
+        if not self._registered:
+            return
+        try:
+            redis = await redis_client.init()
+            await redis.srem(self.registry_key, self.instance_id)
+            await redis.delete(self.spill_key, self._lease_key(self.instance_id))
+            self._registered = False
+        except RedisError:
+            logger.warning("写缓冲租约释放失败，过期后由其他副本清理", exc_info=True)
+
+    async def _maintain_lease(self) -> None:
+        now = asyncio.get_running_loop().time()
+        if now - self._lease_renewed_at >= self.lease_seconds / 3:
+            try:
+                await self._heartbeat()
+            except RedisError:
+                logger.warning("写缓冲租约续期失败", exc_info=True)
+        if now - self._recovered_at >= self.lease_seconds:
+            await self.recover()
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                # 积压较多时连续刷，直到不足一整批
+                while await self.flush_once() >= self.max_batch:
+                    pass
+                await self._maintain_lease()
+            except Exception:
+                logger.exception("写缓冲刷盘循环异常")
+
+    async def _write_batch(self, batch: list[MessageFinalization]) -> None:
+        if self._session_factory is None:
+            raise RuntimeError("MessageWriteBuffer 未启动：缺少 session_factory")
+        async with SQLAlchemyUnitOfWork(self._session_factory) as uow:
+            await uow.chat_repo.finalize_messages_batch([r.to_row() for r in batch])
+
+    async def _unspill(
+        self, message_ids: list[str], spill_key: str | None = None
+    ) -> None:
+        if not message_ids:
+            return
+        try:
+            redis = await redis_client.init()
+            await redis.hdel(spill_key or self.spill_key, *message_ids)
+        except RedisError:
+            # 残留的溢出记录只会在下次恢复时被幂等重放
+            logger.warning("写缓冲溢出记录清理失败: count=%d", len(message_ids))
+
+
+message_write_buffer = MessageWriteBuffer()
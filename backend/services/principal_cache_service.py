@@ -0,0 +1,184 @@
+"""
+Principal Cache Service — 认证主体缓存
+
+设计要点：
+- get_current_user 每个请求都会查一次 users 表，而依赖方只需要
+  id / is_active / is_superuser / 额度上限这几个字段；这里把它们缓存为
+  轻量的 AuthPrincipal，命中时认证链路零 DB 查询。
+- 两级缓存：进程内 TTL 字典（极短 TTL，扛住同一 worker 的突发请求）
+  + Redis Hash（短 TTL，多 worker 共享）。
+- 缓存键为 (user_id, token iat)：同一用户不同 Token 各自一条，
+  Redis 侧同一用户的所有条目放在一个 Hash 里，失效时一次 DEL 即可。
+- 用户更新 / 删除时由 UserService 主动失效；其他 worker 的进程内缓存
+  最多滞后 AUTH_PRINCIPAL_LOCAL_TTL_SECONDS。
+- Redis 不可用时仅退化为进程内缓存 + 查库，不影响认证结果。
+"""
+
+import json
+import logging
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Any
+
+from redis.exceptions import RedisError
+
+from backend.core.config import settings
+from backend.core.redis import redis_client
+
+logger = logging.getLogger(__name__)
+
+PRINCIPAL_KEY_PREFIX = "auth:principal:"
+
+
+@dataclass(frozen=True, slots=True)
+class AuthPrincipal:
+    """认证依赖返回的最小用户视图"""
+
+    id: uuid.UUID
+    is_active: bool
+    is_superuser: bool
+    max_tokens: int
+
+    @classmethod
+    def from_user(cls, user: Any) -> "AuthPrincipal":
+        return cls(
+            id=user.id,
+            is_active=bool(user.is_active),
+            is_superuser=bool(user.is_superuser),
+            max_tokens=int(user.max_tokens),
+        )
+
+    def to_json(self) -> str:
+        data = asdict(self)
+        data["id"] = str(self.id)
+        return json.dumps(data)
+
+    @classmethod
+    def from_json(cls, raw: str) -> "AuthPrincipal":
+        data = json.loads(raw)
+        return cls(
+            id=uuid.UUID(data["id"]),
+            is_active=bool(data["is_active"]),
+            is_superuser=bool(data["is_superuser"]),
+            max_tokens=int(data["max_tokens"]),
+        )
+
+
+def principal_key(user_id: uuid.UUID | str) -> str:
+    return f"{PRINCIPAL_KEY_PREFIX}{user_id}"
+
+
+class PrincipalCache:
+    def __init__(
+        self,
+        local_ttl_seconds: float | None = None,
+        redis_ttl_seconds: int | None = None,
+        max_local_entries: int | None = None,
+    ):
+        self.local_ttl_seconds = (
+            local_ttl_seconds
+            if local_ttl_seconds is not None
+            else settings.AUTH_PRINCIPAL_LOCAL_TTL_SECONDS
+        )
+        self.redis_ttl_seconds = (
+            redis_ttl_seconds
+            if redis_ttl_seconds is not None
+            else settings.AUTH_PRINCIPAL_REDIS_TTL_SECONDS
+        )
+        self.max_local_entries = (
+            max_local_entries
+            if max_local_entries is not None
+            else settings.AUTH_PRINCIPAL_LOCAL_MAX_ENTRIES
+        )
+        # user_id -> {iat -> (过期时间, principal)}
+        self._local: dict[str, dict[str, tuple[float, AuthPrincipal]]] = {}
+        self._local_size = 0
+
+    @property
+    def enabled(self) -> bool:
+        return settings.AUTH_PRINCIPAL_CACHE_ENABLED
+
+    async def get(self, user_id: str, iat: str) -> AuthPrincipal | None:
+        if not self.enabled:
+            return None
+
+        principal = self._get_local(user_id, iat)
+        if principal is not None:
+            return principal
+
+        try:
+            redis = await redis_client.init()
+            raw = await redis.hget(principal_key(user_id), iat)
+        except RedisError as exc:
+            logger.warning("读取认证缓存失败，回退查库: %s", exc)
+            return None
+        if not raw:
+            return None
+
+        try:
+            principal = AuthPrincipal.from_json(raw)
+        except (ValueError, KeyError, TypeError):
+            logger.warning("认证缓存数据损坏，忽略: user_id=%s", user_id)
+            return None
+        self._set_local(user_id, iat, principal)
+        return principal
+
+    async def set(self, user_id: str, iat: str, principal: AuthPrincipal) -> None:
+        if not self.enabled:
+            return
+
+        self._set_local(user_id, iat, principal)
+        try:
+            redis = await redis_client.init()
+            pipe = redis.pipeline(transaction=False)
+            pipe.hset(principal_key(user_id), iat, principal.to_json())
+            pipe.expire(principal_key(user_id), self.redis_ttl_seconds)
+            await pipe.execute()
+        except RedisError as exc:
+            logger.warning("写入认证缓存失败: %s", exc)
+
+    async def invalidate(self, user_id: uuid.UUID | str) -> None:
+        """失效某用户的全部缓存条目（所有 Token）"""
+        entries = self._local.pop(str(user_id), None)
+        if entries:
+            self._local_size -= len(entries)
+        try:
+            redis = await redis_client.init()
+            await redis.delete(principal_key(user_id))
+        except RedisError as exc:
+            logger.warning("失效认证缓存失败: user_id=%s, %s", user_id, exc)
+
+    def clear_local(self) -> None:
+        self._local.clear()
+        self._local_size = 0
+
+    def _get_local(self, user_id: str, iat: str) -> AuthPrincipal | None:
+        entries = self._local.get(user_id)
+        if not entries:
+            return None
+        item = entries.get(iat)
+        if item is None:
+            return None
+        expires_at, principal = item
+        if expires_at <= time.monotonic():
+            del entries[iat]
+            self._local_size -= 1
+            if not entries:
+                del self._local[user_id]
+            return None
+        return principal
+
+    def _set_local(self, user_id: str, iat: str, principal: AuthPrincipal) -> None:
+        if self.local_ttl_seconds <= 0:
+            return
+        if self._local_size >= self.max_local_entries:
+            # 容量打满直接整体清空：条目 TTL 只有几秒，重建成本很低
+            self.clear_local()
+        entries = self._local.setdefault(user_id, {})
+        if iat not in entries:
+            self._local_size += 1
+        entries[iat] = (time.monotonic() + self.local_ttl_seconds, principal)
+
+
+principal_cache = PrincipalCache()
@@ -1,17 +1,89 @@
 import logging
+import time
 import uuid
+from collections.abc import Callable, Sequence
 
+import numpy as np
+from prometheus_client import Counter, Histogram
+
+from backend.core.config import settings
 from backend.core.exceptions import AppError
 from backend.domain.interfaces import (
     AbstractRAGEmbedder,
     AbstractRAGService,
+    AbstractReranker,
     AbstractUnitOfWork,
 )
 from backend.models.orm.chunk import DocumentChunk
+from backend.services.rerank_service import RerankService
 from backend.services.vector_index_service import VectorIndexService
 
 logger = logging.getLogger(__name__)
 
+RAG_MMR_SECONDS = Histogram(
+    "rag_mmr_rerank_seconds",
+    "MMR 重排耗时",
+    buckets=(0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1),
+)
+RAG_MMR_BUDGET_EXCEEDED = Counter(
+    "rag_mmr_budget_exceeded_total",
+    "MMR 重排超出耗时预算、剩余名额按相关度补齐的次数",
+)
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0.0, 1.0, norms)
+
+
+def mmr_rerank(
+    query_vector: Sequence[float],
+    candidate_vectors: Sequence[Sequence[float]],
+    k: int,
+    lambda_mult: float,
+    time_budget_seconds: float | None = None,
+    clock: Callable[[], float] = time.perf_counter,
+) -> list[int]:
+    """
+    最大边际相关性（MMR）重排，返回选中候选的下标（按选中顺序）。
+
+    每一步选 argmax[λ·sim(q, c) − (1−λ)·max_{s∈已选} sim(c, s)]；
+    候选两两相似度一次矩阵乘法算好，循环内只做向量化的 max/argmax。
+    超出时间预算时剩余名额按与查询的相关度补齐。
+    """
+    count = len(candidate_vectors)
+    k = min(k, count)
+    if k <= 0:
+        return []
+
+    started = clock()
+    candidates = _unit_rows(np.asarray(candidate_vectors, dtype=np.float32))
+    query = _unit_rows(np.asarray(query_vector, dtype=np.float32))
+    relevance = candidates @ query
+    similarity = candidates @ candidates.T
+
+    first = int(np.argmax(relevance))
+    selected = [first]
+    available = np.ones(count, dtype=bool)
+    available[first] = False
+    max_redundancy = similarity[first].copy()
+
+    while len(selected) < k:
+        if time_budget_seconds is not None and clock() - started > time_budget_seconds:
+            RAG_MMR_BUDGET_EXCEEDED.inc()
+            rest = [int(i) for i in np.argsort(-relevance) if available[i]]
+            selected.extend(rest[: k - len(selected)])
+            break
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * max_redundancy
+        scores[~available] = -np.inf
+        chosen = int(np.argmax(scores))
+        selected.append(chosen)
+        available[chosen] = False
+        np.maximum(max_redundancy, similarity[chosen], out=max_redundancy)
+
+    RAG_MMR_SECONDS.observe(clock() - started)
+    return selected
+
 
 class RAGService(AbstractRAGService):
     """
@@ -26,11 +98,19 @@ class RAGService(AbstractRAGService):
         uow: AbstractUnitOfWork,
         embedder: AbstractRAGEmbedder,
         top_k: int = 4,
+        mmr_enabled: bool | None = None,
+        mmr_lambda: float | None = None,
+        reranker: AbstractReranker | None = None,
     ):
         self.uow = uow
         self.embedder = embedder
         self.vector_index_service = VectorIndexService(uow=uow, embedder=embedder)
         self.top_k = top_k
+        self.mmr_enabled = (
+            settings.RAG_MMR_ENABLED if mmr_enabled is None else mmr_enabled
+        )
+        self.mmr_lambda = settings.RAG_MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+        self.rerank_service = RerankService(reranker) if reranker is not None else None
 
     async def retrieve(
         self,
@@ -38,26 +118,80 @@ class RAGService(AbstractRAGService):
         kb_id: uuid.UUID | None,
         top_k: int | None = None,
     ) -> list[dict]:
+        chunks, _ = await self.retrieve_with_embedding(
+            query_text=query_text,
+            kb_id=kb_id,
+            top_k=top_k,
+        )
+        return chunks
+
+    async def retrieve_with_embedding(
+        self,
+        query_text: str,
+        kb_id: uuid.UUID | None,
+        top_k: int | None = None,
+    ) -> tuple[list[dict], list[float] | None]:
+        """向量检索，并把本次算出的查询向量一并返回（供语义答案缓存复用）"""
         if kb_id is None or not query_text.strip():
-            return []
+            return [], None
 
         limit = top_k or self.top_k
         if limit <= 0:
-            return []
+            return [], None
 
+        query_vector: list[float] | None = None
         try:
-            hits = await self.vector_index_service.search_chunks_for_kb(
-                query_text=query_text,
-                kb_id=kb_id,
-                limit=limit,
-            )
+            query_vector = await self.vector_index_service.embed_query(query_text)
+            if self.rerank_service is not None:
+                candidates = await self.vector_index_service.search_chunks_for_kb(
+                    query_text=query_text,
+                    kb_id=kb_id,
+                    limit=max(limit, settings.RAG_RERANK_CANDIDATES),
+                    query_vector=query_vector,
+                )
+                hits = await self.rerank_service.rerank(query_text, candidates, limit)
+            elif self.mmr_enabled:
+                hits = await self._search_with_mmr(query_text, kb_id, limit, query_vector)
+            else:
+                hits = await self.vector_index_service.search_chunks_for_kb(
+                    query_text=query_text,
+                    kb_id=kb_id,
+                    limit=limit,
+                    query_vector=query_vector,
+                )
         except AppError:
             raise
         except Exception as exc:
             logger.warning("RAG 检索失败，降级为无检索上下文: %s", exc)
-            return []
+            return [], query_vector
 
-        return self._format_hits(hits)
+        return self._format_hits(hits), query_vector
+
+    async def _search_with_mmr(
+        self,
+        query_text: str,
+        kb_id: uuid.UUID,
+        limit: int,
+        query_vector: list[float],
+    ) -> list[tuple[DocumentChunk, float]]:
+        """取 limit × 倍数的候选（连同向量），MMR 重排后保留 limit 条"""
+        candidates = await self.vector_index_service.search_chunks_for_kb(
+            query_text=query_text,
+            kb_id=kb_id,
+            limit=limit * settings.RAG_MMR_CANDIDATE_MULTIPLIER,
+            query_vector=query_vector,
+            with_embeddings=True,
+        )
+        if len(candidates) <= limit:
+            return candidates
+        order = mmr_rerank(
+            query_vector,
+            [chunk.embedding for chunk, _ in candidates],
+            k=limit,
+            lambda_mult=self.mmr_lambda,
+            time_budget_seconds=settings.RAG_MMR_LATENCY_BUDGET_MS / 1000,
+        )
+        return [candidates[i] for i in order]
 
     async def retrieve_fulltext(
         self,
@@ -100,11 +234,20 @@ class RAGService(AbstractRAGService):
             return []
 
         try:
-            hits = await self.vector_index_service.search_chunks_for_kb_hybrid(
-                query_text=query_text,
-                kb_id=kb_id,
-                limit=limit,
-            )
+            if self.rerank_service is not None:
+                # 融合只按名次排序，交给重排器按语义精排
+                candidates = await self.vector_index_service.search_chunks_for_kb_hybrid(
+                    query_text=query_text,
+                    kb_id=kb_id,
+                    limit=max(limit, settings.RAG_RERANK_CANDIDATES),
+                )
+                hits = await self.rerank_service.rerank(query_text, candidates, limit)
+            else:
+                hits = await self.vector_index_service.search_chunks_for_kb_hybrid(
+                    query_text=query_text,
+                    kb_id=kb_id,
+                    limit=limit,
+                )
         except AppError:
             raise
         except Exception as exc:
@@ -124,6 +267,8 @@ class RAGService(AbstractRAGService):
                     "source_type": str(chunk.source_type),
                     "file_id": str(chunk.file_id) if chunk.file_id else None,
                     "message_id": str(chunk.message_id) if chunk.message_id else None,
+                    "token_count": chunk.token_count,
+                    "chunk_index": chunk.chunk_index,
                     "distance": distance,
                     "score": max(0.0, 1.0 - distance),
                 }
@@ -0,0 +1,174 @@
+"""
+Rerank Service — 候选召回之后的 cross-encoder 精排
+
+设计要点：
+- 向量 / 混合检索先召回 RAG_RERANK_CANDIDATES 条候选，重排器对 (query, chunk)
+  成对打分后保留 top_k；精度提升后可以调小 top_k，直接减少 Prompt Token。
+- 分数缓存键 = (query 哈希, chunk_id)：同一问题重复检索（重试、多轮引用同一问题）
+  不再重复推理；分片内容变化时 chunk_id 随之变化，缓存自然失效。
+- 硬超时 RAG_RERANK_TIMEOUT_MS：按批推理，超出预算即放弃重排、退回召回原顺序，
+  已完成批次的分数仍写入缓存，下次同一问题可以直接复用。
+- 推理在线程中执行，不阻塞事件循环；超时后线程内的批次会跑完但结果被丢弃。
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from collections import OrderedDict
+
+from prometheus_client import Counter, Histogram
+
+from backend.core.config import settings
+from backend.domain.interfaces import AbstractReranker
+from backend.models.orm.chunk import DocumentChunk
+
+logger = logging.getLogger(__name__)
+
+RERANK_SECONDS = Histogram(
+    "rag_rerank_seconds",
+    "重排阶段耗时（含缓存命中）",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0),
+)
+RERANK_FALLBACKS = Counter(
+    "rag_rerank_fallbacks_total",
+    "重排失败退回召回原顺序的次数",
+    ["reason"],
+)
+RERANK_CACHE_LOOKUPS = Counter(
+    "rag_rerank_cache_lookups_total",
+    "重排分数缓存查询次数（按 chunk 计）",
+    ["result"],
+)
+
+
+def query_hash(query_text: str) -> str:
+    return hashlib.sha256(query_text.strip().encode("utf-8")).hexdigest()[:16]
+
+
+class RerankScoreCache:
+    """进程内 LRU：(query 哈希, chunk_id) -> 重排分数"""
+
+    def __init__(self, max_entries: int | None = None):
+        self.max_entries = (
+            settings.RAG_RERANK_CACHE_MAX_ENTRIES
+            if max_entries is None
+            else max_entries
+        )
+        self._entries: OrderedDict[tuple[str, str], float] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: tuple[str, str]) -> float | None:
+        score = self._entries.get(key)
+        if score is not None:
+            self._entries.move_to_end(key)
+        return score
+
+    def put(self, key: tuple[str, str], score: float) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = score
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+rerank_score_cache = RerankScoreCache()
+
+
+def _sigmoid(logit: float) -> float:
+    if logit >= 0:
+        return 1.0 / (1.0 + math.exp(-logit))
+    exp = math.exp(logit)
+    return exp / (1.0 + exp)
+
+
+class RerankService:
+    def __init__(
+        self,
+        reranker: AbstractReranker,
+        *,
+        timeout_seconds: float | None = None,
+        batch_size: int | None = None,
+        cache: RerankScoreCache | None = None,
+    ):
+        self.reranker = reranker
+        self.timeout_seconds = (
+            settings.RAG_RERANK_TIMEOUT_MS / 1000
+            if timeout_seconds is None
+            else timeout_seconds
+        )
+        self.batch_size = batch_size or settings.RAG_RERANK_BATCH_SIZE
+        self.cache = cache if cache is not None else rerank_score_cache
+
+    async def rerank(
+        self,
+        query_text: str,
+        hits: list[tuple[DocumentChunk, float]],
+        limit: int,
+    ) -> list[tuple[DocumentChunk, float]]:
+        """
+        对候选重排并保留 limit 条，返回 (chunk, distance)；
+        distance = 1 - sigmoid(logit)，与向量检索保持"越小越相关"的方向。
+        """
+        if len(hits) <= 1:
+            return hits[:limit]
+
+        started = time.perf_counter()
+        q_hash = query_hash(query_text)
+        scores: dict[str, float] = {}
+        missing: list[DocumentChunk] = []
+        for chunk, _ in hits:
+            cached = self.cache.get((q_hash, str(chunk.id)))
+            if cached is None:
+                missing.append(chunk)
+            else:
+                scores[str(chunk.id)] = cached
+        RERANK_CACHE_LOOKUPS.labels(result="hit").inc(len(scores))
+        RERANK_CACHE_LOOKUPS.labels(result="miss").inc(len(missing))
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout_seconds
+        try:
+            for start in range(0, len(missing), self.batch_size):
+                batch = missing[start : start + self.batch_size]
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise TimeoutError
+                batch_scores = await asyncio.wait_for(
+                    asyncio.to_thread(
+                        self.reranker.score,
+                        query_text,
+                        [chunk.content for chunk in batch],
+                    ),
+                    timeout=remaining,
+                )
+                for chunk, score in zip(batch, batch_scores, strict=True):
+                    scores[str(chunk.id)] = score
+                    self.cache.put((q_hash, str(chunk.id)), score)
+        except TimeoutError:
+            RERANK_FALLBACKS.labels(reason="timeout").inc()
+            logger.warning(
+                "重排超时，退回召回顺序: candidates=%d, timeout=%.3fs",
+                len(hits),
+                self.timeout_seconds,
+            )
+            return hits[:limit]
+        except Exception as exc:
+            RERANK_FALLBACKS.labels(reason="error").inc()
+            logger.warning("重排失败，退回召回顺序: %s", exc)
+            return hits[:limit]
+        finally:
+            RERANK_SECONDS.observe(time.perf_counter() - started)
+
+        ranked = sorted(hits, key=lambda hit: scores[str(hit[0].id)], reverse=True)
+        return [
+            (chunk, 1.0 - _sigmoid(scores[str(chunk.id)]))
+            for chunk, _ in ranked[:limit]
+        ]
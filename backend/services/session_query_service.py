@@ -4,12 +4,12 @@ import uuid
 from backend.core.exceptions import ResourceNotFound, ValidationError
 from backend.domain.interfaces import AbstractUnitOfWork
 from backend.models.schemas.chat_schema import (
-    MessageResponse,
-    SessionDetailResponse,
+    SessionDetailPayload,
     SessionListResponse,
     SessionResponse,
 )
 from backend.services.base import BaseService
+from backend.utils.pagination import decode_cursor, encode_cursor
 
 logger = logging.getLogger(__name__)
 
@@ -21,24 +21,33 @@ class SessionQueryService(BaseService[AbstractUnitOfWork]):
         self,
         *,
         user_id: uuid.UUID,
-        skip: int = 0,
+        cursor: str | None = None,
         limit: int = 20,
     ) -> SessionListResponse:
-        logger.debug("获取会话列表: user_id=%s, skip=%d, limit=%d", user_id, skip, limit)
+        logger.debug(
+            "获取会话列表: user_id=%s, cursor=%s, limit=%d", user_id, cursor, limit
+        )
 
-        rows = await self.uow.chat_repo.get_user_sessions_with_total_tokens(
+        before = decode_cursor(cursor) if cursor else None
+        # 多取一条用于判断是否还有下一页，省掉 count(*)
+        sessions = await self.uow.chat_repo.get_user_sessions_page(
             user_id=user_id,
-            skip=skip,
-            limit=limit,
+            limit=limit + 1,
+            before=before,
         )
-        total = await self.uow.chat_repo.count_user_sessions(user_id)
+        has_more = len(sessions) > limit
+        page = sessions[:limit]
+
+        next_cursor = None
+        if has_more:
+            last = page[-1]
+            next_cursor = encode_cursor(last.updated_at, last.id)
 
-        items = [self._to_session_response(session, total_tokens) for session, total_tokens in rows]
         return SessionListResponse(
-            items=items,
-            total=total,
-            skip=skip,
+            items=[SessionResponse.model_validate(session) for session in page],
             limit=limit,
+            next_cursor=next_cursor,
+            has_more=has_more,
         )
 
     async def get_user_session_detail(
@@ -46,40 +55,43 @@ class SessionQueryService(BaseService[AbstractUnitOfWork]):
         *,
         user_id: uuid.UUID,
         session_id: uuid.UUID,
-        skip: int = 0,
+        cursor: str | None = None,
         limit: int = 100,
-    ) -> SessionDetailResponse:
+    ) -> SessionDetailPayload:
+        """
+        单条 SQL 取会话 + 计数 + 一页消息，直接返回纯 dict，
+        由接口层 orjson 序列化，跳过逐条 model_validate。
+        """
         logger.debug("获取会话详情: session_id=%s, user_id=%s", session_id, user_id)
 
-        session = await self.uow.chat_repo.get_session(session_id)
-        if not session:
+        after = decode_cursor(cursor) if cursor else None
+        session, messages = await self.uow.chat_repo.get_session_detail_rows(
+            session_id=session_id,
+            limit=limit + 1,
+            after=after,
+        )
+        if session is None:
             raise ResourceNotFound(
                 f"会话不存在: {session_id}",
                 details={"session_id": str(session_id)},
             )
-        if session.user_id != user_id:
+        if session["user_id"] != user_id:
             raise ValidationError(
                 "无权访问该会话",
                 details={"session_id": str(session_id)},
             )
 
-        messages = await self.uow.chat_repo.get_session_messages(
-            session_id=session.id,
-            skip=skip,
-            limit=limit,
-        )
-        total_messages = await self.uow.chat_repo.count_session_messages(session.id)
-        total_tokens = await self.uow.chat_repo.get_session_total_tokens(session.id)
+        has_more = len(messages) > limit
+        page = messages[:limit]
+        next_cursor = None
+        if has_more:
+            last = page[-1]
+            next_cursor = encode_cursor(last["created_at"], last["id"])
 
-        session_res = self._to_session_response(session, total_tokens)
-        return SessionDetailResponse(
-            session=session_res,
-            messages=[MessageResponse.model_validate(msg) for msg in messages],
-            total_messages=total_messages,
+        return SessionDetailPayload(
+            session=session,
+            messages=page,
+            total_messages=session["message_count"],
+            next_cursor=next_cursor,
+            has_more=has_more,
         )
-
-    @staticmethod
-    def _to_session_response(session, total_tokens: int) -> SessionResponse:
-        response = SessionResponse.model_validate(session)
-        response.total_tokens = total_tokens
-        return response
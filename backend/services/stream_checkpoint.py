@@ -0,0 +1,121 @@
+"""
+Stream Checkpoint — 流式回答的周期性落盘
+
+设计要点：
+- 流式过程中助手消息原本一直是 THINKING + 空内容，API 进程崩溃即丢失整段回答；
+  现在每累积 N 个分片或每隔 T 秒把已生成内容写回 DB，并置为 STREAMING。
+- 合并写入：同一消息同一时刻至多一个检查点在途；在途期间到达的触发不排队，
+  计数不清零，写完后由下一个分片重新触发并携带最新内容。
+- 检查点写入在后台任务中执行，失败只记日志与指标，不影响推流。
+- 开销有界：写入次数 ≤ 分片数 / N + 时长 / T + 1，热路径每个分片只做计数与取时钟。
+- 检查点使用独立 UoW（与请求主 UoW 不共享会话），终态写入前调用 aclose()：
+  短暂等待在途检查点而不取消它——取消会打断进行中的事务；超时仍未完成的写入
+  留在后台跑完，仓储层只更新仍在生成中的消息，迟到的检查点不会覆盖终态。
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from collections.abc import Awaitable, Callable, Sequence
+
+from prometheus_client import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_WRITES = Counter(
+    "chat_stream_checkpoint_writes_total",
+    "流式检查点写入次数",
+    ["result"],
+)
+CHECKPOINT_COALESCED = Counter(
+    "chat_stream_checkpoint_coalesced_total",
+    "因已有检查点在途而合并跳过的触发次数",
+)
+CHECKPOINT_SECONDS = Histogram(
+    "chat_stream_checkpoint_seconds",
+    "单次流式检查点写入耗时（秒）",
+)
+
+CheckpointWriter = Callable[[uuid.UUID, str], Awaitable[object]]
+
+# aclose 超时后仍在途的检查点：持有引用直到完成，避免任务被提前回收
+_detached_writes: set[asyncio.Task] = set()
+
+
+class StreamCheckpointer:
+    """单条助手消息的检查点调度器（每次流式请求一个实例）"""
+
+    def __init__(
+        self,
+        message_id: uuid.UUID,
+        writer: CheckpointWriter,
+        every_chunks: int,
+        interval_seconds: float,
+        close_timeout_seconds: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.message_id = message_id
+        self._writer = writer
+        self._every_chunks = every_chunks
+        self._interval = interval_seconds
+        self._close_timeout = close_timeout_seconds
+        self._clock = clock
+        self._chunks_since = 0
+        self._last_at = clock()
+        self._inflight: asyncio.Task | None = None
+        self.writes = 0
+        self.coalesced = 0
+
+    def observe(self, parts: Sequence[str]) -> None:
+        """每收到一个分片调用一次；达到阈值且无在途写入时发起后台检查点。"""
+        self._chunks_since += 1
+        now = self._clock()
+        if (
+            self._chunks_since < self._every_chunks
+            and now - self._last_at < self._interval
+        ):
+            return
+        if self._inflight is not None and not self._inflight.done():
+            self.coalesced += 1
+            CHECKPOINT_COALESCED.inc()
+            return
+
+        self._chunks_since = 0
+        self._last_at = now
+        self.writes += 1
+        self._inflight = asyncio.create_task(
+            self._write("".join(parts)),
+            name=f"stream-checkpoint-{self.message_id}",
+        )
+
+    async def aclose(self) -> None:
+        """等待在途检查点写完（最多 close_timeout_seconds，终态写入前调用）。"""
+        task, self._inflight = self._inflight, None
+        if task is None or task.done():
+            return
+        await asyncio.wait({task}, timeout=self._close_timeout)
+        if task.done():
+            return
+        logger.info(
+            "流式检查点未在 %.1fs 内完成，转入后台: message_id=%s",
+            self._close_timeout,
+            self.message_id,
+        )
+        _detached_writes.add(task)
+        task.add_done_callback(_detached_writes.discard)
+
+    async def _write(self, content: str) -> None:
+        started = time.perf_counter()
+        try:
+            await self._writer(self.message_id, content)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            CHECKPOINT_WRITES.labels(result="error").inc()
+            logger.warning(
+                "流式检查点写入失败: message_id=%s", self.message_id, exc_info=True
+            )
+            return
+        CHECKPOINT_WRITES.labels(result="ok").inc()
+        CHECKPOINT_SECONDS.observe(time.perf_counter() - started)
@@ -2,9 +2,15 @@ import uuid
 
 from backend.core.exceptions import ResourceNotFound
 from backend.domain.interfaces import AbstractUnitOfWork
+from backend.models.orm.knowledge import FileStatus
 from backend.models.orm.task import TaskJob, TaskStatus
 from backend.services.base import BaseService
 
+_TERMINAL_TASK_STATUSES = (TaskStatus.COMPLETED, TaskStatus.FAILED)
+# 已被分发认领、尚未到达终态的文件
+_IN_FLIGHT_FILE_STATUSES = (FileStatus.PARSING, FileStatus.CHUNKING)
+_BATCH_ALL_FAILED = "批次内全部文件处理失败"
+
 
 class TaskService(BaseService[AbstractUnitOfWork]):
     def __init__(self, uow: AbstractUnitOfWork):
@@ -32,6 +38,174 @@ class TaskService(BaseService[AbstractUnitOfWork]):
             },
         )
 
+    async def create_kb_batch_ingestion_task(
+        self,
+        *,
+        kb_id: uuid.UUID,
+        user_id: uuid.UUID,
+        file_ids: list[uuid.UUID],
+        skipped: list[dict],
+    ) -> TaskJob:
+        """批量上传的父任务：一个 TaskJob 覆盖整批文件，进度由各文件状态汇总"""
+        return await self.uow.task_repo.create(
+            action_type="KB_BATCH_INGESTION",
+            status=TaskStatus.PENDING,
+            progress=0,
+            payload={
+                "kb_id": str(kb_id),
+                "user_id": str(user_id),
+                "file_ids": [str(file_id) for file_id in file_ids],
+                "skipped": skipped,
+            },
+        )
+
+    async def rollup_batch_ingestion(self, *, task_id: uuid.UUID) -> TaskJob | None:
+        """
+        按批次内各文件的当前状态汇总父任务进度；所有文件到达终态后父任务完成。
+        单个文件失败不影响批次，只有全部失败时父任务才标记失败。
+        父任务行加锁，多个子任务同时回写时串行汇总，不会用旧计数覆盖新计数。
+        已结束的父任务也会重新汇总：被看门狗判为超时的子任务之后跑完时，
+        终态计数随之更正，不会与文件的实际状态矛盾。
+        """
+        task = await self.uow.task_repo.get_for_update(task_id)
+        if task is None:
+            return None
+
+        file_ids = self._batch_file_ids(task)
+        counts = await self.uow.knowledge_repo.count_files_by_status(file_ids)
+        ready = counts.get(FileStatus.READY, 0)
+        failed = counts.get(FileStatus.FAILED, 0)
+        total = len(file_ids)
+        result = {
+            "files_total": total,
+            "files_ready": ready,
+            "files_failed": failed,
+            "files_skipped": len(task.payload.get("skipped", [])),
+        }
+        if ready + failed < total:
+            if task.status in _TERMINAL_TASK_STATUSES:
+                # 迟到的子任务重新开始处理，等它到达终态后再更正
+                return task
+            progress = (ready + failed) * 100 // total
+            return await self.uow.task_repo.update_status(
+                task_id=task_id,
+                status=TaskStatus.PROCESSING,
+                progress=progress,
+                result=result,
+            )
+        if total and ready == 0:
+            return await self.uow.task_repo.update_status(
+                task_id=task_id,
+                status=TaskStatus.FAILED,
+                progress=100,
+                # 保留此前记录的超时 / 投递失败原因
+                error_log="; ".join([*self._batch_errors(task), _BATCH_ALL_FAILED]),
+                result=result,
+            )
+        return await self.uow.task_repo.update_status(
+            task_id=task_id,
+            status=TaskStatus.COMPLETED,
+            progress=100,
+            # 全部失败后又有文件迟到成功时，去掉"全部失败"的结论
+            error_log="; ".join(self._batch_errors(task)) if task.error_log else None,
+            result=result,
+        )
+
+    async def advance_batch_ingestion(
+        self,
+        *,
+        task_id: uuid.UUID,
+        parallelism: int,
+        file_timeout_seconds: float,
+    ) -> tuple[TaskJob | None, list[uuid.UUID]]:
+        """
+        推进批量入库父任务，返回 (父任务, 本次认领待投递的文件 id)。
+        每次都从各文件的 File.status 重新推导，不依赖分发方的内存状态，可随时重入：
+        在途（PARSING / CHUNKING）超过 file_timeout_seconds 未更新的文件视为超时或随 worker
+        丢失，标记失败并记录原因；再按 parallelism 减去在途数的空闲名额把 UPLOADED 文件置为
+        PARSING 认领，仍在运行的子任务一直占着名额；最后汇总父任务。
+        """
+        task = await self.uow.task_repo.get_for_update(task_id)
+        if task is None:
+            return None, []
+        if task.status in _TERMINAL_TASK_STATUSES:
+            return await self.rollup_batch_ingestion(task_id=task_id), []
+
+        file_ids = self._batch_file_ids(task)
+        expired = await self.uow.knowledge_repo.fail_stale_files(
+            file_ids,
+            statuses=_IN_FLIGHT_FILE_STATUSES,
+            older_than_seconds=file_timeout_seconds,
+        )
+        if expired:
+            await self._append_batch_error(
+                task,
+                f"{len(expired)} 个文件超过 {file_timeout_seconds:.0f}s 未完成入库，已标记失败",
+            )
+        counts = await self.uow.knowledge_repo.count_files_by_status(file_ids)
+        in_flight = sum(counts.get(status, 0) for status in _IN_FLIGHT_FILE_STATUSES)
+        claimed = await self.uow.knowledge_repo.claim_uploaded_files(
+            file_ids, limit=parallelism - in_flight
+        )
+        return await self.rollup_batch_ingestion(task_id=task_id), claimed
+
+    async def fail_batch_files(
+        self,
+        *,
+        task_id: uuid.UUID,
+        file_ids: list[uuid.UUID],
+        reason: str,
+    ) -> TaskJob | None:
+        """批次内无法继续入库的文件（如投递失败）直接标记失败并记录原因，随后重新汇总"""
+        task = await self.uow.task_repo.get_for_update(task_id)
+        if task is None or task.status in _TERMINAL_TASK_STATUSES:
+            return task
+        await self.uow.knowledge_repo.update_files_status(file_ids, FileStatus.FAILED)
+        await self._append_batch_error(task, reason)
+        return await self.rollup_batch_ingestion(task_id=task_id)
+
+    async def touch_batch_file(self, *, file_id: uuid.UUID) -> None:
+        """子任务心跳：刷新在途文件的 updated_at，看门狗据此区分仍在运行与已丢失的子任务"""
+        await self.uow.knowledge_repo.touch_files(
+            [file_id], statuses=_IN_FLIGHT_FILE_STATUSES
+        )
+
+    async def _append_batch_error(self, task: TaskJob, reason: str) -> None:
+        error_log = "; ".join([*self._batch_errors(task), reason])
+        await self.uow.task_repo.update_status(
+            task_id=task.id, status=task.status, error_log=error_log
+        )
+
+    @staticmethod
+    def _batch_errors(task: TaskJob) -> list[str]:
+        return [
+            reason
+            for reason in (task.error_log or "").split("; ")
+            if reason and reason != _BATCH_ALL_FAILED
+        ]
+
+    @staticmethod
+    def _batch_file_ids(task: TaskJob) -> list[uuid.UUID]:
+        return [uuid.UUID(file_id) for file_id in task.payload.get("file_ids", [])]
+
+    async def create_user_import_task(
+        self,
+        *,
+        file_path: str,
+        filename: str,
+        user_id: uuid.UUID,
+    ) -> TaskJob:
+        return await self.uow.task_repo.create(
+            action_type="USER_IMPORT",
+            status=TaskStatus.PENDING,
+            progress=0,
+            payload={
+                "file_path": file_path,
+                "filename": filename,
+                "user_id": str(user_id),
+            },
+        )
+
     async def get_by_id(self, task_id: uuid.UUID) -> TaskJob | None:
         return await self.uow.task_repo.get(task_id)
 
@@ -50,9 +224,10 @@ class TaskService(BaseService[AbstractUnitOfWork]):
         *,
         task_id: uuid.UUID,
         progress: int = 100,
+        result: dict | None = None,
     ) -> TaskJob | None:
         return await self.uow.task_repo.mark_completed(
-            task_id=task_id, progress=progress
+            task_id=task_id, progress=progress, result=result
         )
 
     async def mark_failed(
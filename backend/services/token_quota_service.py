@@ -0,0 +1,341 @@
+"""
+Token Quota Service — 基于 Redis 的 Token 额度账本
+
+设计要点：
+- 额度以 Hash 形式缓存在 Redis（max / used / reserved），
+  预占（reserve）、结算（commit）、退还（refund）均由 Lua 脚本原子完成，
+  消除「先读 users 行再生成」在并发请求下的竞态。
+- 结算时实际消耗先与业务写入同一事务插入 token_usage_pending（只插入，
+  不 UPDATE 热点用户行）；事务提交后才在 Redis 中释放预占、累加 used，
+  回滚时 Redis 不受影响。消息终态走写缓冲时，增量随终态批量插入，
+  热路径只结算 Redis（commit_buffered）。TokenQuotaReconciler 在后台批量把待回写增量
+  累加到 users.used_tokens，增量始终在 DB 中，进程崩溃或 Redis 重启都不会丢账。
+- Redis 中不存在账本时（首次访问 / Redis 重启）按「已用 + 待回写」从 DB 重新水合；
+  Redis 不可用时降级为直接读写 DB，保持旧行为。
+"""
+
+import asyncio
+import logging
+import uuid
+from dataclasses import dataclass
+
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from backend.core.config import settings
+from backend.core.exceptions import ValidationError
+from backend.core.redis import redis_client
+from backend.domain.interfaces import AbstractUnitOfWork
+from backend.services.base import BaseService
+from backend.services.unit_of_work import SQLAlchemyUnitOfWork
+
+logger = logging.getLogger(__name__)
+
+QUOTA_KEY_PREFIX = "quota:user:"
+
+# KEYS[1]: 用户额度 Hash
+# ARGV[1]: 预占数量
+# ARGV[2]: Key 过期时间 (秒)
+# 返回 {status, used, max}；status: 1 成功 / 0 余额不足 / -1 账本缺失需水合
+LUA_RESERVE = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return {-1, 0, 0}
+end
+local max = tonumber(redis.call('HGET', KEYS[1], 'max') or '0')
+local used = tonumber(redis.call('HGET', KEYS[1], 'used') or '0')
+local reserved = tonumber(redis.call('HGET', KEYS[1], 'reserved') or '0')
+if used + reserved >= max then
+    return {0, used, max}
+end
+redis.call('HINCRBY', KEYS[1], 'reserved', ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return {1, used, max}
+"""
+
+# KEYS[1]: 用户额度 Hash
+# ARGV[1]: max_tokens, ARGV[2]: 已用 + 待回写 (来自 DB), ARGV[3]: 过期时间
+# 仅在账本不存在时写入，避免并发水合覆盖已有的 reserved
+LUA_HYDRATE = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'max', ARGV[1], 'used', ARGV[2], 'reserved', 0)
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+# KEYS[1]: 用户额度 Hash
+# ARGV[1]: 预占数量, ARGV[2]: 实际消耗, ARGV[3]: 过期时间
+# 返回 1 表示已记账；0 表示账本已丢失（如 Redis 重启），下次预占时从 DB 水合即可
+LUA_SETTLE = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+local reserved = redis.call('HINCRBY', KEYS[1], 'reserved', -tonumber(ARGV[1]))
+if reserved < 0 then
+    redis.call('HSET', KEYS[1], 'reserved', 0)
+end
+local actual = tonumber(ARGV[2])
+if actual > 0 then
+    redis.call('HINCRBY', KEYS[1], 'used', actual)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+# KEYS[1]: 用户额度 Hash, ARGV[1]: 新的 max_tokens
+LUA_SET_LIMIT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'max', ARGV[1])
+return 1
+"""
+
+
+def quota_key(user_id: uuid.UUID | str) -> str:
+    return f"{QUOTA_KEY_PREFIX}{user_id}"
+
+
+@dataclass
+class QuotaReservation:
+    """
+    一次对话的额度预占凭证。via_ledger=False 表示走了 DB 降级路径；
+    recorded 表示消耗已写入当前事务，settled 表示 Redis 预占已释放。
+    """
+
+    user_id: uuid.UUID
+    amount: int
+    via_ledger: bool = True
+    recorded: bool = False
+    settled: bool = False
+
+
+class TokenQuotaService(BaseService[AbstractUnitOfWork]):
+    """额度预占 / 结算 / 退还。水合与降级路径需要在 uow 上下文内调用。"""
+
+    def __init__(self, uow: AbstractUnitOfWork):
+        super().__init__(uow)
+
+    @staticmethod
+    def estimate_turn_tokens(query_text: str) -> int:
+        """
+        单轮对话的预占估算：问题长度 + 预留的回复额度。
+        字符数作为问题 Token 的粗略上界，避免为预占额外跑一次分词。
+        """
+        return len(query_text or "") + settings.LLM_RESERVED_RESPONSE_TOKENS
+
+    async def reserve(self, user_id: uuid.UUID, amount: int) -> QuotaReservation:
+        """
+        预占额度
+
+        只要「已用 + 已预占」仍低于总额度即放行，并预占 amount，
+        使并发请求之间互相可见。
+
+        Raises:
+            ValidationError: Token 余额不足
+        """
+        amount = max(0, int(amount))
+        if not settings.TOKEN_QUOTA_LEDGER_ENABLED:
+            return await self._reserve_from_db(user_id, amount)
+
+        try:
+            redis = await redis_client.init()
+            status, used, max_tokens = await self._eval_reserve(redis, user_id, amount)
+            if status == -1:
+                snapshot = await self.uow.user_repo.get_quota_snapshot(user_id)
+                if snapshot is None:
+                    return QuotaReservation(user_id=user_id, amount=0, via_ledger=False)
+                await redis.eval(
+                    LUA_HYDRATE,
+                    1,
+                    quota_key(user_id),
+                    *snapshot,
+                    settings.TOKEN_QUOTA_KEY_TTL_SECONDS,
+                )
+                status, used, max_tokens = await self._eval_reserve(
+                    redis, user_id, amount
+                )
+        except RedisError as exc:
+            logger.warning("额度账本不可用，降级为 DB 校验: user_id=%s, error=%s", user_id, exc)
+            return await self._reserve_from_db(user_id, amount)
+
+        if status == 0:
+            raise ValidationError(
+                "Token 余额不足",
+                details={"used": used, "max": max_tokens},
+            )
+        return QuotaReservation(user_id=user_id, amount=amount)
+
+    async def commit(self, reservation: QuotaReservation, actual: int) -> None:
+        """
+        结算实际消耗（需在 uow 上下文内调用）。
+
+        消耗随当前事务落库；Redis 账本在事务提交后才结算。
+        事务回滚时预占保持未结算，由调用方 finally 中的 refund 退还。
+        """
+        if reservation.settled or reservation.recorded:
+            return
+        reservation.recorded = True
+        actual = max(0, int(actual))
+
+        if not reservation.via_ledger:
+            reservation.settled = True
+            if actual > 0:
+                await self.uow.user_repo.increment_used_tokens(
+                    reservation.user_id, actual
+                )
+            return
+
+        if actual > 0:
+            await self.uow.user_repo.add_pending_tokens(reservation.user_id, actual)
+
+        async def settle_after_commit() -> None:
+            await self._settle_ledger(reservation, actual)
+
+        self.uow.after_commit(settle_after_commit)
+
+    async def commit_buffered(self, reservation: QuotaReservation, actual: int) -> None:
+        """
+        结算已交给消息写缓冲的消耗（不需要 uow 上下文）。
+
+        待回写增量随消息终态在写缓冲刷盘时插入 token_usage_pending，
+        这里只释放 Redis 预占、累加 used，热路径不再为额度单独开事务。
+        """
+        if reservation.settled or reservation.recorded:
+            return
+        reservation.recorded = True
+        if not reservation.via_ledger:
+            # 降级路径同样由对账器把增量累加到 users.used_tokens
+            reservation.settled = True
+            return
+        await self._settle_ledger(reservation, max(0, int(actual)))
+
+    async def refund(self, reservation: QuotaReservation | None) -> None:
+        """退还未使用的预占（失败路径调用，不需要 uow 上下文）。"""
+        if reservation is None or reservation.settled:
+            return
+        reservation.settled = True
+        if not reservation.via_ledger or reservation.amount <= 0:
+            return
+        try:
+            await self._settle(reservation, 0)
+        except RedisError:
+            logger.warning("额度预占退还失败: user_id=%s", reservation.user_id, exc_info=True)
+
+    async def sync_limit(self, user_id: uuid.UUID, max_tokens: int) -> None:
+        """管理员调整额度后同步到账本（账本不存在时无需处理，下次水合即可）。"""
+        if not settings.TOKEN_QUOTA_LEDGER_ENABLED:
+            return
+        try:
+            redis = await redis_client.init()
+            await redis.eval(LUA_SET_LIMIT, 1, quota_key(user_id), int(max_tokens))
+        except RedisError:
+            logger.warning("额度上限同步失败: user_id=%s", user_id, exc_info=True)
+
+    async def _reserve_from_db(self, user_id: uuid.UUID, amount: int) -> QuotaReservation:
+        # 降级路径下预占走 DB 直写，待回写增量只来自降级前的结算，由对账器秒级清空
+        user = await self.uow.user_repo.get(user_id)
+        if user and user.used_tokens >= user.max_tokens:
+            raise ValidationError(
+                "Token 余额不足",
+                details={"used": user.used_tokens, "max": user.max_tokens},
+            )
+        return QuotaReservation(user_id=user_id, amount=amount, via_ledger=False)
+
+    async def _settle_ledger(self, reservation: QuotaReservation, actual: int) -> None:
+        reservation.settled = True
+        try:
+            if not await self._settle(reservation, actual):
+                # 消耗已在 DB 中，下次预占水合时会计入
+                logger.info("额度账本已丢失，跳过结算: user_id=%s", reservation.user_id)
+        except RedisError:
+            logger.warning(
+                "额度账本结算失败: user_id=%s", reservation.user_id, exc_info=True
+            )
+
+    @staticmethod
+    async def _eval_reserve(redis, user_id: uuid.UUID, amount: int) -> tuple[int, int, int]:
+        res = await redis.eval(
+            LUA_RESERVE,
+            1,
+            quota_key(user_id),
+            amount,
+            settings.TOKEN_QUOTA_KEY_TTL_SECONDS,
+        )
+        return int(res[0]), int(res[1]), int(res[2])
+
+    @staticmethod
+    async def _settle(reservation: QuotaReservation, actual: int) -> bool:
+        redis = await redis_client.init()
+        res = await redis.eval(
+            LUA_SETTLE,
+            1,
+            quota_key(reservation.user_id),
+            reservation.amount,
+            actual,
+            settings.TOKEN_QUOTA_KEY_TTL_SECONDS,
+        )
+        return int(res) == 1
+
+
+class TokenQuotaReconciler:
+    """
+    后台对账器：周期性地把 token_usage_pending 中的增量批量累加到 users.used_tokens。
+
+    取走增量与累加在同一事务内完成，失败时整批回滚、下一轮重试；
+    多个 API 进程可同时运行，SKIP LOCKED 保证同一增量只被一个进程处理。
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        interval_seconds: float | None = None,
+        batch_size: int | None = None,
+    ):
+        self.session_factory = session_factory
+        self.interval_seconds = interval_seconds or settings.TOKEN_QUOTA_FLUSH_INTERVAL_SECONDS
+        self.batch_size = batch_size or settings.TOKEN_QUOTA_FLUSH_BATCH_SIZE
+        self._task: asyncio.Task | None = None
+        self._stopping = asyncio.Event()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run(), name="token-quota-reconciler")
+
+    async def stop(self) -> None:
+        """停止后台循环，并做最后一次回写（优雅停机）。"""
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+        try:
+            await self.flush_once()
+        except Exception:
+            # 增量仍在 DB 中，下次启动后继续回写
+            logger.warning("停机前 Token 额度回写失败", exc_info=True)
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.interval_seconds)
+            except TimeoutError:
+                pass
+            try:
+                await self.flush_once()
+            except Exception:
+                logger.exception("Token 额度对账异常，将在下一轮重试")
+
+    async def flush_once(self) -> int:
+        """执行一轮回写（按批取完为止），返回本轮更新的用户数。"""
+        users_total = 0
+        while True:
+            async with SQLAlchemyUnitOfWork(self.session_factory) as uow:
+                rows, users = await uow.user_repo.apply_pending_tokens(self.batch_size)
+            users_total += users
+            if rows < self.batch_size:
+                break
+        if users_total:
+            logger.debug("Token 额度回写完成: users=%d", users_total)
+        return users_total
@@ -1,8 +1,21 @@
 import asyncio
+import itertools
 import logging
+import math
 import secrets
+from collections.abc import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterable,
+    Iterator,
+    Sized,
+)
+from dataclasses import dataclass, field
+from pathlib import Path
 from typing import Any
 
+import asyncpg
 from fastapi import UploadFile
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
@@ -13,14 +26,32 @@ from backend.core.exceptions import (
     ServiceError,
     ValidationError,
 )
-from backend.core.security import get_password_hash
+from backend.core.hash_executor import (
+    PasswordHashExecutor,
+    hash_passwords_sync,
+    password_hash_executor,
+)
 from backend.domain.interfaces import AbstractUnitOfWork
+from backend.models.orm.base import IDGenerator
 from backend.models.schemas.user_schema import UserImportResponse
 from backend.services.base import BaseService
-from backend.utils.file_parser import parse_file
+from backend.utils.file_parser import iter_file_rows
 
 logger = logging.getLogger(__name__)
 
+# 进度回调：参数为 0-100 的整体进度
+ProgressCallback = Callable[[int], Awaitable[None]]
+
+
+@dataclass
+class ImportRowStats:
+    """流式校验过程中的行统计"""
+
+    total: int = 0
+    valid: int = 0
+    invalid: int = 0
+    errors: list[str] = field(default_factory=list)
+
 
 class UserImportService(BaseService[AbstractUnitOfWork]):
     """用户批量导入编排服务。"""
@@ -31,106 +62,286 @@ class UserImportService(BaseService[AbstractUnitOfWork]):
         "username": "username",
         "email": "email",
     }
+    SUPPORTED_SUFFIXES = {".csv", ".xlsx"}
+    MAX_REPORTED_ERRORS = 20
+    UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(
+        self,
+        uow: AbstractUnitOfWork,
+        *,
+        storage_root: Path | None = None,
+        hash_executor: PasswordHashExecutor | None = None,
+    ):
+        super().__init__(uow)
+        self.storage_root = Path(storage_root or settings.USER_IMPORT_STORAGE_ROOT)
+        self.hash_executor = hash_executor or password_hash_executor
 
-    async def import_from_upload(self, upload_file: UploadFile) -> UserImportResponse:
+    async def save_upload_file(self, upload_file: UploadFile) -> Path:
+        """把上传文件落盘，供后台任务读取；返回落盘路径。"""
         if not upload_file.filename:
             raise ValidationError("文件名不能为空")
+        suffix = Path(upload_file.filename).suffix.lower()
+        if suffix not in self.SUPPORTED_SUFFIXES:
+            raise ValidationError("不支持的文件格式，仅支持 .xlsx, .csv")
+
+        target_path = self.storage_root / f"{IDGenerator.new_ulid_as_uuid()}{suffix}"
+        await asyncio.to_thread(target_path.parent.mkdir, parents=True, exist_ok=True)
+
+        file_size = 0
+        try:
+            with target_path.open("wb") as fh:
+                while chunk := await upload_file.read(self.UPLOAD_CHUNK_SIZE):
+                    file_size += len(chunk)
+                    await asyncio.to_thread(fh.write, chunk)
+        except Exception as exc:
+            self.remove_file(target_path)
+            raise ServiceError("上传文件保存失败，请稍后重试") from exc
+
+        if file_size == 0:
+            self.remove_file(target_path)
+            raise ValidationError("上传文件为空")
+        return target_path
+
+    @staticmethod
+    def remove_file(path: str | Path) -> None:
+        try:
+            Path(path).unlink(missing_ok=True)
+        except OSError:
+            logger.warning("导入临时文件清理失败: %s", path)
 
-        content = await upload_file.read()
-        if not content:
+    async def import_from_file(
+        self,
+        *,
+        file_path: str | Path,
+        filename: str,
+        progress_callback: ProgressCallback | None = None,
+    ) -> UserImportResponse:
+        """
+        两遍流式导入，内存占用只与 BATCH_SIZE 相关：
+        1. 校验遍：逐行映射校验 + 分批查重名，不做哈希，坏数据尽早失败并得到总行数；
+        2. 导入遍：再次流式读取，分批哈希并 COPY 进暂存表。
+        """
+        path = Path(file_path)
+        file_size = await asyncio.to_thread(lambda: path.stat().st_size)
+        if not file_size:
             raise ValidationError("上传文件为空")
 
-        raw_data = await asyncio.to_thread(parse_file, upload_file.filename, content)
-        total_rows = len(raw_data)
-        cleaned_data = await self.transform_and_validate(raw_data)
+        stats = await self._prevalidate_file(path, filename)
+        await self._report(progress_callback, 10)
 
-        imported_rows = await self.import_users(cleaned_data)
+        with path.open("rb") as fh:
+            imported_rows = await self.import_users(
+                self.transform_and_validate(iter_file_rows(filename, fh)),
+                total_rows=stats.valid,
+                progress_callback=progress_callback,
+            )
 
         return UserImportResponse(
-            filename=upload_file.filename,
-            total_rows=total_rows,
+            filename=filename,
+            total_rows=stats.total,
             imported_rows=imported_rows,
             message=f"成功导入 {imported_rows} 条用户数据",
         )
 
-    async def import_users(self, user_maps: list[dict[str, Any]]) -> int:
-        """批量导入用户，返回成功导入数量。"""
-        if not user_maps:
-            logger.info("No valid users data found in file")
-            raise ValidationError("有效客户为0")
+    async def _prevalidate_file(self, path: Path, filename: str) -> ImportRowStats:
+        stats = ImportRowStats()
+        conflicts: set[str] = set()
+        with path.open("rb") as fh:
+            rows = self.transform_and_validate(iter_file_rows(filename, fh), stats)
+            async for batch in self._iter_batches(rows):
+                if len(conflicts) >= self.MAX_REPORTED_ERRORS:
+                    continue
+                conflicts |= await self.uow.user_repo.get_existing_usernames(
+                    [str(u["username"]) for u in batch]
+                )
+
+        if conflicts:
+            shown = set(sorted(conflicts)[: self.MAX_REPORTED_ERRORS])
+            raise ValidationError(f"以下用户名已被占用，无法注册: {shown}")
+        return stats
 
-        incoming_usernames = [str(u["username"]) for u in user_maps]
+    async def import_users(
+        self,
+        user_maps: Iterable[dict[str, Any]],
+        *,
+        total_rows: int | None = None,
+        progress_callback: ProgressCallback | None = None,
+    ) -> int:
+        """
+        批量导入用户，返回成功导入数量。
+        user_maps 可以是列表，也可以是流式生成器（按 BATCH_SIZE 分批拉取）。
+        流水线：进程池并行哈希第 N+1 批的同时，把第 N 批 COPY 进暂存表；
+        全部写完后一条 INSERT ... ON CONFLICT 合并进 users。
+        注意：同一 Session 上的 DB 操作全部在本协程内串行执行，后台任务只做哈希。
+        """
+        if total_rows is None and isinstance(user_maps, Sized):
+            total_rows = len(user_maps)
+        batches = self._iter_batches(iter(user_maps))
+        next_rows: asyncio.Task | None = None
 
         try:
-            existing_names = await self.uow.user_repo.get_existing_usernames(
-                incoming_usernames
-            )
-            if existing_names:
-                raise ValidationError(f"以下用户名已被占用，无法注册: {existing_names}")
+            first_batch = await anext(batches, None)
+            if not first_batch:
+                logger.info("No valid users data found in file")
+                raise ValidationError("有效客户为0")
 
-            size = settings.BATCH_SIZE
-            batches = [user_maps[i : i + size] for i in range(0, len(user_maps), size)]
-            total_records = sum(len(batch) for batch in batches)
-            total_batches = len(batches)
+            await self._ensure_usernames_available(first_batch)
+            await self.uow.user_repo.create_import_staging()
+            next_rows = asyncio.create_task(self._build_import_rows(first_batch))
 
-            for idx, batch in enumerate(batches, 1):
-                if not batch:
-                    continue
-                import_rows = await self._build_import_rows(batch)
-                await self.uow.user_repo.bulk_upsert(import_rows)
+            processed = 0
+            batch_no = 0
+            while next_rows is not None:
+                import_rows = await next_rows
+                next_rows = None
+
+                following = await anext(batches, None)
+                if following:
+                    await self._ensure_usernames_available(following)
+                    next_rows = asyncio.create_task(self._build_import_rows(following))
+
+                # row_no 为文件内的全局行序，合并时据此保证「重复邮箱以最后一行为准」
+                await self.uow.user_repo.copy_into_import_staging(
+                    [
+                        (
+                            row["id"],
+                            row["username"],
+                            row["email"],
+                            row["hashed_password"],
+                            processed + offset,
+                        )
+                        for offset, row in enumerate(import_rows)
+                    ]
+                )
                 await self._after_import_batch_hook(import_rows)
-                logger.debug("批次 [%d/%d] 处理完成，本批 %d 条", idx, total_batches, len(batch))
 
-            logger.info("批量处理成功, 成功提交 %d 用户", total_records)
-            return total_records
+                batch_no += 1
+                processed += len(import_rows)
+                logger.debug(
+                    "批次 [%d] 写入暂存表，本批 %d 条，累计 %d 条",
+                    batch_no,
+                    len(import_rows),
+                    processed,
+                )
+                if total_rows:
+                    await self._report(
+                        progress_callback,
+                        10 + 80 * min(processed, total_rows) // total_rows,
+                    )
+
+            imported_rows = await self.uow.user_repo.merge_import_staging()
+            logger.info("批量处理成功, 成功提交 %d 用户", imported_rows)
+            return imported_rows
         except AppError:
             raise
         except IntegrityError as exc:
             raise DatabaseOperationError("数据违反了唯一性约束或其他限制") from exc
-        except SQLAlchemyError as exc:
+        except (SQLAlchemyError, asyncpg.PostgresError) as exc:
             raise DatabaseOperationError("数据库操作执行失败") from exc
         except Exception as exc:
             logger.exception("导入过程发生未知错误")
             raise ServiceError("Internal server error during import") from exc
+        finally:
+            if next_rows is not None and not next_rows.done():
+                next_rows.cancel()
+            await batches.aclose()
 
-    @classmethod
-    async def transform_and_validate(
-        cls, raw_data: list[dict[str, Any]]
-    ) -> list[dict[str, Any]]:
-        """执行字段映射、清洗与基础校验。"""
-        cleaned_schemas: list[dict[str, Any]] = []
-        errors: list[str] = []
+    async def _ensure_usernames_available(self, batch: list[dict[str, Any]]) -> None:
+        existing_names = await self.uow.user_repo.get_existing_usernames(
+            [str(u["username"]) for u in batch]
+        )
+        if existing_names:
+            raise ValidationError(f"以下用户名已被占用，无法注册: {existing_names}")
 
-        for index, row in enumerate(raw_data):
-            mapped_row = {cls.HEADER_MAP[k]: v for k, v in row.items() if k in cls.HEADER_MAP}
+    @classmethod
+    def transform_and_validate(
+        cls,
+        raw_rows: Iterable[dict[str, Any]],
+        stats: ImportRowStats | None = None,
+    ) -> Iterator[dict[str, Any]]:
+        """
+        逐行执行字段映射、清洗与基础校验（生成器）。
+        有效行即时产出；无效行只记录前 MAX_REPORTED_ERRORS 条，遍历结束后统一抛错。
+        """
+        stats = stats if stats is not None else ImportRowStats()
+        for index, row in enumerate(raw_rows):
+            stats.total += 1
+            mapped_row = {
+                cls.HEADER_MAP[k]: v for k, v in row.items() if k in cls.HEADER_MAP
+            }
             if mapped_row.get("username") and mapped_row.get("email"):
-                cleaned_schemas.append(mapped_row)
+                stats.valid += 1
+                yield mapped_row
             else:
-                errors.append(f"Row {index}: {mapped_row}")
-
-        if not cleaned_schemas:
-            raise ValidationError(f"No valid data found. Errors: {errors}")
-        if errors:
-            raise ValidationError(f"No valid data found. Errors: {errors}")
-        return cleaned_schemas
-
-    async def _build_import_rows(self, user_maps: list[dict[str, Any]]) -> list[dict[str, str]]:
-        """构造可直接入库的数据行（补齐 hashed_password）。"""
-        rows: list[dict[str, str]] = []
-        for user_map in user_maps:
-            username = str(user_map["username"]).strip().lower()
-            email = str(user_map["email"]).strip().lower()
-            temp_password = secrets.token_urlsafe(12)
-            hashed_password = await get_password_hash(temp_password)
+                stats.invalid += 1
+                if len(stats.errors) < cls.MAX_REPORTED_ERRORS:
+                    stats.errors.append(f"Row {index}: {mapped_row}")
+
+        if not stats.valid or stats.invalid:
+            raise ValidationError(
+                f"No valid data found. Errors: {stats.errors}",
+                details={"invalid_rows": stats.invalid},
+            )
+
+    @staticmethod
+    def _take(rows: Iterator[dict[str, Any]], size: int) -> list[dict[str, Any]]:
+        return list(itertools.islice(rows, size))
+
+    async def _iter_batches(
+        self, rows: Iterator[dict[str, Any]]
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """在线程中按批拉取（解析 / 解码是阻塞 IO + CPU），避免卡住事件循环。"""
+        size = settings.BATCH_SIZE
+        while batch := await asyncio.to_thread(self._take, rows, size):
+            yield batch
+
+    async def _build_import_rows(
+        self, user_maps: list[dict[str, Any]]
+    ) -> list[dict[str, Any]]:
+        """构造可直接入库的数据行（补齐 id 与 hashed_password）。"""
+        temp_passwords = [secrets.token_urlsafe(12) for _ in user_maps]
+        hashed_passwords = await self._hash_passwords(temp_passwords)
+
+        rows: list[dict[str, Any]] = []
+        for user_map, hashed_password in zip(user_maps, hashed_passwords, strict=True):
             rows.append(
                 {
-                    "username": username,
-                    "email": email,
+                    "id": IDGenerator.new_ulid_as_uuid(),
+                    "username": str(user_map["username"]).strip().lower(),
+                    "email": str(user_map["email"]).strip().lower(),
                     "hashed_password": hashed_password,
                 }
             )
         return rows
 
-    async def _after_import_batch_hook(self, import_rows: list[dict[str, str]]) -> None:
+    async def _hash_passwords(self, passwords: list[str]) -> list[str]:
+        """按 worker 数切片，整批密码在进程池中并行哈希。"""
+        if not passwords:
+            return []
+        chunk_size = math.ceil(len(passwords) / self.hash_executor.max_workers)
+        parts = await asyncio.gather(
+            *(
+                self.hash_executor.run(
+                    hash_passwords_sync, passwords[i : i + chunk_size]
+                )
+                for i in range(0, len(passwords), chunk_size)
+            )
+        )
+        return [hashed for part in parts for hashed in part]
+
+    @staticmethod
+    async def _report(
+        progress_callback: ProgressCallback | None, progress: int
+    ) -> None:
+        if progress_callback is None:
+            return
+        try:
+            await progress_callback(progress)
+        except Exception:
+            # 进度回写失败不影响导入本身
+            logger.warning("导入进度回写失败: progress=%s", progress, exc_info=True)
+
+    async def _after_import_batch_hook(self, import_rows: list[dict[str, Any]]) -> None:
         """导入后扩展钩子（预留给激活流程/通知流程）。"""
         _ = import_rows
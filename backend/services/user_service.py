@@ -1,6 +1,7 @@
 import logging
 import uuid
 from collections.abc import Sequence
+from functools import partial
 from typing import Any
 
 from pydantic import EmailStr
@@ -19,6 +20,8 @@ from backend.models.schemas.user_schema import (
     UserUpdate,
 )
 from backend.services.base import BaseService
+from backend.services.principal_cache_service import principal_cache
+from backend.services.token_quota_service import TokenQuotaService
 
 # 模块级 logger，或者放在类里也可以
 logger = logging.getLogger(__name__)
@@ -93,6 +96,17 @@ class UserService(BaseService[AbstractUnitOfWork]):
             raise ResourceNotFound("用户不存在")
 
         user = await self.uow.user_repo.update(db_obj=db_obj, obj_in=user_in)
+        # 外部状态都在事务提交后再变更：提交前失效缓存，并发请求会把旧行重新写回缓存；
+        # 提交前改账本上限，回滚后账本与 DB 不一致
+        if user_in.max_tokens is not None:
+            # 额度上限变更需同步到 Redis 账本，否则要等账本过期才生效
+            self.uow.after_commit(
+                partial(
+                    TokenQuotaService(self.uow).sync_limit, user_id, user_in.max_tokens
+                )
+            )
+        # is_active / is_superuser / 额度变更后，认证缓存必须立即失效
+        self.uow.after_commit(partial(principal_cache.invalidate, user_id))
         return user
 
     async def authenticate(self, user_in: UserLogin) -> User | None:
@@ -114,4 +128,5 @@ class UserService(BaseService[AbstractUnitOfWork]):
         # if id == 1: raise Error("不能删管理员")
 
         user = await self.uow.user_repo.remove(id=id)
+        self.uow.after_commit(partial(principal_cache.invalidate, id))
         return user
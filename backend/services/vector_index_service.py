@@ -1,10 +1,54 @@
 import asyncio
+import contextlib
+import hashlib
 import uuid
+from collections import deque
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
 from typing import TypedDict
 
+from prometheus_client import Counter
+
+from backend.ai.core.token_counter import count_tokens
+from backend.core.config import settings
 from backend.domain.interfaces import AbstractRAGEmbedder, AbstractUnitOfWork
 from backend.models.orm.chunk import ChunkSourceType, DocumentChunk
 from backend.services.base import BaseService
+from backend.services.chunking_service import ParsedChunk
+
+INGEST_CHUNKS = Counter(
+    "knowledge_ingest_chunks_total",
+    "知识文件入库的切片数（reused: 沿用旧向量；embedded: 新向量化；deleted: 移除；"
+    "cloned: 从同内容文件复制）",
+    ["outcome"],
+)
+
+
+def chunk_content_hash(chunk_text: str) -> str:
+    return hashlib.sha256(chunk_text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class ChunkIngestStats:
+    """一次入库的切片差量统计"""
+
+    total: int = 0
+    reused: int = 0
+    embedded: int = 0
+    deleted: int = 0
+
+    @property
+    def reuse_ratio(self) -> float:
+        return self.reused / self.total if self.total else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "chunks_total": self.total,
+            "chunks_reused": self.reused,
+            "chunks_embedded": self.embedded,
+            "chunks_deleted": self.deleted,
+            "reuse_ratio": round(self.reuse_ratio, 4),
+        }
 
 
 class _HybridHit(TypedDict):
@@ -25,30 +69,223 @@ class VectorIndexService(BaseService[AbstractUnitOfWork]):
         self,
         *,
         file_id: uuid.UUID,
-        chunks: list[str],
+        chunks: list[str | ParsedChunk],
+        filename: str,
+        file_path: str,
+    ) -> ChunkIngestStats:
+        async def iter_chunks() -> AsyncIterator[str | ParsedChunk]:
+            for chunk_text in chunks:
+                yield chunk_text
+
+        return await self.stream_file_chunks(
+            file_id=file_id,
+            chunks=iter_chunks(),
+            filename=filename,
+            file_path=file_path,
+        )
+
+    async def stream_file_chunks(
+        self,
+        *,
+        file_id: uuid.UUID,
+        chunks: AsyncIterator[str | ParsedChunk],
+        filename: str,
+        file_path: str,
+        reuse_existing: bool = True,
+        batch_size: int | None = None,
+        queue_size: int | None = None,
+    ) -> ChunkIngestStats:
+        """
+        流式增量替换文件切片，返回差量统计。
+
+        向量化阶段按批消费上游切片，写库阶段攒批后以二进制 COPY 写入，两者经有界队列衔接，
+        上游解析、向量化与写库相互重叠；队列满时上游自然阻塞（背压）。
+        重新入库时按 content_hash 与旧切片做多重集差量：内容未变的行只改 chunk_index、
+        沿用旧向量，只有新增内容才向量化写入，最后删除新版本中已不存在的旧行。
+        reuse_existing 为 False（旧切片由其他向量模型 / 切片配置生成）时旧行一律视为过期，
+        全部重新向量化，避免同一索引内混入不同模型的向量。
+        所有变更与 generation 递增都在调用方的同一事务内完成，中途失败整体回滚。
+        ParsedChunk 携带的 meta_info（抽取层级、页码等）合并进新写入行的 meta_info。
+        """
+        batch_size = batch_size or settings.KNOWLEDGE_INGEST_EMBED_BATCH_SIZE
+        batches: asyncio.Queue[tuple[list[dict], list[dict]] | None] = asyncio.Queue(
+            maxsize=queue_size or settings.KNOWLEDGE_INGEST_QUEUE_SIZE
+        )
+        stats = ChunkIngestStats()
+
+        # 旧切片按内容哈希分组；同一内容出现多次时按原顺序依次复用
+        reusable: dict[str, deque[tuple[uuid.UUID, int]]] = {}
+        stale_ids: list[uuid.UUID] = []
+        existing = await self.uow.knowledge_repo.list_chunk_hashes_for_file(file_id)
+        for chunk_id, content_hash, chunk_index in existing:
+            if content_hash is None or not reuse_existing:
+                stale_ids.append(chunk_id)
+            else:
+                reusable.setdefault(content_hash, deque()).append(
+                    (chunk_id, chunk_index)
+                )
+
+        async def embed_stage() -> None:
+            pending: list[tuple[int, str, str, dict]] = []
+            moved: list[dict] = []
+
+            async def flush() -> None:
+                nonlocal pending, moved
+                records: list[dict] = []
+                if pending:
+                    records = await asyncio.to_thread(
+                        self._build_chunk_records,
+                        pending,
+                        file_id=file_id,
+                        filename=filename,
+                        file_path=file_path,
+                    )
+                item = (records, moved)
+                pending, moved = [], []
+                await batches.put(item)
+
+            try:
+                async for chunk in chunks:
+                    if isinstance(chunk, ParsedChunk):
+                        chunk_text, extra_meta = chunk
+                    else:
+                        chunk_text, extra_meta = chunk, {}
+                    chunk_index = stats.total
+                    stats.total += 1
+                    content_hash = chunk_content_hash(chunk_text)
+                    candidates = reusable.get(content_hash)
+                    if candidates:
+                        old_id, old_index = candidates.popleft()
+                        stats.reused += 1
+                        if old_index != chunk_index:
+                            moved.append({"id": old_id, "chunk_index": chunk_index})
+                    else:
+                        pending.append(
+                            (chunk_index, chunk_text, content_hash, extra_meta)
+                        )
+                    if len(pending) + len(moved) >= batch_size:
+                        await flush()
+                if pending or moved:
+                    await flush()
+            except Exception:
+                # 写库阶段仍在消费队列：先送结束标记，再由 await embed_task 抛出原始异常
+                await batches.put(None)
+                raise
+            await batches.put(None)
+
+        embed_task = asyncio.create_task(embed_stage())
+        write_batch_size = settings.KNOWLEDGE_INGEST_WRITE_BATCH_SIZE
+        moved_count = 0
+        try:
+            buffered: list[dict] = []
+            buffered_moves: list[dict] = []
+            while (item := await batches.get()) is not None:
+                records, moves = item
+                buffered.extend(records)
+                buffered_moves.extend(moves)
+                if len(buffered) + len(buffered_moves) >= write_batch_size:
+                    stats.embedded += await self._write_chunk_records(buffered)
+                    await self.uow.knowledge_repo.update_chunk_indexes(buffered_moves)
+                    moved_count += len(buffered_moves)
+                    buffered, buffered_moves = [], []
+            await embed_task
+            stats.embedded += await self._write_chunk_records(buffered)
+            await self.uow.knowledge_repo.update_chunk_indexes(buffered_moves)
+            moved_count += len(buffered_moves)
+
+            stale_ids.extend(
+                chunk_id for group in reusable.values() for chunk_id, _ in group
+            )
+            stats.deleted = await self.uow.knowledge_repo.delete_chunks_by_ids(
+                stale_ids
+            )
+        finally:
+            if not embed_task.done():
+                embed_task.cancel()
+                with contextlib.suppress(asyncio.CancelledError, Exception):
+                    await embed_task
+
+        # 内容与顺序都没变时不递增 generation，避免无谓地让答案缓存失效
+        if stats.embedded or stats.deleted or moved_count:
+            await self.uow.knowledge_repo.bump_kb_generation_for_file(file_id=file_id)
+        for outcome in ("reused", "embedded", "deleted"):
+            INGEST_CHUNKS.labels(outcome=outcome).inc(getattr(stats, outcome))
+        return stats
+
+    async def clone_duplicate_file_chunks(
+        self,
+        *,
+        file_id: uuid.UUID,
+        content_hash: str,
+        ingest_fingerprint: str,
+        filename: str,
+        file_path: str,
+    ) -> ChunkIngestStats | None:
+        """
+        同内容文件已按相同配置入库时，在库内复制其切片，跳过解析与向量化；
+        没有可复用的来源文件时返回 None，由调用方走完整入库流程。
+        """
+        source = await self.uow.knowledge_repo.find_ingested_duplicate(
+            content_hash=content_hash,
+            ingest_fingerprint=ingest_fingerprint,
+            exclude_file_id=file_id,
+        )
+        if source is None:
+            return None
+
+        existing = await self.uow.knowledge_repo.list_chunk_hashes_for_file(file_id)
+        deleted = await self.uow.knowledge_repo.delete_chunks_by_ids(
+            [chunk_id for chunk_id, _, _ in existing]
+        )
+        cloned = await self.uow.knowledge_repo.clone_chunks_from_file(
+            source_file_id=source.id,
+            target_file_id=file_id,
+            meta_info={"filename": filename, "path": file_path},
+        )
+        await self.uow.knowledge_repo.bump_kb_generation_for_file(file_id=file_id)
+        INGEST_CHUNKS.labels(outcome="cloned").inc(cloned)
+        return ChunkIngestStats(total=cloned, reused=cloned, deleted=deleted)
+
+    async def _write_chunk_records(self, records: list[dict]) -> int:
+        if not records:
+            return 0
+        if settings.KNOWLEDGE_INGEST_COPY_ENABLED:
+            return await self.uow.knowledge_repo.copy_chunks(records)
+        await self.uow.knowledge_repo.add_chunks(records)
+        return len(records)
+
+    def _build_chunk_records(
+        self,
+        pending: list[tuple[int, str, str, dict]],
+        *,
+        file_id: uuid.UUID,
         filename: str,
         file_path: str,
-    ) -> None:
-        chunk_records: list[dict] = []
-        for idx, chunk_text in enumerate(chunks):
-            embedding = await asyncio.to_thread(self.embedder.encode_query, chunk_text)
-            chunk_records.append(
-                {
-                    "source_type": ChunkSourceType.FILE,
-                    "file_id": file_id,
-                    "content": chunk_text,
-                    "token_count": len(chunk_text),
-                    "chunk_index": idx,
-                    "meta_info": {
-                        "filename": filename,
-                        "path": file_path,
-                    },
-                    "embedding": embedding,
-                }
+    ) -> list[dict]:
+        """在工作线程中执行：批量向量化并组装切片记录（pending: (序号, 内容, 哈希, 附加元数据)）"""
+        embeddings = self.embedder.encode_batch([item[1] for item in pending])
+        return [
+            {
+                "source_type": ChunkSourceType.FILE,
+                "file_id": file_id,
+                "content": chunk_text,
+                "content_hash": content_hash,
+                "token_count": count_tokens(chunk_text, settings.LLM_MODEL_NAME),
+                "chunk_index": chunk_index,
+                "meta_info": {
+                    "filename": filename,
+                    "path": file_path,
+                    **extra_meta,
+                },
+                "embedding": embedding,
+            }
+            for (chunk_index, chunk_text, content_hash, extra_meta), embedding in zip(
+                pending, embeddings, strict=True
             )
+        ]
 
-        await self.uow.knowledge_repo.delete_chunks_for_file(file_id=file_id)
-        await self.uow.knowledge_repo.add_chunks(chunk_records)
+    async def embed_query(self, query_text: str) -> list[float]:
+        return await asyncio.to_thread(self.embedder.encode_query, query_text)
 
     async def search_chunks_for_kb(
         self,
@@ -56,15 +293,19 @@ class VectorIndexService(BaseService[AbstractUnitOfWork]):
         query_text: str,
         kb_id: uuid.UUID,
         limit: int,
+        query_vector: list[float] | None = None,
+        with_embeddings: bool = False,
     ) -> list[tuple[DocumentChunk, float]]:
         if not query_text.strip() or limit <= 0:
             return []
 
-        query_vector = await asyncio.to_thread(self.embedder.encode_query, query_text)
+        if query_vector is None:
+            query_vector = await self.embed_query(query_text)
         return await self.uow.knowledge_repo.search_chunks_for_kb(
             query_vector=query_vector,
             kb_id=kb_id,
             limit=limit,
+            with_embeddings=with_embeddings,
         )
 
     async def search_chunks_for_kb_fulltext(
@@ -4,4 +4,8 @@ Keep package import side-effect free so workers can load individual task
 modules without eagerly importing every task dependency chain.
 """
 
-__all__ = ["generate_llm_stream_task", "ingest_knowledge_file_task"]
+__all__ = [
+    "generate_llm_stream_task",
+    "import_users_task",
+    "ingest_knowledge_file_task",
+]
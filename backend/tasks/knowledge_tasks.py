@@ -1,14 +1,19 @@
+import asyncio
+import contextlib
 import logging
 import uuid
 
 from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+from taskiq import TaskiqEvents, TaskiqState
 
 from backend.ai.providers.embedding.rag_embedding import RAGEmbedderFactory
 from backend.core.config import settings
 from backend.core.database import create_db_assets
 from backend.core.exceptions import AppError, ServiceError, ValidationError
 from backend.core.task_broker import broker
+from backend.models.orm.task import TaskJob, TaskStatus
 from backend.services.chunking_service import ChunkingService
+from backend.services.docling_parser import docling_parse_executor
 from backend.services.knowledge_service import KnowledgeService
 from backend.services.task_service import TaskService
 from backend.services.unit_of_work import SQLAlchemyUnitOfWork
@@ -17,6 +22,10 @@ from backend.workflow.knowledge_rag_workflow import KnowledgeRAGWorkflow
 
 logger = logging.getLogger(__name__)
 
+# 页段并行解析时，解析阶段进度映射到 TaskJob.progress 的 [5, 60] 区间
+_PARSE_PROGRESS_START = 5
+_PARSE_PROGRESS_END = 60
+
 _engine: AsyncEngine | None = None
 _session_factory: async_sessionmaker | None = None
 _embedder = None
@@ -43,6 +52,17 @@ def _get_embedder():
     return _embedder
 
 
+@broker.on_event(TaskiqEvents.WORKER_STARTUP)
+async def _warm_docling_parser(state: TaskiqState) -> None:
+    if settings.DOCLING_PARSE_WARMUP:
+        await asyncio.to_thread(docling_parse_executor.warm_up)
+
+
+@broker.on_event(TaskiqEvents.WORKER_SHUTDOWN)
+async def _shutdown_docling_parser(state: TaskiqState) -> None:
+    await asyncio.to_thread(docling_parse_executor.shutdown)
+
+
 async def _safe_mark_failed(
     *,
     uow: SQLAlchemyUnitOfWork,
@@ -59,8 +79,137 @@ async def _safe_mark_failed(
         logger.exception("TaskIQ 任务失败状态回写异常: task_id=%s", task_id)
 
 
+def _make_parse_progress_reporter(task_id: uuid.UUID):
+    # 解析进度与入库写库并发发生，使用独立的 UnitOfWork，不与入库事务共用会话
+    task_service = TaskService(SQLAlchemyUnitOfWork(_get_session_factory()))
+
+    async def report(done: int, total: int) -> None:
+        progress = _PARSE_PROGRESS_START + (
+            (_PARSE_PROGRESS_END - _PARSE_PROGRESS_START) * done // total
+        )
+        try:
+            async with task_service.uow:
+                await task_service.mark_processing(task_id=task_id, progress=progress)
+        except Exception:
+            # 进度只是展示信息，回写失败不影响入库
+            logger.warning(
+                "TaskIQ 解析进度回写失败: task_id=%s", task_id, exc_info=True
+            )
+
+    return report
+
+
+async def _advance_batch(task_id: uuid.UUID) -> TaskJob | None:
+    """
+    推进一次批量父任务：回收超时文件、认领空闲名额并投递单文件入库、汇总进度。
+    状态全部来自数据库，分发任务与子任务结束时都会调用，重复调用无副作用。
+    """
+    task_service = TaskService(SQLAlchemyUnitOfWork(_get_session_factory()))
+    async with task_service.uow:
+        task, claimed = await task_service.advance_batch_ingestion(
+            task_id=task_id,
+            parallelism=settings.KNOWLEDGE_BATCH_PARALLELISM,
+            file_timeout_seconds=settings.KNOWLEDGE_BATCH_FILE_TIMEOUT_SECONDS,
+        )
+
+    undelivered: list[uuid.UUID] = []
+    for file_id in claimed:
+        try:
+            await ingest_knowledge_file_task.kiq(str(file_id), None, str(task_id))
+        except Exception:
+            logger.warning(
+                "TaskIQ 批量子任务投递失败: task_id=%s file_id=%s",
+                task_id,
+                file_id,
+                exc_info=True,
+            )
+            undelivered.append(file_id)
+    if undelivered:
+        async with task_service.uow:
+            task = await task_service.fail_batch_files(
+                task_id=task_id,
+                file_ids=undelivered,
+                reason=f"{len(undelivered)} 个文件任务投递失败，已标记失败",
+            )
+    return task
+
+
+async def _heartbeat_batch_file(file_id: str) -> None:
+    """
+    批量子任务运行期间定期刷新文件 updated_at：整篇解析、在解析池排队与向量化期间
+    文件状态都不会变化，看门狗只凭心跳区分仍在运行的长文件与随 worker 丢失的子任务。
+    """
+    try:
+        file_uuid = uuid.UUID(file_id)
+    except ValueError:
+        return
+    task_service = TaskService(SQLAlchemyUnitOfWork(_get_session_factory()))
+    interval = settings.KNOWLEDGE_BATCH_FILE_TIMEOUT_SECONDS / 3
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with task_service.uow:
+                await task_service.touch_batch_file(file_id=file_uuid)
+        except Exception:
+            logger.warning(
+                "TaskIQ 批量子任务心跳失败: file_id=%s", file_id, exc_info=True
+            )
+
+
 @broker.task(task_name="ingest_knowledge_file")
-async def ingest_knowledge_file_task(file_id: str, task_id: str | None = None):
+async def ingest_knowledge_file_task(
+    file_id: str,
+    task_id: str | None = None,
+    parent_task_id: str | None = None,
+):
+    heartbeat = (
+        asyncio.create_task(_heartbeat_batch_file(file_id)) if parent_task_id else None
+    )
+    try:
+        await _ingest_knowledge_file(file_id, task_id)
+    finally:
+        if heartbeat is not None:
+            heartbeat.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await heartbeat
+        if parent_task_id:
+            # 尽力而为：失败不影响单文件结果，分发任务的看门狗还会再推进
+            try:
+                await _advance_batch(uuid.UUID(parent_task_id))
+            except Exception:
+                logger.warning(
+                    "TaskIQ 批量父任务推进失败: task_id=%s",
+                    parent_task_id,
+                    exc_info=True,
+                )
+
+
+@broker.task(task_name="dispatch_knowledge_batch")
+async def dispatch_knowledge_batch_task(task_id: str):
+    """
+    批量上传的分发任务：按 KNOWLEDGE_BATCH_PARALLELISM 的名额逐步投递单文件入库，
+    避免一次性把整批文件压给 worker 与嵌入服务；子任务结束时就地推进批次、补上空出的名额。
+    不在内存中持有整批状态：每次运行都从 File.status 重新推导，批次未结束时等待
+    KNOWLEDGE_BATCH_WATCHDOG_SECONDS 后重新投递自身，回收超时或随 worker 丢失的子任务。
+    worker 崩溃导致看门狗中断时，重新投递本任务即可从数据库状态继续。
+    """
+    try:
+        task_uuid = uuid.UUID(task_id)
+    except ValueError as exc:
+        raise ValidationError("任务参数非法: task_id 必须为 UUID") from exc
+
+    task = await _advance_batch(task_uuid)
+    if task is None:
+        raise ValidationError("批量任务不存在", details={"task_id": task_id})
+    if task.status in (TaskStatus.COMPLETED, TaskStatus.FAILED):
+        logger.info("TaskIQ 批量入库结束: task_id=%s status=%s", task_id, task.status)
+        return
+
+    await asyncio.sleep(settings.KNOWLEDGE_BATCH_WATCHDOG_SECONDS)
+    await dispatch_knowledge_batch_task.kiq(task_id)
+
+
+async def _ingest_knowledge_file(file_id: str, task_id: str | None) -> None:
     logger.info("TaskIQ 开始处理知识库文件: file_id=%s task_id=%s", file_id, task_id)
 
     uow = SQLAlchemyUnitOfWork(_get_session_factory())
@@ -79,6 +228,7 @@ async def ingest_knowledge_file_task(file_id: str, task_id: str | None = None):
         knowledge_service=knowledge_service,
         chunking_service=chunking_service,
         vector_index_service=vector_index_service,
+        docling_executor=docling_parse_executor,
     )
 
     task_uuid: uuid.UUID | None = None
@@ -88,12 +238,21 @@ async def ingest_knowledge_file_task(file_id: str, task_id: str | None = None):
 
         if task_uuid:
             async with uow:
-                await task_service.mark_processing(task_id=task_uuid, progress=5)
+                await task_service.mark_processing(
+                    task_id=task_uuid, progress=_PARSE_PROGRESS_START
+                )
 
-        await workflow.ingest_file(file_id=file_uuid)
+        stats = await workflow.ingest_file(
+            file_id=file_uuid,
+            on_parse_progress=(
+                _make_parse_progress_reporter(task_uuid) if task_uuid else None
+            ),
+        )
         if task_uuid:
             async with uow:
-                await task_service.mark_completed(task_id=task_uuid, progress=100)
+                await task_service.mark_completed(
+                    task_id=task_uuid, progress=100, result=stats.as_dict()
+                )
     except ValueError as exc:
         logger.warning(
             "TaskIQ 知识库任务参数非法: file_id=%s task_id=%s",
@@ -135,4 +294,10 @@ async def ingest_knowledge_file_task(file_id: str, task_id: str | None = None):
         )
         raise ServiceError("知识文件处理失败，请稍后重试") from exc
 
-    logger.info("TaskIQ 完成知识库文件处理: file_id=%s task_id=%s", file_id, task_id)
+    logger.info(
+        "TaskIQ 完成知识库文件处理: file_id=%s task_id=%s chunks=%d reused=%d",
+        file_id,
+        task_id,
+        stats.total,
+        stats.reused,
+    )
@@ -0,0 +1,131 @@
+import logging
+import uuid
+
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from backend.core.config import settings
+from backend.core.database import create_db_assets
+from backend.core.exceptions import (
+    AppError,
+    ResourceNotFound,
+    ServiceError,
+    ValidationError,
+)
+from backend.core.hash_executor import PasswordHashExecutor
+from backend.core.task_broker import broker
+from backend.services.task_service import TaskService
+from backend.services.unit_of_work import SQLAlchemyUnitOfWork
+from backend.services.user_import_service import UserImportService
+
+logger = logging.getLogger(__name__)
+
+_engine: AsyncEngine | None = None
+_session_factory: async_sessionmaker | None = None
+_hash_executor: PasswordHashExecutor | None = None
+
+
+def _get_session_factory() -> async_sessionmaker:
+    global _engine, _session_factory
+    if _session_factory is None:
+        _engine, _session_factory = create_db_assets()
+    return _session_factory
+
+
+def _get_hash_executor() -> PasswordHashExecutor:
+    # worker 进程内独立的哈希进程池，不与 API 进程的登录哈希争抢
+    global _hash_executor
+    if _hash_executor is None:
+        workers = settings.USER_IMPORT_HASH_WORKERS
+        _hash_executor = PasswordHashExecutor(
+            max_workers=workers,
+            # 流水线最多同时在途两批，每批切成 workers 片
+            max_queue=workers * 2,
+            kind="process",
+        )
+    return _hash_executor
+
+
+async def _safe_mark_failed(
+    *,
+    uow: SQLAlchemyUnitOfWork,
+    task_service: TaskService,
+    task_id: uuid.UUID,
+    error_log: str,
+) -> None:
+    try:
+        async with uow:
+            await task_service.mark_failed(task_id=task_id, error_log=error_log)
+    except Exception:
+        logger.exception("TaskIQ 任务失败状态回写异常: task_id=%s", task_id)
+
+
+@broker.task(task_name="import_users")
+async def import_users_task(task_id: str):
+    logger.info("TaskIQ 开始批量导入用户: task_id=%s", task_id)
+
+    try:
+        task_uuid = uuid.UUID(task_id)
+    except ValueError as exc:
+        logger.warning("TaskIQ 用户导入任务参数非法: task_id=%s", task_id)
+        raise ValidationError("任务参数非法: task_id 必须为 UUID") from exc
+
+    session_factory = _get_session_factory()
+    # 导入本身是一个长事务；进度用独立 UoW 提交，轮询方才能实时看到
+    import_uow = SQLAlchemyUnitOfWork(session_factory)
+    progress_uow = SQLAlchemyUnitOfWork(session_factory)
+    task_service = TaskService(progress_uow)
+    import_service = UserImportService(
+        uow=import_uow,
+        hash_executor=_get_hash_executor(),
+    )
+
+    async def report_progress(progress: int) -> None:
+        async with progress_uow:
+            await task_service.mark_processing(task_id=task_uuid, progress=progress)
+
+    file_path: str | None = None
+    try:
+        async with progress_uow:
+            task = await task_service.get_by_id(task_uuid)
+            if not task:
+                raise ResourceNotFound("导入任务不存在")
+            payload = dict(task.payload or {})
+            await task_service.mark_processing(task_id=task_uuid, progress=5)
+
+        file_path = payload["file_path"]
+        async with import_uow:
+            result = await import_service.import_from_file(
+                file_path=file_path,
+                filename=payload["filename"],
+                progress_callback=report_progress,
+            )
+
+        async with progress_uow:
+            await task_service.mark_completed(
+                task_id=task_uuid,
+                progress=100,
+                result=result.model_dump(),
+            )
+    except AppError as exc:
+        await _safe_mark_failed(
+            uow=progress_uow,
+            task_service=task_service,
+            task_id=task_uuid,
+            error_log=str(exc),
+        )
+        logger.warning("TaskIQ 用户导入业务失败: task_id=%s error=%s", task_id, exc)
+        raise
+    except Exception as exc:
+        await _safe_mark_failed(
+            uow=progress_uow,
+            task_service=task_service,
+            task_id=task_uuid,
+            error_log="用户导入失败，请稍后重试",
+        )
+        logger.exception("TaskIQ 用户导入系统异常: task_id=%s", task_id)
+        raise ServiceError("用户导入失败，请稍后重试") from exc
+    finally:
+        if file_path:
+            UserImportService.remove_file(file_path)
+
+    logger.info("TaskIQ 完成批量导入用户: task_id=%s", task_id)
@@ -1,63 +1,77 @@
 import csv
 import io
+from collections.abc import Iterator
 from io import BytesIO
 from pathlib import Path
-from typing import Any
+from typing import IO, Any
 
 from openpyxl import load_workbook
 
 from backend.core.exceptions import FileParseException
 
 
-def parse_excel_to_list(file_content: bytes) -> list[dict[str, Any]]:
-    """解析 Excel 文件为 list[dict]"""
+def iter_excel_rows(source: IO[bytes]) -> Iterator[dict[str, Any]]:
+    """逐行流式解析 Excel（read_only 模式按需读取 XML，不整表载入内存）"""
     try:
-        workbook = load_workbook(
-            filename=BytesIO(file_content), read_only=True, data_only=True
-        )
-        sheet = workbook.active
-
-        rows = list(sheet.iter_rows(values_only=True))
-        if not rows:
-            return []
+        workbook = load_workbook(filename=source, read_only=True, data_only=True)
+    except Exception as exc:
+        raise FileParseException(f"Excel 解析失败: {exc}") from exc
 
-        headers = [str(h).strip() for h in rows[0]]
-        data: list[dict[str, Any]] = []
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
 
-        for row in rows[1:]:
+        headers = [str(h).strip() for h in header]
+        for row in rows:
             if not any(row):
                 continue
-
-            row_dict = dict(zip(headers, row, strict=False))
-            data.append(row_dict)
-
-        return data
+            yield dict(zip(headers, row, strict=False))
     except Exception as exc:
         raise FileParseException(f"Excel 解析失败: {exc}") from exc
+    finally:
+        workbook.close()
 
 
-def parse_csv_to_list(file_content: bytes) -> list[dict[str, Any]]:
-    """解析 CSV 文件为 list[dict]"""
+def iter_csv_rows(source: IO[bytes]) -> Iterator[dict[str, Any]]:
+    """逐行流式解析 CSV（增量解码，不把整个文件解码成字符串）"""
+    text_stream = io.TextIOWrapper(source, encoding="utf-8-sig", newline="")
     try:
-        content_str = file_content.decode("utf-8-sig")
-        f = io.StringIO(content_str)
-        reader = csv.DictReader(f)
-        return [row for row in reader]
+        yield from csv.DictReader(text_stream)
     except UnicodeDecodeError as exc:
         raise FileParseException("文件编码格式不正确，请上传 UTF-8 编码的文件") from exc
     except csv.Error as exc:
         raise FileParseException(f"CSV 解析失败: {exc}") from exc
     except Exception as exc:
         raise FileParseException(f"CSV 解析失败: {exc}") from exc
+    finally:
+        # 只解除包装，底层文件由调用方负责关闭
+        text_stream.detach()
 
 
-def parse_file(filename: str, file_content: bytes) -> list[dict[str, Any]]:
-    """总入口：根据文件名后缀选择解析器"""
+def iter_file_rows(filename: str, source: IO[bytes]) -> Iterator[dict[str, Any]]:
+    """流式总入口：根据文件名后缀选择解析器"""
     suffix = Path(filename).suffix.lower()
     if suffix == ".xlsx":
-        return parse_excel_to_list(file_content)
+        return iter_excel_rows(source)
     if suffix == ".xls":
         raise FileParseException("暂不支持 .xls，请转换为 .xlsx 后再上传")
     if suffix == ".csv":
-        return parse_csv_to_list(file_content)
+        return iter_csv_rows(source)
     raise FileParseException("不支持的文件格式，仅支持 .xlsx, .csv")
+
+
+def parse_excel_to_list(file_content: bytes) -> list[dict[str, Any]]:
+    """解析 Excel 文件为 list[dict]"""
+    return list(iter_excel_rows(BytesIO(file_content)))
+
+
+def parse_csv_to_list(file_content: bytes) -> list[dict[str, Any]]:
+    """解析 CSV 文件为 list[dict]"""
+    return list(iter_csv_rows(BytesIO(file_content)))
+
+
+def parse_file(filename: str, file_content: bytes) -> list[dict[str, Any]]:
+    """总入口：根据文件名后缀选择解析器（小文件便捷版，大文件请用 iter_file_rows）"""
+    return list(iter_file_rows(filename, BytesIO(file_content)))
@@ -0,0 +1,29 @@
+import base64
+import binascii
+import uuid
+from datetime import datetime
+
+from backend.core.exceptions import ValidationError
+
+# keyset 游标：(排序时间, 行 id)，与 ORDER BY ts DESC, id DESC 一一对应
+KeysetCursor = tuple[datetime, uuid.UUID]
+
+
+def encode_cursor(sort_value: datetime, row_id: uuid.UUID) -> str:
+    """把 (排序时间, id) 编码成对客户端不透明的 URL 安全字符串"""
+    raw = f"{sort_value.isoformat()}|{row_id.hex}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> KeysetCursor:
+    """解析游标；被篡改或格式不对统一视为参数错误"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        sort_part, id_part = raw.split("|", 1)
+        return datetime.fromisoformat(sort_part), uuid.UUID(hex=id_part)
+    except (binascii.Error, UnicodeError, ValueError) as exc:
+        raise ValidationError(
+            "无效的分页游标",
+            details={"cursor": token},
+        ) from exc
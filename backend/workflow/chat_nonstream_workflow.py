@@ -1,27 +1,41 @@
 import asyncio
 import logging
 import uuid
+from datetime import UTC, datetime
 
 from langfuse import get_client, observe
 
-from backend.ai.core import PromptManager
+from backend.ai.core import PromptManager, template_fingerprint
+from backend.ai.core.context_packer import pack_context_chunks
 from backend.ai.core.prompt_templates import RAG_SYSTEM_TEMPLATE
 from backend.core.config import settings
-from backend.core.exceptions import AppError, ServiceError, ValidationError
+from backend.core.exceptions import AppError, ServiceError
 from backend.core.redis import redis_client
 from backend.domain.interfaces import (
     AbstractLLMService,
     AbstractRAGService,
     AbstractUnitOfWork,
 )
-from backend.models.orm.chat import MessageStatus
+from backend.models.orm.chat import ChatMessage, ChatSession, MessageStatus
 from backend.models.schemas.chat_schema import (
     ChatQueryResponse,
     ConversationMessage,
     LLMQueryDTO,
     MessageResponse,
 )
+from backend.services.answer_cache import (
+    AnswerCacheKey,
+    CachedAnswer,
+    answer_cache,
+    semantic_answer_cache,
+)
+from backend.services.chat_idempotency import ChatIdempotency
 from backend.services.chat_service import ChatMessageUpdater, SessionManager
+from backend.services.message_write_buffer import (
+    MessageFinalization,
+    message_write_buffer,
+)
+from backend.services.token_quota_service import QuotaReservation, TokenQuotaService
 
 logger = logging.getLogger(__name__)
 
@@ -189,17 +203,19 @@ class ChatNonStreamWorkflow:
         self,
         query_text: str,
         kb_id: uuid.UUID | None,
-    ) -> list[dict]:
+    ) -> tuple[list[dict], list[float] | None]:
         if not self.rag_service or kb_id is None:
-            return []
+            return [], None
         try:
             rag_uow = getattr(self.rag_service, "uow", None)
             if rag_uow is None or getattr(rag_uow, "_session", None) is not None:
-                return await self.rag_service.retrieve(query_text=query_text, kb_id=kb_id)
+                return await self.rag_service.retrieve_with_embedding(
+                    query_text=query_text, kb_id=kb_id
+                )
 
             async with self._get_db_semaphore():
                 async with rag_uow:
-                    return await self.rag_service.retrieve(
+                    return await self.rag_service.retrieve_with_embedding(
                         query_text=query_text,
                         kb_id=kb_id,
                     )
@@ -207,7 +223,7 @@ class ChatNonStreamWorkflow:
             raise
         except Exception as exc:
             logger.warning("RAG 检索失败，降级为普通对话: %s", exc)
-            return []
+            return [], None
 
     @staticmethod
     def _build_search_context(
@@ -231,83 +247,55 @@ class ChatNonStreamWorkflow:
             ],
         }
 
-    @observe()
-    async def handle_query(
+    async def _await_duplicate(
         self,
+        idempotency: ChatIdempotency,
         user_id: uuid.UUID,
-        query_text: str,
-        session_id: uuid.UUID | None = None,
-        kb_id: uuid.UUID | None = None,
-        client_request_id: str | None = None,
+        client_request_id: str,
     ) -> ChatQueryResponse:
-        get_client().update_current_trace(
-            user_id=str(user_id),
-            session_id=str(session_id) if session_id else None,
-            tags=["chat_api", "non-stream"],
-        )
+        """重复请求：等待在途请求的结果而不是直接拒绝，完成后直接返回缓存的响应。"""
         logger.info(
-            "Workflow 收到查询: user_id=%s, session_id=%s, query_len=%d",
-            user_id,
-            session_id,
-            len(query_text),
+            "重复的非流式请求挂靠在途结果: client_request_id=%s", client_request_id
         )
-
-        redis = None
-        lock_key: str | None = None
-
-        if client_request_id:
-            redis = await redis_client.init()
-            lock_key = f"idempotency:chat:{user_id}:{client_request_id}"
-            is_new = await redis.set(lock_key, "PROCESSING", nx=True, ex=300)
-            if not is_new:
-                val = await redis.get(lock_key)
-                if val == "PROCESSING":
-                    raise ServiceError(
-                        "正在加速计算中...",
-                        details={"client_request_id": client_request_id},
-                    )
-                async with self.uow:
-                    msg = await self.uow.chat_repo.get_message_by_client_request_id(
-                        client_request_id,
-                        user_id,
-                    )
-                    if msg and msg.status == MessageStatus.SUCCESS:
-                        session = await self.uow.chat_repo.get_session(msg.session_id)
-                        if session is None:
-                            raise ServiceError("会话不存在")
-                        return ChatQueryResponse(
-                            session_id=session.id,
-                            session_title=session.title,
-                            answer=MessageResponse.model_validate(msg),
-                        )
-
-        async with self._get_db_semaphore():
-            async with self.uow:
-                user = await self.uow.user_repo.get(user_id)
-                if user and user.used_tokens >= user.max_tokens:
-                    if redis is not None and lock_key is not None:
-                        await redis.delete(lock_key)
-                    raise ValidationError(
-                        "Token 余额不足",
-                        details={"used": user.used_tokens, "max": user.max_tokens},
-                    )
-
-                session_manager = SessionManager(self.uow)
-                session = await session_manager.ensure_session(
-                    user_id=user_id,
-                    query_text=query_text,
-                    session_id=session_id,
-                    kb_id=kb_id,
-                )
-                await session_manager.create_user_message(
-                    session_id=session.id,
-                    content=query_text,
-                )
-                assistant_msg = await session_manager.create_assistant_message(
+        result = await idempotency.wait_result(
+            settings.CHAT_IDEMPOTENCY_WAIT_TIMEOUT_SECONDS
+        )
+        if result is not None:
+            return result
+
+        # 结果缓存已过期（或旧版本只写了锁）时回退到 DB
+        async with self.uow:
+            msg = await self.uow.chat_repo.get_message_by_client_request_id(
+                client_request_id,
+                user_id,
+            )
+            if msg and msg.status == MessageStatus.SUCCESS:
+                session = await self.uow.chat_repo.get_session(msg.session_id)
+                if session is None:
+                    raise ServiceError("会话不存在")
+                return ChatQueryResponse(
                     session_id=session.id,
-                    client_request_id=client_request_id,
+                    session_title=session.title,
+                    answer=MessageResponse.model_validate(msg),
                 )
+        raise ServiceError(
+            "原请求处理失败，请重试",
+            details={"client_request_id": client_request_id},
+        )
+
+    async def _generate_answer(
+        self,
+        session: ChatSession,
+        assistant_msg: ChatMessage,
+        query_text: str,
+        kb_id: uuid.UUID | None,
+        cache_key: AnswerCacheKey | None = None,
+    ) -> tuple[str, dict | None, int, int]:
+        """检索 + 组装 Prompt + 调用 LLM；失败时把助手消息标记为 FAILED 后抛出。
 
+        返回 (回答内容, 检索上下文, 输入 Token, 输出 Token)。
+        带 cache_key 时先用检索算出的查询向量查语义缓存，命中则跳过 LLM。
+        """
         async with self._get_db_semaphore():
             async with self.uow:
                 session_manager = SessionManager(self.uow)
@@ -321,14 +309,21 @@ class ChatNonStreamWorkflow:
             history_dicts,
             query_text,
         )
-        rag_chunks = await self._retrieve_rag_chunks(query_text=query_text, kb_id=kb_id)
-        search_context = self._build_search_context(kb_id=kb_id, rag_chunks=rag_chunks)
-        if rag_chunks:
+        rag_chunks, query_embedding = await self._retrieve_rag_chunks(
+            query_text=query_text, kb_id=kb_id
+        )
+        if cache_key is not None and query_embedding is not None:
+            cached = semantic_answer_cache.get(cache_key, query_embedding)
+            if cached is not None:
+                return cached.content, cached.search_context, 0, 0
+        packed = pack_context_chunks(rag_chunks)
+        search_context = self._build_search_context(kb_id=kb_id, rag_chunks=packed.sources)
+        if packed.contents:
             assembled = self.rag_prompt_manager.assemble(
                 memory_history,
                 query_text,
                 extra_vars={
-                    "context_chunks": [chunk["content"] for chunk in rag_chunks],
+                    "context_chunks": packed.contents,
                     "conversation_summary": memory_summary,
                 },
             )
@@ -350,16 +345,12 @@ class ChatNonStreamWorkflow:
             async with self._get_llm_semaphore():
                 result = await self.llm_service.generate_response(llm_query)
         except AppError:
-            if redis is not None and lock_key is not None:
-                await redis.delete(lock_key)
             async with self._get_db_semaphore():
                 async with self.uow:
                     updater = ChatMessageUpdater(self.uow)
                     await updater.update_as_failed(assistant_msg.id)
             raise
         except Exception as exc:
-            if redis is not None and lock_key is not None:
-                await redis.delete(lock_key)
             async with self._get_db_semaphore():
                 async with self.uow:
                     updater = ChatMessageUpdater(self.uow)
@@ -367,8 +358,6 @@ class ChatNonStreamWorkflow:
             raise ServiceError("LLM 服务调用失败，请稍后重试") from exc
 
         if not result.success:
-            if redis is not None and lock_key is not None:
-                await redis.delete(lock_key)
             async with self._get_db_semaphore():
                 async with self.uow:
                     updater = ChatMessageUpdater(self.uow)
@@ -380,27 +369,174 @@ class ChatNonStreamWorkflow:
                 "LLM 服务返回失败",
                 details={"error": result.error_message},
             )
+        if cache_key is not None and query_embedding is not None:
+            semantic_answer_cache.put(
+                cache_key,
+                query_embedding,
+                CachedAnswer(result.content, search_context),
+            )
+        return (
+            result.content,
+            search_context,
+            tokens_input,
+            result.completion_tokens or 0,
+        )
+
+    async def _finalize_answer(
+        self,
+        *,
+        assistant_msg: ChatMessage,
+        content: str,
+        tokens_input: int,
+        tokens_output: int,
+        search_context: dict | None,
+        quota_service: TokenQuotaService,
+        reservation: QuotaReservation,
+    ) -> MessageResponse:
+        """助手消息落终态并结算额度，返回响应中的回答"""
+        if message_write_buffer.running:
+            # 写缓冲：终态与额度增量由后台批量落库，本轮不再开事务
+            await message_write_buffer.submit(
+                MessageFinalization(
+                    message_id=assistant_msg.id,
+                    content=content,
+                    tokens_input=tokens_input,
+                    tokens_output=tokens_output,
+                    search_context=search_context,
+                    user_id=reservation.user_id,
+                )
+            )
+            await quota_service.commit_buffered(
+                reservation, tokens_input + tokens_output
+            )
+            return MessageResponse(
+                id=assistant_msg.id,
+                session_id=assistant_msg.session_id,
+                role=assistant_msg.role,
+                content=content,
+                status=MessageStatus.SUCCESS,
+                search_context=search_context,
+                created_at=assistant_msg.created_at,
+                updated_at=datetime.now(UTC),
+            )
 
         async with self._get_db_semaphore():
             async with self.uow:
                 updater = ChatMessageUpdater(self.uow)
                 updated_msg = await updater.update_as_success(
                     message_id=assistant_msg.id,
-                    content=result.content,
+                    content=content,
                     tokens_input=tokens_input,
-                    tokens_output=result.completion_tokens,
+                    tokens_output=tokens_output,
                     search_context=search_context,
                 )
-                await self.uow.user_repo.increment_used_tokens(
-                    user_id,
-                    tokens_input + (result.completion_tokens or 0),
+                await quota_service.commit(reservation, tokens_input + tokens_output)
+        return MessageResponse.model_validate(updated_msg)
+
+    @observe()
+    async def handle_query(
+        self,
+        user_id: uuid.UUID,
+        query_text: str,
+        session_id: uuid.UUID | None = None,
+        kb_id: uuid.UUID | None = None,
+        client_request_id: str | None = None,
+    ) -> ChatQueryResponse:
+        get_client().update_current_trace(
+            user_id=str(user_id),
+            session_id=str(session_id) if session_id else None,
+            tags=["chat_api", "non-stream"],
+        )
+        logger.info(
+            "Workflow 收到查询: user_id=%s, session_id=%s, query_len=%d",
+            user_id,
+            session_id,
+            len(query_text),
+        )
+
+        idempotency: ChatIdempotency | None = None
+        if client_request_id:
+            idempotency = ChatIdempotency(
+                await redis_client.init(), user_id, client_request_id
+            )
+            if not await idempotency.acquire():
+                return await self._await_duplicate(
+                    idempotency, user_id, client_request_id
                 )
 
-        if redis is not None and lock_key is not None:
-            await redis.set(lock_key, str(updated_msg.id), ex=3600)
+        quota_service = TokenQuotaService(self.uow)
+        reservation: QuotaReservation | None = None
+        try:
+            async with self._get_db_semaphore():
+                async with self.uow:
+                    # 预占额度（Redis 原子账本），结算时按实际消耗多退少补
+                    reservation = await quota_service.reserve(
+                        user_id,
+                        quota_service.estimate_turn_tokens(query_text),
+                    )
 
-        return ChatQueryResponse(
-            session_id=session.id,
-            session_title=session.title,
-            answer=MessageResponse.model_validate(updated_msg),
-        )
+                    session_manager = SessionManager(self.uow)
+                    session = await session_manager.ensure_session(
+                        user_id=user_id,
+                        query_text=query_text,
+                        session_id=session_id,
+                        kb_id=kb_id,
+                    )
+                    await session_manager.create_user_message(
+                        session_id=session.id,
+                        content=query_text,
+                    )
+                    assistant_msg = await session_manager.create_assistant_message(
+                        session_id=session.id,
+                        client_request_id=client_request_id,
+                    )
+                    cache_key = await answer_cache.resolve_key(
+                        self.uow,
+                        query_text=query_text,
+                        kb_id=kb_id,
+                        session_id=session_id,
+                        template=template_fingerprint(
+                            self.rag_prompt_manager.system_template
+                        ),
+                    )
+
+            cached = answer_cache.get(cache_key) if cache_key is not None else None
+            if cached is not None:
+                # 命中答案缓存：跳过检索与 LLM 生成，本轮不消耗 Token
+                content, search_context = cached.content, cached.search_context
+                tokens_input = tokens_output = 0
+            else:
+                (
+                    content,
+                    search_context,
+                    tokens_input,
+                    tokens_output,
+                ) = await self._generate_answer(
+                    session, assistant_msg, query_text, kb_id, cache_key
+                )
+                if cache_key is not None:
+                    answer_cache.put(cache_key, CachedAnswer(content, search_context))
+
+            response = ChatQueryResponse(
+                session_id=session.id,
+                session_title=session.title,
+                answer=await self._finalize_answer(
+                    assistant_msg=assistant_msg,
+                    content=content,
+                    tokens_input=tokens_input,
+                    tokens_output=tokens_output,
+                    search_context=search_context,
+                    quota_service=quota_service,
+                    reservation=reservation,
+                ),
+            )
+            if idempotency is not None:
+                # 缓存序列化结果：之后的重复请求直接返回，不再触达 DB
+                await idempotency.complete(response)
+            return response
+        finally:
+            # 未结算（异常 / LLM 失败）的预占统一退还；已结算时为空操作
+            await quota_service.refund(reservation)
+            # 未成功完成时释放幂等锁并通知等待者；已完成时为空操作
+            if idempotency is not None:
+                await idempotency.fail()
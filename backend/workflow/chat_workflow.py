@@ -13,22 +13,42 @@ import json
 import logging
 import uuid
 from collections.abc import AsyncGenerator
+from contextlib import aclosing
+from datetime import UTC, datetime
 
 from langfuse import get_client, observe
 
-from backend.ai.core import PromptManager
+from backend.ai.core import PromptManager, template_fingerprint
 from backend.ai.core.chat_context_builder import ChatContextBuilder
 from backend.ai.core.token_counter import count_tokens
 from backend.core.config import settings
-from backend.core.exceptions import AppError, ServiceError
+from backend.core.exceptions import AppError, ServiceError, ValidationError
 from backend.core.redis import redis_client
 from backend.domain.interfaces import (
     AbstractLLMService,
     AbstractRAGService,
     AbstractUnitOfWork,
 )
-from backend.models.schemas.chat_schema import LLMQueryDTO
+from backend.models.orm.chat import ChatMessage, ChatSession, MessageStatus
+from backend.models.schemas.chat_schema import (
+    ChatQueryResponse,
+    LLMQueryDTO,
+    MessageResponse,
+)
+from backend.services.answer_cache import (
+    CachedAnswer,
+    answer_cache,
+    replay_chunks,
+    semantic_answer_cache,
+)
+from backend.services.chat_idempotency import ChatIdempotency
 from backend.services.chat_service import ChatMessageUpdater, SessionManager
+from backend.services.message_write_buffer import (
+    MessageFinalization,
+    message_write_buffer,
+)
+from backend.services.stream_checkpoint import StreamCheckpointer
+from backend.services.token_quota_service import QuotaReservation, TokenQuotaService
 from backend.tasks.llm_tasks import generate_llm_stream_task
 
 logger = logging.getLogger(__name__)
@@ -58,14 +78,23 @@ class ChatWorkflow:
         prompt_manager: PromptManager | None = None,
         rag_service: AbstractRAGService | None = None,
         chat_context_builder: ChatContextBuilder | None = None,
+        checkpoint_uow: AbstractUnitOfWork | None = None,
     ):
         self.uow = uow
+        # 流式检查点在后台任务中写入，必须使用独立 UoW，不与请求主流程共享会话
+        self.checkpoint_uow = checkpoint_uow
         self.llm_service = llm_service
         self.chat_context_builder = chat_context_builder or ChatContextBuilder(
             prompt_manager=prompt_manager,
             rag_service=rag_service,
         )
 
+    async def _write_checkpoint(self, message_id: uuid.UUID, content: str) -> None:
+        async with self._get_db_semaphore():
+            async with self.checkpoint_uow:
+                updater = ChatMessageUpdater(self.checkpoint_uow)
+                await updater.update_as_streaming(message_id, content)
+
     @observe()
     async def handle_query_stream(
         self,
@@ -91,69 +120,54 @@ class ChatWorkflow:
             len(query_text),
         )
 
-        redis = None
-        lock_key: str | None = None
-
-        # 0. 幂等校验
+        idempotency: ChatIdempotency | None = None
+        # 0. 幂等校验：重复请求挂靠到在途请求的事件流，而不是直接拒绝
         if client_request_id:
-            redis = await redis_client.init()
-            lock_key = f"idempotency:chat:{user_id}:{client_request_id}"
-            is_new = await redis.set(lock_key, "PROCESSING", nx=True, ex=300)
-            if not is_new:
-                val = await redis.get(lock_key)
-                if val == "PROCESSING":
-                    yield f"data: {json.dumps({'type': 'error', 'message': '正在加速计算中...'})}\n\n"
-                    return
-                else:
-                    yield f"data: {json.dumps({'type': 'error', 'message': '该请求已完成，请刷新页面'})}\n\n"
-                    return
+            idempotency = ChatIdempotency(
+                await redis_client.init(), user_id, client_request_id
+            )
+            if not await idempotency.acquire():
+                async for event in self._follow_duplicate(idempotency):
+                    yield event
+                return
 
-        # 1. 确认或创建会话 + 保存用户消息 + 创建助手消息占位
-        async with self._get_db_semaphore():
-            async with self.uow:
-                # 校验 Token 余额
-                user = await self.uow.user_repo.get(user_id)
-                if user and user.used_tokens >= user.max_tokens:
-                    if redis is not None and lock_key is not None:
-                        await redis.delete(lock_key)
-                    yield f"data: {json.dumps({'type': 'error', 'message': 'Token 余额不足'})}\n\n"
-                    return
-
-                session_manager = SessionManager(self.uow)
-                session = await session_manager.ensure_session(
+        try:
+            async with aclosing(
+                self._stream_turn(
                     user_id=user_id,
                     query_text=query_text,
                     session_id=session_id,
                     kb_id=kb_id,
-                )
-                await session_manager.create_user_message(
-                    session_id=session.id,
-                    content=query_text,
-                )
-                assistant_msg = await session_manager.create_assistant_message(
-                    session_id=session.id,
                     client_request_id=client_request_id,
+                    idempotency=idempotency,
                 )
+            ) as events:
+                async for event in events:
+                    if idempotency is not None:
+                        await idempotency.append_event(event)
+                    yield event
+        finally:
+            # 未成功完成（异常 / 额度不足 / 客户端断开）时释放幂等锁；已完成时为空操作
+            if idempotency is not None:
+                await idempotency.fail()
 
-        # 2. 查询历史消息并组装 Prompt
-        async with self._get_db_semaphore():
-            async with self.uow:
-                session_manager = SessionManager(self.uow)
-                history_messages = await session_manager.get_session_messages(
-                    session_id=session.id,
-                    limit=settings.CHAT_MEMORY_FETCH_LIMIT,
-                )
-
-        prepared_context = await self.chat_context_builder.build(
-            history_messages=history_messages,
-            current_query=query_text,
-            kb_id=kb_id,
+    async def _follow_duplicate(
+        self, idempotency: ChatIdempotency
+    ) -> AsyncGenerator[str, None]:
+        logger.info(
+            "重复的流式请求挂靠在途结果: client_request_id=%s",
+            idempotency.client_request_id,
         )
-        assembled = prepared_context.assembled_prompt
-        search_context = prepared_context.search_context
-        tokens_input = assembled.total_tokens
+        try:
+            async for event in idempotency.follow_events(
+                settings.CHAT_IDEMPOTENCY_WAIT_TIMEOUT_SECONDS
+            ):
+                yield event
+        except AppError as exc:
+            yield f"data: {json.dumps({'type': 'error', 'message': str(exc)})}\n\n"
 
-        # 3. 发送 meta 事件
+    @staticmethod
+    def _meta_event(session: ChatSession, assistant_msg: ChatMessage) -> str:
         meta_event = json.dumps(
             {
                 "type": "meta",
@@ -162,163 +176,373 @@ class ChatWorkflow:
                 "message_id": str(assistant_msg.id),
             }
         )
-        yield f"data: {meta_event}\n\n"
+        return f"data: {meta_event}\n\n"
 
-        # 4. 改为 Taskiq 异步队列排队与 Redis Pub/Sub 接收流
+    async def _finalize_turn(
+        self,
+        *,
+        session: ChatSession,
+        assistant_msg: ChatMessage,
+        content: str,
+        tokens_input: int,
+        tokens_output: int,
+        search_context: dict | None,
+        quota_service: TokenQuotaService,
+        reservation: QuotaReservation | None,
+        idempotency: ChatIdempotency | None,
+    ) -> None:
+        """助手消息落终态、结算额度，并缓存幂等结果"""
+        if message_write_buffer.running:
+            # 写缓冲：终态进溢出日志后即返回，由后台批量落库
+            await message_write_buffer.submit(
+                MessageFinalization(
+                    message_id=assistant_msg.id,
+                    content=content,
+                    tokens_input=tokens_input,
+                    tokens_output=tokens_output,
+                    search_context=search_context,
+                    user_id=reservation.user_id,
+                )
+            )
+            # 额度增量随终态由写缓冲批量插入，这里只结算 Redis，不再开事务
+            await quota_service.commit_buffered(
+                reservation, tokens_input + tokens_output
+            )
+        else:
+            async with self._get_db_semaphore():
+                async with self.uow:
+                    updater = ChatMessageUpdater(self.uow)
+                    await updater.update_as_success(
+                        message_id=assistant_msg.id,
+                        content=content,
+                        tokens_input=tokens_input,
+                        tokens_output=tokens_output,
+                        search_context=search_context,
+                    )
+                    await quota_service.commit(
+                        reservation, tokens_input + tokens_output
+                    )
+
+        if idempotency is not None:
+            # 缓存结果：之后的重复请求直接回放，不再触达 DB
+            await idempotency.complete(
+                ChatQueryResponse(
+                    session_id=session.id,
+                    session_title=session.title,
+                    answer=MessageResponse(
+                        id=assistant_msg.id,
+                        session_id=session.id,
+                        role=assistant_msg.role,
+                        content=content,
+                        status=MessageStatus.SUCCESS,
+                        search_context=search_context,
+                        created_at=assistant_msg.created_at,
+                        updated_at=datetime.now(UTC),
+                    ),
+                )
+            )
 
-        llm_query = LLMQueryDTO(
-            session_id=session.id,
-            query_text=query_text,
-            conversation_history=assembled.messages,
+    async def _replay_cached(
+        self,
+        cached: CachedAnswer,
+        *,
+        session: ChatSession,
+        assistant_msg: ChatMessage,
+        quota_service: TokenQuotaService,
+        reservation: QuotaReservation | None,
+        idempotency: ChatIdempotency | None,
+    ) -> AsyncGenerator[str, None]:
+        """缓存命中：按分片模拟流式回放并落终态，本轮不消耗 Token"""
+        yield self._meta_event(session, assistant_msg)
+        for piece in replay_chunks(cached.content):
+            yield f"data: {json.dumps({'type': 'chunk', 'content': piece})}\n\n"
+        await self._finalize_turn(
+            session=session,
+            assistant_msg=assistant_msg,
+            content=cached.content,
+            tokens_input=0,
+            tokens_output=0,
+            search_context=cached.search_context,
+            quota_service=quota_service,
+            reservation=reservation,
+            idempotency=idempotency,
         )
+        yield "data: [DONE]\n\n"
 
-        task_id = str(uuid.uuid4())
-        channel = f"stream:{task_id}"
-
-        pubsub = None
+    async def _stream_turn(
+        self,
+        user_id: uuid.UUID,
+        query_text: str,
+        session_id: uuid.UUID | None,
+        kb_id: uuid.UUID | None,
+        client_request_id: str | None,
+        idempotency: ChatIdempotency | None,
+    ) -> AsyncGenerator[str, None]:
+        quota_service = TokenQuotaService(self.uow)
+        reservation: QuotaReservation | None = None
         try:
-            # 先订阅后投递，避免 worker 首包发布过快导致丢消息
-            pubsub = (await redis_client.init()).pubsub()
-            await pubsub.subscribe(channel)
-            await generate_llm_stream_task.kiq(llm_query.model_dump(mode="json"), channel)
-        except AppError as exc:
-            if redis is not None and lock_key is not None:
-                await redis.delete(lock_key)
-            logger.warning("流式任务初始化失败: %s", exc)
-            yield f"data: {json.dumps({'type': 'error', 'message': str(exc)})}\n\n"
+            # 1. 确认或创建会话 + 保存用户消息 + 创建助手消息占位
             async with self._get_db_semaphore():
                 async with self.uow:
-                    updater = ChatMessageUpdater(self.uow)
-                    await updater.update_as_failed(assistant_msg.id)
-            yield "data: [DONE]\n\n"
-            return
-        except Exception as exc:
-            if redis is not None and lock_key is not None:
-                await redis.delete(lock_key)
-            logger.error("流式任务初始化异常: %s", str(exc), exc_info=True)
-            yield f"data: {json.dumps({'type': 'error', 'message': '服务暂时不可用，请稍后重试'})}\n\n"
+                    # 预占 Token 额度（Redis 原子账本），结算时按实际消耗多退少补
+                    try:
+                        reservation = await quota_service.reserve(
+                            user_id,
+                            quota_service.estimate_turn_tokens(query_text),
+                        )
+                    except ValidationError:
+                        yield f"data: {json.dumps({'type': 'error', 'message': 'Token 余额不足'})}\n\n"
+                        return
+
+                    session_manager = SessionManager(self.uow)
+                    session = await session_manager.ensure_session(
+                        user_id=user_id,
+                        query_text=query_text,
+                        session_id=session_id,
+                        kb_id=kb_id,
+                    )
+                    await session_manager.create_user_message(
+                        session_id=session.id,
+                        content=query_text,
+                    )
+                    assistant_msg = await session_manager.create_assistant_message(
+                        session_id=session.id,
+                        client_request_id=client_request_id,
+                    )
+                    cache_key = await answer_cache.resolve_key(
+                        self.uow,
+                        query_text=query_text,
+                        kb_id=kb_id,
+                        session_id=session_id,
+                        template=template_fingerprint(
+                            self.chat_context_builder.rag_prompt_manager.system_template
+                        ),
+                    )
+
+            cached = answer_cache.get(cache_key) if cache_key is not None else None
+            if cached is not None:
+                # 命中答案缓存：跳过检索与 LLM 生成
+                async for event in self._replay_cached(
+                    cached,
+                    session=session,
+                    assistant_msg=assistant_msg,
+                    quota_service=quota_service,
+                    reservation=reservation,
+                    idempotency=idempotency,
+                ):
+                    yield event
+                return
+
+            # 2. 查询历史消息并组装 Prompt
             async with self._get_db_semaphore():
                 async with self.uow:
-                    updater = ChatMessageUpdater(self.uow)
-                    await updater.update_as_failed(assistant_msg.id)
-            yield "data: [DONE]\n\n"
-            return
+                    session_manager = SessionManager(self.uow)
+                    history_messages = await session_manager.get_session_messages(
+                        session_id=session.id,
+                        limit=settings.CHAT_MEMORY_FETCH_LIMIT,
+                    )
+
+            prepared_context = await self.chat_context_builder.build(
+                history_messages=history_messages,
+                current_query=query_text,
+                kb_id=kb_id,
+            )
+            assembled = prepared_context.assembled_prompt
+            search_context = prepared_context.search_context
+            tokens_input = assembled.total_tokens
+
+            query_embedding = prepared_context.query_embedding
+            if cache_key is not None and query_embedding is not None:
+                # 语义缓存：复用检索已算出的查询向量找近似问题，命中则跳过 LLM
+                cached = semantic_answer_cache.get(cache_key, query_embedding)
+                if cached is not None:
+                    answer_cache.put(cache_key, cached)
+                    async for event in self._replay_cached(
+                        cached,
+                        session=session,
+                        assistant_msg=assistant_msg,
+                        quota_service=quota_service,
+                        reservation=reservation,
+                        idempotency=idempotency,
+                    ):
+                        yield event
+                    return
 
-        accumulated_content = []
-        done_received = False
-        stream_iter = pubsub.listen()
+            # 3. 发送 meta 事件
+            yield self._meta_event(session, assistant_msg)
+
+            # 4. 改为 Taskiq 异步队列排队与 Redis Pub/Sub 接收流
+
+            llm_query = LLMQueryDTO(
+                session_id=session.id,
+                query_text=query_text,
+                conversation_history=assembled.messages,
+            )
+
+            task_id = str(uuid.uuid4())
+            channel = f"stream:{task_id}"
+
+            pubsub = None
+            try:
+                # 先订阅后投递，避免 worker 首包发布过快导致丢消息
+                pubsub = (await redis_client.init()).pubsub()
+                await pubsub.subscribe(channel)
+                await generate_llm_stream_task.kiq(llm_query.model_dump(mode="json"), channel)
+            except AppError as exc:
+                logger.warning("流式任务初始化失败: %s", exc)
+                yield f"data: {json.dumps({'type': 'error', 'message': str(exc)})}\n\n"
+                async with self._get_db_semaphore():
+                    async with self.uow:
+                        updater = ChatMessageUpdater(self.uow)
+                        await updater.update_as_failed(assistant_msg.id)
+                yield "data: [DONE]\n\n"
+                return
+            except Exception as exc:
+                logger.error("流式任务初始化异常: %s", str(exc), exc_info=True)
+                yield f"data: {json.dumps({'type': 'error', 'message': '服务暂时不可用，请稍后重试'})}\n\n"
+                async with self._get_db_semaphore():
+                    async with self.uow:
+                        updater = ChatMessageUpdater(self.uow)
+                        await updater.update_as_failed(assistant_msg.id)
+                yield "data: [DONE]\n\n"
+                return
+
+            accumulated_content = []
+            done_received = False
+            stream_iter = pubsub.listen()
+            checkpointer: StreamCheckpointer | None = None
+            if (
+                settings.CHAT_STREAM_CHECKPOINT_ENABLED
+                and self.checkpoint_uow is not None
+            ):
+                checkpointer = StreamCheckpointer(
+                    message_id=assistant_msg.id,
+                    writer=self._write_checkpoint,
+                    every_chunks=settings.CHAT_STREAM_CHECKPOINT_EVERY_CHUNKS,
+                    interval_seconds=settings.CHAT_STREAM_CHECKPOINT_INTERVAL_SECONDS,
+                    close_timeout_seconds=settings.CHAT_STREAM_CHECKPOINT_CLOSE_TIMEOUT_SECONDS,
+                )
 
-        def _read_stream_payload(message: dict) -> str | None:
-            if message.get("type") != "message":
+            def _read_stream_payload(message: dict) -> str | None:
+                if message.get("type") != "message":
+                    return None
+                data = message.get("data")
+                if isinstance(data, bytes):
+                    return data.decode("utf-8")
+                if isinstance(data, str):
+                    return data
                 return None
-            data = message.get("data")
-            if isinstance(data, bytes):
-                return data.decode("utf-8")
-            if isinstance(data, str):
-                return data
-            return None
 
-        try:
-            loop = asyncio.get_running_loop()
-            deadline = loop.time() + settings.CHAT_STREAM_FIRST_MESSAGE_TIMEOUT_SECONDS
-            while True:
-                remaining = deadline - loop.time()
-                if remaining <= 0:
-                    raise ServiceError("LLM 响应超时，请稍后重试")
-                try:
-                    first_message = await asyncio.wait_for(anext(stream_iter), timeout=remaining)
-                except TimeoutError as exc:
-                    raise ServiceError("LLM 响应超时，请稍后重试") from exc
-                except StopAsyncIteration as exc:
-                    raise ServiceError("LLM 流式通道异常结束") from exc
-
-                first_payload = _read_stream_payload(first_message)
-                if first_payload is None:
-                    continue
-                if first_payload == "[DONE]":
-                    done_received = True
-                elif first_payload.startswith("[ERROR]"):
-                    raise ServiceError(f"Taskiq 队列执行 LLM 错误: {first_payload[7:]}")
-                else:
-                    accumulated_content.append(first_payload)
-                    first_chunk = json.dumps({"type": "chunk", "content": first_payload})
-                    yield f"data: {first_chunk}\n\n"
-                break
-
-            if not done_received:
-                async for message in stream_iter:
-                    payload = _read_stream_payload(message)
-                    if payload is None:
+            try:
+                loop = asyncio.get_running_loop()
+                deadline = loop.time() + settings.CHAT_STREAM_FIRST_MESSAGE_TIMEOUT_SECONDS
+                while True:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        raise ServiceError("LLM 响应超时，请稍后重试")
+                    try:
+                        first_message = await asyncio.wait_for(anext(stream_iter), timeout=remaining)
+                    except TimeoutError as exc:
+                        raise ServiceError("LLM 响应超时，请稍后重试") from exc
+                    except StopAsyncIteration as exc:
+                        raise ServiceError("LLM 流式通道异常结束") from exc
+
+                    first_payload = _read_stream_payload(first_message)
+                    if first_payload is None:
                         continue
-                    if payload == "[DONE]":
+                    if first_payload == "[DONE]":
                         done_received = True
-                        break
-                    if payload.startswith("[ERROR]"):
-                        raise ServiceError(f"Taskiq 队列执行 LLM 错误: {payload[7:]}")
-                    accumulated_content.append(payload)
-                    chunk_event = json.dumps({"type": "chunk", "content": payload})
-                    yield f"data: {chunk_event}\n\n"
-
-            if not done_received:
-                raise ServiceError("LLM 流式响应中断，请稍后重试")
-        except AppError as exc:
-            if redis is not None and lock_key is not None:
-                await redis.delete(lock_key)
-            logger.warning("流式 LLM 调用业务异常: %s", exc)
-            yield f"data: {json.dumps({'type': 'error', 'message': str(exc)})}\n\n"
-            async with self._get_db_semaphore():
-                async with self.uow:
-                    updater = ChatMessageUpdater(self.uow)
-                    await updater.update_as_failed(assistant_msg.id)
-            yield "data: [DONE]\n\n"
-            return
-        except Exception as exc:
-            if redis is not None and lock_key is not None:
-                await redis.delete(lock_key)
-            logger.error("流式 LLM 调用异常: %s", str(exc), exc_info=True)
-            yield f"data: {json.dumps({'type': 'error', 'message': '服务暂时不可用，请稍后重试'})}\n\n"
-            async with self._get_db_semaphore():
-                async with self.uow:
-                    updater = ChatMessageUpdater(self.uow)
-                    await updater.update_as_failed(assistant_msg.id)
+                    elif first_payload.startswith("[ERROR]"):
+                        raise ServiceError(f"Taskiq 队列执行 LLM 错误: {first_payload[7:]}")
+                    else:
+                        accumulated_content.append(first_payload)
+                        if checkpointer is not None:
+                            checkpointer.observe(accumulated_content)
+                        first_chunk = json.dumps({"type": "chunk", "content": first_payload})
+                        yield f"data: {first_chunk}\n\n"
+                    break
+
+                if not done_received:
+                    async for message in stream_iter:
+                        payload = _read_stream_payload(message)
+                        if payload is None:
+                            continue
+                        if payload == "[DONE]":
+                            done_received = True
+                            break
+                        if payload.startswith("[ERROR]"):
+                            raise ServiceError(f"Taskiq 队列执行 LLM 错误: {payload[7:]}")
+                        accumulated_content.append(payload)
+                        if checkpointer is not None:
+                            checkpointer.observe(accumulated_content)
+                        chunk_event = json.dumps({"type": "chunk", "content": payload})
+                        yield f"data: {chunk_event}\n\n"
+
+                if not done_received:
+                    raise ServiceError("LLM 流式响应中断，请稍后重试")
+            except AppError as exc:
+                logger.warning("流式 LLM 调用业务异常: %s", exc)
+                yield f"data: {json.dumps({'type': 'error', 'message': str(exc)})}\n\n"
+                if checkpointer is not None:
+                    await checkpointer.aclose()
+                async with self._get_db_semaphore():
+                    async with self.uow:
+                        updater = ChatMessageUpdater(self.uow)
+                        await updater.update_as_failed(assistant_msg.id)
+                yield "data: [DONE]\n\n"
+                return
+            except Exception as exc:
+                logger.error("流式 LLM 调用异常: %s", str(exc), exc_info=True)
+                yield f"data: {json.dumps({'type': 'error', 'message': '服务暂时不可用，请稍后重试'})}\n\n"
+                if checkpointer is not None:
+                    await checkpointer.aclose()
+                async with self._get_db_semaphore():
+                    async with self.uow:
+                        updater = ChatMessageUpdater(self.uow)
+                        await updater.update_as_failed(assistant_msg.id)
+                yield "data: [DONE]\n\n"
+                return
+            finally:
+                # 终态写入与检查点共用 self.uow，必须先结束在途检查点
+                if checkpointer is not None:
+                    await checkpointer.aclose()
+                if pubsub is not None:
+                    try:
+                        await pubsub.unsubscribe(channel)
+                    except Exception:
+                        logger.debug("Redis 取消订阅失败: channel=%s", channel, exc_info=True)
+
+                    close_coro = getattr(pubsub, "aclose", None)
+                    if close_coro is not None:
+                        await close_coro()
+                    else:
+                        close_fn = getattr(pubsub, "close", None)
+                        if close_fn is not None:
+                            maybe_awaitable = close_fn()
+                            if asyncio.iscoroutine(maybe_awaitable):
+                                await maybe_awaitable
+
+            # 5. 更新助手消息并累加 Token
+            full_content = "".join(accumulated_content)
+            tokens_output = count_tokens(full_content, settings.LLM_MODEL_NAME)
+            await self._finalize_turn(
+                session=session,
+                assistant_msg=assistant_msg,
+                content=full_content,
+                tokens_input=tokens_input,
+                tokens_output=tokens_output,
+                search_context=search_context,
+                quota_service=quota_service,
+                reservation=reservation,
+                idempotency=idempotency,
+            )
+            if cache_key is not None:
+                answer = CachedAnswer(full_content, search_context)
+                answer_cache.put(cache_key, answer)
+                if query_embedding is not None:
+                    semantic_answer_cache.put(cache_key, query_embedding, answer)
+
             yield "data: [DONE]\n\n"
-            return
         finally:
-            if pubsub is not None:
-                try:
-                    await pubsub.unsubscribe(channel)
-                except Exception:
-                    logger.debug("Redis 取消订阅失败: channel=%s", channel, exc_info=True)
-
-                close_coro = getattr(pubsub, "aclose", None)
-                if close_coro is not None:
-                    await close_coro()
-                else:
-                    close_fn = getattr(pubsub, "close", None)
-                    if close_fn is not None:
-                        maybe_awaitable = close_fn()
-                        if asyncio.iscoroutine(maybe_awaitable):
-                            await maybe_awaitable
-
-        # 5. 更新助手消息并累加 Token
-        full_content = "".join(accumulated_content)
-        tokens_output = count_tokens(full_content, settings.LLM_MODEL_NAME)
-
-        async with self._get_db_semaphore():
-            async with self.uow:
-                updater = ChatMessageUpdater(self.uow)
-                await updater.update_as_success(
-                    message_id=assistant_msg.id,
-                    content=full_content,
-                    tokens_input=tokens_input,
-                    tokens_output=tokens_output,
-                    search_context=search_context,
-                )
-                await self.uow.user_repo.increment_used_tokens(
-                    user_id, tokens_input + tokens_output
-                )
-
-        if redis is not None and lock_key is not None:
-            await redis.set(lock_key, str(assistant_msg.id), ex=3600)
-
-        yield "data: [DONE]\n\n"
+            # 未结算（异常 / 客户端断开）的预占统一退还；已结算时为空操作
+            await quota_service.refund(reservation)
@@ -1,20 +1,31 @@
 import asyncio
+import hashlib
+import json
+import threading
 import uuid
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterator
+from functools import partial
 from pathlib import Path
 
-from docling_core.types.doc import DoclingDocument
-
-from backend.core.docling_models import DoclingModelFactory
+from backend.core.config import settings
 from backend.core.exceptions import (
     AppError,
     ResourceNotFound,
     ServiceError,
     ValidationError,
 )
-from backend.models.orm.knowledge import FileStatus
-from backend.services.chunking_service import ChunkingService
+from backend.models.orm.knowledge import File, FileStatus
+from backend.services.chunking_service import ChunkingService, ParsedChunk
+from backend.services.docling_parser import (
+    DoclingParseExecutor,
+    parse_structured_document,
+    record_parse_metrics,
+)
 from backend.services.knowledge_service import KnowledgeService
-from backend.services.vector_index_service import VectorIndexService
+from backend.services.vector_index_service import (
+    ChunkIngestStats,
+    VectorIndexService,
+)
 
 TEXT_FILE_SUFFIXES = {
     ".txt",
@@ -32,6 +43,23 @@ TEXT_FILE_SUFFIXES = {
 
 DOCLING_STRUCTURED_SUFFIXES = {".pdf", ".docx", ".pptx"}
 
+SUPPORTED_FILE_SUFFIXES = TEXT_FILE_SUFFIXES | DOCLING_STRUCTURED_SUFFIXES
+
+# 纯文本按块读取的字符数：内存占用只取决于块大小与切片窗口，与文件大小无关
+_TEXT_READ_BLOCK_CHARS = 64 * 1024
+
+# 解析线程 -> 事件循环 的流结束标记
+_END_OF_STREAM = object()
+
+
+class _ParseFailure:
+    """解析线程中的异常，经队列转交给消费方重新抛出"""
+
+    __slots__ = ("error",)
+
+    def __init__(self, error: Exception):
+        self.error = error
+
 
 class KnowledgeRAGWorkflow:
     def __init__(
@@ -39,16 +67,24 @@ class KnowledgeRAGWorkflow:
         knowledge_service: KnowledgeService,
         chunking_service: ChunkingService,
         vector_index_service: VectorIndexService,
+        docling_executor: DoclingParseExecutor | None = None,
     ):
         self.knowledge_service = knowledge_service
         self.chunking_service = chunking_service
         self.vector_index_service = vector_index_service
+        # 未注入时在当前进程内解析（单测 / 本地调试）
+        self.docling_executor = docling_executor
 
     async def ingest_file(
         self,
         *,
         file_id: uuid.UUID,
-    ) -> None:
+        on_parse_progress: Callable[[int, int], Awaitable[None]] | None = None,
+    ) -> ChunkIngestStats:
+        """
+        解析、切片、向量化并写库；同内容文件已按相同配置入库时直接在库内复制其切片。
+        on_parse_progress(已完成页段数, 页段总数)：超大 PDF 按页段并行解析时逐段回调。
+        """
         async with self.knowledge_service.uow:
             file_obj = await self.knowledge_service.set_file_status(
                 file_id=file_id,
@@ -66,28 +102,26 @@ class KnowledgeRAGWorkflow:
                 )
             raise ResourceNotFound("上传文件在存储路径中不存在")
 
+        fingerprint = self._ingest_fingerprint()
+        chunk_stream = self._stream_chunks(file_path, on_progress=on_parse_progress)
         try:
-            chunks = await asyncio.to_thread(self._extract_chunks, file_path)
-            if not chunks:
-                raise ValidationError("文件无可用文本内容，无法构建 RAG 索引")
-
-            async with self.knowledge_service.uow:
-                await self.knowledge_service.set_file_status(
-                    file_id=file_id,
-                    status=FileStatus.CHUNKING,
-                )
-            async with self.vector_index_service.uow:
-                await self.vector_index_service.replace_file_chunks(
-                    file_id=file_id,
-                    chunks=chunks,
-                    filename=file_obj.filename,
-                    file_path=str(file_path),
+            stats = await self._clone_duplicate_chunks(
+                file_obj, file_path=file_path, fingerprint=fingerprint
+            )
+            if stats is None:
+                stats = await self._parse_and_index(
+                    file_obj,
+                    file_path=file_path,
+                    chunk_stream=chunk_stream,
+                    fingerprint=fingerprint,
                 )
             async with self.knowledge_service.uow:
                 await self.knowledge_service.set_file_status(
                     file_id=file_id,
                     status=FileStatus.READY,
+                    ingest_fingerprint=fingerprint,
                 )
+            return stats
         except AppError:
             async with self.knowledge_service.uow:
                 await self.knowledge_service.set_file_status(
@@ -102,51 +136,168 @@ class KnowledgeRAGWorkflow:
                     status=FileStatus.FAILED,
                 )
             raise ServiceError("知识文件处理失败，请稍后重试") from exc
+        finally:
+            await chunk_stream.aclose()
 
-    def _extract_chunks(self, file_path: Path) -> list[str]:
-        suffix = file_path.suffix.lower()
-        if suffix in TEXT_FILE_SUFFIXES:
-            text = file_path.read_text(encoding="utf-8", errors="ignore")
-            return self.chunking_service.split_text(text)
-        if suffix in DOCLING_STRUCTURED_SUFFIXES:
-            return self._extract_docling_chunks(file_path)
+    def _ingest_fingerprint(self) -> str:
+        """影响切片结果的配置指纹：切片参数、向量模型、PDF 抽取阈值任一变化都不复用旧切片"""
+        config = {
+            "chunk_size": self.chunking_service.chunk_size,
+            "chunk_overlap": self.chunking_service.chunk_overlap,
+            "embed_provider": settings.RAG_EMBED_PROVIDER,
+            "embed_model": settings.RAG_EMBED_MODEL_NAME,
+            "embed_dim": settings.RAG_EMBED_DIM,
+            "pdf_text_layer": [
+                settings.PDF_TEXT_LAYER_ENABLED,
+                settings.PDF_TEXT_LAYER_MIN_CHARS_PER_PAGE,
+                settings.PDF_TEXT_LAYER_MAX_GARBAGE_RATIO,
+                settings.PDF_TEXT_LAYER_MAX_FALLBACK_RATIO,
+            ],
+        }
+        encoded = json.dumps(config, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
 
-        raise ValidationError(
-            f"暂不支持的文件类型: {suffix or '(无扩展名)'}，建议使用 txt/md/pdf/docx"
-        )
+    async def _clone_duplicate_chunks(
+        self, file_obj: File, *, file_path: Path, fingerprint: str
+    ) -> ChunkIngestStats | None:
+        if not file_obj.content_hash:
+            return None
+        async with self.vector_index_service.uow:
+            return await self.vector_index_service.clone_duplicate_file_chunks(
+                file_id=file_obj.id,
+                content_hash=file_obj.content_hash,
+                ingest_fingerprint=fingerprint,
+                filename=file_obj.filename,
+                file_path=str(file_path),
+            )
 
-    def _extract_docling_chunks(self, file_path: Path) -> list[str]:
+    async def _parse_and_index(
+        self,
+        file_obj: File,
+        *,
+        file_path: Path,
+        chunk_stream: AsyncIterator[str | ParsedChunk],
+        fingerprint: str,
+    ) -> ChunkIngestStats:
+        # 解析出第一个切片后即进入 CHUNKING，后续解析 / 向量化 / 写库流水线并行
+        first_chunk = await anext(chunk_stream, None)
+        if first_chunk is None:
+            raise ValidationError("文件无可用文本内容，无法构建 RAG 索引")
+
+        async with self.knowledge_service.uow:
+            await self.knowledge_service.set_file_status(
+                file_id=file_obj.id,
+                status=FileStatus.CHUNKING,
+            )
+        indexed_stream = self._prepend_chunk(first_chunk, chunk_stream)
         try:
-            converter = DoclingModelFactory.get_converter()
-            chunker = DoclingModelFactory.get_hierarchical_chunker()
+            async with self.vector_index_service.uow:
+                return await self.vector_index_service.stream_file_chunks(
+                    file_id=file_obj.id,
+                    chunks=indexed_stream,
+                    filename=file_obj.filename,
+                    file_path=str(file_path),
+                    # 旧切片只有在同一配置指纹下生成时才能按内容哈希复用向量
+                    reuse_existing=file_obj.ingest_fingerprint == fingerprint,
+                )
+        finally:
+            await indexed_stream.aclose()
 
-            result = converter.convert(str(file_path))
-            chunks: list[str] = []
+    @staticmethod
+    async def _prepend_chunk(
+        first_chunk: str | ParsedChunk, rest: AsyncIterator[str | ParsedChunk]
+    ) -> AsyncIterator[str | ParsedChunk]:
+        yield first_chunk
+        async for chunk_text in rest:
+            yield chunk_text
 
-            for chunk in chunker.chunk(dl_doc=result.document):
-                text = chunker.contextualize(chunk).strip()
-                if not text:
-                    continue
+    async def _stream_chunks(
+        self,
+        file_path: Path,
+        *,
+        queue_size: int | None = None,
+        on_progress: Callable[[int, int], Awaitable[None]] | None = None,
+    ) -> AsyncIterator[str | ParsedChunk]:
+        """
+        在工作线程中解析 / 切片，经有界队列逐个交给事件循环。
 
-                # 对超长结构块做二次切分，避免向量块过大
-                if len(text) > self.chunking_service.chunk_size:
-                    chunks.extend(self.chunking_service.split_text(text))
-                else:
-                    chunks.append(text)
+        队列满时解析线程阻塞在 put 上（背压），整篇文档的切片不会一次性驻留内存；
+        消费方提前退出时通知解析线程停止，并排空队列让其尽快结束。
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(
+            maxsize=queue_size or settings.KNOWLEDGE_INGEST_EMBED_BATCH_SIZE
+        )
+        stopped = threading.Event()
 
-            if chunks:
-                return chunks
+        def put(item: object) -> None:
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
 
-            fallback_text = self._export_docling_document(result.document)
-            return self.chunking_service.split_text(fallback_text)
-        except AppError:
-            raise
-        except Exception as exc:
-            raise ValidationError(f"文件解析失败: {file_path.name}") from exc
+        def report(done: int, total: int) -> None:
+            if on_progress is not None:
+                asyncio.run_coroutine_threadsafe(
+                    on_progress(done, total), loop
+                ).result()
 
-    @staticmethod
-    def _export_docling_document(document: DoclingDocument) -> str:
-        markdown = document.export_to_markdown()
-        if markdown:
-            return markdown
-        return document.export_to_text()
+        def produce() -> None:
+            try:
+                for chunk in self._iter_chunks(file_path, on_progress=report):
+                    if stopped.is_set():
+                        return
+                    put(chunk)
+            except Exception as exc:
+                put(_ParseFailure(exc))
+            else:
+                put(_END_OF_STREAM)
+
+        producer = asyncio.create_task(asyncio.to_thread(produce))
+        try:
+            while True:
+                item = await queue.get()
+                if item is _END_OF_STREAM:
+                    return
+                if isinstance(item, _ParseFailure):
+                    raise item.error
+                yield item
+        finally:
+            stopped.set()
+            while not producer.done():
+                while not queue.empty():
+                    queue.get_nowait()
+                await asyncio.wait({producer}, timeout=0.05)
+
+    def _extract_chunks(self, file_path: Path) -> list[str | ParsedChunk]:
+        return list(self._iter_chunks(file_path))
+
+    def _iter_chunks(
+        self,
+        file_path: Path,
+        on_progress: Callable[[int, int], None] | None = None,
+    ) -> Iterator[str | ParsedChunk]:
+        """
+        纯文本按块流式读取、增量切分，逐段产出 str；
+        结构化文档产出带抽取层级元数据的 ParsedChunk（解析结果按整篇 / 页段整体返回）
+        """
+        suffix = file_path.suffix.lower()
+        if suffix in TEXT_FILE_SUFFIXES:
+            with file_path.open(encoding="utf-8", errors="ignore") as fh:
+                blocks = iter(partial(fh.read, _TEXT_READ_BLOCK_CHARS), "")
+                yield from self.chunking_service.iter_split_stream(blocks)
+            return
+        if suffix in DOCLING_STRUCTURED_SUFFIXES:
+            if self.docling_executor is None:
+                document = parse_structured_document(file_path, self.chunking_service)
+                record_parse_metrics(document)
+            else:
+                document = self.docling_executor.parse(
+                    file_path,
+                    chunk_size=self.chunking_service.chunk_size,
+                    chunk_overlap=self.chunking_service.chunk_overlap,
+                    on_progress=on_progress,
+                )
+            yield from document.chunks
+            return
+
+        raise ValidationError(
+            f"暂不支持的文件类型: {suffix or '(无扩展名)'}，建议使用 txt/md/pdf/docx"
+        )
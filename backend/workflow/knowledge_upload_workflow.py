@@ -5,10 +5,18 @@ from fastapi import UploadFile
 
 from backend.core.exceptions import AppError, DependencyUnavailable, ServiceError
 from backend.models.orm.knowledge import File, FileStatus
-from backend.models.schemas.knowledge_schema import KnowledgeUploadResponse
+from backend.models.schemas.knowledge_schema import (
+    KnowledgeBatchSkippedFile,
+    KnowledgeBatchUploadResponse,
+    KnowledgeUploadResponse,
+)
 from backend.services.knowledge_service import KnowledgeService
 from backend.services.task_service import TaskService
-from backend.tasks.knowledge_tasks import ingest_knowledge_file_task
+from backend.tasks.knowledge_tasks import (
+    dispatch_knowledge_batch_task,
+    ingest_knowledge_file_task,
+)
+from backend.workflow.knowledge_rag_workflow import SUPPORTED_FILE_SUFFIXES
 
 logger = logging.getLogger(__name__)
 
@@ -43,25 +51,95 @@ class KnowledgeUploadWorkflow:
             file_obj=file_obj,
         )
 
-    async def submit_stream_ingestion(
+    async def submit_batch_ingestion(
         self,
         *,
         kb_id: uuid.UUID,
         user_id: uuid.UUID,
-        upload_file: UploadFile,
-    ) -> KnowledgeUploadResponse:
+        upload_files: list[UploadFile],
+    ) -> KnowledgeBatchUploadResponse:
+        """
+        多文件 / 压缩包上传：文件记录一次批量写入，整批只创建一个父任务，
+        由 worker 端的分发任务按有限并发逐个投递单文件入库。
+        """
+        # 权限校验与建档各用一个短事务，解压落盘在事务外进行，不占用连接池连接
         async with self.knowledge_service.uow:
-            file_obj = await self.knowledge_service.save_upload_file_streaming(
-                kb_id=kb_id,
-                user_id=user_id,
-                upload_file=upload_file,
+            await self.knowledge_service.ensure_kb_access(kb_id=kb_id, user_id=user_id)
+        staged = await self.knowledge_service.stage_upload_batch(
+            upload_files=upload_files,
+            allowed_suffixes=SUPPORTED_FILE_SUFFIXES,
+        )
+        try:
+            async with self.knowledge_service.uow:
+                batch = await self.knowledge_service.record_upload_batch(
+                    kb_id=kb_id, staged=staged
+                )
+        except Exception as exc:
+            self.knowledge_service.discard_staged_batch(staged)
+            if isinstance(exc, AppError):
+                raise
+            raise ServiceError("批量上传保存失败，请稍后重试") from exc
+        file_ids = [file_obj.id for file_obj in batch.files]
+
+        try:
+            async with self.task_service.uow:
+                task = await self.task_service.create_kb_batch_ingestion_task(
+                    kb_id=kb_id,
+                    user_id=user_id,
+                    file_ids=file_ids,
+                    skipped=batch.skipped,
+                )
+        except Exception as exc:
+            await self._mark_batch_files_failed(file_ids)
+            logger.warning(
+                "知识库批量任务创建失败: kb_id=%s, files=%d, error=%s",
+                kb_id,
+                len(file_ids),
+                exc,
             )
-        return await self._create_and_dispatch_ingestion(
-            kb_id=kb_id,
-            user_id=user_id,
-            file_obj=file_obj,
+            if isinstance(exc, AppError):
+                raise
+            raise ServiceError("创建知识处理任务失败，请稍后重试") from exc
+
+        try:
+            await dispatch_knowledge_batch_task.kiq(str(task.id))
+        except Exception as exc:
+            try:
+                async with self.task_service.uow:
+                    await self.task_service.mark_failed(
+                        task_id=task.id,
+                        error_log=f"任务投递失败: {exc}",
+                    )
+            except Exception:
+                logger.exception("任务失败状态更新异常: task_id=%s", task.id)
+            await self._mark_batch_files_failed(file_ids)
+            logger.warning(
+                "知识库批量任务投递失败: kb_id=%s, task_id=%s, error=%s",
+                kb_id,
+                task.id,
+                exc,
+            )
+            if isinstance(exc, AppError):
+                raise
+            raise DependencyUnavailable("任务投递失败，请稍后重试") from exc
+
+        return KnowledgeBatchUploadResponse(
+            task_id=task.id,
+            task_status=task.status,
+            file_ids=file_ids,
+            skipped=[KnowledgeBatchSkippedFile(**item) for item in batch.skipped],
         )
 
+    async def _mark_batch_files_failed(self, file_ids: list[uuid.UUID]) -> None:
+        try:
+            async with self.knowledge_service.uow:
+                await self.knowledge_service.set_files_status(
+                    file_ids=file_ids,
+                    status=FileStatus.FAILED,
+                )
+        except Exception:
+            logger.exception("批量文件失败状态更新异常: files=%d", len(file_ids))
+
     async def _create_and_dispatch_ingestion(
         self,
         *,
@@ -0,0 +1,80 @@
+import logging
+import uuid
+
+from fastapi import UploadFile
+
+from backend.core.exceptions import AppError, DependencyUnavailable, ServiceError
+from backend.models.schemas.user_schema import UserImportSubmitResponse
+from backend.services.task_service import TaskService
+from backend.services.user_import_service import UserImportService
+from backend.tasks.user_tasks import import_users_task
+
+logger = logging.getLogger(__name__)
+
+
+class UserImportWorkflow:
+    """用户批量导入工作流：落盘文件、创建任务并投递后台导入。"""
+
+    def __init__(
+        self,
+        import_service: UserImportService,
+        task_service: TaskService,
+    ):
+        self.import_service = import_service
+        self.task_service = task_service
+
+    async def submit_import(
+        self,
+        *,
+        user_id: uuid.UUID,
+        upload_file: UploadFile,
+    ) -> UserImportSubmitResponse:
+        file_path = await self.import_service.save_upload_file(upload_file)
+        filename = upload_file.filename or file_path.name
+
+        try:
+            async with self.task_service.uow:
+                task = await self.task_service.create_user_import_task(
+                    file_path=str(file_path),
+                    filename=filename,
+                    user_id=user_id,
+                )
+        except AppError:
+            self.import_service.remove_file(file_path)
+            raise
+        except Exception as exc:
+            self.import_service.remove_file(file_path)
+            logger.exception("用户导入任务创建失败: filename=%s", filename)
+            raise ServiceError("创建用户导入任务失败，请稍后重试") from exc
+
+        try:
+            await import_users_task.kiq(str(task.id))
+        except Exception as exc:
+            await self._handle_dispatch_failure(task_id=task.id, exc=exc)
+            self.import_service.remove_file(file_path)
+            if isinstance(exc, AppError):
+                raise
+            raise DependencyUnavailable("任务投递失败，请稍后重试") from exc
+
+        return UserImportSubmitResponse(
+            task_id=task.id,
+            filename=filename,
+            task_status=task.status,
+        )
+
+    async def _handle_dispatch_failure(
+        self,
+        *,
+        task_id: uuid.UUID,
+        exc: Exception,
+    ) -> None:
+        try:
+            async with self.task_service.uow:
+                await self.task_service.mark_failed(
+                    task_id=task_id,
+                    error_log=f"任务投递失败: {exc}",
+                )
+        except Exception:
+            logger.exception("任务失败状态更新异常: task_id=%s", task_id)
+
+        logger.warning("用户导入任务投递失败: task_id=%s, error=%s", task_id, exc)
@@ -3,6 +3,7 @@ import asyncio
 import json
 from pathlib import Path
 
+from backend.ai.core.context_packer import pack_context_chunks
 from backend.ai.providers.embedding.rag_embedding import RAGEmbedderFactory
 from backend.core.config import settings
 from backend.core.database import create_db_assets
@@ -25,6 +26,17 @@ def parse_args() -> argparse.Namespace:
         default=settings.RAG_TOP_K,
         help="Top-K chunks to retrieve",
     )
+    parser.add_argument(
+        "--mmr",
+        action="store_true",
+        help="Also run MMR re-ranking and compare against plain top-k",
+    )
+    parser.add_argument(
+        "--mmr-lambda",
+        type=float,
+        default=settings.RAG_MMR_LAMBDA,
+        help="MMR lambda (1.0 = pure relevance)",
+    )
     parser.add_argument(
         "--output",
         type=Path,
@@ -38,7 +50,59 @@ def _safe_div(a: float, b: float) -> float:
     return a / b if b else 0.0
 
 
-async def run(dataset: Path, top_k: int, output: Path) -> None:
+def _score_sample(sample, chunks: list[dict]) -> dict:
+    retrieved_ids = [chunk["id"] for chunk in chunks]
+
+    hit_at_k = 0.0
+    recall_at_k = 0.0
+    mrr = 0.0
+
+    if sample.expected_chunk_ids:
+        expected = set(sample.expected_chunk_ids)
+        found = [cid for cid in retrieved_ids if cid in expected]
+        hit_at_k = 1.0 if found else 0.0
+        recall_at_k = _safe_div(len(set(found)), len(expected))
+        first_rank = next(
+            (idx + 1 for idx, cid in enumerate(retrieved_ids) if cid in expected),
+            None,
+        )
+        mrr = _safe_div(1.0, first_rank) if first_rank else 0.0
+    elif sample.expected_keywords:
+        context_text = "\n".join(chunk["content"] for chunk in chunks).lower()
+        keyword_hits = sum(
+            1 for kw in sample.expected_keywords if kw.lower() in context_text
+        )
+        hit_at_k = 1.0 if keyword_hits > 0 else 0.0
+        recall_at_k = _safe_div(keyword_hits, len(sample.expected_keywords))
+        mrr = hit_at_k
+
+    # 注入 Prompt 前的实际上下文 Token：相邻切片合并去重后、不设预算
+    context_tokens = pack_context_chunks(chunks, token_budget=0).total_tokens
+    return {
+        "retrieved_count": len(chunks),
+        "hit_at_k": hit_at_k,
+        "recall_at_k": recall_at_k,
+        "mrr": mrr,
+        "context_tokens": context_tokens,
+        "retrieved_chunk_ids": retrieved_ids,
+    }
+
+
+def _summarize(rows: list[dict], key: str) -> dict:
+    count = len(rows)
+    return {
+        metric: _safe_div(sum(row[key][metric] for row in rows), count)
+        for metric in ("hit_at_k", "recall_at_k", "mrr", "context_tokens")
+    }
+
+
+async def run(
+    dataset: Path,
+    top_k: int,
+    output: Path,
+    mmr: bool = False,
+    mmr_lambda: float = settings.RAG_MMR_LAMBDA,
+) -> None:
     samples = load_samples(dataset)
     engine, session_factory = create_db_assets()
     try:
@@ -48,68 +112,51 @@ async def run(dataset: Path, top_k: int, output: Path) -> None:
             model_name=settings.RAG_EMBED_MODEL_NAME,
             device=settings.RAG_EMBED_DEVICE,
         )
-        rag_service = RAGService(uow=uow, embedder=embedder, top_k=top_k)
+        variants = {
+            "baseline": RAGService(
+                uow=uow, embedder=embedder, top_k=top_k, mmr_enabled=False
+            )
+        }
+        if mmr:
+            variants["mmr"] = RAGService(
+                uow=uow,
+                embedder=embedder,
+                top_k=top_k,
+                mmr_enabled=True,
+                mmr_lambda=mmr_lambda,
+            )
 
         rows = []
-        hit_total = 0.0
-        recall_total = 0.0
-        mrr_total = 0.0
-
         for sample in samples:
-            chunks = await rag_service.retrieve(
-                query_text=sample.query,
-                kb_id=sample.kb_id,
-                top_k=top_k,
-            )
-            retrieved_ids = [chunk["id"] for chunk in chunks]
-
-            hit_at_k = 0.0
-            recall_at_k = 0.0
-            mrr = 0.0
-
-            if sample.expected_chunk_ids:
-                expected = set(sample.expected_chunk_ids)
-                found = [cid for cid in retrieved_ids if cid in expected]
-                hit_at_k = 1.0 if found else 0.0
-                recall_at_k = _safe_div(len(set(found)), len(expected))
-                first_rank = next(
-                    (idx + 1 for idx, cid in enumerate(retrieved_ids) if cid in expected),
-                    None,
-                )
-                mrr = _safe_div(1.0, first_rank) if first_rank else 0.0
-            elif sample.expected_keywords:
-                context_text = "\n".join(chunk["content"] for chunk in chunks).lower()
-                keyword_hits = sum(
-                    1 for kw in sample.expected_keywords if kw.lower() in context_text
-                )
-                hit_at_k = 1.0 if keyword_hits > 0 else 0.0
-                recall_at_k = _safe_div(keyword_hits, len(sample.expected_keywords))
-                mrr = hit_at_k
-
-            hit_total += hit_at_k
-            recall_total += recall_at_k
-            mrr_total += mrr
-
-            rows.append(
-                {
-                    "id": sample.id,
-                    "query": sample.query,
-                    "kb_id": str(sample.kb_id) if sample.kb_id else None,
-                    "retrieved_count": len(chunks),
-                    "hit_at_k": hit_at_k,
-                    "recall_at_k": recall_at_k,
-                    "mrr": mrr,
-                    "retrieved_chunk_ids": retrieved_ids,
-                }
-            )
+            row = {
+                "id": sample.id,
+                "query": sample.query,
+                "kb_id": str(sample.kb_id) if sample.kb_id else None,
+            }
+            for name, rag_service in variants.items():
+                async with uow:
+                    chunks = await rag_service.retrieve(
+                        query_text=sample.query,
+                        kb_id=sample.kb_id,
+                        top_k=top_k,
+                    )
+                row[name] = _score_sample(sample, chunks)
+            rows.append(row)
 
         summary = {
             "samples": len(samples),
             "top_k": top_k,
-            "hit_at_k": _safe_div(hit_total, len(samples)),
-            "recall_at_k": _safe_div(recall_total, len(samples)),
-            "mrr": _safe_div(mrr_total, len(samples)),
+            **_summarize(rows, "baseline"),
         }
+        if mmr:
+            mmr_summary = _summarize(rows, "mmr")
+            summary["mmr"] = {
+                "lambda": mmr_lambda,
+                **mmr_summary,
+                "context_token_savings": 1.0
+                - _safe_div(mmr_summary["context_tokens"], summary["context_tokens"]),
+                "recall_delta": mmr_summary["recall_at_k"] - summary["recall_at_k"],
+            }
         report = {"summary": summary, "details": rows}
 
         ensure_parent_dir(output)
@@ -124,7 +171,9 @@ async def run(dataset: Path, top_k: int, output: Path) -> None:
 
 def main() -> None:
     args = parse_args()
-    asyncio.run(run(args.dataset, args.top_k, args.output))
+    asyncio.run(
+        run(args.dataset, args.top_k, args.output, args.mmr, args.mmr_lambda)
+    )
 
 
 if __name__ == "__main__":
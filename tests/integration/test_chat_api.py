@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import uuid
-from datetime import UTC, datetime
+from datetime import UTC, datetime, timedelta
 from types import SimpleNamespace
 from unittest.mock import patch
 
@@ -14,6 +14,7 @@ from backend.api.v1.endpoint import chat_api
 from backend.core.config import settings
 from backend.models.orm.chat import MessageStatus
 from backend.models.schemas.chat_schema import LLMQueryDTO, LLMResultDTO
+from backend.services.session_query_service import SessionQueryService
 from backend.workflow.chat_nonstream_workflow import ChatNonStreamWorkflow
 
 
@@ -53,6 +54,7 @@ def make_session(**overrides):
         "user_id": uuid.uuid4(),
         "kb_id": None,
         "llm_config": {},
+        "message_count": 0,
         "total_tokens": 0,
         "created_at": now,
         "updated_at": now,
@@ -153,6 +155,37 @@ class FakeChatRepo:
         messages = list(self.session_messages.get(session_id, []))
         return messages[skip : skip + limit]
 
+    async def get_session_detail_rows(
+        self,
+        session_id: uuid.UUID,
+        limit: int = 100,
+        after=None,
+    ):
+        session = self.sessions.get(session_id)
+        if session is None:
+            return None, []
+        messages = sorted(
+            self.session_messages.get(session_id, []),
+            key=lambda m: (m.created_at, m.id),
+        )
+        if after is not None:
+            messages = [m for m in messages if (m.created_at, m.id) > after]
+        message_fields = (
+            "id",
+            "session_id",
+            "role",
+            "content",
+            "status",
+            "latency_ms",
+            "search_context",
+            "created_at",
+            "updated_at",
+        )
+        return dict(vars(session)), [
+            {name: getattr(m, name) for name in message_fields}
+            for m in messages[:limit]
+        ]
+
     async def update_message_status(
         self,
         message_id: uuid.UUID,
@@ -256,6 +289,9 @@ def api_context():
     app.dependency_overrides[chat_api.get_current_active_user] = lambda: current_user
     app.dependency_overrides[chat_api.get_chat_nonstream_workflow] = lambda: workflow
     app.dependency_overrides[chat_api.chat_limiter] = lambda: None
+    app.dependency_overrides[chat_api.get_session_query_service] = (
+        lambda: SessionQueryService(uow)
+    )
 
     ctx = SimpleNamespace(
         app=app,
@@ -371,3 +407,45 @@ async def test_query_sent_rejects_blank_query(client):
     )
 
     assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_session_detail_pages_messages_with_cursor(client, api_context):
+    session = api_context.chat_repo.seed_session(
+        make_session(
+            user_id=api_context.current_user.id,
+            message_count=3,
+            total_tokens=42,
+        )
+    )
+    base = datetime(2026, 1, 1, tzinfo=UTC)
+    for i in range(3):
+        api_context.chat_repo.seed_message(
+            make_message(
+                session_id=session.id,
+                content=f"第{i}条",
+                status=MessageStatus.SUCCESS,
+                created_at=base + timedelta(seconds=i),
+            )
+        )
+
+    first = await client.get(
+        f"/api/v1/chat/sessions/{session.id}", params={"limit": 2}
+    )
+    assert first.status_code == 200
+    body = first.json()
+    assert body["session"]["id"] == str(session.id)
+    assert body["session"]["total_tokens"] == 42
+    assert body["total_messages"] == 3
+    assert [m["content"] for m in body["messages"]] == ["第0条", "第1条"]
+    assert body["has_more"] is True
+
+    second = await client.get(
+        f"/api/v1/chat/sessions/{session.id}",
+        params={"limit": 2, "cursor": body["next_cursor"]},
+    )
+    body = second.json()
+    assert [m["content"] for m in body["messages"]] == ["第2条"]
+    assert body["has_more"] is False
+    assert body["next_cursor"] is None
+
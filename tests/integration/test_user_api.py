@@ -23,16 +23,16 @@ class DummyUoW:
 class StubUserService:
     def __init__(self):
         self.uow = DummyUoW()
+        self.get_by_id = AsyncMock()
         self.get_by_username = AsyncMock()
         self.get_by_email = AsyncMock()
         self.user_update = AsyncMock()
         self.user_register = AsyncMock()
 
 
-class StubUserImportService:
+class StubUserImportWorkflow:
     def __init__(self):
-        self.uow = DummyUoW()
-        self.import_from_upload = AsyncMock()
+        self.submit_import = AsyncMock()
 
 
 def make_user(**overrides):
@@ -60,19 +60,19 @@ def api_context():
     current_user = make_user(username="me_user")
     super_user = make_user(username="admin_user", is_superuser=True)
     user_service = StubUserService()
-    import_service = StubUserImportService()
+    import_workflow = StubUserImportWorkflow()
 
     app.dependency_overrides[user_api.get_current_active_user] = lambda: current_user
     app.dependency_overrides[user_api.get_current_superuser] = lambda: super_user
     app.dependency_overrides[user_api.get_user_service] = lambda: user_service
-    app.dependency_overrides[user_api.get_user_import_service] = lambda: import_service
+    app.dependency_overrides[user_api.get_user_import_workflow] = lambda: import_workflow
 
     ctx = SimpleNamespace(
         app=app,
         current_user=current_user,
         super_user=super_user,
         user_service=user_service,
-        import_service=import_service,
+        import_workflow=import_workflow,
     )
     yield ctx
     app.dependency_overrides.clear()
@@ -87,12 +87,17 @@ async def client(api_context):
 
 @pytest.mark.asyncio
 async def test_read_users_me_success(client, api_context):
+    api_context.user_service.get_by_id.return_value = api_context.current_user
+
     response = await client.get("/api/v1/users/me")
     assert response.status_code == 200
     body = response.json()
     assert body["id"] == str(api_context.current_user.id)
     assert body["username"] == api_context.current_user.username
     assert body["email"] == api_context.current_user.email
+    api_context.user_service.get_by_id.assert_awaited_once_with(
+        api_context.current_user.id
+    )
 
 
 @pytest.mark.asyncio
@@ -222,12 +227,12 @@ async def test_create_user_invalid_payload_returns_422(client):
 
 
 @pytest.mark.asyncio
-async def test_csv_upload_success(client, api_context):
-    api_context.import_service.import_from_upload.return_value = {
+async def test_csv_upload_accepted_as_background_task(client, api_context):
+    task_id = uuid.uuid4()
+    api_context.import_workflow.submit_import.return_value = {
+        "task_id": str(task_id),
         "filename": "users.csv",
-        "total_rows": 2,
-        "imported_rows": 2,
-        "message": "成功导入 2 条用户数据",
+        "task_status": "pending",
     }
 
     response = await client.post(
@@ -237,11 +242,13 @@ async def test_csv_upload_success(client, api_context):
         },
     )
 
-    assert response.status_code == 200
+    assert response.status_code == 202
     body = response.json()
     assert body["filename"] == "users.csv"
-    assert body["imported_rows"] == 2
-    api_context.import_service.import_from_upload.assert_awaited_once()
+    assert body["task_id"] == str(task_id)
+    api_context.import_workflow.submit_import.assert_awaited_once()
+    kwargs = api_context.import_workflow.submit_import.await_args.kwargs
+    assert kwargs["user_id"] == api_context.super_user.id
 
 
 @pytest.mark.asyncio
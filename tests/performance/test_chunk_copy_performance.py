@@ -0,0 +1,116 @@
+"""
+document_chunks 写入吞吐：多 VALUES INSERT vs asyncpg 二进制 COPY
+
+运行: pytest -m performance tests/performance/test_chunk_copy_performance.py -s
+
+需要可连接且已执行迁移（含 pgvector 扩展）的 PostgreSQL（读取 POSTGRES_* 配置），
+连不上时跳过。每组测量在独立事务里写入同名临时表（遮蔽 public.document_chunks，
+不带外键与 HNSW 索引，只比较写入路径本身），结束后回滚，不污染业务数据。
+"""
+
+import time
+import uuid
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from backend.core.config import settings
+from backend.repositories.knowledge_repo import (
+    KnowledgeRepository,
+    encode_chunk_copy_payload,
+)
+
+pytestmark = [pytest.mark.asyncio, pytest.mark.performance]
+
+ROW_COUNTS = (1_000, 10_000, 100_000)
+EMBED_DIM = 768
+
+
+def _make_records(count: int) -> list[dict]:
+    file_id = uuid.uuid4()
+    # 所有行共享同一个向量对象，避免 10 万条 768 维列表撑爆测试进程内存
+    embedding = [0.001 * idx for idx in range(EMBED_DIM)]
+    return [
+        {
+            "source_type": "file",
+            "file_id": file_id,
+            "content": f"第 {idx} 段：知识库入库压测文本。" * 8,
+            "token_count": 96,
+            "chunk_index": idx,
+            "meta_info": {"filename": "bench.md", "path": "/tmp/bench.md"},
+            "embedding": embedding,
+        }
+        for idx in range(count)
+    ]
+
+
+async def _measure(session: AsyncSession, records: list[dict], mode: str) -> float:
+    repo = KnowledgeRepository(session)
+    batch_size = settings.KNOWLEDGE_INGEST_WRITE_BATCH_SIZE
+    await session.execute(
+        text(
+            "CREATE TEMP TABLE document_chunks "
+            "(LIKE public.document_chunks INCLUDING DEFAULTS) ON COMMIT DROP"
+        )
+    )
+    start = time.perf_counter()
+    for offset in range(0, len(records), batch_size):
+        batch = records[offset : offset + batch_size]
+        if mode == "copy":
+            await repo.copy_chunks(batch)
+        else:
+            await repo.add_chunks(batch)
+    elapsed = time.perf_counter() - start
+
+    written = await session.scalar(text("SELECT count(*) FROM pg_temp.document_chunks"))
+    assert written == len(records)
+    return len(records) / elapsed
+
+
+async def test_encode_copy_payload_throughput():
+    records = _make_records(10_000)
+
+    start = time.perf_counter()
+    payload = encode_chunk_copy_payload(records)
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"\nencode 10k rows: {len(records) / elapsed:,.0f} rows/s, "
+        f"{len(payload) / len(records):,.0f} bytes/row"
+    )
+    # 向量按 float32 二进制编码：4 字节/维 + 4 字节头
+    assert len(payload) / len(records) > EMBED_DIM * 4
+
+
+async def test_copy_vs_insert_rows_per_second():
+    engine = create_async_engine(settings.database_url)
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    except Exception as exc:
+        # 无数据库环境直接跳过
+        await engine.dispose()
+        pytest.skip(f"PostgreSQL 不可用: {exc}")
+
+    results: dict[tuple[int, str], float] = {}
+    try:
+        for count in ROW_COUNTS:
+            records = _make_records(count)
+            for mode in ("insert", "copy"):
+                async with AsyncSession(engine) as session:
+                    results[(count, mode)] = await _measure(session, records, mode)
+                    await session.rollback()
+    finally:
+        await engine.dispose()
+
+    print(f"\n{'rows':>8} | {'insert rows/s':>14} | {'copy rows/s':>12} | speedup")
+    for count in ROW_COUNTS:
+        insert_rps = results[(count, "insert")]
+        copy_rps = results[(count, "copy")]
+        print(
+            f"{count:>8} | {insert_rps:>14,.0f} | {copy_rps:>12,.0f} "
+            f"| {copy_rps / insert_rps:>6.1f}x"
+        )
+
+    assert results[(ROW_COUNTS[-1], "copy")] > results[(ROW_COUNTS[-1], "insert")]
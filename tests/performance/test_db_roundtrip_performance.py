@@ -0,0 +1,113 @@
+"""
+单轮对话的数据库往返次数：旧写法 (get / flush / refresh) vs RETURNING 写原语
+
+运行: pytest -m performance tests/performance/test_db_roundtrip_performance.py -s
+
+用计数会话代替真实连接：每次 execute / flush / refresh / get 记为一次往返，
+只统计一轮对话里的写路径（用户消息、助手占位消息、终态回写）。
+"""
+
+import uuid
+from collections import Counter
+from unittest.mock import MagicMock
+
+import pytest
+
+from backend.models.orm.chat import ChatMessage, MessageStatus
+from backend.repositories.chat_repo import ChatRepository
+
+pytestmark = [pytest.mark.asyncio, pytest.mark.performance]
+
+
+class RoundTripCountingSession:
+    """只记录调用的伪 AsyncSession；add 不产生往返。"""
+
+    def __init__(self):
+        self.calls: Counter[str] = Counter()
+        self._objects: dict[uuid.UUID, ChatMessage] = {}
+
+    @property
+    def round_trips(self) -> int:
+        return sum(self.calls.values())
+
+    def add(self, obj):
+        if getattr(obj, "id", None) is None:
+            obj.id = uuid.uuid4()
+        self._objects[obj.id] = obj
+
+    async def flush(self):
+        self.calls["flush"] += 1
+
+    async def refresh(self, obj):
+        self.calls["refresh"] += 1
+
+    async def get(self, model, id):
+        self.calls["get"] += 1
+        return self._objects.get(id)
+
+    async def execute(self, stmt):
+        self.calls["execute"] += 1
+        result = MagicMock()
+        result.scalar_one.return_value = ChatMessage(id=uuid.uuid4())
+        result.scalar_one_or_none.return_value = ChatMessage(id=uuid.uuid4())
+        return result
+
+
+async def _legacy_turn(session: RoundTripCountingSession, session_id: uuid.UUID):
+    """复刻旧实现：create = add + flush + refresh；update = get + flush + refresh。"""
+
+    async def create(**data):
+        obj = ChatMessage(**data)
+        session.add(obj)
+        await session.flush()
+        await session.refresh(obj)
+        return obj
+
+    await create(session_id=session_id, role="user", content="q")
+    assistant = await create(
+        session_id=session_id,
+        role="assistant",
+        content="",
+        status=MessageStatus.THINKING,
+    )
+
+    message = await session.get(ChatMessage, assistant.id)
+    message.status = MessageStatus.SUCCESS
+    message.content = "a"
+    message.tokens_input = 18
+    message.tokens_output = 7
+    session.add(message)
+    await session.flush()
+    await session.refresh(message)
+
+
+async def _returning_turn(session: RoundTripCountingSession, session_id: uuid.UUID):
+    repo = ChatRepository(session)
+    await repo.create_message(session_id=session_id, role="user", content="q")
+    assistant = await repo.create_thinking_message(
+        session_id=session_id, role="assistant"
+    )
+    await repo.update_message_status(
+        message_id=assistant.id,
+        status=MessageStatus.SUCCESS,
+        content="a",
+        tokens_input=18,
+        tokens_output=7,
+    )
+
+
+async def test_chat_turn_round_trips_before_and_after():
+    session_id = uuid.uuid4()
+
+    legacy = RoundTripCountingSession()
+    await _legacy_turn(legacy, session_id)
+    returning = RoundTripCountingSession()
+    await _returning_turn(returning, session_id)
+
+    print(f"\n{'path':>10} | {'round trips':>11} | breakdown")
+    for name, session in (("legacy", legacy), ("returning", returning)):
+        print(f"{name:>10} | {session.round_trips:>11} | {dict(session.calls)}")
+
+    # 旧写法：2 + 2 + 3 = 7；RETURNING（含会话计数 CTE）：1 + 1 + 1 = 3
+    assert legacy.round_trips == 7
+    assert returning.round_trips == 3
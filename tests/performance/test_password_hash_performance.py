@@ -0,0 +1,65 @@
+"""
+登录吞吐 vs 密码哈希进程池大小
+
+运行: pytest -m performance tests/performance/test_password_hash_performance.py -s
+"""
+
+import asyncio
+import os
+import time
+
+import pytest
+
+from backend.core.hash_executor import (
+    PasswordHashExecutor,
+    hash_password_sync,
+    verify_password_sync,
+)
+
+pytestmark = [pytest.mark.asyncio, pytest.mark.performance]
+
+LOGIN_REQUESTS = 48
+
+
+async def _measure_login_throughput(pool_size: int, hashed: str) -> float:
+    # 队列放开，只测吞吐；生产环境由 PASSWORD_HASH_MAX_QUEUE 限制
+    executor = PasswordHashExecutor(
+        max_workers=pool_size, max_queue=LOGIN_REQUESTS, kind="process"
+    )
+    try:
+        # 预热：让 worker 进程启动并构造好 hasher，不计入耗时
+        await asyncio.gather(
+            *(
+                executor.run(verify_password_sync, "Password123", hashed)
+                for _ in range(pool_size)
+            )
+        )
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(
+                executor.run(verify_password_sync, "Password123", hashed)
+                for _ in range(LOGIN_REQUESTS)
+            )
+        )
+        elapsed = time.perf_counter() - start
+    finally:
+        executor.shutdown()
+
+    assert all(results)
+    return LOGIN_REQUESTS / elapsed
+
+
+async def test_login_throughput_vs_pool_size():
+    hashed = hash_password_sync("Password123")
+    cpu_count = os.cpu_count() or 1
+    pool_sizes = sorted({1, 2, 4, cpu_count})
+
+    print(f"\n{'pool_size':>10} | {'logins/s':>10}")
+    throughput: dict[int, float] = {}
+    for size in pool_sizes:
+        throughput[size] = await _measure_login_throughput(size, hashed)
+        print(f"{size:>10} | {throughput[size]:>10.1f}")
+
+    # 多核机器上进程池扩容应带来吞吐提升（单核环境只做记录不断言）
+    if cpu_count >= 2:
+        assert throughput[2] > throughput[1]
@@ -0,0 +1,83 @@
+"""
+流式检查点的开销：写入次数上界 + 每个分片在热路径上增加的耗时
+
+运行: pytest -m performance tests/performance/test_stream_checkpoint_performance.py -s
+
+模拟 LLM 以固定间隔推送分片，检查点写入用固定延迟的伪 DB 写代替；
+对比关闭/开启检查点时的流总耗时，并统计写入次数与合并次数。
+"""
+
+import asyncio
+import time
+import uuid
+
+import pytest
+
+from backend.services.stream_checkpoint import StreamCheckpointer
+
+pytestmark = [pytest.mark.asyncio, pytest.mark.performance]
+
+CHUNKS = 2000
+CHUNK_INTERVAL_SECONDS = 0.0005
+DB_WRITE_SECONDS = 0.02
+EVERY_CHUNKS = 64
+INTERVAL_SECONDS = 0.2
+
+
+async def _run_stream(checkpointer: StreamCheckpointer | None) -> float:
+    parts: list[str] = []
+    observe_cost = 0.0
+    for i in range(CHUNKS):
+        await asyncio.sleep(CHUNK_INTERVAL_SECONDS)
+        parts.append(f"tok{i} ")
+        if checkpointer is not None:
+            started = time.perf_counter()
+            checkpointer.observe(parts)
+            observe_cost += time.perf_counter() - started
+    if checkpointer is not None:
+        await checkpointer.aclose()
+    return observe_cost
+
+
+async def test_checkpoint_overhead_is_bounded():
+    in_flight = 0
+    max_in_flight = 0
+
+    async def fake_db_write(message_id, content):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        try:
+            await asyncio.sleep(DB_WRITE_SECONDS)
+        finally:
+            in_flight -= 1
+
+    started = time.perf_counter()
+    await _run_stream(None)
+    baseline = time.perf_counter() - started
+
+    checkpointer = StreamCheckpointer(
+        message_id=uuid.uuid4(),
+        writer=fake_db_write,
+        every_chunks=EVERY_CHUNKS,
+        interval_seconds=INTERVAL_SECONDS,
+    )
+    started = time.perf_counter()
+    observe_cost = await _run_stream(checkpointer)
+    with_checkpoint = time.perf_counter() - started
+
+    per_chunk_us = observe_cost / CHUNKS * 1e6
+    print(f"\n{'mode':>12} | {'stream s':>8} | {'writes':>6} | {'coalesced':>9}")
+    print(f"{'baseline':>12} | {baseline:>8.3f} | {0:>6} | {0:>9}")
+    print(
+        f"{'checkpoint':>12} | {with_checkpoint:>8.3f} | "
+        f"{checkpointer.writes:>6} | {checkpointer.coalesced:>9}"
+    )
+    print(f"observe() cost per chunk: {per_chunk_us:.1f} µs")
+
+    # 写入次数上界：分片数 / N + 时长 / T + 1
+    bound = CHUNKS // EVERY_CHUNKS + int(with_checkpoint / INTERVAL_SECONDS) + 1
+    assert 0 < checkpointer.writes <= bound
+    assert max_in_flight == 1
+    # 检查点在后台执行，推流总耗时不应被 DB 写入拖长
+    assert with_checkpoint < baseline * 1.5 + checkpointer.writes * 0.001
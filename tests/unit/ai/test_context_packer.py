@@ -0,0 +1,117 @@
+import pytest
+
+from backend.ai.core import context_packer
+from backend.ai.core.context_packer import pack_context_chunks
+
+
+@pytest.fixture(autouse=True)
+def char_token_counter(monkeypatch):
+    # 单测不依赖 tiktoken 编码文件：按字符数计 Token
+    monkeypatch.setattr(
+        context_packer, "count_tokens", lambda text, model="gpt-4": len(text)
+    )
+
+
+def make_chunk(chunk_id, content, score, file_id=None, chunk_index=None):
+    return {
+        "id": chunk_id,
+        "content": content,
+        "score": score,
+        "distance": 1 - score,
+        "source_type": "file",
+        "file_id": file_id,
+        "message_id": None,
+        "token_count": len(content),
+        "chunk_index": chunk_index,
+    }
+
+
+def test_pack_prefers_score_per_token_within_budget():
+    chunks = [
+        make_chunk("long", "x" * 80, 0.9),
+        make_chunk("short-a", "a" * 20, 0.8),
+        make_chunk("short-b", "b" * 20, 0.7),
+    ]
+
+    packed = pack_context_chunks(chunks, token_budget=50, merge_adjacent=False)
+
+    assert [chunk["id"] for chunk in packed.sources] == ["short-a", "short-b"]
+    assert packed.total_tokens == 40
+    assert packed.dropped == 1
+
+
+def test_pack_outputs_selected_chunks_by_score():
+    chunks = [
+        make_chunk("low", "l" * 10, 0.2),
+        make_chunk("high", "h" * 30, 0.9),
+    ]
+
+    packed = pack_context_chunks(chunks, token_budget=100, merge_adjacent=False)
+
+    assert packed.contents == ["h" * 30, "l" * 10]
+
+
+def test_pack_without_budget_keeps_everything():
+    chunks = [make_chunk(str(i), "c" * 500, 0.5) for i in range(3)]
+
+    packed = pack_context_chunks(chunks, token_budget=0, merge_adjacent=False)
+
+    assert len(packed.contents) == 3
+    assert packed.dropped == 0
+
+
+def test_pack_merges_adjacent_chunks_and_strips_overlap():
+    chunks = [
+        make_chunk("c2", "第二段内容的开头部分，和第三段重叠的句子。", 0.6, "f1", 2),
+        make_chunk("c1", "第一段内容。第二段内容的开头部分，", 0.9, "f1", 1),
+        make_chunk("c3", "和第三段重叠的句子。第三段结尾。", 0.5, "f1", 3),
+        make_chunk("other", "别的文件", 0.4, "f2", 2),
+    ]
+
+    packed = pack_context_chunks(chunks, token_budget=0, merge_adjacent=True)
+
+    assert packed.contents[0] == (
+        "第一段内容。第二段内容的开头部分，和第三段重叠的句子。第三段结尾。"
+    )
+    assert [chunk["id"] for chunk in packed.sources] == ["c1", "c2", "c3", "other"]
+
+
+def test_pack_joins_non_overlapping_neighbours_with_newline():
+    chunks = [
+        make_chunk("a", "alpha section", 0.9, "f1", 0),
+        make_chunk("b", "beta section", 0.8, "f1", 1),
+        make_chunk("gap", "gamma section", 0.7, "f1", 3),
+    ]
+
+    packed = pack_context_chunks(chunks, token_budget=0, merge_adjacent=True)
+
+    assert packed.contents == ["alpha section\nbeta section", "gamma section"]
+
+
+def test_pack_trims_merged_run_that_exceeds_budget():
+    # 三个相邻的大切片合并后超出预算，不能整组丢弃导致上下文为空
+    chunks = [
+        make_chunk("c1", "一" * 700, 0.7, "f1", 1),
+        make_chunk("c2", "二" * 700, 0.9, "f1", 2),
+        make_chunk("c3", "三" * 700, 0.8, "f1", 3),
+    ]
+
+    packed = pack_context_chunks(chunks, token_budget=1200, merge_adjacent=True)
+
+    assert [chunk["id"] for chunk in packed.sources] == ["c2"]
+    assert packed.contents == ["二" * 700]
+    assert packed.total_tokens == 700
+    assert packed.dropped == 2
+
+
+def test_pack_keeps_the_largest_adjacent_sub_run_that_fits():
+    chunks = [
+        make_chunk("c1", "a" * 300, 0.9, "f1", 1),
+        make_chunk("c2", "b" * 300, 0.8, "f1", 2),
+        make_chunk("c3", "c" * 300, 0.2, "f1", 3),
+    ]
+
+    packed = pack_context_chunks(chunks, token_budget=700, merge_adjacent=True)
+
+    assert packed.contents == ["a" * 300 + "\n" + "b" * 300]
+    assert [chunk["id"] for chunk in packed.sources] == ["c1", "c2"]
@@ -83,3 +83,34 @@ def test_openai_embedder_rejects_empty_text():
 
     with pytest.raises(ServiceError):
         embedder.encode_query("   ")
+
+
+def test_openai_embedder_encode_batch_orders_by_index(monkeypatch):
+    calls: list = []
+    fake_response = SimpleNamespace(
+        data=[
+            SimpleNamespace(index=1, embedding=[0.4, 0.5, 0.6]),
+            SimpleNamespace(index=0, embedding=[0.1, 0.2, 0.3]),
+        ]
+    )
+
+    def create(**kwargs):
+        calls.append(kwargs["input"])
+        return fake_response
+
+    fake_client = SimpleNamespace(embeddings=SimpleNamespace(create=create))
+    monkeypatch.setattr(
+        "backend.ai.providers.embedding.rag_embedding.openai.OpenAI",
+        lambda **_: fake_client,
+    )
+
+    embedder = OpenAICompatibleEmbedder(
+        model_name="text-embedding-3-small",
+        base_url="http://example.com/v1",
+        api_key="test-key",
+        dimensions=3,
+    )
+
+    vectors = embedder.encode_batch(["first", "second"])
+    assert vectors == [[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]]
+    assert calls == [["first", "second"]]
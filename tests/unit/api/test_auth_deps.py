@@ -2,12 +2,14 @@ from __future__ import annotations
 
 import uuid
 from types import SimpleNamespace
-from unittest.mock import AsyncMock
+from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 from fastapi import HTTPException
 
 from backend.api.deps import auth
+from backend.services import principal_cache_service as cache_module
+from backend.services.principal_cache_service import AuthPrincipal, PrincipalCache
 
 
 class DummyUoW:
@@ -31,16 +33,30 @@ def make_user(**overrides):
         "email": "tester@example.com",
         "is_active": True,
         "is_superuser": False,
+        "max_tokens": 100000,
     }
     data.update(overrides)
     return SimpleNamespace(**data)
 
 
 @pytest.fixture
-def auth_ctx():
+def auth_ctx(monkeypatch):
     uow = DummyUoW()
     fake_service = SimpleNamespace(get_by_id=AsyncMock())
-    return SimpleNamespace(uow=uow, fake_service=fake_service)
+
+    redis = MagicMock()
+    redis.hget = AsyncMock(return_value=None)
+    redis.delete = AsyncMock()
+    pipe = MagicMock()
+    pipe.execute = AsyncMock()
+    redis.pipeline.return_value = pipe
+    monkeypatch.setattr(cache_module.redis_client, "init", AsyncMock(return_value=redis))
+
+    cache = PrincipalCache(local_ttl_seconds=60, redis_ttl_seconds=60, max_local_entries=100)
+    monkeypatch.setattr(auth, "principal_cache", cache)
+    return SimpleNamespace(
+        uow=uow, fake_service=fake_service, redis=redis, pipe=pipe, cache=cache
+    )
 
 
 def _patch_auth(monkeypatch, auth_ctx, payload: dict):
@@ -73,15 +89,60 @@ def test_get_login_data_returns_422_for_invalid_form():
 @pytest.mark.asyncio
 async def test_get_current_user_returns_loaded_user(monkeypatch, auth_ctx):
     user = make_user()
-    _patch_auth(monkeypatch, auth_ctx, {"sub": str(user.id)})
+    _patch_auth(monkeypatch, auth_ctx, {"sub": str(user.id), "iat": 1700000000})
     auth_ctx.fake_service.get_by_id.return_value = user
 
     result = await auth.get_current_user(uow=auth_ctx.uow, token="good-token")
 
-    assert result == user
+    assert result == AuthPrincipal.from_user(user)
     auth_ctx.fake_service.get_by_id.assert_awaited_once_with(str(user.id))
     assert auth_ctx.uow.enter_count == 1
     assert auth_ctx.uow.exit_count == 1
+    auth_ctx.pipe.hset.assert_called_once_with(
+        f"auth:principal:{user.id}", "1700000000", result.to_json()
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_current_user_hits_local_cache_without_db(monkeypatch, auth_ctx):
+    user = make_user()
+    _patch_auth(monkeypatch, auth_ctx, {"sub": str(user.id), "iat": 1700000000})
+    auth_ctx.fake_service.get_by_id.return_value = user
+
+    first = await auth.get_current_user(uow=auth_ctx.uow, token="good-token")
+    second = await auth.get_current_user(uow=auth_ctx.uow, token="good-token")
+
+    assert first == second
+    auth_ctx.fake_service.get_by_id.assert_awaited_once()
+    assert auth_ctx.uow.enter_count == 1
+
+
+@pytest.mark.asyncio
+async def test_get_current_user_hits_redis_cache_without_db(monkeypatch, auth_ctx):
+    user = make_user(is_superuser=True)
+    _patch_auth(monkeypatch, auth_ctx, {"sub": str(user.id), "iat": 1700000000})
+    auth_ctx.redis.hget.return_value = AuthPrincipal.from_user(user).to_json()
+
+    result = await auth.get_current_user(uow=auth_ctx.uow, token="good-token")
+
+    assert result.id == user.id
+    assert result.is_superuser is True
+    auth_ctx.fake_service.get_by_id.assert_not_awaited()
+    assert auth_ctx.uow.enter_count == 0
+
+
+@pytest.mark.asyncio
+async def test_invalidate_forces_reload(monkeypatch, auth_ctx):
+    user = make_user()
+    _patch_auth(monkeypatch, auth_ctx, {"sub": str(user.id), "iat": 1700000000})
+    auth_ctx.fake_service.get_by_id.return_value = user
+
+    await auth.get_current_user(uow=auth_ctx.uow, token="good-token")
+    await auth_ctx.cache.invalidate(user.id)
+    await auth.get_current_user(uow=auth_ctx.uow, token="good-token")
+
+    assert auth_ctx.fake_service.get_by_id.await_count == 2
+    auth_ctx.redis.delete.assert_awaited_once_with(f"auth:principal:{user.id}")
 
 
 @pytest.mark.asyncio
@@ -12,7 +12,7 @@ from backend.models.schemas.knowledge_schema import KnowledgeUploadResponse
 
 
 @pytest.mark.asyncio
-async def test_upload_file_stream_uses_stream_workflow():
+async def test_upload_file_stream_is_alias_of_default_upload():
     kb_id = uuid.uuid4()
     user_id = uuid.uuid4()
     upload_file = MagicMock(spec=UploadFile)
@@ -23,7 +23,7 @@ async def test_upload_file_stream_uses_stream_workflow():
         task_status="pending",
     )
     upload_workflow = SimpleNamespace(
-        submit_stream_ingestion=AsyncMock(return_value=expected)
+        submit_ingestion=AsyncMock(return_value=expected)
     )
 
     result = await knowledge_api.upload_file_stream(
@@ -34,7 +34,7 @@ async def test_upload_file_stream_uses_stream_workflow():
     )
 
     assert result == expected
-    upload_workflow.submit_stream_ingestion.assert_awaited_once_with(
+    upload_workflow.submit_ingestion.assert_awaited_once_with(
         kb_id=kb_id,
         user_id=user_id,
         upload_file=upload_file,
@@ -11,7 +11,7 @@ from fastapi import HTTPException, UploadFile
 from backend.api.v1.endpoint import user_api
 from backend.models.schemas.user_schema import (
     UserCreate,
-    UserImportResponse,
+    UserImportSubmitResponse,
     UserSearch,
     UserUpdate,
 )
@@ -46,6 +46,7 @@ def make_user(**overrides):
 def user_service():
     service = SimpleNamespace(
         uow=DummyUoW(),
+        get_by_id=AsyncMock(),
         get_by_username=AsyncMock(),
         get_by_email=AsyncMock(),
         user_update=AsyncMock(),
@@ -55,20 +56,20 @@ def user_service():
 
 
 @pytest.fixture
-def import_service():
-    service = SimpleNamespace(
-        uow=DummyUoW(),
-        import_from_upload=AsyncMock(),
-    )
-    return service
+def import_workflow():
+    return SimpleNamespace(submit_import=AsyncMock())
 
 
 @pytest.mark.asyncio
-async def test_read_users_me_returns_user_response():
+async def test_read_users_me_returns_user_response(user_service):
     current_user = make_user(username="me_user", email="me@example.com")
+    user_service.get_by_id.return_value = current_user
 
-    result = await user_api.read_users_me(current_user=current_user)
+    result = await user_api.read_users_me(
+        current_user=current_user, user_service=user_service
+    )
 
+    user_service.get_by_id.assert_awaited_once_with(current_user.id)
     assert result.id == current_user.id
     assert result.username == "me_user"
     assert result.email == "me@example.com"
@@ -198,21 +199,24 @@ async def test_create_user_returns_400_when_service_returns_none(user_service):
 
 
 @pytest.mark.asyncio
-async def test_csv_bulk_insert_users_success(import_service):
+async def test_csv_bulk_insert_users_submits_background_task(import_workflow):
     upload_file = MagicMock(spec=UploadFile)
-    expected = UserImportResponse(
+    super_user = make_user(is_superuser=True)
+    expected = UserImportSubmitResponse(
+        task_id=uuid.uuid4(),
         filename="users.csv",
-        total_rows=2,
-        imported_rows=2,
-        message="成功导入 2 条用户数据",
+        task_status="pending",
     )
-    import_service.import_from_upload.return_value = expected
+    import_workflow.submit_import.return_value = expected
 
     result = await user_api.csv_balk_insert_users(
         file=upload_file,
-        _=make_user(is_superuser=True),
-        import_service=import_service,
+        current_user=super_user,
+        import_workflow=import_workflow,
     )
 
     assert result == expected
-    import_service.import_from_upload.assert_awaited_once_with(upload_file)
+    import_workflow.submit_import.assert_awaited_once_with(
+        user_id=super_user.id,
+        upload_file=upload_file,
+    )
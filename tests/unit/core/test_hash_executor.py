@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+
+import pytest
+
+from backend.core.exceptions import TooManyRequests
+from backend.core.hash_executor import (
+    PasswordHashExecutor,
+    hash_password_sync,
+    verify_password_sync,
+)
+
+
+@pytest.mark.asyncio
+async def test_executor_round_trip_with_thread_pool():
+    executor = PasswordHashExecutor(max_workers=1, max_queue=1, kind="thread")
+    try:
+        hashed = await executor.run(hash_password_sync, "Password123")
+
+        assert await executor.run(verify_password_sync, "Password123", hashed)
+        assert not await executor.run(verify_password_sync, "Wrong123", hashed)
+        assert executor.in_flight == 0
+    finally:
+        executor.shutdown()
+
+
+def test_verify_password_sync_returns_false_for_invalid_hash():
+    assert verify_password_sync("Password123", "not-a-valid-hash") is False
+
+
+@pytest.mark.asyncio
+async def test_executor_rejects_when_queue_is_full():
+    executor = PasswordHashExecutor(max_workers=1, max_queue=1, kind="thread")
+    release = threading.Event()
+
+    def blocking() -> str:
+        release.wait(timeout=5)
+        return "done"
+
+    try:
+        running = asyncio.create_task(executor.run(blocking))
+        queued = asyncio.create_task(executor.run(blocking))
+        await asyncio.sleep(0)
+
+        assert executor.in_flight == 2
+        assert executor.queue_depth == 1
+        with pytest.raises(TooManyRequests) as exc_info:
+            await executor.run(blocking)
+        assert exc_info.value.status_code == 429
+
+        release.set()
+        assert await asyncio.gather(running, queued) == ["done", "done"]
+        assert executor.in_flight == 0
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_late_reset_keeps_rebuilt_pool():
+    executor = PasswordHashExecutor(max_workers=1, max_queue=1, kind="thread")
+    try:
+        broken = executor._get_pool()
+        executor._reset_pool(broken)
+        rebuilt = executor._get_pool()
+
+        # 另一个同时遇到损坏池的调用方晚到，不能关掉已重建的新池
+        executor._reset_pool(broken)
+
+        assert executor._pool is rebuilt
+        assert await executor.run(lambda: "ok") == "ok"
+    finally:
+        executor.shutdown()
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+from typing import Annotated
+
+import pytest
+from fastapi import APIRouter, FastAPI, File, UploadFile
+from httpx import ASGITransport, AsyncClient
+
+from backend.middleware import upload_limit
+from backend.middleware.upload_limit import UploadLimitRoute
+
+LIMIT = 1024
+
+
+@pytest.fixture
+async def client(monkeypatch):
+    monkeypatch.setattr(upload_limit, "max_upload_body_bytes", lambda: LIMIT)
+    received: list[int] = []
+    router = APIRouter(route_class=UploadLimitRoute)
+
+    @router.post("/upload")
+    async def upload(file: Annotated[UploadFile, File()]):
+        received.append(len(await file.read()))
+        return {"size": received[-1]}
+
+    app = FastAPI()
+    app.include_router(router)
+    transport = ASGITransport(app=app, raise_app_exceptions=False)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        ac.received = received
+        yield ac
+
+
+@pytest.mark.asyncio
+async def test_upload_within_limit_reaches_endpoint(client):
+    response = await client.post("/upload", files={"file": ("a.txt", b"x" * 100)})
+
+    assert response.status_code == 200
+    assert response.json() == {"size": 100}
+
+
+@pytest.mark.asyncio
+async def test_declared_oversized_body_rejected_before_parsing(client):
+    response = await client.post(
+        "/upload", files={"file": ("a.txt", b"x" * (LIMIT * 2))}
+    )
+
+    assert response.status_code == 413
+    assert client.received == []
+
+
+@pytest.mark.asyncio
+async def test_chunked_oversized_body_aborted_while_receiving(client):
+    boundary = "limit-boundary"
+    head = (
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="a.txt"\r\n'
+        "Content-Type: text/plain\r\n\r\n"
+    ).encode()
+    sent: list[int] = []
+
+    async def body():
+        yield head
+        # 未声明 Content-Length：超限后服务端不再继续读取
+        for _ in range(64):
+            sent.append(1)
+            yield b"x" * 256
+        yield f"\r\n--{boundary}--\r\n".encode()
+
+    response = await client.post(
+        "/upload",
+        content=body(),
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+    )
+
+    assert response.status_code == 413
+    assert client.received == []
+    assert len(sent) < 64
@@ -0,0 +1,74 @@
+import uuid
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from backend.models.orm.task import TaskJob
+from backend.repositories.base import CRUDBase
+
+
+@pytest.fixture
+def crud_ctx():
+    session = AsyncMock()
+    result_proxy = MagicMock()
+    session.execute.return_value = result_proxy
+    return CRUDBase(TaskJob, session), session, result_proxy
+
+
+@pytest.mark.asyncio
+async def test_create_issues_single_insert_returning(crud_ctx):
+    crud, session, result_proxy = crud_ctx
+    expected = MagicMock()
+    result_proxy.scalar_one.return_value = expected
+
+    result = await crud.create(obj_in={"action_type": "X", "payload": {}})
+
+    assert result is expected
+    session.execute.assert_awaited_once()
+    session.flush.assert_not_called()
+    session.refresh.assert_not_called()
+    sql = str(session.execute.call_args.args[0])
+    assert sql.startswith("INSERT INTO task_jobs")
+    assert "RETURNING" in sql
+
+
+@pytest.mark.asyncio
+async def test_update_issues_update_where_id_returning(crud_ctx):
+    crud, session, result_proxy = crud_ctx
+    db_obj = SimpleNamespace(id=uuid.uuid4(), progress=0)
+    updated = MagicMock()
+    result_proxy.scalar_one_or_none.return_value = updated
+
+    result = await crud.update(db_obj=db_obj, obj_in={"progress": 50})
+
+    assert result is updated
+    stmt = session.execute.call_args.args[0]
+    sql = str(stmt)
+    assert sql.startswith("UPDATE task_jobs SET")
+    assert "WHERE task_jobs.id = :id_1" in sql
+    assert "RETURNING" in sql
+    assert stmt.get_execution_options()["populate_existing"] is True
+    session.refresh.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_update_with_empty_data_skips_round_trip(crud_ctx):
+    crud, session, _ = crud_ctx
+    db_obj = SimpleNamespace(id=uuid.uuid4(), progress=0)
+
+    result = await crud.update(db_obj=db_obj, obj_in={})
+
+    assert result is db_obj
+    session.execute.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_update_rejects_unknown_fields(crud_ctx):
+    crud, session, _ = crud_ctx
+    db_obj = SimpleNamespace(id=uuid.uuid4())
+
+    with pytest.raises(ValueError, match="Unknown fields"):
+        await crud.update(db_obj=db_obj, obj_in={"nope": 1})
+
+    session.execute.assert_not_called()
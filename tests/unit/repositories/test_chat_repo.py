@@ -1,4 +1,5 @@
 import uuid
+from datetime import UTC, datetime
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
@@ -20,6 +21,8 @@ def repo(mock_session):
         instance.create = AsyncMock()
         instance.update = AsyncMock()
         instance.remove = AsyncMock()
+        instance.insert_returning = AsyncMock()
+        instance.update_returning = AsyncMock()
         yield ChatRepository(mock_session)
 
 
@@ -49,7 +52,7 @@ async def test_create_session_maps_input_into_llm_config(repo):
 async def test_create_message_passes_extended_fields(repo):
     session_id = uuid.uuid4()
     expected = MagicMock()
-    repo.message_crud.create.return_value = expected
+    repo.message_crud.insert_returning.return_value = expected
 
     result = await repo.create_message(
         session_id=session_id,
@@ -64,13 +67,24 @@ async def test_create_message_passes_extended_fields(repo):
     )
 
     assert result == expected
-    kwargs = repo.message_crud.create.call_args.kwargs["obj_in"]
-    assert kwargs["session_id"] == session_id
-    assert kwargs["role"] == "assistant"
-    assert kwargs["status"] == MessageStatus.STREAMING
-    assert kwargs["client_request_id"] == "req-1"
-    assert kwargs["tokens_input"] == 11
-    assert kwargs["tokens_output"] == 22
+    repo.message_crud.insert_returning.assert_awaited_once()
+    data = repo.message_crud.insert_returning.call_args.args[0]
+    assert data["session_id"] == session_id
+    assert data["role"] == "assistant"
+    assert data["status"] == MessageStatus.STREAMING
+    assert data["client_request_id"] == "req-1"
+    assert data["tokens_input"] == 11
+    assert data["tokens_output"] == 22
+
+    # 计数递增以 CTE 形式随 INSERT 一起发出，不单独往返
+    (counters,) = repo.message_crud.insert_returning.call_args.kwargs["ctes"]
+    sql = str(counters)
+    assert "UPDATE chat_sessions" in sql
+    assert "message_count=(chat_sessions.message_count +" in sql
+    params = counters.compile().params
+    assert params["message_count_1"] == 1
+    assert params["total_tokens_1"] == 33
+    repo.session.execute.assert_not_called()
 
 
 @pytest.mark.asyncio
@@ -91,13 +105,93 @@ async def test_get_user_sessions_builds_query_and_executes(mock_session):
     assert "ORDER BY chat_sessions.updated_at DESC" in sql
 
 
+@pytest.mark.asyncio
+async def test_get_user_sessions_page_uses_keyset_predicate(mock_session):
+    repo = ChatRepository(mock_session)
+    result_proxy = MagicMock()
+    result_proxy.scalars.return_value.all.return_value = []
+    mock_session.execute.return_value = result_proxy
+
+    await repo.get_user_sessions_page(
+        user_id=uuid.uuid4(),
+        limit=21,
+        before=(datetime(2026, 1, 1, tzinfo=UTC), uuid.uuid4()),
+    )
+
+    sql = str(mock_session.execute.call_args.args[0])
+    assert "(chat_sessions.updated_at, chat_sessions.id) <" in sql
+    assert "ORDER BY chat_sessions.updated_at DESC, chat_sessions.id DESC" in sql
+    assert "OFFSET" not in sql
+
+
+@pytest.mark.asyncio
+async def test_get_session_detail_rows_single_statement_with_lateral_page(mock_session):
+    repo = ChatRepository(mock_session)
+    session_id = uuid.uuid4()
+    now = datetime(2026, 1, 1, tzinfo=UTC)
+    session_part = (session_id, "t", uuid.uuid4(), None, {}, 2, 30, now, now)
+    msg_ids = [uuid.uuid4(), uuid.uuid4()]
+    rows = [
+        session_part
+        + (mid, session_id, "user", f"m{i}", "success", None, None, now, now)
+        for i, mid in enumerate(msg_ids)
+    ]
+    result_proxy = MagicMock()
+    result_proxy.all.return_value = rows
+    mock_session.execute.return_value = result_proxy
+
+    session, messages = await repo.get_session_detail_rows(session_id, limit=10)
+
+    mock_session.execute.assert_awaited_once()
+    sql = str(mock_session.execute.call_args.args[0])
+    assert "LEFT OUTER JOIN LATERAL" in sql
+    assert "ORDER BY chat_messages.created_at ASC, chat_messages.id ASC" in sql
+    assert session["id"] == session_id
+    assert session["message_count"] == 2
+    assert [m["id"] for m in messages] == msg_ids
+    assert messages[1]["content"] == "m1"
+
+
+@pytest.mark.asyncio
+async def test_get_session_detail_rows_session_without_messages(mock_session):
+    repo = ChatRepository(mock_session)
+    now = datetime(2026, 1, 1, tzinfo=UTC)
+    row = (uuid.uuid4(), "t", uuid.uuid4(), None, {}, 0, 0, now, now) + (None,) * 9
+    result_proxy = MagicMock()
+    result_proxy.all.return_value = [row]
+    mock_session.execute.return_value = result_proxy
+
+    session, messages = await repo.get_session_detail_rows(row[0])
+
+    assert session["title"] == "t"
+    assert messages == []
+
+
+@pytest.mark.asyncio
+async def test_update_message_status_bumps_session_tokens_by_delta(repo):
+    message_id = uuid.uuid4()
+
+    await repo.update_message_status(
+        message_id=message_id,
+        status=MessageStatus.SUCCESS,
+        tokens_output=25,
+    )
+
+    old, counters = repo.message_crud.update_returning.call_args.kwargs["ctes"]
+    assert "FROM chat_messages" in str(old)
+    sql = str(counters)
+    assert "UPDATE chat_sessions" in sql
+    # 差额 = 新值 - 旧值，旧值取自同一语句快照里的 old_message
+    assert "old_message.tokens_input" in sql
+    assert "old_message.tokens_output" in sql
+    assert counters.compile().params["param_1"] == 25
+
+
 @pytest.mark.asyncio
 async def test_update_message_status_with_optional_fields(repo):
     message_id = uuid.uuid4()
-    existing = MagicMock()
     updated = MagicMock()
-    repo.message_crud.get.return_value = existing
-    repo.message_crud.update.return_value = updated
+    repo.message_crud.update_returning.return_value = updated
 
     result = await repo.update_message_status(
         message_id=message_id,
@@ -110,23 +204,109 @@ async def test_update_message_status_with_optional_fields(repo):
     )
 
     assert result == updated
-    repo.message_crud.get.assert_awaited_once_with(message_id)
-    kwargs = repo.message_crud.update.call_args.kwargs
-    assert kwargs["db_obj"] == existing
-    assert kwargs["obj_in"]["status"] == MessageStatus.SUCCESS
-    assert kwargs["obj_in"]["tokens_input"] == 12
-    assert kwargs["obj_in"]["tokens_output"] == 34
+    repo.message_crud.get.assert_not_called()
+    args = repo.message_crud.update_returning.call_args.args
+    assert args[0] == message_id
+    assert args[1]["status"] == MessageStatus.SUCCESS
+    assert args[1]["tokens_input"] == 12
+    assert args[1]["tokens_output"] == 34
 
 
 @pytest.mark.asyncio
 async def test_update_message_status_returns_none_when_message_missing(repo):
-    repo.message_crud.get.return_value = None
+    repo.message_crud.update_returning.return_value = None
+    message_id = uuid.uuid4()
 
     result = await repo.update_message_status(
-        message_id=uuid.uuid4(),
+        message_id=message_id,
         status=MessageStatus.FAILED,
         content="err",
     )
 
     assert result is None
-    repo.message_crud.update.assert_not_called()
+    # 不涉及 token 时不挂 CTE，只有一条 UPDATE ... RETURNING
+    repo.message_crud.update_returning.assert_awaited_once_with(
+        message_id, {"status": MessageStatus.FAILED, "content": "err"}
+    )
+
+
+@pytest.mark.asyncio
+async def test_finalize_messages_batch_single_update_from_values(mock_session):
+    repo = ChatRepository(mock_session)
+    mock_session.execute.return_value = MagicMock(rowcount=2)
+    rows = [
+        {
+            "id": uuid.uuid4(),
+            "status": MessageStatus.SUCCESS,
+            "content": "a",
+            "tokens_input": 3,
+            "tokens_output": 4,
+            "latency_ms": None,
+            "search_context": None,
+            "user_id": uuid.uuid4(),
+        },
+        {
+            "id": uuid.uuid4(),
+            "status": MessageStatus.FAILED,
+            "content": "b",
+            "tokens_input": 0,
+            "tokens_output": 0,
+            "latency_ms": 120,
+            "search_context": {"kb_id": "x"},
+        },
+    ]
+
+    result = await repo.finalize_messages_batch(rows)
+
+    assert result == 2
+    mock_session.execute.assert_awaited_once()
+    sql = str(mock_session.execute.call_args.args[0])
+    assert "UPDATE chat_messages SET" in sql
+    assert "finalized" in sql
+    assert "UPDATE chat_sessions" in sql
+    assert "INSERT INTO token_usage_pending" in sql
+    assert "coalesce(CAST" in sql
+
+
+@pytest.mark.asyncio
+async def test_finalize_messages_batch_empty_is_noop(mock_session):
+    repo = ChatRepository(mock_session)
+
+    assert await repo.finalize_messages_batch([]) == 0
+    mock_session.execute.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_message_content_only_touches_in_flight(mock_session):
+    repo = ChatRepository(mock_session)
+    mock_session.execute.return_value = MagicMock(rowcount=0)
+
+    result = await repo.checkpoint_message_content(uuid.uuid4(), "partial")
+
+    assert result is False
+    stmt = mock_session.execute.call_args.args[0]
+    sql = str(stmt)
+    assert sql.startswith("UPDATE chat_messages SET")
+    assert "chat_messages.status IN" in sql
+    assert "RETURNING" not in sql
+    params = stmt.compile().params
+    assert params["status"] == MessageStatus.STREAMING
+    assert set(params["status_1"]) == {MessageStatus.THINKING, MessageStatus.STREAMING}
+
+
+@pytest.mark.asyncio
+async def test_fail_orphaned_messages_keeps_partial_content(mock_session):
+    repo = ChatRepository(mock_session)
+    mock_session.execute.return_value = MagicMock(rowcount=3)
+    cutoff = datetime(2026, 10, 18, tzinfo=UTC)
+
+    result = await repo.fail_orphaned_messages(cutoff, "中断")
+
+    assert result == 3
+    stmt = mock_session.execute.call_args.args[0]
+    sql = str(stmt)
+    assert "CASE WHEN (chat_messages.content = " in sql
+    assert "chat_messages.updated_at < " in sql
+    params = stmt.compile().params
+    assert params["status"] == MessageStatus.FAILED
+    assert cutoff in params.values()
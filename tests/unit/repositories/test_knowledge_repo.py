@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import json
+import struct
+import uuid
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from pgvector import Vector
+
+from backend.repositories.knowledge_repo import (
+    CHUNK_COPY_COLUMNS,
+    KnowledgeRepository,
+    encode_chunk_copy_payload,
+)
+
+
+def make_record(**overrides):
+    data = {
+        "source_type": "file",
+        "file_id": uuid.uuid4(),
+        "content": "部署说明",
+        "token_count": 4,
+        "chunk_index": 7,
+        "meta_info": {"filename": "a.md"},
+        "embedding": [0.5, -1.0, 2.0],
+    }
+    data.update(overrides)
+    return data
+
+
+def decode_rows(payload: bytes) -> list[list[bytes | None]]:
+    """按 PGCOPY 二进制格式解出每行的原始字段"""
+    assert payload.startswith(b"PGCOPY\n\xff\r\n\x00")
+    offset = 11 + 8
+    rows: list[list[bytes | None]] = []
+    while True:
+        (field_count,) = struct.unpack_from(">h", payload, offset)
+        offset += 2
+        if field_count == -1:
+            break
+        fields: list[bytes | None] = []
+        for _ in range(field_count):
+            (length,) = struct.unpack_from(">i", payload, offset)
+            offset += 4
+            if length == -1:
+                fields.append(None)
+                continue
+            fields.append(payload[offset : offset + length])
+            offset += length
+        rows.append(fields)
+    assert offset == len(payload)
+    return rows
+
+
+def test_encode_chunk_copy_payload_uses_binary_column_formats():
+    record = make_record()
+
+    (row,) = decode_rows(encode_chunk_copy_payload([record]))
+
+    assert len(row) == len(CHUNK_COPY_COLUMNS)
+    fields = dict(zip(CHUNK_COPY_COLUMNS, row, strict=True))
+    assert len(fields["id"]) == 16
+    assert fields["source_type"] == b"file"
+    assert fields["file_id"] == record["file_id"].bytes
+    assert fields["message_id"] is None
+    assert fields["content"].decode() == "部署说明"
+    assert struct.unpack(">i", fields["chunk_index"]) == (7,)
+    assert fields["content_hash"] is None
+    assert fields["meta_info"][:1] == b"\x01"
+    assert json.loads(fields["meta_info"][1:]) == {"filename": "a.md"}
+    assert Vector.from_binary(fields["embedding"]).to_list() == [0.5, -1.0, 2.0]
+
+
+def test_encode_chunk_copy_payload_keeps_explicit_ids():
+    chunk_id = uuid.uuid4()
+
+    rows = decode_rows(
+        encode_chunk_copy_payload([make_record(id=chunk_id), make_record()])
+    )
+
+    assert rows[0][0] == chunk_id.bytes
+    assert rows[1][0] != chunk_id.bytes
+
+
+@pytest.mark.asyncio
+async def test_copy_chunks_streams_binary_copy_on_session_connection():
+    session = AsyncMock()
+    driver_conn = MagicMock()
+    driver_conn.copy_to_table = AsyncMock()
+    conn = MagicMock()
+    conn.get_raw_connection = AsyncMock(
+        return_value=MagicMock(driver_connection=driver_conn)
+    )
+    session.connection.return_value = conn
+    repo = KnowledgeRepository(session)
+
+    written = await repo.copy_chunks([make_record(), make_record()])
+
+    assert written == 2
+    driver_conn.copy_to_table.assert_awaited_once()
+    call = driver_conn.copy_to_table.call_args
+    assert call.args == ("document_chunks",)
+    assert call.kwargs["columns"] == CHUNK_COPY_COLUMNS
+    assert call.kwargs["format"] == "binary"
+    assert len(decode_rows(call.kwargs["source"])) == 2
+
+
+@pytest.mark.asyncio
+async def test_copy_chunks_skips_empty_batch():
+    session = AsyncMock()
+    repo = KnowledgeRepository(session)
+
+    assert await repo.copy_chunks([]) == 0
+    session.connection.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_delete_chunks_by_ids_binds_single_array_parameter():
+    session = AsyncMock()
+    session.execute.return_value = MagicMock(rowcount=3)
+    repo = KnowledgeRepository(session)
+    chunk_ids = [uuid.uuid4() for _ in range(3)]
+
+    deleted = await repo.delete_chunks_by_ids(chunk_ids)
+
+    assert deleted == 3
+    stmt = session.execute.call_args.args[0]
+    assert "= ANY (" in str(stmt)
+    assert stmt.compile().params["chunk_ids"] == chunk_ids
@@ -130,3 +130,39 @@ async def test_increment_used_tokens_executes_atomic_update(repo_ctx):
     sql = str(stmt)
     assert "UPDATE users SET used_tokens=" in sql
     assert "users.used_tokens +" in sql
+
+
+@pytest.mark.asyncio
+async def test_copy_into_import_staging_uses_driver_copy(repo_ctx):
+    repo, session = repo_ctx
+    driver_conn = MagicMock()
+    driver_conn.copy_records_to_table = AsyncMock()
+    raw_conn = MagicMock(driver_connection=driver_conn)
+    conn = MagicMock()
+    conn.get_raw_connection = AsyncMock(return_value=raw_conn)
+    session.connection.return_value = conn
+    records = [(uuid.uuid4(), "alice", "alice@example.com", "hash-a", 0)]
+
+    await repo.copy_into_import_staging(records)
+
+    driver_conn.copy_records_to_table.assert_awaited_once_with(
+        "user_import_staging",
+        records=records,
+        columns=("id", "username", "email", "hashed_password", "row_no"),
+    )
+
+
+@pytest.mark.asyncio
+async def test_merge_import_staging_runs_single_upsert(repo_ctx):
+    repo, session = repo_ctx
+    session.execute.return_value = MagicMock(rowcount=3)
+
+    merged = await repo.merge_import_staging()
+
+    assert merged == 3
+    session.execute.assert_awaited_once()
+    sql = str(session.execute.call_args.args[0])
+    assert "INSERT INTO users" in sql
+    assert "FROM user_import_staging" in sql
+    assert "ORDER BY email, row_no DESC" in sql
+    assert "ON CONFLICT (email) DO UPDATE" in sql
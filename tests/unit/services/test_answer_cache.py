@@ -0,0 +1,219 @@
+"""
+AnswerCache 单元测试
+
+覆盖：问题归一化、命中/未命中、TTL 过期、LRU 淘汰、首轮 + 知识库开关门控、回放分片，
+以及语义层的近邻命中、generation 作废与容量上限。
+"""
+
+import uuid
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from backend.core.config import settings
+from backend.services.answer_cache import (
+    AnswerCache,
+    AnswerCacheKey,
+    CachedAnswer,
+    SemanticAnswerCache,
+    normalize_query,
+    replay_chunks,
+)
+
+KB_ID = uuid.UUID(int=7)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_key(query="什么是 RAG？", generation=1, template="tpl") -> AnswerCacheKey:
+    return AnswerCacheKey.build(
+        query_text=query,
+        kb_id=KB_ID,
+        generation=generation,
+        template=template,
+        model="m",
+    )
+
+
+def make_uow(state):
+    return SimpleNamespace(
+        knowledge_repo=SimpleNamespace(get_kb_cache_state=AsyncMock(return_value=state))
+    )
+
+
+def test_normalize_query_ignores_case_and_whitespace():
+    assert normalize_query("  What   is\tRAG? ") == normalize_query("what is rag?")
+    assert make_key("What is RAG?") == make_key(" what  is rag? ")
+
+
+def test_key_changes_with_generation_and_template():
+    assert make_key(generation=1) != make_key(generation=2)
+    assert make_key(template="a") != make_key(template="b")
+
+
+def test_get_put_hit_and_miss():
+    cache = AnswerCache(max_entries=4, ttl_seconds=60)
+    key = make_key()
+    assert cache.get(key) is None
+
+    cache.put(key, CachedAnswer("答案", {"kb_id": str(KB_ID)}))
+
+    hit = cache.get(key)
+    assert hit is not None
+    assert hit.content == "答案"
+    assert cache.get(make_key(generation=2)) is None
+
+
+def test_put_skips_empty_answer():
+    cache = AnswerCache(max_entries=4, ttl_seconds=60)
+    cache.put(make_key(), CachedAnswer(""))
+    assert len(cache) == 0
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = AnswerCache(max_entries=4, ttl_seconds=10, clock=clock)
+    cache.put(make_key(), CachedAnswer("答案"))
+
+    clock.now += 9
+    assert cache.get(make_key()) is not None
+    clock.now += 2
+    assert cache.get(make_key()) is None
+    assert len(cache) == 0
+
+
+def test_lru_evicts_least_recently_used():
+    cache = AnswerCache(max_entries=2, ttl_seconds=60)
+    first, second, third = make_key("a"), make_key("b"), make_key("c")
+    cache.put(first, CachedAnswer("1"))
+    cache.put(second, CachedAnswer("2"))
+    # 读一次 first，使 second 成为最久未用
+    assert cache.get(first) is not None
+
+    cache.put(third, CachedAnswer("3"))
+
+    assert len(cache) == 2
+    assert cache.get(second) is None
+    assert cache.get(first) is not None
+    assert cache.get(third) is not None
+
+
+@pytest.mark.asyncio
+async def test_resolve_key_requires_global_and_kb_flags(monkeypatch):
+    cache = AnswerCache(max_entries=4, ttl_seconds=60)
+    kwargs = dict(query_text="q", kb_id=KB_ID, session_id=None, template="tpl")
+
+    monkeypatch.setattr(settings, "CHAT_ANSWER_CACHE_ENABLED", False)
+    uow = make_uow((3, True))
+    assert await cache.resolve_key(uow, **kwargs) is None
+    uow.knowledge_repo.get_kb_cache_state.assert_not_awaited()
+
+    monkeypatch.setattr(settings, "CHAT_ANSWER_CACHE_ENABLED", True)
+    assert await cache.resolve_key(make_uow((3, False)), **kwargs) is None
+    assert await cache.resolve_key(make_uow(None), **kwargs) is None
+
+    key = await cache.resolve_key(make_uow((3, True)), **kwargs)
+    assert key is not None
+    assert key.generation == 3
+    assert key.model == settings.LLM_MODEL_NAME
+
+
+@pytest.mark.asyncio
+async def test_resolve_key_skips_follow_up_turns_and_plain_chat(monkeypatch):
+    monkeypatch.setattr(settings, "CHAT_ANSWER_CACHE_ENABLED", True)
+    cache = AnswerCache(max_entries=4, ttl_seconds=60)
+    uow = make_uow((1, True))
+
+    # 已有会话：答案依赖历史上下文
+    assert (
+        await cache.resolve_key(
+            uow, query_text="q", kb_id=KB_ID, session_id=uuid.uuid4(), template="tpl"
+        )
+        is None
+    )
+    # 未指定知识库 / 自定义模板
+    assert (
+        await cache.resolve_key(
+            uow, query_text="q", kb_id=None, session_id=None, template="tpl"
+        )
+        is None
+    )
+    assert (
+        await cache.resolve_key(
+            uow, query_text="q", kb_id=KB_ID, session_id=None, template=None
+        )
+        is None
+    )
+    uow.knowledge_repo.get_kb_cache_state.assert_not_awaited()
+
+
+def test_replay_chunks_splits_and_rejoins():
+    content = "一二三四五六七八九十"
+    chunks = replay_chunks(content, size=3)
+    assert chunks == ["一二三", "四五六", "七八九", "十"]
+    assert "".join(chunks) == content
+    assert replay_chunks("", size=3) == [""]
+
+
+@pytest.fixture
+def semantic_enabled(monkeypatch):
+    monkeypatch.setattr(settings, "CHAT_SEMANTIC_CACHE_ENABLED", True)
+
+
+def test_semantic_cache_hits_paraphrase_above_threshold(semantic_enabled):
+    cache = SemanticAnswerCache(threshold=0.9, max_entries_per_kb=8, ttl_seconds=60)
+    key = make_key("如何上传文件")
+    cache.put(key, [1.0, 0.0, 0.0], CachedAnswer("上传步骤"))
+
+    # 余弦相似度约 0.995：视为同一问题的改写
+    hit = cache.get(make_key("文件怎么上传"), [1.0, 0.1, 0.0])
+    assert hit is not None
+    assert hit.content == "上传步骤"
+    # 正交向量：不相关的问题
+    assert cache.get(make_key("别的问题"), [0.0, 1.0, 0.0]) is None
+
+
+def test_semantic_cache_invalidated_by_generation_and_ttl(semantic_enabled):
+    clock = FakeClock()
+    cache = SemanticAnswerCache(
+        threshold=0.9, max_entries_per_kb=8, ttl_seconds=10, clock=clock
+    )
+    cache.put(make_key(generation=1), [1.0, 0.0], CachedAnswer("旧答案"))
+
+    assert cache.get(make_key(generation=2), [1.0, 0.0]) is None
+    assert len(cache) == 0
+
+    cache.put(make_key(generation=2), [1.0, 0.0], CachedAnswer("新答案"))
+    clock.now += 11
+    assert cache.get(make_key(generation=2), [1.0, 0.0]) is None
+    assert len(cache) == 0
+
+
+def test_semantic_cache_caps_entries_per_kb(semantic_enabled):
+    cache = SemanticAnswerCache(threshold=0.99, max_entries_per_kb=2, ttl_seconds=60)
+    for i, vector in enumerate(([1.0, 0.0], [0.0, 1.0], [1.0, 1.0])):
+        cache.put(make_key(str(i)), vector, CachedAnswer(str(i)))
+
+    assert len(cache) == 2
+    assert cache.get(make_key(), [1.0, 0.0]) is None
+    assert cache.get(make_key(), [0.0, 1.0]).content == "1"
+
+
+def test_semantic_cache_disabled_and_dimension_mismatch(monkeypatch):
+    cache = SemanticAnswerCache(threshold=0.9, max_entries_per_kb=8, ttl_seconds=60)
+    monkeypatch.setattr(settings, "CHAT_SEMANTIC_CACHE_ENABLED", False)
+    cache.put(make_key(), [1.0, 0.0], CachedAnswer("答案"))
+    assert len(cache) == 0
+
+    monkeypatch.setattr(settings, "CHAT_SEMANTIC_CACHE_ENABLED", True)
+    cache.put(make_key(), [1.0, 0.0], CachedAnswer("答案"))
+    # 换了 embedding 模型（维度变化）时视为未命中
+    assert cache.get(make_key(), [1.0, 0.0, 0.0]) is None
+    assert cache.get(make_key(), [0.0, 0.0]) is None
@@ -0,0 +1,262 @@
+"""
+ChatIdempotency 单元测试
+
+用内存版 Redis 覆盖：抢锁、结果缓存、非流式等待者、流式事件重放与跟随。
+"""
+
+import asyncio
+import uuid
+from datetime import UTC, datetime
+
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from backend.core.exceptions import ServiceError
+from backend.models.schemas.chat_schema import ChatQueryResponse, MessageResponse
+from backend.services.chat_idempotency import DONE_EVENT, ChatIdempotency
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self._redis = redis
+        self._calls = []
+
+    def __getattr__(self, name):
+        def record(*args, **kwargs):
+            self._calls.append((name, args, kwargs))
+
+        return record
+
+    async def execute(self):
+        return [
+            await getattr(self._redis, name)(*args, **kwargs)
+            for name, args, kwargs in self._calls
+        ]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakePubSub:
+    def __init__(self, redis):
+        self._redis = redis
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    async def subscribe(self, channel):
+        self._redis.subscribers.setdefault(channel, []).append(self.queue)
+
+    async def unsubscribe(self, channel):
+        self._redis.subscribers.get(channel, []).remove(self.queue)
+
+    async def aclose(self):
+        pass
+
+    async def get_message(self, ignore_subscribe_messages=True, timeout=None):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except TimeoutError:
+            return None
+
+
+class FakeRedis:
+    """只实现 ChatIdempotency 用到的命令"""
+
+    def __init__(self):
+        self.kv: dict[str, str] = {}
+        self.streams: dict[str, list[tuple[str, dict]]] = {}
+        self.subscribers: dict[str, list[asyncio.Queue]] = {}
+        self._stream_changed = asyncio.Event()
+        self.fail_xadd = False
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.kv:
+            return None
+        self.kv[key] = value
+        return True
+
+    async def get(self, key):
+        return self.kv.get(key)
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.kv.pop(key, None)
+            self.streams.pop(key, None)
+
+    async def expire(self, key, seconds):
+        return True
+
+    async def publish(self, channel, message):
+        for queue in self.subscribers.get(channel, []):
+            queue.put_nowait({"type": "message", "data": message})
+
+    async def xadd(self, key, fields, maxlen=None, approximate=True):
+        if self.fail_xadd:
+            raise RedisConnectionError("down")
+        entries = self.streams.setdefault(key, [])
+        entry_id = f"{len(entries) + 1}-0"
+        entries.append((entry_id, dict(fields)))
+        self._stream_changed.set()
+        return entry_id
+
+    async def xread(self, streams, count=None, block=None):
+        ((key, last_id),) = streams.items()
+        seq = int(last_id.split("-")[0])
+        for _ in range(2):
+            entries = self.streams.get(key, [])[seq:]
+            if entries:
+                return [[key, entries[:count]]]
+            self._stream_changed.clear()
+            try:
+                await asyncio.wait_for(self._stream_changed.wait(), block / 1000)
+            except TimeoutError:
+                return []
+        return []
+
+    def pubsub(self):
+        return FakePubSub(self)
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+
+def make_response(content="answer") -> ChatQueryResponse:
+    now = datetime.now(UTC)
+    session_id = uuid.uuid4()
+    return ChatQueryResponse(
+        session_id=session_id,
+        session_title="会话",
+        answer=MessageResponse(
+            id=uuid.uuid4(),
+            session_id=session_id,
+            role="assistant",
+            content=content,
+            status="success",
+            created_at=now,
+            updated_at=now,
+        ),
+    )
+
+
+@pytest.fixture
+def redis():
+    return FakeRedis()
+
+
+def make_guard(redis, client_request_id="req-1") -> ChatIdempotency:
+    return ChatIdempotency(redis, uuid.UUID(int=1), client_request_id)
+
+
+@pytest.mark.asyncio
+async def test_second_acquire_loses_and_complete_caches_result(redis):
+    primary, duplicate = make_guard(redis), make_guard(redis)
+    response = make_response()
+
+    assert await primary.acquire() is True
+    assert await duplicate.acquire() is False
+
+    await primary.complete(response)
+
+    assert await duplicate.cached_result() == response
+    assert redis.kv[primary.lock_key] == str(response.answer.id)
+    # 已完成后 fail 为空操作，不会误删锁
+    await primary.fail()
+    assert primary.lock_key in redis.kv
+
+
+@pytest.mark.asyncio
+async def test_wait_result_attaches_to_in_flight_request(redis):
+    primary, duplicate = make_guard(redis), make_guard(redis)
+    response = make_response()
+    await primary.acquire()
+
+    waiter = asyncio.create_task(duplicate.wait_result(timeout=5))
+    await asyncio.sleep(0.01)
+    assert not waiter.done()
+    await primary.complete(response)
+
+    assert await asyncio.wait_for(waiter, 1) == response
+
+
+@pytest.mark.asyncio
+async def test_wait_result_returns_none_when_primary_fails(redis):
+    primary, duplicate = make_guard(redis), make_guard(redis)
+    await primary.acquire()
+
+    waiter = asyncio.create_task(duplicate.wait_result(timeout=5))
+    await asyncio.sleep(0.01)
+    await primary.fail()
+
+    assert await asyncio.wait_for(waiter, 1) is None
+    # 锁已释放，客户端可用同一 ID 重试
+    assert await make_guard(redis).acquire() is True
+
+
+@pytest.mark.asyncio
+async def test_wait_result_times_out(redis):
+    primary, duplicate = make_guard(redis), make_guard(redis)
+    await primary.acquire()
+
+    with pytest.raises(ServiceError, match="超时"):
+        await duplicate.wait_result(timeout=0.05)
+
+
+@pytest.mark.asyncio
+async def test_follow_events_replays_and_follows_primary_stream(redis):
+    primary, duplicate = make_guard(redis), make_guard(redis)
+    await primary.acquire()
+    await primary.append_event("data: meta\n\n")
+    await primary.append_event("data: a\n\n")
+
+    async def collect():
+        return [event async for event in duplicate.follow_events(timeout=5)]
+
+    follower = asyncio.create_task(collect())
+    await asyncio.sleep(0.01)
+    await primary.append_event("data: b\n\n")
+    await primary.complete(make_response())
+    await primary.append_event(DONE_EVENT)
+
+    events = await asyncio.wait_for(follower, 1)
+    assert events == ["data: meta\n\n", "data: a\n\n", "data: b\n\n", DONE_EVENT]
+
+
+@pytest.mark.asyncio
+async def test_follow_events_after_completion_replays_cached_result(redis):
+    primary, duplicate = make_guard(redis), make_guard(redis)
+    response = make_response("full answer")
+    await primary.acquire()
+    await primary.complete(response)
+
+    events = [event async for event in duplicate.follow_events(timeout=5)]
+
+    assert len(events) == 3
+    assert str(response.answer.id) in events[0]
+    assert "full answer" in events[1]
+    assert events[2] == DONE_EVENT
+
+
+@pytest.mark.asyncio
+async def test_follow_events_errors_when_primary_fails(redis):
+    primary, duplicate = make_guard(redis), make_guard(redis)
+    await primary.acquire()
+    await primary.fail()
+
+    with pytest.raises(ServiceError, match="原请求处理失败"):
+        async for _ in duplicate.follow_events(timeout=5):
+            pass
+
+
+@pytest.mark.asyncio
+async def test_append_event_stops_mirroring_on_redis_error(redis):
+    primary = make_guard(redis)
+    await primary.acquire()
+    redis.fail_xadd = True
+
+    await primary.append_event("data: a\n\n")
+    redis.fail_xadd = False
+    await primary.append_event("data: b\n\n")
+
+    assert primary.events_key not in redis.streams
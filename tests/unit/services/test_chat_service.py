@@ -7,6 +7,7 @@ ChatService 单元测试
 
 import time
 import uuid
+from datetime import UTC, datetime, timedelta
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
@@ -365,21 +366,34 @@ class TestChatMessageUpdater:
 
     @pytest.mark.asyncio
     async def test_update_as_streaming(self, message_updater, mock_uow):
-        """更新消息为流式输出状态"""
+        """流式检查点走受状态保护的写入，不回退终态"""
         message_id = uuid.uuid4()
         content = "部分内容..."
-
-        updated_msg = MagicMock(spec=ChatMessage)
-        mock_uow.chat_repo.update_message_status.return_value = updated_msg
+        mock_uow.chat_repo.checkpoint_message_content.return_value = True
 
         result = await message_updater.update_as_streaming(
             message_id=message_id,
             content=content,
         )
 
-        assert result == updated_msg
-        mock_uow.chat_repo.update_message_status.assert_called_once_with(
+        assert result is True
+        mock_uow.chat_repo.checkpoint_message_content.assert_called_once_with(
             message_id=message_id,
-            status=MessageStatus.STREAMING,
             content=content,
         )
+        mock_uow.chat_repo.update_message_status.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_fail_orphaned_messages_uses_stale_cutoff(
+        self, message_updater, mock_uow
+    ):
+        """孤儿回收按 now - stale_after_seconds 计算截止时间"""
+        mock_uow.chat_repo.fail_orphaned_messages.return_value = 2
+        before = datetime.now(UTC) - timedelta(seconds=600)
+
+        result = await message_updater.fail_orphaned_messages(stale_after_seconds=600)
+
+        after = datetime.now(UTC) - timedelta(seconds=600)
+        assert result == 2
+        kwargs = mock_uow.chat_repo.fail_orphaned_messages.call_args.kwargs
+        assert before <= kwargs["stale_before"] <= after
@@ -0,0 +1,56 @@
+import pytest
+
+from backend.services.chunking_service import ChunkingService
+
+
+def _blocks(text: str, size: int) -> list[str]:
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+SAMPLE = (
+    "  \r\n第一章 总览。本章介绍部署流程。\r\n\r\n"
+    + "部署步骤包括准备环境、配置参数与启动服务。" * 40
+    + "\r\nSecond part. " * 60
+    + "结尾段落。\r\n   "
+)
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 199, 1000, 100_000])
+@pytest.mark.parametrize("chunk_overlap", [0, 60, 120])
+def test_stream_split_matches_whole_text_split(block_size, chunk_overlap):
+    service = ChunkingService(chunk_size=200, chunk_overlap=chunk_overlap)
+
+    streamed = list(service.iter_split_stream(_blocks(SAMPLE, block_size)))
+
+    assert streamed == service.split_text(SAMPLE)
+    assert streamed
+
+
+def test_stream_split_normalizes_crlf_across_block_boundary():
+    service = ChunkingService(chunk_size=200, chunk_overlap=0)
+
+    assert list(service.iter_split_stream(["a\r", "\nb"])) == ["a\nb"]
+
+
+def test_stream_split_reads_blocks_lazily():
+    service = ChunkingService(chunk_size=200, chunk_overlap=0)
+    consumed = 0
+
+    def blocks():
+        nonlocal consumed
+        for _ in range(1000):
+            consumed += 1
+            yield "段落内容。" * 20
+
+    first = next(service.iter_split_stream(blocks()))
+
+    assert first
+    # 第一个切片只需读到窗口之后，而不是把整个文件读进内存
+    assert consumed <= 3
+
+
+def test_empty_or_blank_text_yields_nothing():
+    service = ChunkingService()
+
+    assert list(service.iter_split_stream([])) == []
+    assert list(service.iter_split_stream(["  ", "\r\n", "\t"])) == []
@@ -0,0 +1,307 @@
+import os
+import queue
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from types import SimpleNamespace
+
+import pytest
+
+from backend.core.config import settings
+from backend.core.exceptions import ValidationError
+from backend.services import docling_parser
+from backend.services.chunking_service import ChunkingService, ParsedChunk
+from backend.services.docling_parser import (
+    DoclingParseExecutor,
+    ParsedDocument,
+    garbage_ratio,
+    is_text_layer_usable,
+    parse_structured_document,
+    plan_page_ranges,
+)
+
+
+class FakeConverter:
+    def __init__(self):
+        self.page_ranges: list[tuple[int, int] | None] = []
+
+    def convert(self, _: str, page_range: tuple[int, int] | None = None):
+        self.page_ranges.append(page_range)
+        return SimpleNamespace(document=object())
+
+
+class FakeChunker:
+    def chunk(self, *, dl_doc: object):
+        return iter(["标题\n" + "正文" * 150, "  ", "短段落"])
+
+    def contextualize(self, chunk: str) -> str:
+        return chunk
+
+
+@pytest.fixture
+def fake_docling(monkeypatch):
+    converter = FakeConverter()
+    monkeypatch.setattr(
+        docling_parser.DoclingModelFactory, "get_converter", lambda: converter
+    )
+    monkeypatch.setattr(
+        docling_parser.DoclingModelFactory,
+        "get_hierarchical_chunker",
+        lambda: FakeChunker(),
+    )
+    monkeypatch.setattr(docling_parser, "read_pdf_text_layer", lambda *_: None)
+    return converter
+
+
+@pytest.mark.usefixtures("fake_docling")
+def test_parse_returns_chunk_texts(tmp_path):
+    executor = DoclingParseExecutor(max_workers=1, timeout_seconds=5, kind="thread")
+    try:
+        document = executor.parse(
+            tmp_path / "demo.pdf", chunk_size=200, chunk_overlap=20
+        )
+    finally:
+        executor.shutdown()
+
+    # 超长结构块被二次切分，空块被跳过
+    texts = [chunk.text for chunk in document.chunks]
+    assert len(texts) > 2
+    assert texts[0].startswith("标题")
+    assert texts[-1] == "短段落"
+
+
+def test_parse_times_out_without_resetting_pool(monkeypatch, tmp_path):
+    def slow_parse(file_path, chunk_size, chunk_overlap, page_range=None):
+        time.sleep(0.5)
+        return ParsedDocument(chunks=[], tier_pages={})
+
+    monkeypatch.setattr(docling_parser, "parse_structured_document_sync", slow_parse)
+    executor = DoclingParseExecutor(max_workers=1, timeout_seconds=0.05, kind="thread")
+    pool = executor._get_pool()
+
+    with pytest.raises(ValidationError, match="超时"):
+        executor.parse(tmp_path / "big.pdf", chunk_size=800, chunk_overlap=120)
+
+    # 单个文档超时不拖垮池内其它文档
+    assert executor._pool is pool
+    executor.shutdown()
+
+
+def test_parse_timeout_excludes_time_queued_behind_other_documents(
+    monkeypatch, tmp_path
+):
+    def parse(file_path, chunk_size, chunk_overlap, page_range=None):
+        time.sleep(0.2)
+        return ParsedDocument(chunks=[ParsedChunk(file_path, {})], tier_pages={})
+
+    monkeypatch.setattr(docling_parser, "parse_structured_document_sync", parse)
+    executor = DoclingParseExecutor(max_workers=1, timeout_seconds=0.3, kind="thread")
+    try:
+        with ThreadPoolExecutor(max_workers=2) as callers:
+            # 第二个文档排队约 0.2s、解析 0.2s，总耗时超过 timeout 但解析本身未超时
+            documents = list(
+                callers.map(
+                    lambda name: executor.parse(
+                        tmp_path / name, chunk_size=800, chunk_overlap=0
+                    ),
+                    ["a.docx", "b.docx"],
+                )
+            )
+    finally:
+        executor.shutdown()
+
+    assert [document.chunks[0].text for document in documents] == [
+        str(tmp_path / "a.docx"),
+        str(tmp_path / "b.docx"),
+    ]
+
+
+def test_worker_deadline_interrupts_only_the_running_task(monkeypatch):
+    def stuck_parse(file_path, chunk_size, chunk_overlap, page_range=None):
+        time.sleep(5)
+
+    monkeypatch.setattr(docling_parser, "parse_structured_document_sync", stuck_parse)
+    started = queue.SimpleQueue()
+    docling_parser._bind_start_queue(started)
+    try:
+        with pytest.raises(docling_parser.ParseDeadlineExceeded):
+            docling_parser._parse_task("token", 0.05, "a.pdf", 800, 0)
+    finally:
+        docling_parser._bind_start_queue(None)
+
+    token, pid, _ = started.get_nowait()
+    assert (token, pid) == ("token", os.getpid())
+
+
+def test_worker_deadline_is_not_swallowed_by_docling_error_handling(
+    monkeypatch, fake_docling, tmp_path
+):
+    def slow_convert(_: str, page_range=None):
+        time.sleep(5)
+
+    monkeypatch.setattr(fake_docling, "convert", slow_convert)
+
+    # 真实解析链路里的 except Exception 不能把超时包装成"文件解析失败"
+    with pytest.raises(docling_parser.ParseDeadlineExceeded):
+        with docling_parser._worker_deadline(0.05):
+            list(
+                parse_structured_document(
+                    tmp_path / "slow.docx",
+                    ChunkingService(chunk_size=800, chunk_overlap=0),
+                ).chunks
+            )
+
+
+def test_parse_reports_worker_deadline_as_timeout(monkeypatch, tmp_path):
+    def expired_parse(file_path, chunk_size, chunk_overlap, page_range=None):
+        raise docling_parser.ParseDeadlineExceeded("解析超过 1s")
+
+    monkeypatch.setattr(docling_parser, "parse_structured_document_sync", expired_parse)
+    timeouts = docling_parser.DOCLING_PARSE_TIMEOUTS._value.get()
+    executor = DoclingParseExecutor(max_workers=1, timeout_seconds=1, kind="thread")
+    try:
+        with pytest.raises(ValidationError, match="超时"):
+            executor.parse(tmp_path / "a.docx", chunk_size=800, chunk_overlap=0)
+    finally:
+        executor.shutdown()
+
+    assert docling_parser.DOCLING_PARSE_TIMEOUTS._value.get() == timeouts + 1
+
+
+def test_parse_retries_once_on_broken_pool(monkeypatch, tmp_path):
+    class BrokenPool:
+        def submit(self, *args):
+            raise BrokenProcessPool("worker killed")
+
+        def shutdown(self, **kwargs):
+            pass
+
+    class HealthyPool:
+        def submit(self, fn, *args):
+            future = Future()
+            future.set_result(
+                ParsedDocument(chunks=[ParsedChunk("ok", {})], tier_pages={})
+            )
+            return future
+
+        def shutdown(self, **kwargs):
+            pass
+
+    pools = [BrokenPool(), HealthyPool()]
+    executor = DoclingParseExecutor(max_workers=1, timeout_seconds=1, kind="thread")
+    monkeypatch.setattr(executor, "_get_pool", lambda: pools[0])
+    monkeypatch.setattr(executor, "_reset_pool", lambda pool, **_: pools.remove(pool))
+
+    document = executor.parse(tmp_path / "a.pdf", chunk_size=800, chunk_overlap=120)
+
+    assert [chunk.text for chunk in document.chunks] == ["ok"]
+
+
+BORN_DIGITAL_PAGE = "这是原生数字 PDF 的正文段落，文本层可以直接抽取。" * 4
+
+
+def test_text_layer_heuristic_flags_scans_and_garbage():
+    assert is_text_layer_usable(BORN_DIGITAL_PAGE, has_images=False)
+    # 几乎无文字的图片页视为扫描页；无图片的稀疏页（如目录页）仍走文本层
+    assert not is_text_layer_usable("  12 ", has_images=True)
+    assert is_text_layer_usable("第一章", has_images=False)
+    # 缺 ToUnicode 映射的字体抽出私有区字符
+    garbled = "\ue000\ue001\ufffd" * 40
+    assert garbage_ratio(garbled) == 1.0
+    assert not is_text_layer_usable(garbled, has_images=False)
+
+
+def test_pdf_uses_text_layer_and_sends_failed_pages_to_docling(
+    monkeypatch, fake_docling, tmp_path
+):
+    pages = [
+        (BORN_DIGITAL_PAGE, False),
+        (BORN_DIGITAL_PAGE, True),
+        ("", True),
+        (BORN_DIGITAL_PAGE, False),
+    ]
+    monkeypatch.setattr(docling_parser, "read_pdf_text_layer", lambda *_: pages)
+
+    document = parse_structured_document(
+        tmp_path / "mixed.pdf", ChunkingService(chunk_size=800, chunk_overlap=0)
+    )
+
+    assert fake_docling.page_ranges == [(3, 3)]
+    assert document.tier_pages == {"text_layer": 3, "docling": 1}
+    spans = [
+        (chunk.meta_info["extract_tier"], chunk.meta_info["page_start"])
+        for chunk in document.chunks
+    ]
+    assert spans[0] == ("text_layer", 1)
+    assert ("docling", 3) in spans
+    assert spans[-1] == ("text_layer", 4)
+
+
+def test_pdf_with_mostly_scanned_pages_goes_to_docling_whole(
+    monkeypatch, fake_docling, tmp_path
+):
+    pages = [("", True), ("", True), (BORN_DIGITAL_PAGE, False)]
+    monkeypatch.setattr(docling_parser, "read_pdf_text_layer", lambda *_: pages)
+
+    document = parse_structured_document(
+        tmp_path / "scan.pdf", ChunkingService(chunk_size=800, chunk_overlap=0)
+    )
+
+    assert fake_docling.page_ranges == [None]
+    assert document.tier_pages == {"docling": 3}
+    assert {chunk.meta_info["extract_tier"] for chunk in document.chunks} == {"docling"}
+
+
+def test_plan_page_ranges_splits_only_large_pdfs(monkeypatch):
+    monkeypatch.setattr(settings, "DOCLING_PARSE_SPLIT_MIN_PAGES", 100)
+    monkeypatch.setattr(settings, "DOCLING_PARSE_RANGE_PAGES", 50)
+
+    assert plan_page_ranges(99) == []
+    assert plan_page_ranges(120) == [(1, 50), (51, 100), (101, 120)]
+
+
+@pytest.mark.usefixtures("fake_docling")
+def test_large_pdf_is_parsed_by_page_range_in_parallel(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "DOCLING_PARSE_SPLIT_MIN_PAGES", 100)
+    monkeypatch.setattr(settings, "DOCLING_PARSE_RANGE_PAGES", 50)
+    monkeypatch.setattr(docling_parser, "count_pdf_pages", lambda _: 120)
+
+    def read_range(_, page_range):
+        first, last = page_range
+        # 倒序放慢前面的页段，让页段乱序完成
+        time.sleep(0.01 * (120 - last) / 10)
+        return [
+            (f"第 {page_no} 页正文。" + BORN_DIGITAL_PAGE, False)
+            for page_no in range(first, last + 1)
+        ]
+
+    monkeypatch.setattr(docling_parser, "read_pdf_text_layer", read_range)
+    progress: list[tuple[int, int]] = []
+    executor = DoclingParseExecutor(max_workers=3, timeout_seconds=5, kind="thread")
+    try:
+        document = executor.parse(
+            tmp_path / "book.pdf",
+            chunk_size=800,
+            chunk_overlap=0,
+            on_progress=lambda done, total: progress.append((done, total)),
+        )
+    finally:
+        executor.shutdown()
+
+    assert progress == [(1, 3), (2, 3), (3, 3)]
+    assert document.tier_pages == {"text_layer": 120}
+    # 合并结果按页段顺序排列，与整篇顺序解析一致
+    starts = [chunk.meta_info["page_start"] for chunk in document.chunks]
+    assert starts == sorted(starts)
+    assert document.chunks[0].text.startswith("第 1 页")
+    assert set(starts) == {1, 51, 101}
+
+
+def test_parse_workers_default_to_cpu_count(monkeypatch):
+    monkeypatch.setattr(settings, "DOCLING_PARSE_WORKERS", None)
+    monkeypatch.setattr(docling_parser.os, "cpu_count", lambda: 8)
+
+    # 未配置时页段也能并行，但限制进程数以控制模型内存
+    assert DoclingParseExecutor().max_workers == 4
+    monkeypatch.setattr(docling_parser.os, "cpu_count", lambda: 1)
+    assert DoclingParseExecutor().max_workers == 1
@@ -1,6 +1,10 @@
 from __future__ import annotations
 
+import hashlib
+import io
+import tarfile
 import uuid
+import zipfile
 from io import BytesIO
 from pathlib import Path
 from types import SimpleNamespace
@@ -9,9 +13,9 @@ from unittest.mock import AsyncMock
 import pytest
 from fastapi import UploadFile
 
-from backend.core.exceptions import ResourceNotFound, ValidationError
+from backend.core.exceptions import ResourceNotFound, ServiceError, ValidationError
 from backend.models.orm.knowledge import FileStatus
-from backend.services.knowledge_service import KnowledgeService
+from backend.services.knowledge_service import UPLOAD_BUFFER_SIZE, KnowledgeService
 
 
 @pytest.fixture
@@ -33,9 +37,9 @@ def make_upload_file(filename: str, content: bytes, *, size: int | None = None)
     )
 
 
-class TestKnowledgeServiceStreamingUpload:
+class TestKnowledgeServiceUpload:
     @pytest.mark.asyncio
-    async def test_save_upload_file_streaming_writes_file_and_records_metadata(
+    async def test_save_upload_file_writes_file_and_records_metadata(
         self,
         knowledge_service,
     ):
@@ -52,16 +56,18 @@ class TestKnowledgeServiceStreamingUpload:
         repo.create_file.side_effect = create_file
         upload_file = make_upload_file("demo.txt", content, size=len(content))
 
-        result = await service.save_upload_file_streaming(
+        result = await service.save_upload_file(
             kb_id=kb_id,
             user_id=user_id,
             upload_file=upload_file,
         )
 
         saved_path = Path(result.file_path)
+        content_hash = hashlib.sha256(content).hexdigest()
         assert saved_path.exists()
         assert saved_path.read_bytes() == content
-        assert saved_path.parent == storage_root / str(kb_id)
+        assert saved_path == storage_root / "objects" / content_hash[:2] / f"{content_hash}.txt"
+        assert result.content_hash == content_hash
         assert result.filename == "demo.txt"
         assert result.file_size == len(content)
         assert result.status == FileStatus.UPLOADED
@@ -69,7 +75,7 @@ class TestKnowledgeServiceStreamingUpload:
         repo.create_file.assert_awaited_once()
 
     @pytest.mark.asyncio
-    async def test_save_upload_file_streaming_rejects_missing_kb_access(
+    async def test_save_upload_file_rejects_missing_kb_access(
         self,
         knowledge_service,
     ):
@@ -79,7 +85,7 @@ class TestKnowledgeServiceStreamingUpload:
         upload_file = make_upload_file("demo.txt", b"abc", size=3)
 
         with pytest.raises(ResourceNotFound):
-            await service.save_upload_file_streaming(
+            await service.save_upload_file(
                 kb_id=uuid.uuid4(),
                 user_id=uuid.uuid4(),
                 upload_file=upload_file,
@@ -89,7 +95,7 @@ class TestKnowledgeServiceStreamingUpload:
         assert not any(path.is_file() for path in storage_root.rglob("*"))
 
     @pytest.mark.asyncio
-    async def test_save_upload_file_streaming_cleans_partial_file_when_size_limit_exceeded(
+    async def test_save_upload_file_cleans_partial_file_when_size_limit_exceeded(
         self,
         knowledge_service,
     ):
@@ -102,7 +108,7 @@ class TestKnowledgeServiceStreamingUpload:
         upload_file = make_upload_file("too-large.txt", oversize_content)
 
         with pytest.raises(ValidationError) as exc_info:
-            await service.save_upload_file_streaming(
+            await service.save_upload_file(
                 kb_id=kb_id,
                 user_id=user_id,
                 upload_file=upload_file,
@@ -111,3 +117,190 @@ class TestKnowledgeServiceStreamingUpload:
         assert f"最大 {service.max_upload_size_mb}MB" in exc_info.value.message
         repo.create_file.assert_not_awaited()
         assert not any(path.is_file() for path in storage_root.rglob("*"))
+
+    @pytest.mark.asyncio
+    async def test_save_upload_file_stores_same_content_once(
+        self,
+        knowledge_service,
+    ):
+        service, repo, storage_root = knowledge_service
+        repo.get_kb_for_user.return_value = SimpleNamespace(id=uuid.uuid4())
+
+        async def create_file(**kwargs):
+            return SimpleNamespace(id=uuid.uuid4(), **kwargs)
+
+        repo.create_file.side_effect = create_file
+        content = b"same document"
+        results = [
+            await service.save_upload_file(
+                kb_id=uuid.uuid4(),
+                user_id=uuid.uuid4(),
+                upload_file=make_upload_file("doc.md", content),
+            )
+            for _ in range(2)
+        ]
+
+        assert results[0].file_path == results[1].file_path
+        assert results[0].content_hash == results[1].content_hash
+        stored = [path for path in storage_root.rglob("*") if path.is_file()]
+        assert stored == [Path(results[0].file_path)]
+
+    @pytest.mark.asyncio
+    async def test_failed_record_keeps_object_shared_with_existing_file(
+        self,
+        knowledge_service,
+    ):
+        service, repo, storage_root = knowledge_service
+        repo.get_kb_for_user.return_value = SimpleNamespace(id=uuid.uuid4())
+
+        async def create_file(**kwargs):
+            return SimpleNamespace(id=uuid.uuid4(), **kwargs)
+
+        repo.create_file.side_effect = create_file
+        first = await service.save_upload_file(
+            kb_id=uuid.uuid4(),
+            user_id=uuid.uuid4(),
+            upload_file=make_upload_file("doc.md", b"shared"),
+        )
+        repo.create_file.side_effect = RuntimeError("db down")
+
+        with pytest.raises(ServiceError):
+            await service.save_upload_file(
+                kb_id=uuid.uuid4(),
+                user_id=uuid.uuid4(),
+                upload_file=make_upload_file("copy.md", b"shared"),
+            )
+
+        assert Path(first.file_path).exists()
+
+    @pytest.mark.asyncio
+    async def test_save_upload_file_stops_reading_once_limit_is_exceeded(
+        self,
+        knowledge_service,
+    ):
+        service, repo, storage_root = knowledge_service
+        repo.get_kb_for_user.return_value = SimpleNamespace(id=uuid.uuid4())
+
+        class CountingSource(BytesIO):
+            consumed = 0
+
+            def readinto(self, buffer):
+                read = super().readinto(buffer)
+                CountingSource.consumed += read
+                return read
+
+        source = CountingSource(b"a" * (service.max_upload_size_bytes * 5))
+        upload_file = UploadFile(file=source, filename="huge.pdf")
+
+        with pytest.raises(ValidationError):
+            await service.save_upload_file(
+                kb_id=uuid.uuid4(),
+                user_id=uuid.uuid4(),
+                upload_file=upload_file,
+            )
+
+        # 超限后立即中止，最多多读一个缓冲区，不会把整个请求体读进内存
+        assert CountingSource.consumed <= service.max_upload_size_bytes + UPLOAD_BUFFER_SIZE
+        assert not any(path.is_file() for path in storage_root.rglob("*"))
+
+
+def make_zip(entries: dict[str, bytes]) -> bytes:
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in entries.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+def make_tar_gz(entries: dict[str, bytes]) -> bytes:
+    buffer = BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, content in entries.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+class TestKnowledgeServiceBatchUpload:
+    @staticmethod
+    def _bind_create_files(repo):
+        async def create_files(*, kb_id, files):
+            return [
+                SimpleNamespace(id=uuid.uuid4(), status=FileStatus.UPLOADED, **row)
+                for row in files
+            ]
+
+        repo.create_files = AsyncMock(side_effect=create_files)
+
+    @pytest.mark.asyncio
+    async def test_zip_entries_are_stored_with_one_bulk_insert(self, knowledge_service):
+        service, repo, storage_root = knowledge_service
+        repo.get_kb_for_user.return_value = SimpleNamespace(id=uuid.uuid4())
+        self._bind_create_files(repo)
+        archive = make_zip(
+            {
+                "docs/guide.md": b"# guide",
+                "docs/notes.txt": b"notes",
+                "docs/image.png": b"\x89PNG",
+                "__MACOSX/docs/._guide.md": b"meta",
+                "docs/.hidden.md": b"hidden",
+                "docs/empty.txt": b"",
+            }
+        )
+
+        staged = await service.stage_upload_batch(
+            upload_files=[
+                make_upload_file("bundle.zip", archive),
+                make_upload_file("single.md", b"single"),
+            ],
+            allowed_suffixes={".md", ".txt"},
+        )
+        result = await service.record_upload_batch(kb_id=uuid.uuid4(), staged=staged)
+
+        repo.create_files.assert_awaited_once()
+        assert sorted(item.filename for item in result.files) == [
+            "guide.md",
+            "notes.txt",
+            "single.md",
+        ]
+        for item in result.files:
+            assert Path(item.file_path).is_file()
+        assert sorted(item["filename"] for item in result.skipped) == [
+            "empty.txt",
+            "image.png",
+        ]
+
+    @pytest.mark.asyncio
+    async def test_tar_archive_is_stream_extracted(self, knowledge_service):
+        service, repo, storage_root = knowledge_service
+        repo.get_kb_for_user.return_value = SimpleNamespace(id=uuid.uuid4())
+        self._bind_create_files(repo)
+        archive = make_tar_gz({"a/one.md": b"one", "a/two.txt": b"two"})
+
+        staged = await service.stage_upload_batch(
+            upload_files=[make_upload_file("bundle.tar.gz", archive)],
+            allowed_suffixes={".md", ".txt"},
+        )
+        result = await service.record_upload_batch(kb_id=uuid.uuid4(), staged=staged)
+
+        contents = sorted(Path(item.file_path).read_bytes() for item in result.files)
+        assert contents == [b"one", b"two"]
+        assert result.skipped == []
+
+    @pytest.mark.asyncio
+    async def test_batch_rejects_too_many_files_and_cleans_up(self, knowledge_service):
+        service, repo, storage_root = knowledge_service
+        repo.get_kb_for_user.return_value = SimpleNamespace(id=uuid.uuid4())
+        self._bind_create_files(repo)
+        service.max_batch_files = 2
+        archive = make_zip({f"doc{idx}.md": f"doc {idx}".encode() for idx in range(3)})
+
+        with pytest.raises(ValidationError):
+            await service.stage_upload_batch(
+                upload_files=[make_upload_file("bundle.zip", archive)],
+                allowed_suffixes={".md"},
+            )
+
+        repo.create_files.assert_not_awaited()
+        assert not any(path.is_file() for path in storage_root.rglob("*"))
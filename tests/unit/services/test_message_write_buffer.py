@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import asyncio
+import uuid
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from backend.models.orm.chat import MessageStatus
+from backend.services import message_write_buffer as buffer_module
+from backend.services.message_write_buffer import (
+    MessageFinalization,
+    MessageWriteBuffer,
+)
+
+
+class FakeSpillLog:
+    """用 dict 模拟溢出日志用到的 Redis 命令（Hash / Set / 带 NX、EX 的 String）"""
+
+    def __init__(self):
+        self.hashes: dict[str, dict[str, bytes]] = {}
+        self.sets: dict[str, set[str]] = {}
+        self.strings: dict[str, str] = {}
+        self.hset = AsyncMock(side_effect=self._hset)
+        self.hdel = AsyncMock(side_effect=self._hdel)
+
+    async def _hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = value
+
+    async def _hdel(self, key, *fields):
+        for field in fields:
+            self.hashes.get(key, {}).pop(field, None)
+
+    async def hscan_iter(self, key, count=None):
+        for item in list(self.hashes.get(key, {}).items()):
+            yield item
+
+    async def hlen(self, key):
+        return len(self.hashes.get(key, {}))
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = value
+        return True
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.strings.pop(key, None)
+            self.hashes.pop(key, None)
+
+    async def sadd(self, key, *members):
+        self.sets.setdefault(key, set()).update(members)
+
+    async def srem(self, key, *members):
+        self.sets.get(key, set()).difference_update(members)
+
+    async def smembers(self, key):
+        return set(self.sets.get(key, set()))
+
+
+def make_record(**overrides) -> MessageFinalization:
+    data = {
+        "message_id": uuid.uuid4(),
+        "content": "answer",
+        "tokens_input": 10,
+        "tokens_output": 5,
+    }
+    data.update(overrides)
+    return MessageFinalization(**data)
+
+
+@pytest.fixture
+def buffer_ctx(monkeypatch):
+    redis = FakeSpillLog()
+    monkeypatch.setattr(
+        buffer_module.redis_client, "init", AsyncMock(return_value=redis)
+    )
+    buffer = MessageWriteBuffer(
+        flush_interval_ms=10_000, max_batch=3, spill_key="spill"
+    )
+    written: list[list[MessageFinalization]] = []
+
+    async def write_batch(batch):
+        written.append(list(batch))
+
+    buffer._write_batch = AsyncMock(side_effect=write_batch)
+    return SimpleNamespace(
+        buffer=buffer,
+        redis=redis,
+        written=written,
+        spill=lambda: redis.hashes.get(buffer.spill_key, {}),
+    )
+
+
+def test_record_json_round_trip():
+    record = make_record(
+        status=MessageStatus.FAILED,
+        latency_ms=12,
+        search_context={"kb_id": "1"},
+        user_id=uuid.uuid4(),
+    )
+
+    assert MessageFinalization.from_json(record.to_json()) == record
+    assert record.to_row()["id"] == record.message_id
+
+
+@pytest.mark.asyncio
+async def test_submit_spills_before_returning_and_flush_clears_spill(buffer_ctx):
+    buffer_ctx.buffer.start(MagicMock())
+    record = make_record()
+
+    await buffer_ctx.buffer.submit(record)
+
+    # 热路径只写溢出日志，不等 DB
+    assert str(record.message_id) in buffer_ctx.spill()
+    assert buffer_ctx.written == []
+
+    assert await buffer_ctx.buffer.flush_once() == 1
+    assert buffer_ctx.written == [[record]]
+    assert buffer_ctx.spill() == {}
+    await buffer_ctx.buffer.stop()
+
+
+@pytest.mark.asyncio
+async def test_full_batch_wakes_background_flush(buffer_ctx):
+    buffer_ctx.buffer.start(MagicMock())
+
+    for _ in range(3):
+        await buffer_ctx.buffer.submit(make_record())
+    for _ in range(20):
+        if buffer_ctx.written:
+            break
+        await asyncio.sleep(0.01)
+
+    assert len(buffer_ctx.written) == 1
+    assert len(buffer_ctx.written[0]) == 3
+    await buffer_ctx.buffer.stop()
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_records_for_retry(buffer_ctx):
+    buffer_ctx.buffer.start(MagicMock())
+    record = make_record()
+    await buffer_ctx.buffer.submit(record)
+    buffer_ctx.buffer._write_batch.side_effect = RuntimeError("db down")
+
+    assert await buffer_ctx.buffer.flush_once() == 0
+
+    assert buffer_ctx.buffer.pending_count == 1
+    assert str(record.message_id) in buffer_ctx.spill()
+    buffer_ctx.buffer._write_batch.side_effect = None
+    await buffer_ctx.buffer.stop()
+    assert buffer_ctx.buffer.pending_count == 0
+
+
+@pytest.mark.asyncio
+async def test_stop_flushes_remaining_records(buffer_ctx):
+    buffer_ctx.buffer.start(MagicMock())
+    records = [make_record() for _ in range(5)]
+    for record in records:
+        await buffer_ctx.buffer.submit(record)
+
+    await buffer_ctx.buffer.stop()
+
+    flushed = [r for batch in buffer_ctx.written for r in batch]
+    assert flushed == records
+    assert buffer_ctx.spill() == {}
+
+
+@pytest.mark.asyncio
+async def test_spill_failure_falls_back_to_sync_write(buffer_ctx):
+    buffer_ctx.buffer.start(MagicMock())
+    buffer_ctx.redis.hset.side_effect = RedisConnectionError("down")
+    record = make_record()
+
+    await buffer_ctx.buffer.submit(record)
+
+    assert buffer_ctx.written == [[record]]
+    assert buffer_ctx.buffer.pending_count == 0
+    await buffer_ctx.buffer.stop()
+
+
+def _write_foreign_log(redis, owner: str, records) -> None:
+    redis.hashes[f"spill:{owner}"] = {
+        str(record.message_id): record.to_json() for record in records
+    }
+    redis.sets.setdefault("spill:instances", set()).add(owner)
+
+
+@pytest.mark.asyncio
+async def test_recover_replays_logs_of_instances_with_expired_lease(buffer_ctx):
+    records = [make_record() for _ in range(4)]
+    _write_foreign_log(buffer_ctx.redis, "dead", records)
+    buffer_ctx.redis.hashes["spill:dead"]["broken"] = b"{not json"
+
+    replayed = await buffer_ctx.buffer.recover()
+
+    assert replayed == 4
+    assert [len(batch) for batch in buffer_ctx.written] == [3, 1]
+    assert list(buffer_ctx.redis.hashes["spill:dead"]) == ["broken"]
+
+
+@pytest.mark.asyncio
+async def test_recover_skips_logs_of_live_instances(buffer_ctx):
+    live = MessageWriteBuffer(flush_interval_ms=10_000, max_batch=3, spill_key="spill")
+    live._write_batch = AsyncMock()
+    live.start(MagicMock())
+    record = make_record()
+    await live.submit(record)
+
+    assert await buffer_ctx.buffer.recover() == 0
+
+    # 存活副本仍持有该记录，其溢出日志不能被别的副本删掉
+    assert buffer_ctx.written == []
+    assert str(record.message_id) in buffer_ctx.redis.hashes[live.spill_key]
+    await live.stop()
+
+
+@pytest.mark.asyncio
+async def test_recovered_log_is_unregistered_once_drained(buffer_ctx):
+    _write_foreign_log(buffer_ctx.redis, "dead", [make_record()])
+
+    assert await buffer_ctx.buffer.recover() == 1
+
+    assert "dead" not in buffer_ctx.redis.sets["spill:instances"]
+    assert "spill:lease:dead" not in buffer_ctx.redis.strings
+    # 再次恢复不会重复重放
+    assert await buffer_ctx.buffer.recover() == 0
+
+
+@pytest.mark.asyncio
+async def test_clean_stop_releases_lease_and_log(buffer_ctx):
+    buffer_ctx.buffer.start(MagicMock())
+    await buffer_ctx.buffer.submit(make_record())
+
+    await buffer_ctx.buffer.stop()
+
+    assert buffer_ctx.buffer.instance_id not in buffer_ctx.redis.sets["spill:instances"]
+    assert buffer_ctx.buffer.spill_key not in buffer_ctx.redis.hashes
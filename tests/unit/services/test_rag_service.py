@@ -4,7 +4,7 @@ from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 
-from backend.services.rag_service import RAGService
+from backend.services.rag_service import RAGService, mmr_rerank
 
 
 def _build_service() -> RAGService:
@@ -27,6 +27,8 @@ async def test_retrieve_fulltext_formats_hits():
         source_type="file",
         file_id=uuid.uuid4(),
         message_id=None,
+        token_count=3,
+        chunk_index=0,
     )
     service.vector_index_service.search_chunks_for_kb_fulltext = AsyncMock(
         return_value=[(chunk, 0.2)]
@@ -44,6 +46,8 @@ async def test_retrieve_fulltext_formats_hits():
     assert result[0]["file_id"] == str(chunk.file_id)
     assert result[0]["distance"] == 0.2
     assert result[0]["score"] == 0.8
+    assert result[0]["token_count"] == 3
+    assert result[0]["chunk_index"] == 0
 
 
 @pytest.mark.asyncio
@@ -60,3 +64,97 @@ async def test_retrieve_hybrid_returns_empty_on_error():
     )
 
     assert result == []
+
+
+@pytest.mark.asyncio
+async def test_retrieve_with_embedding_reuses_query_vector():
+    service = _build_service()
+    kb_id = uuid.uuid4()
+    chunk = SimpleNamespace(
+        id=uuid.uuid4(),
+        content="chunk text",
+        source_type="file",
+        file_id=None,
+        message_id=None,
+        token_count=3,
+        chunk_index=0,
+    )
+    service.vector_index_service.embed_query = AsyncMock(return_value=[0.1, 0.2])
+    service.vector_index_service.search_chunks_for_kb = AsyncMock(
+        return_value=[(chunk, 0.1)]
+    )
+
+    chunks, embedding = await service.retrieve_with_embedding(
+        query_text="test query",
+        kb_id=kb_id,
+    )
+
+    assert embedding == [0.1, 0.2]
+    assert chunks[0]["id"] == str(chunk.id)
+    service.vector_index_service.embed_query.assert_awaited_once_with("test query")
+    search_kwargs = service.vector_index_service.search_chunks_for_kb.await_args.kwargs
+    assert search_kwargs["query_vector"] == [0.1, 0.2]
+
+
+def test_mmr_rerank_skips_near_duplicates():
+    query = [1.0, 0.0, 0.0]
+    candidates = [
+        [1.0, 0.05, 0.0],  # 最相关
+        [1.0, 0.06, 0.0],  # 与第一条几乎重复
+        [0.8, 0.0, 0.6],  # 相关度稍低但提供新信息
+    ]
+
+    assert mmr_rerank(query, candidates, k=2, lambda_mult=0.5) == [0, 2]
+    # λ=1 退化为纯相关度排序
+    assert mmr_rerank(query, candidates, k=2, lambda_mult=1.0) == [0, 1]
+
+
+def test_mmr_rerank_fills_by_relevance_when_over_budget():
+    ticks = iter([0.0, 1.0, 1.0, 1.0])
+    query = [1.0, 0.0]
+    candidates = [[0.6, 0.8], [1.0, 0.0], [0.9, 0.1], [0.0, 1.0]]
+
+    order = mmr_rerank(
+        query,
+        candidates,
+        k=3,
+        lambda_mult=0.5,
+        time_budget_seconds=0.5,
+        clock=lambda: next(ticks),
+    )
+
+    assert order == [1, 2, 0]
+
+
+@pytest.mark.asyncio
+async def test_retrieve_with_mmr_fetches_candidates_with_embeddings():
+    service = _build_service()
+    service.mmr_enabled = True
+    service.mmr_lambda = 0.3
+
+    def make_chunk(vector):
+        return SimpleNamespace(
+            id=uuid.uuid4(),
+            content="c",
+            source_type="file",
+            file_id=None,
+            message_id=None,
+            token_count=1,
+            chunk_index=0,
+            embedding=vector,
+        )
+
+    duplicate_a = make_chunk([1.0, 0.05])
+    duplicate_b = make_chunk([1.0, 0.06])
+    distinct = make_chunk([0.7, 0.7])
+    service.vector_index_service.embed_query = AsyncMock(return_value=[1.0, 0.0])
+    service.vector_index_service.search_chunks_for_kb = AsyncMock(
+        return_value=[(duplicate_a, 0.01), (duplicate_b, 0.02), (distinct, 0.3)]
+    )
+
+    chunks = await service.retrieve(query_text="q", kb_id=uuid.uuid4(), top_k=2)
+
+    assert [chunk["id"] for chunk in chunks] == [str(duplicate_a.id), str(distinct.id)]
+    search_kwargs = service.vector_index_service.search_chunks_for_kb.await_args.kwargs
+    assert search_kwargs["with_embeddings"] is True
+    assert search_kwargs["limit"] > 2
@@ -0,0 +1,110 @@
+import time
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from backend.ai.providers.rerank import RerankerFactory
+from backend.api.deps.ai import get_reranker, load_reranker
+from backend.core.config import settings
+from backend.core.exceptions import DependencyUnavailable, ServiceError
+from backend.domain.interfaces import AbstractReranker
+from backend.services.rerank_service import RerankScoreCache, RerankService
+
+
+class KeywordReranker(AbstractReranker):
+    """按 passage 中关键词出现次数打分，记录每次调用的批大小"""
+
+    def __init__(self, keyword: str, delay: float = 0.0):
+        self.keyword = keyword
+        self.delay = delay
+        self.calls: list[int] = []
+
+    def score(self, query: str, passages: list[str]) -> list[float]:
+        self.calls.append(len(passages))
+        if self.delay:
+            time.sleep(self.delay)
+        return [float(text.count(self.keyword)) - 1.0 for text in passages]
+
+
+def make_hits(*contents: str):
+    return [
+        (SimpleNamespace(id=uuid.uuid4(), content=content), 0.1 * idx)
+        for idx, content in enumerate(contents)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_rerank_orders_by_cross_encoder_score_in_batches():
+    reranker = KeywordReranker("部署")
+    service = RerankService(
+        reranker, timeout_seconds=5, batch_size=2, cache=RerankScoreCache(100)
+    )
+    hits = make_hits("无关内容", "部署 部署 部署", "部署一次")
+
+    ranked = await service.rerank("怎么部署", hits, limit=2)
+
+    assert [chunk.content for chunk, _ in ranked] == ["部署 部署 部署", "部署一次"]
+    # distance = 1 - sigmoid(logit)，越相关越小
+    assert ranked[0][1] < ranked[1][1] < 1.0
+    assert reranker.calls == [2, 1]
+
+
+@pytest.mark.asyncio
+async def test_rerank_reuses_cached_scores():
+    reranker = KeywordReranker("部署")
+    service = RerankService(
+        reranker, timeout_seconds=5, batch_size=8, cache=RerankScoreCache(100)
+    )
+    hits = make_hits("部署", "其他")
+
+    await service.rerank("怎么部署", hits, limit=2)
+    await service.rerank("怎么部署", hits, limit=2)
+
+    assert reranker.calls == [2]
+
+
+@pytest.mark.asyncio
+async def test_rerank_falls_back_to_fused_order_on_timeout():
+    reranker = KeywordReranker("部署", delay=0.2)
+    service = RerankService(
+        reranker, timeout_seconds=0.05, batch_size=8, cache=RerankScoreCache(100)
+    )
+    hits = make_hits("无关内容", "部署 部署")
+
+    ranked = await service.rerank("怎么部署", hits, limit=1)
+
+    assert ranked == hits[:1]
+
+
+@pytest.mark.asyncio
+async def test_rerank_falls_back_on_reranker_error():
+    class BrokenReranker(AbstractReranker):
+        def score(self, query, passages):
+            raise RuntimeError("onnx failure")
+
+    service = RerankService(
+        BrokenReranker(), timeout_seconds=5, cache=RerankScoreCache(100)
+    )
+    hits = make_hits("a", "b", "c")
+
+    assert await service.rerank("q", hits, limit=2) == hits[:2]
+
+
+def test_factory_returns_none_when_disabled():
+    assert RerankerFactory.create(provider="none") is None
+
+
+def test_factory_onnx_requires_runtime_and_model_files(tmp_path):
+    with pytest.raises((DependencyUnavailable, ServiceError)):
+        RerankerFactory.create(provider="onnx", model_path=tmp_path)
+
+
+def test_load_reranker_falls_back_to_none_on_startup_failure(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "RAG_RERANK_PROVIDER", "onnx")
+    monkeypatch.setattr(settings, "RAG_RERANK_MODEL_PATH", tmp_path)
+
+    # 依赖或模型缺失只在启动时记录一次，请求期拿到 None 退回融合顺序
+    assert load_reranker() is None
+    request = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace()))
+    assert get_reranker(request) is None
@@ -0,0 +1,113 @@
+"""
+SessionQueryService 单元测试
+
+覆盖会话列表的 keyset 游标分页与详情计数字段。
+"""
+
+import uuid
+from datetime import UTC, datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from backend.core.exceptions import ResourceNotFound, ValidationError
+from backend.services.session_query_service import SessionQueryService
+from backend.utils.pagination import decode_cursor, encode_cursor
+
+
+def make_session(updated_at: datetime, **overrides):
+    data = {
+        "id": uuid.uuid4(),
+        "title": "会话",
+        "user_id": uuid.uuid4(),
+        "kb_id": None,
+        "llm_config": {},
+        "message_count": 4,
+        "total_tokens": 120,
+        "created_at": updated_at,
+        "updated_at": updated_at,
+    }
+    data.update(overrides)
+    return SimpleNamespace(**data)
+
+
+@pytest.fixture
+def mock_uow():
+    uow = AsyncMock()
+    uow.chat_repo = AsyncMock()
+    return uow
+
+
+@pytest.fixture
+def service(mock_uow):
+    return SessionQueryService(mock_uow)
+
+
+def test_cursor_round_trip():
+    ts = datetime(2026, 5, 1, 8, 30, tzinfo=UTC)
+    row_id = uuid.uuid4()
+
+    assert decode_cursor(encode_cursor(ts, row_id)) == (ts, row_id)
+
+
+def test_decode_cursor_rejects_garbage():
+    with pytest.raises(ValidationError):
+        decode_cursor("not-a-cursor")
+
+
+@pytest.mark.asyncio
+async def test_list_user_sessions_returns_next_cursor_when_more(service, mock_uow):
+    now = datetime.now(UTC)
+    rows = [make_session(now - timedelta(minutes=i)) for i in range(3)]
+    mock_uow.chat_repo.get_user_sessions_page.return_value = rows
+    user_id = uuid.uuid4()
+
+    result = await service.list_user_sessions(user_id=user_id, limit=2)
+
+    mock_uow.chat_repo.get_user_sessions_page.assert_awaited_once_with(
+        user_id=user_id, limit=3, before=None
+    )
+    assert [item.id for item in result.items] == [rows[0].id, rows[1].id]
+    assert result.has_more is True
+    assert decode_cursor(result.next_cursor) == (rows[1].updated_at, rows[1].id)
+    assert result.items[0].message_count == 4
+    assert result.items[0].total_tokens == 120
+
+
+@pytest.mark.asyncio
+async def test_list_user_sessions_passes_decoded_cursor(service, mock_uow):
+    mock_uow.chat_repo.get_user_sessions_page.return_value = []
+    ts = datetime(2026, 5, 1, tzinfo=UTC)
+    row_id = uuid.uuid4()
+
+    result = await service.list_user_sessions(
+        user_id=uuid.uuid4(), cursor=encode_cursor(ts, row_id), limit=20
+    )
+
+    kwargs = mock_uow.chat_repo.get_user_sessions_page.call_args.kwargs
+    assert kwargs["before"] == (ts, row_id)
+    assert result.has_more is False
+    assert result.next_cursor is None
+
+
+@pytest.mark.asyncio
+async def test_session_detail_rejects_foreign_session(service, mock_uow):
+    now = datetime.now(UTC)
+    session = vars(make_session(now))
+    mock_uow.chat_repo.get_session_detail_rows.return_value = (session, [])
+
+    with pytest.raises(ValidationError):
+        await service.get_user_session_detail(
+            user_id=uuid.uuid4(), session_id=session["id"]
+        )
+
+
+@pytest.mark.asyncio
+async def test_session_detail_missing_session_raises_not_found(service, mock_uow):
+    mock_uow.chat_repo.get_session_detail_rows.return_value = (None, [])
+
+    with pytest.raises(ResourceNotFound):
+        await service.get_user_session_detail(
+            user_id=uuid.uuid4(), session_id=uuid.uuid4()
+        )
@@ -0,0 +1,154 @@
+import asyncio
+import uuid
+from unittest.mock import AsyncMock
+
+import pytest
+
+from backend.services.stream_checkpoint import StreamCheckpointer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_checkpointer(writer, clock=None, every_chunks=3, interval_seconds=10.0):
+    return StreamCheckpointer(
+        message_id=uuid.uuid4(),
+        writer=writer,
+        every_chunks=every_chunks,
+        interval_seconds=interval_seconds,
+        clock=clock or FakeClock(),
+    )
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_every_n_chunks_with_latest_content():
+    writer = AsyncMock()
+    checkpointer = make_checkpointer(writer)
+    parts: list[str] = []
+
+    for token in "abcdefg":
+        parts.append(token)
+        checkpointer.observe(parts)
+        await asyncio.sleep(0)
+
+    assert [c.args[1] for c in writer.await_args_list] == ["abc", "abcdef"]
+    await checkpointer.aclose()
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_on_interval_even_with_few_chunks():
+    writer = AsyncMock()
+    clock = FakeClock()
+    checkpointer = make_checkpointer(writer, clock, every_chunks=100)
+
+    checkpointer.observe(["a"])
+    clock.now = 10.5
+    checkpointer.observe(["a", "b"])
+    await asyncio.sleep(0)
+
+    writer.assert_awaited_once_with(checkpointer.message_id, "ab")
+    await checkpointer.aclose()
+
+
+@pytest.mark.asyncio
+async def test_triggers_coalesce_while_write_in_flight():
+    release = asyncio.Event()
+    concurrent = 0
+    max_concurrent = 0
+
+    async def slow_writer(message_id, content):
+        nonlocal concurrent, max_concurrent
+        concurrent += 1
+        max_concurrent = max(max_concurrent, concurrent)
+        await release.wait()
+        concurrent -= 1
+
+    checkpointer = make_checkpointer(slow_writer, every_chunks=1)
+    parts: list[str] = []
+    for token in "abcd":
+        parts.append(token)
+        checkpointer.observe(parts)
+        await asyncio.sleep(0)
+
+    assert checkpointer.writes == 1
+    assert checkpointer.coalesced == 3
+
+    release.set()
+    await asyncio.sleep(0)
+    parts.append("e")
+    checkpointer.observe(parts)
+    await asyncio.sleep(0)
+
+    assert checkpointer.writes == 2
+    assert max_concurrent == 1
+    await checkpointer.aclose()
+
+
+@pytest.mark.asyncio
+async def test_writer_failure_does_not_break_stream():
+    writer = AsyncMock(side_effect=RuntimeError("db down"))
+    checkpointer = make_checkpointer(writer, every_chunks=1)
+
+    checkpointer.observe(["a"])
+    await asyncio.sleep(0)
+    checkpointer.observe(["a", "b"])
+    await asyncio.sleep(0)
+
+    assert writer.await_count == 2
+    await checkpointer.aclose()
+
+
+@pytest.mark.asyncio
+async def test_aclose_waits_for_in_flight_write():
+    release = asyncio.Event()
+    written: list[str] = []
+
+    async def slow_writer(message_id, content):
+        await release.wait()
+        written.append(content)
+
+    checkpointer = make_checkpointer(slow_writer, every_chunks=1)
+    checkpointer.observe(["a"])
+    await asyncio.sleep(0)
+    asyncio.get_running_loop().call_later(0.01, release.set)
+
+    await checkpointer.aclose()
+
+    # 在途写入跑完才返回，不会被取消打断
+    assert written == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_aclose_gives_up_waiting_without_cancelling():
+    release = asyncio.Event()
+    cancelled = False
+
+    async def hanging_writer(message_id, content):
+        nonlocal cancelled
+        try:
+            await release.wait()
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+
+    checkpointer = StreamCheckpointer(
+        message_id=uuid.uuid4(),
+        writer=hanging_writer,
+        every_chunks=1,
+        interval_seconds=10.0,
+        close_timeout_seconds=0.01,
+        clock=FakeClock(),
+    )
+    checkpointer.observe(["a"])
+    await asyncio.sleep(0)
+
+    await checkpointer.aclose()
+
+    assert cancelled is False
+    release.set()
+    await asyncio.sleep(0)
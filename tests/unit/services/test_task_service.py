@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from backend.models.orm.knowledge import FileStatus
+from backend.models.orm.task import TaskStatus
+from backend.services.task_service import TaskService
+
+
+class FakeTaskRepo:
+    def __init__(self, task):
+        self.task = task
+
+    async def get_for_update(self, task_id):
+        return self.task if self.task.id == task_id else None
+
+    async def update_status(
+        self, task_id, status, progress=None, error_log=None, result=None
+    ):
+        self.task.status = status
+        if progress is not None:
+            self.task.progress = progress
+        if error_log is not None:
+            self.task.error_log = error_log
+        if result is not None:
+            self.task.result = result
+        return self.task
+
+
+class FakeKnowledgeRepo:
+    """文件状态存在内存里；stale 中的文件视为超过超时时长未更新"""
+
+    def __init__(self, statuses: dict[uuid.UUID, FileStatus], stale=()):
+        self.statuses = statuses
+        self.stale = set(stale)
+        self.touched: list[uuid.UUID] = []
+
+    async def fail_stale_files(self, file_ids, *, statuses, older_than_seconds):
+        expired = [
+            file_id
+            for file_id in file_ids
+            if file_id in self.stale and self.statuses[file_id] in statuses
+        ]
+        await self.update_files_status(expired, FileStatus.FAILED)
+        return expired
+
+    async def claim_uploaded_files(self, file_ids, *, limit):
+        pending = [f for f in file_ids if self.statuses[f] == FileStatus.UPLOADED]
+        claimed = pending[: max(limit, 0)]
+        await self.update_files_status(claimed, FileStatus.PARSING)
+        return claimed
+
+    async def touch_files(self, file_ids, *, statuses):
+        self.touched.extend(f for f in file_ids if self.statuses[f] in statuses)
+        self.stale.difference_update(self.touched)
+
+    async def update_files_status(self, file_ids, status):
+        for file_id in file_ids:
+            self.statuses[file_id] = status
+
+    async def count_files_by_status(self, file_ids):
+        counts: dict[str, int] = {}
+        for file_id in file_ids:
+            status = str(self.statuses[file_id])
+            counts[status] = counts.get(status, 0) + 1
+        return counts
+
+
+def make_service(statuses: list[FileStatus], *, stale=()):
+    file_ids = [uuid.uuid4() for _ in statuses]
+    task = SimpleNamespace(
+        id=uuid.uuid4(),
+        status=TaskStatus.PROCESSING,
+        progress=0,
+        error_log=None,
+        result=None,
+        payload={"file_ids": [str(file_id) for file_id in file_ids], "skipped": []},
+    )
+    knowledge_repo = FakeKnowledgeRepo(
+        dict(zip(file_ids, statuses, strict=True)),
+        stale=[file_ids[idx] for idx in stale],
+    )
+    uow = SimpleNamespace(task_repo=FakeTaskRepo(task), knowledge_repo=knowledge_repo)
+    return TaskService(uow), task, file_ids, knowledge_repo
+
+
+@pytest.mark.asyncio
+async def test_advance_batch_claims_only_free_slots():
+    service, task, file_ids, repo = make_service(
+        [FileStatus.CHUNKING, FileStatus.UPLOADED, FileStatus.UPLOADED]
+    )
+
+    _, claimed = await service.advance_batch_ingestion(
+        task_id=task.id, parallelism=2, file_timeout_seconds=900
+    )
+
+    # 仍在运行的子任务占着一个名额，只认领一个新文件
+    assert claimed == [file_ids[1]]
+    assert repo.statuses[file_ids[2]] == FileStatus.UPLOADED
+    assert task.status == TaskStatus.PROCESSING
+
+
+@pytest.mark.asyncio
+async def test_advance_batch_fails_stale_files_and_finishes_parent():
+    service, task, file_ids, repo = make_service(
+        [FileStatus.READY, FileStatus.PARSING, FileStatus.FAILED], stale=[1]
+    )
+
+    _, claimed = await service.advance_batch_ingestion(
+        task_id=task.id, parallelism=2, file_timeout_seconds=900
+    )
+
+    assert claimed == []
+    assert repo.statuses[file_ids[1]] == FileStatus.FAILED
+    assert task.status == TaskStatus.COMPLETED
+    assert task.result["files_failed"] == 2
+    assert "900s" in task.error_log
+
+
+@pytest.mark.asyncio
+async def test_fail_batch_files_keeps_reason_when_whole_batch_fails():
+    service, task, file_ids, _ = make_service([FileStatus.PARSING])
+
+    await service.fail_batch_files(
+        task_id=task.id, file_ids=file_ids, reason="1 个文件任务投递失败"
+    )
+
+    assert task.status == TaskStatus.FAILED
+    assert task.error_log == "1 个文件任务投递失败; 批次内全部文件处理失败"
+
+
+@pytest.mark.asyncio
+async def test_late_ready_file_corrects_finished_parent():
+    service, task, file_ids, repo = make_service([FileStatus.FAILED, FileStatus.FAILED])
+    task.status = TaskStatus.FAILED
+    task.error_log = "1 个文件超过 900s 未完成入库，已标记失败; 批次内全部文件处理失败"
+
+    # 被看门狗判超时的子任务稍后重新开始：父任务保持终态，等它跑完
+    repo.statuses[file_ids[1]] = FileStatus.PARSING
+    await service.advance_batch_ingestion(
+        task_id=task.id, parallelism=2, file_timeout_seconds=900
+    )
+    assert task.status == TaskStatus.FAILED
+
+    repo.statuses[file_ids[1]] = FileStatus.READY
+    _, claimed = await service.advance_batch_ingestion(
+        task_id=task.id, parallelism=2, file_timeout_seconds=900
+    )
+
+    assert claimed == []
+    assert task.status == TaskStatus.COMPLETED
+    assert task.result["files_ready"] == 1
+    assert task.error_log == "1 个文件超过 900s 未完成入库，已标记失败"
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_keeps_long_running_file_alive():
+    service, task, file_ids, repo = make_service(
+        [FileStatus.PARSING, FileStatus.READY], stale=[0]
+    )
+
+    # 整篇解析期间文件状态不变，只有心跳能证明子任务仍在运行
+    await service.touch_batch_file(file_id=file_ids[0])
+    await service.advance_batch_ingestion(
+        task_id=task.id, parallelism=2, file_timeout_seconds=900
+    )
+
+    assert repo.touched == [file_ids[0]]
+    assert repo.statuses[file_ids[0]] == FileStatus.PARSING
+    assert task.status == TaskStatus.PROCESSING
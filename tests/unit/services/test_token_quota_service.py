@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import uuid
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from backend.core.exceptions import ValidationError
+from backend.services import token_quota_service as quota_module
+from backend.services.token_quota_service import (
+    LUA_HYDRATE,
+    LUA_RESERVE,
+    LUA_SETTLE,
+    QuotaReservation,
+    TokenQuotaReconciler,
+    TokenQuotaService,
+)
+
+
+@pytest.fixture
+def quota_ctx(monkeypatch):
+    redis = MagicMock()
+    redis.eval = AsyncMock()
+    monkeypatch.setattr(quota_module.redis_client, "init", AsyncMock(return_value=redis))
+
+    user = SimpleNamespace(id=uuid.uuid4(), max_tokens=1000, used_tokens=100)
+    user_repo = SimpleNamespace(
+        get=AsyncMock(return_value=user),
+        get_quota_snapshot=AsyncMock(return_value=(user.max_tokens, user.used_tokens)),
+        increment_used_tokens=AsyncMock(),
+        add_pending_tokens=AsyncMock(),
+    )
+    uow = FakeUoW(user_repo)
+    return SimpleNamespace(
+        redis=redis,
+        user=user,
+        user_repo=user_repo,
+        uow=uow,
+        service=TokenQuotaService(uow),
+    )
+
+
+class FakeUoW:
+    """模拟 AbstractUnitOfWork 的提交后回调：正常退出时执行，异常退出时丢弃"""
+
+    def __init__(self, user_repo):
+        self.user_repo = user_repo
+        self._after_commit = []
+
+    def after_commit(self, callback):
+        self._after_commit.append(callback)
+
+    async def __aenter__(self):
+        self._after_commit = []
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        callbacks, self._after_commit = self._after_commit, []
+        if exc_type is None:
+            for callback in callbacks:
+                await callback()
+        return False
+
+
+@pytest.mark.asyncio
+async def test_reserve_hits_ledger_without_touching_db(quota_ctx):
+    quota_ctx.redis.eval.return_value = [1, 100, 1000]
+
+    reservation = await quota_ctx.service.reserve(quota_ctx.user.id, 50)
+
+    assert reservation.via_ledger is True
+    assert reservation.amount == 50
+    quota_ctx.user_repo.get_quota_snapshot.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_reserve_hydrates_from_db_when_ledger_missing(quota_ctx):
+    quota_ctx.redis.eval.side_effect = [[-1, 0, 0], 1, [1, 100, 1000]]
+
+    reservation = await quota_ctx.service.reserve(quota_ctx.user.id, 50)
+
+    assert reservation.via_ledger is True
+    scripts = [call.args[0] for call in quota_ctx.redis.eval.await_args_list]
+    assert scripts == [LUA_RESERVE, LUA_HYDRATE, LUA_RESERVE]
+    hydrate_args = quota_ctx.redis.eval.await_args_list[1].args
+    assert hydrate_args[3:5] == (1000, 100)
+
+
+@pytest.mark.asyncio
+async def test_reserve_raises_when_quota_exhausted(quota_ctx):
+    quota_ctx.redis.eval.return_value = [0, 1000, 1000]
+
+    with pytest.raises(ValidationError, match="Token 余额不足") as exc_info:
+        await quota_ctx.service.reserve(quota_ctx.user.id, 50)
+
+    assert exc_info.value.details == {"used": 1000, "max": 1000}
+
+
+@pytest.mark.asyncio
+async def test_reserve_falls_back_to_db_when_redis_unavailable(quota_ctx):
+    quota_ctx.redis.eval.side_effect = RedisConnectionError("down")
+
+    reservation = await quota_ctx.service.reserve(quota_ctx.user.id, 50)
+
+    assert reservation.via_ledger is False
+    quota_ctx.user_repo.get.assert_awaited_once_with(quota_ctx.user.id)
+
+
+@pytest.mark.asyncio
+async def test_commit_records_pending_and_settles_redis_after_commit(quota_ctx):
+    quota_ctx.redis.eval.return_value = 1
+    reservation = QuotaReservation(user_id=quota_ctx.user.id, amount=50)
+
+    async with quota_ctx.uow:
+        await quota_ctx.service.commit(reservation, 30)
+        # 事务提交前 Redis 账本不变
+        quota_ctx.redis.eval.assert_not_awaited()
+        assert reservation.settled is False
+
+    assert reservation.settled is True
+    quota_ctx.user_repo.add_pending_tokens.assert_awaited_once_with(
+        quota_ctx.user.id, 30
+    )
+    args = quota_ctx.redis.eval.await_args.args
+    assert args[0] == LUA_SETTLE
+    assert args[3:5] == (50, 30)
+    quota_ctx.user_repo.increment_used_tokens.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_rolled_back_commit_leaves_redis_untouched_and_refund_releases(
+    quota_ctx,
+):
+    quota_ctx.redis.eval.return_value = 1
+    reservation = QuotaReservation(user_id=quota_ctx.user.id, amount=50)
+
+    with pytest.raises(RuntimeError):
+        async with quota_ctx.uow:
+            await quota_ctx.service.commit(reservation, 30)
+            raise RuntimeError("db commit failed")
+
+    quota_ctx.redis.eval.assert_not_awaited()
+    await quota_ctx.service.refund(reservation)
+
+    args = quota_ctx.redis.eval.await_args.args
+    assert args[3:5] == (50, 0)
+    assert reservation.settled is True
+
+
+@pytest.mark.asyncio
+async def test_commit_writes_db_directly_without_ledger(quota_ctx):
+    reservation = QuotaReservation(
+        user_id=quota_ctx.user.id, amount=50, via_ledger=False
+    )
+
+    async with quota_ctx.uow:
+        await quota_ctx.service.commit(reservation, 30)
+
+    quota_ctx.user_repo.increment_used_tokens.assert_awaited_once_with(
+        quota_ctx.user.id, 30
+    )
+    quota_ctx.redis.eval.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_commit_buffered_settles_redis_without_db(quota_ctx):
+    quota_ctx.redis.eval.return_value = 1
+    reservation = QuotaReservation(user_id=quota_ctx.user.id, amount=50)
+
+    # 不进入 uow：增量由写缓冲随消息终态插入
+    await quota_ctx.service.commit_buffered(reservation, 30)
+    await quota_ctx.service.refund(reservation)
+
+    assert reservation.settled is True
+    quota_ctx.user_repo.add_pending_tokens.assert_not_awaited()
+    args = quota_ctx.redis.eval.await_args.args
+    assert args[0] == LUA_SETTLE
+    assert args[3:5] == (50, 30)
+    assert quota_ctx.redis.eval.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_refund_is_noop_after_commit(quota_ctx):
+    quota_ctx.redis.eval.return_value = 1
+    reservation = QuotaReservation(user_id=quota_ctx.user.id, amount=50)
+
+    async with quota_ctx.uow:
+        await quota_ctx.service.commit(reservation, 30)
+    await quota_ctx.service.refund(reservation)
+
+    assert quota_ctx.redis.eval.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_reconciler_drains_pending_in_batches(monkeypatch):
+    batches = [(2, 2), (1, 1)]
+    seen_limits: list[int] = []
+
+    class BatchUoW:
+        def __init__(self, session_factory):
+            self.user_repo = SimpleNamespace(apply_pending_tokens=self._apply)
+
+        async def _apply(self, limit):
+            seen_limits.append(limit)
+            return batches.pop(0)
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, exc_type, exc, tb):
+            return False
+
+    monkeypatch.setattr(quota_module, "SQLAlchemyUnitOfWork", BatchUoW)
+    reconciler = TokenQuotaReconciler(
+        session_factory=MagicMock(), interval_seconds=1, batch_size=2
+    )
+
+    assert await reconciler.flush_once() == 3
+    assert seen_limits == [2, 2]
@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import io
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from fastapi import UploadFile
+from openpyxl import Workbook
+
+from backend.core.exceptions import ValidationError
+from backend.core.hash_executor import PasswordHashExecutor, verify_password_sync
+from backend.services import user_import_service as import_module
+from backend.services.user_import_service import UserImportService
+
+
+@pytest.fixture
+def import_ctx(tmp_path):
+    user_repo = SimpleNamespace(
+        get_existing_usernames=AsyncMock(return_value=set()),
+        create_import_staging=AsyncMock(),
+        copy_into_import_staging=AsyncMock(),
+        merge_import_staging=AsyncMock(return_value=5),
+    )
+    executor = PasswordHashExecutor(max_workers=2, max_queue=4, kind="thread")
+    service = UserImportService(
+        uow=SimpleNamespace(user_repo=user_repo),
+        storage_root=tmp_path,
+        hash_executor=executor,
+    )
+    yield SimpleNamespace(service=service, user_repo=user_repo, tmp_path=tmp_path)
+    executor.shutdown()
+
+
+def make_user_maps(count: int) -> list[dict[str, str]]:
+    return [
+        {"username": f"User_{i}", "email": f"User_{i}@Example.com"}
+        for i in range(count)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_import_users_copies_batches_then_merges_once(monkeypatch, import_ctx):
+    monkeypatch.setattr(import_module.settings, "BATCH_SIZE", 2)
+    progress: list[int] = []
+
+    async def record(value: int) -> None:
+        progress.append(value)
+
+    imported = await import_ctx.service.import_users(
+        make_user_maps(5), progress_callback=record
+    )
+
+    assert imported == 5
+    import_ctx.user_repo.create_import_staging.assert_awaited_once()
+    copies = import_ctx.user_repo.copy_into_import_staging.await_args_list
+    assert [len(call.args[0]) for call in copies] == [2, 2, 1]
+    import_ctx.user_repo.merge_import_staging.assert_awaited_once()
+    assert progress == [42, 74, 90]
+
+    _, username, email, hashed, _ = copies[0].args[0][0]
+    assert (username, email) == ("user_0", "user_0@example.com")
+    assert hashed.startswith("$argon2")
+    # 行序跨批次连续，合并时按行序保留重复邮箱的最后一行
+    row_numbers = [record[-1] for call in copies for record in call.args[0]]
+    assert row_numbers == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.asyncio
+async def test_import_users_rejects_existing_usernames_before_hashing(import_ctx):
+    import_ctx.user_repo.get_existing_usernames.return_value = {"User_0"}
+
+    with pytest.raises(ValidationError, match="已被占用"):
+        await import_ctx.service.import_users(make_user_maps(2))
+
+    import_ctx.user_repo.create_import_staging.assert_not_awaited()
+    import_ctx.user_repo.copy_into_import_staging.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_hash_passwords_splits_across_workers(import_ctx):
+    hashed = await import_ctx.service._hash_passwords(["Password1", "Password2"])
+
+    assert len(hashed) == 2
+    assert verify_password_sync("Password2", hashed[1]) is True
+
+
+@pytest.mark.asyncio
+async def test_save_upload_file_writes_to_storage_root(import_ctx):
+    upload = UploadFile(filename="users.csv", file=io.BytesIO(b"username,email\n"))
+
+    path = await import_ctx.service.save_upload_file(upload)
+
+    assert path.parent == import_ctx.tmp_path
+    assert path.suffix == ".csv"
+    assert path.read_bytes() == b"username,email\n"
+
+
+@pytest.mark.asyncio
+async def test_save_upload_file_rejects_empty_file(import_ctx):
+    upload = UploadFile(filename="users.csv", file=io.BytesIO(b""))
+
+    with pytest.raises(ValidationError, match="上传文件为空"):
+        await import_ctx.service.save_upload_file(upload)
+
+    assert list(import_ctx.tmp_path.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_save_upload_file_rejects_unsupported_suffix(import_ctx):
+    upload = UploadFile(filename="users.txt", file=io.BytesIO(b"data"))
+
+    with pytest.raises(ValidationError, match="不支持的文件格式"):
+        await import_ctx.service.save_upload_file(upload)
+
+
+@pytest.mark.asyncio
+async def test_import_from_file_parses_and_reports_result(import_ctx):
+    path = import_ctx.tmp_path / "users.csv"
+    path.write_bytes(b"username,email\nalice,alice@example.com\nbob,bob@example.com\n")
+    import_ctx.user_repo.merge_import_staging.return_value = 2
+
+    result = await import_ctx.service.import_from_file(
+        file_path=path, filename="users.csv"
+    )
+
+    assert result.total_rows == 2
+    assert result.imported_rows == 2
+
+
+@pytest.mark.asyncio
+async def test_import_from_file_streams_fixed_size_batches(monkeypatch, import_ctx):
+    monkeypatch.setattr(import_module.settings, "BATCH_SIZE", 2)
+    lines = ["username,email"] + [f"user{i},user{i}@example.com" for i in range(5)]
+    path = import_ctx.tmp_path / "users.csv"
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    result = await import_ctx.service.import_from_file(
+        file_path=path, filename="users.csv"
+    )
+
+    assert result.total_rows == 5
+    copies = import_ctx.user_repo.copy_into_import_staging.await_args_list
+    assert [len(call.args[0]) for call in copies] == [2, 2, 1]
+    # 校验遍与导入遍各查一次重名
+    assert import_ctx.user_repo.get_existing_usernames.await_count == 6
+
+
+@pytest.mark.asyncio
+async def test_import_from_file_fails_fast_on_invalid_rows(import_ctx):
+    path = import_ctx.tmp_path / "users.csv"
+    path.write_bytes(b"username,email\nalice,alice@example.com\nbob,\n")
+
+    with pytest.raises(ValidationError, match="Row 1") as exc_info:
+        await import_ctx.service.import_from_file(file_path=path, filename="users.csv")
+
+    assert exc_info.value.details == {"invalid_rows": 1}
+    import_ctx.user_repo.create_import_staging.assert_not_awaited()
+
+
+def test_transform_and_validate_is_lazy():
+    consumed: list[int] = []
+
+    def rows():
+        for i in range(3):
+            consumed.append(i)
+            yield {"username": f"u{i}", "email": f"u{i}@example.com"}
+
+    stream = UserImportService.transform_and_validate(rows())
+
+    assert next(stream) == {"username": "u0", "email": "u0@example.com"}
+    assert consumed == [0]
+
+
+@pytest.mark.asyncio
+async def test_import_from_file_streams_xlsx(import_ctx):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["用户名", "邮箱"])
+    sheet.append(["alice", "alice@example.com"])
+    sheet.append([None, None])
+    sheet.append(["bob", "bob@example.com"])
+    path = import_ctx.tmp_path / "users.xlsx"
+    workbook.save(path)
+    import_ctx.user_repo.merge_import_staging.return_value = 2
+
+    result = await import_ctx.service.import_from_file(
+        file_path=path, filename="users.xlsx"
+    )
+
+    assert result.total_rows == 2
+    assert result.imported_rows == 2
@@ -23,9 +23,10 @@ def service_ctx():
         get_multi=AsyncMock(),
         remove=AsyncMock(),
     )
-    uow = SimpleNamespace(user_repo=repo)
+    uow = SimpleNamespace(user_repo=repo, after_commit_callbacks=[])
+    uow.after_commit = uow.after_commit_callbacks.append
     service = UserService(uow=uow)
-    return SimpleNamespace(service=service, repo=repo)
+    return SimpleNamespace(service=service, repo=repo, uow=uow)
 
 
 def _build_user_create() -> UserCreate:
@@ -109,6 +110,36 @@ async def test_user_update_raises_not_found_when_user_missing(service_ctx):
         )
 
 
+@pytest.mark.asyncio
+async def test_user_update_defers_cache_and_quota_sync_until_commit(
+    service_ctx, monkeypatch
+):
+    user_id = uuid.uuid4()
+    service_ctx.repo.get.return_value = SimpleNamespace(id=user_id)
+    service_ctx.repo.update.return_value = SimpleNamespace(id=user_id)
+    invalidate = AsyncMock()
+    sync_limit = AsyncMock()
+    monkeypatch.setattr(
+        "backend.services.user_service.principal_cache.invalidate", invalidate
+    )
+    monkeypatch.setattr(
+        "backend.services.user_service.TokenQuotaService.sync_limit", sync_limit
+    )
+
+    await service_ctx.service.user_update(
+        user_id=user_id,
+        user_in=UserUpdate(is_active=False, max_tokens=500),
+    )
+
+    # 提交前不触碰 Redis，提交后才同步账本并失效认证缓存
+    invalidate.assert_not_awaited()
+    sync_limit.assert_not_awaited()
+    for callback in service_ctx.uow.after_commit_callbacks:
+        await callback()
+    invalidate.assert_awaited_once_with(user_id)
+    sync_limit.assert_awaited_once_with(user_id, 500)
+
+
 @pytest.mark.asyncio
 async def test_authenticate_returns_none_when_user_missing(service_ctx):
     service_ctx.repo.get_by_username.return_value = None
@@ -1,9 +1,18 @@
+import asyncio
+import uuid
 from types import SimpleNamespace
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 
-from backend.core.exceptions import ValidationError
+from backend.core.config import settings
+from backend.core.exceptions import ServiceError, ValidationError
+from backend.domain.interfaces import AbstractRAGEmbedder
+from backend.models.orm.knowledge import FileStatus
+from backend.services import vector_index_service
+from backend.services.chunking_service import ParsedChunk
+from backend.services.docling_parser import ParsedDocument
+from backend.services.vector_index_service import VectorIndexService
 from backend.workflow.knowledge_rag_workflow import KnowledgeRAGWorkflow
 
 
@@ -18,6 +27,12 @@ class FakeChunkingService:
             return [text]
         return [text[: self.chunk_size], text[self.chunk_size :]]
 
+    def iter_split_text(self, text: str):
+        yield from self.split_text(text)
+
+    def iter_split_stream(self, blocks):
+        yield from self.iter_split_text("".join(blocks))
+
 
 def make_workflow(chunking_service: FakeChunkingService) -> KnowledgeRAGWorkflow:
     return KnowledgeRAGWorkflow(
@@ -58,20 +73,22 @@ def test_extract_chunks_uses_docling_hierarchical_channel(monkeypatch, tmp_path)
             return chunk
 
     monkeypatch.setattr(
-        "backend.workflow.knowledge_rag_workflow.DoclingModelFactory.get_converter",
+        "backend.services.docling_parser.DoclingModelFactory.get_converter",
         lambda: FakeConverter(),
     )
     monkeypatch.setattr(
-        (
-            "backend.workflow."
-            "knowledge_rag_workflow.DoclingModelFactory.get_hierarchical_chunker"
-        ),
+        "backend.services.docling_parser.DoclingModelFactory.get_hierarchical_chunker",
         lambda: FakeChunker(),
     )
+    # 无文本层（扫描件）时整篇走 Docling
+    monkeypatch.setattr(
+        "backend.services.docling_parser.read_pdf_text_layer", lambda *_: None
+    )
 
     chunks = workflow._extract_chunks(file_path)
 
-    assert chunks == ["0123456789", "ABC", "short"]
+    assert [chunk.text for chunk in chunks] == ["0123456789", "ABC", "short"]
+    assert {chunk.meta_info["extract_tier"] for chunk in chunks} == {"docling"}
     assert chunking.split_calls == ["0123456789ABC"]
 
 
@@ -98,23 +115,48 @@ def test_extract_chunks_docling_fallbacks_to_exported_text(monkeypatch, tmp_path
             return chunk
 
     monkeypatch.setattr(
-        "backend.workflow.knowledge_rag_workflow.DoclingModelFactory.get_converter",
+        "backend.services.docling_parser.DoclingModelFactory.get_converter",
         lambda: FakeConverter(),
     )
     monkeypatch.setattr(
-        (
-            "backend.workflow."
-            "knowledge_rag_workflow.DoclingModelFactory.get_hierarchical_chunker"
-        ),
+        "backend.services.docling_parser.DoclingModelFactory.get_hierarchical_chunker",
         lambda: FakeChunker(),
     )
 
     chunks = workflow._extract_chunks(file_path)
 
-    assert chunks == ["fallback markdown"]
+    assert [chunk.text for chunk in chunks] == ["fallback markdown"]
     assert chunking.split_calls == ["fallback markdown"]
 
 
+def test_extract_chunks_delegates_structured_files_to_docling_executor(tmp_path):
+    class FakeDoclingExecutor:
+        def __init__(self):
+            self.calls: list[tuple] = []
+
+        def parse(self, file_path, *, chunk_size, chunk_overlap, on_progress=None):
+            self.calls.append((file_path.name, chunk_size, chunk_overlap))
+            return ParsedDocument(
+                chunks=[ParsedChunk("page one", {}), ParsedChunk("page two", {})],
+                tier_pages={"text_layer": 2},
+            )
+
+    docling_executor = FakeDoclingExecutor()
+    workflow = KnowledgeRAGWorkflow(
+        knowledge_service=MagicMock(),
+        chunking_service=SimpleNamespace(chunk_size=800, chunk_overlap=120),
+        vector_index_service=MagicMock(),
+        docling_executor=docling_executor,
+    )
+    file_path = tmp_path / "demo.pdf"
+    file_path.write_text("fake", encoding="utf-8")
+
+    chunks = workflow._extract_chunks(file_path)
+
+    assert [chunk.text for chunk in chunks] == ["page one", "page two"]
+    assert docling_executor.calls == [("demo.pdf", 800, 120)]
+
+
 def test_extract_chunks_rejects_unsupported_file_suffix(tmp_path):
     chunking = FakeChunkingService()
     workflow = make_workflow(chunking)
@@ -123,3 +165,416 @@ def test_extract_chunks_rejects_unsupported_file_suffix(tmp_path):
 
     with pytest.raises(ValidationError):
         workflow._extract_chunks(file_path)
+
+
+@pytest.fixture
+def char_token_counter(monkeypatch):
+    # 单测不依赖 tiktoken 编码文件：按字符数计 Token
+    monkeypatch.setattr(
+        vector_index_service, "count_tokens", lambda text, model="gpt-4": len(text)
+    )
+
+
+class LineChunkingService:
+    """每行一个切片，并记录解析线程已产出的切片数"""
+
+    chunk_size = 800
+    chunk_overlap = 0
+
+    def __init__(self):
+        self.produced = 0
+
+    def iter_split_text(self, text: str):
+        for line in text.splitlines():
+            self.produced += 1
+            yield line
+
+    def iter_split_stream(self, blocks):
+        yield from self.iter_split_text("".join(blocks))
+
+
+class FakeEmbedder(AbstractRAGEmbedder):
+    def __init__(self, fail_on: str | None = None):
+        self.fail_on = fail_on
+        self.batch_sizes: list[int] = []
+
+    def encode_query(self, text: str) -> list[float]:
+        return [float(len(text))]
+
+    def encode_batch(self, texts: list[str]) -> list[list[float]]:
+        if self.fail_on in texts:
+            raise RuntimeError("embedding api down")
+        self.batch_sizes.append(len(texts))
+        return [self.encode_query(text) for text in texts]
+
+
+class FakeKnowledgeRepo:
+    def __init__(self, gate: asyncio.Event | None = None, existing=None, donor=None):
+        self.gate = gate
+        self.donor = donor
+        self.cloned: list[dict] = []
+        self.existing: list[tuple[uuid.UUID, str | None, int]] = existing or []
+        self.deleted: list[uuid.UUID] = []
+        self.moved: list[dict] = []
+        self.written: list[dict] = []
+        self.bumped = 0
+
+    async def find_ingested_duplicate(
+        self, *, content_hash, ingest_fingerprint, exclude_file_id
+    ):
+        if self.donor and self.donor["fingerprint"] == ingest_fingerprint:
+            return SimpleNamespace(id=self.donor["id"])
+        return None
+
+    async def clone_chunks_from_file(
+        self, *, source_file_id, target_file_id, meta_info
+    ):
+        self.cloned.append({"source": source_file_id, "meta_info": meta_info})
+        return 3
+
+    async def list_chunk_hashes_for_file(self, file_id):
+        return list(self.existing)
+
+    async def update_chunk_indexes(self, updates):
+        self.moved.extend(updates)
+
+    async def delete_chunks_by_ids(self, chunk_ids):
+        self.deleted.extend(chunk_ids)
+        return len(chunk_ids)
+
+    async def copy_chunks(self, records):
+        if self.gate is not None:
+            await self.gate.wait()
+        self.written.extend(records)
+        return len(records)
+
+    async def bump_kb_generation_for_file(self, *, file_id):
+        self.bumped += 1
+
+
+def make_ingest_workflow(
+    tmp_path,
+    lines,
+    *,
+    embedder=None,
+    repo=None,
+    content_hash=None,
+    stored_fingerprint=None,
+):
+    file_path = tmp_path / "notes.txt"
+    file_path.write_text("\n".join(lines), encoding="utf-8")
+    file_obj = SimpleNamespace(
+        id=uuid.uuid4(),
+        file_path=str(file_path),
+        filename="notes.txt",
+        content_hash=content_hash,
+        ingest_fingerprint=stored_fingerprint,
+    )
+
+    knowledge_service = MagicMock()
+    knowledge_service.set_file_status = AsyncMock(return_value=file_obj)
+    uow = MagicMock()
+    uow.knowledge_repo = repo or FakeKnowledgeRepo()
+    chunking = LineChunkingService()
+    workflow = KnowledgeRAGWorkflow(
+        knowledge_service=knowledge_service,
+        chunking_service=chunking,
+        vector_index_service=VectorIndexService(uow, embedder or FakeEmbedder()),
+    )
+    # 默认模拟旧切片由当前配置生成，可按内容哈希复用
+    if stored_fingerprint is None:
+        file_obj.ingest_fingerprint = workflow._ingest_fingerprint()
+    return workflow, knowledge_service, uow.knowledge_repo, chunking
+
+
+def recorded_statuses(knowledge_service) -> list[FileStatus]:
+    return [
+        call.kwargs["status"]
+        for call in knowledge_service.set_file_status.call_args_list
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("char_token_counter")
+async def test_ingest_file_streams_chunks_in_batches(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "KNOWLEDGE_INGEST_EMBED_BATCH_SIZE", 4)
+    embedder = FakeEmbedder()
+    lines = [f"line-{idx}" for idx in range(10)]
+    workflow, knowledge_service, repo, _ = make_ingest_workflow(
+        tmp_path, lines, embedder=embedder
+    )
+
+    stats = await workflow.ingest_file(file_id=uuid.uuid4())
+
+    assert recorded_statuses(knowledge_service) == [
+        FileStatus.PARSING,
+        FileStatus.CHUNKING,
+        FileStatus.READY,
+    ]
+    assert embedder.batch_sizes == [4, 4, 2]
+    assert [record["content"] for record in repo.written] == lines
+    assert [record["chunk_index"] for record in repo.written] == list(range(10))
+    assert stats.as_dict()["chunks_embedded"] == 10
+    assert stats.reuse_ratio == 0
+    assert repo.bumped == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("char_token_counter")
+async def test_ingest_file_bounds_in_flight_chunks(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "KNOWLEDGE_INGEST_EMBED_BATCH_SIZE", 4)
+    monkeypatch.setattr(settings, "KNOWLEDGE_INGEST_QUEUE_SIZE", 1)
+    monkeypatch.setattr(settings, "KNOWLEDGE_INGEST_WRITE_BATCH_SIZE", 4)
+    gate = asyncio.Event()
+    lines = [f"line-{idx}" for idx in range(500)]
+    workflow, _, repo, chunking = make_ingest_workflow(
+        tmp_path, lines, repo=FakeKnowledgeRepo(gate=gate)
+    )
+
+    ingest = asyncio.create_task(workflow.ingest_file(file_id=uuid.uuid4()))
+    await asyncio.sleep(0.3)
+
+    # 写库阶段被阻塞时，解析线程受背压停在 (QUEUE_SIZE + 3) * BATCH + WRITE_BATCH 附近
+    assert not ingest.done()
+    assert chunking.produced <= (1 + 3) * 4 + 4 + 1
+
+    gate.set()
+    await ingest
+    assert len(repo.written) == 500
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("char_token_counter")
+async def test_ingest_file_marks_failed_when_embedding_breaks(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "KNOWLEDGE_INGEST_EMBED_BATCH_SIZE", 2)
+    lines = [f"line-{idx}" for idx in range(8)]
+    workflow, knowledge_service, repo, _ = make_ingest_workflow(
+        tmp_path, lines, embedder=FakeEmbedder(fail_on="line-5")
+    )
+
+    with pytest.raises(ServiceError):
+        await workflow.ingest_file(file_id=uuid.uuid4())
+
+    assert recorded_statuses(knowledge_service)[-1] == FileStatus.FAILED
+    assert repo.bumped == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("char_token_counter")
+async def test_ingest_file_rejects_empty_document(tmp_path):
+    workflow, knowledge_service, repo, _ = make_ingest_workflow(tmp_path, [])
+
+    with pytest.raises(ValidationError):
+        await workflow.ingest_file(file_id=uuid.uuid4())
+
+    assert recorded_statuses(knowledge_service) == [
+        FileStatus.PARSING,
+        FileStatus.FAILED,
+    ]
+    assert repo.written == []
+    assert repo.bumped == 0
+
+
+def existing_rows(*contents: str) -> list[tuple[uuid.UUID, str | None, int]]:
+    return [
+        (uuid.uuid4(), vector_index_service.chunk_content_hash(text), idx)
+        for idx, text in enumerate(contents)
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("char_token_counter")
+async def test_reingest_reuses_unchanged_chunks(tmp_path):
+    existing = existing_rows("alpha", "beta", "gamma", "delta")
+    embedder = FakeEmbedder()
+    workflow, _, repo, _ = make_ingest_workflow(
+        tmp_path,
+        ["alpha", "inserted", "gamma", "delta", "delta"],
+        embedder=embedder,
+        repo=FakeKnowledgeRepo(existing=existing),
+    )
+
+    stats = await workflow.ingest_file(file_id=uuid.uuid4())
+
+    # 只有新增内容（含重复出现的第二个 delta）需要向量化
+    assert [(r["content"], r["chunk_index"]) for r in repo.written] == [
+        ("inserted", 1),
+        ("delta", 4),
+    ]
+    assert repo.moved == []
+    assert repo.deleted == [existing[1][0]]
+    assert stats.as_dict() == {
+        "chunks_total": 5,
+        "chunks_reused": 3,
+        "chunks_embedded": 2,
+        "chunks_deleted": 1,
+        "reuse_ratio": 0.6,
+    }
+    assert repo.bumped == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("char_token_counter")
+async def test_reingest_only_moves_shifted_chunks(tmp_path):
+    existing = existing_rows("alpha", "beta")
+    workflow, _, repo, _ = make_ingest_workflow(
+        tmp_path,
+        ["intro", "alpha", "beta"],
+        repo=FakeKnowledgeRepo(existing=existing),
+    )
+
+    await workflow.ingest_file(file_id=uuid.uuid4())
+
+    assert [r["content"] for r in repo.written] == ["intro"]
+    assert repo.moved == [
+        {"id": existing[0][0], "chunk_index": 1},
+        {"id": existing[1][0], "chunk_index": 2},
+    ]
+    assert repo.deleted == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("char_token_counter")
+async def test_reingest_after_fingerprint_change_reembeds_everything(tmp_path):
+    existing = existing_rows("alpha", "beta")
+    embedder = FakeEmbedder()
+    workflow, knowledge_service, repo, _ = make_ingest_workflow(
+        tmp_path,
+        ["alpha", "beta"],
+        embedder=embedder,
+        repo=FakeKnowledgeRepo(existing=existing),
+        stored_fingerprint="0" * 64,
+    )
+
+    stats = await workflow.ingest_file(file_id=uuid.uuid4())
+
+    # 旧向量来自其他模型 / 配置，内容相同也不能复用
+    assert [r["content"] for r in repo.written] == ["alpha", "beta"]
+    assert repo.moved == []
+    assert repo.deleted == [row[0] for row in existing]
+    assert stats.reused == 0
+    assert stats.embedded == 2
+    assert repo.bumped == 1
+    ready_call = knowledge_service.set_file_status.call_args_list[-1]
+    assert ready_call.kwargs["ingest_fingerprint"] == workflow._ingest_fingerprint()
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("char_token_counter")
+async def test_reingest_identical_file_keeps_generation(tmp_path):
+    existing = existing_rows("alpha", "beta")
+    embedder = FakeEmbedder()
+    workflow, _, repo, _ = make_ingest_workflow(
+        tmp_path,
+        ["alpha", "beta"],
+        embedder=embedder,
+        repo=FakeKnowledgeRepo(existing=existing),
+    )
+
+    stats = await workflow.ingest_file(file_id=uuid.uuid4())
+
+    assert stats.reuse_ratio == 1.0
+    assert embedder.batch_sizes == []
+    assert repo.bumped == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("char_token_counter")
+async def test_ingest_records_extract_tier_in_meta_info():
+    uow = MagicMock()
+    uow.knowledge_repo = FakeKnowledgeRepo()
+    service = VectorIndexService(uow, FakeEmbedder())
+    text_meta = {"extract_tier": "text_layer", "page_start": 1, "page_end": 2}
+
+    await service.replace_file_chunks(
+        file_id=uuid.uuid4(),
+        chunks=[
+            ParsedChunk("page one", text_meta),
+            ParsedChunk("scanned", {"extract_tier": "docling"}),
+            "plain",
+        ],
+        filename="demo.pdf",
+        file_path="/tmp/demo.pdf",
+    )
+
+    metas = [record["meta_info"] for record in uow.knowledge_repo.written]
+    assert metas[0] == {"filename": "demo.pdf", "path": "/tmp/demo.pdf", **text_meta}
+    assert metas[1]["extract_tier"] == "docling"
+    assert "extract_tier" not in metas[2]
+
+
+@pytest.mark.asyncio
+async def test_stream_chunks_forwards_page_range_progress(tmp_path):
+    class RangedDoclingExecutor:
+        def parse(self, file_path, *, chunk_size, chunk_overlap, on_progress=None):
+            for done in (1, 2):
+                on_progress(done, 2)
+            return ParsedDocument(
+                chunks=[ParsedChunk("a", {}), ParsedChunk("b", {})],
+                tier_pages={"text_layer": 400},
+            )
+
+    progress: list[tuple[int, int]] = []
+
+    async def on_progress(done: int, total: int) -> None:
+        progress.append((done, total))
+
+    workflow = KnowledgeRAGWorkflow(
+        knowledge_service=MagicMock(),
+        chunking_service=SimpleNamespace(chunk_size=800, chunk_overlap=120),
+        vector_index_service=MagicMock(),
+        docling_executor=RangedDoclingExecutor(),
+    )
+    file_path = tmp_path / "book.pdf"
+    file_path.write_text("fake", encoding="utf-8")
+
+    chunks = [
+        chunk.text
+        async for chunk in workflow._stream_chunks(file_path, on_progress=on_progress)
+    ]
+
+    assert chunks == ["a", "b"]
+    assert progress == [(1, 2), (2, 2)]
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("char_token_counter")
+async def test_duplicate_upload_clones_chunks_without_parsing(tmp_path):
+    repo = FakeKnowledgeRepo(existing=existing_rows("stale"))
+    embedder = FakeEmbedder()
+    workflow, knowledge_service, repo, chunking = make_ingest_workflow(
+        tmp_path, ["a", "b", "c"], embedder=embedder, repo=repo, content_hash="f" * 64
+    )
+    donor_id = uuid.uuid4()
+    repo.donor = {"id": donor_id, "fingerprint": workflow._ingest_fingerprint()}
+
+    stats = await workflow.ingest_file(file_id=uuid.uuid4())
+
+    assert chunking.produced == 0
+    assert embedder.batch_sizes == []
+    assert repo.cloned[0]["source"] == donor_id
+    assert repo.cloned[0]["meta_info"]["filename"] == "notes.txt"
+    assert len(repo.deleted) == 1
+    assert repo.bumped == 1
+    assert stats.as_dict()["chunks_reused"] == 3
+    assert recorded_statuses(knowledge_service)[-1] == FileStatus.READY
+    ready_call = knowledge_service.set_file_status.call_args_list[-1]
+    assert ready_call.kwargs["ingest_fingerprint"] == workflow._ingest_fingerprint()
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("char_token_counter")
+async def test_duplicate_with_other_chunking_config_is_reingested(
+    monkeypatch, tmp_path
+):
+    workflow, _, repo, chunking = make_ingest_workflow(
+        tmp_path, ["a", "b"], content_hash="f" * 64
+    )
+    repo.donor = {"id": uuid.uuid4(), "fingerprint": workflow._ingest_fingerprint()}
+    monkeypatch.setattr(settings, "RAG_EMBED_MODEL_NAME", "another-embedding-model")
+
+    stats = await workflow.ingest_file(file_id=uuid.uuid4())
+
+    assert repo.cloned == []
+    assert chunking.produced == 2
+    assert stats.embedded == 2
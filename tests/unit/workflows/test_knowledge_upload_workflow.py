@@ -7,6 +7,7 @@ from unittest.mock import AsyncMock, MagicMock
 import pytest
 from fastapi import UploadFile
 
+from backend.core.exceptions import DependencyUnavailable, ServiceError
 from backend.models.orm.knowledge import FileStatus
 from backend.workflow.knowledge_upload_workflow import KnowledgeUploadWorkflow
 
@@ -20,7 +21,7 @@ class DummyUoW:
 
 
 @pytest.mark.asyncio
-async def test_submit_stream_ingestion_creates_task_and_dispatches_job(monkeypatch):
+async def test_submit_ingestion_creates_task_and_dispatches_job(monkeypatch):
     file_id = uuid.uuid4()
     task_id = uuid.uuid4()
     kb_id = uuid.uuid4()
@@ -29,7 +30,7 @@ async def test_submit_stream_ingestion_creates_task_and_dispatches_job(monkeypat
 
     knowledge_service = SimpleNamespace(
         uow=DummyUoW(),
-        save_upload_file_streaming=AsyncMock(
+        save_upload_file=AsyncMock(
             return_value=SimpleNamespace(
                 id=file_id,
                 file_path="/tmp/demo.txt",
@@ -55,13 +56,13 @@ async def test_submit_stream_ingestion_creates_task_and_dispatches_job(monkeypat
         kiq_mock,
     )
 
-    result = await workflow.submit_stream_ingestion(
+    result = await workflow.submit_ingestion(
         kb_id=kb_id,
         user_id=user_id,
         upload_file=upload_file,
     )
 
-    knowledge_service.save_upload_file_streaming.assert_awaited_once_with(
+    knowledge_service.save_upload_file.assert_awaited_once_with(
         kb_id=kb_id,
         user_id=user_id,
         upload_file=upload_file,
@@ -78,3 +79,160 @@ async def test_submit_stream_ingestion_creates_task_and_dispatches_job(monkeypat
     assert result.file_id == file_id
     assert result.file_status == FileStatus.UPLOADED
     assert result.task_status == "pending"
+
+
+@pytest.mark.asyncio
+async def test_submit_batch_ingestion_creates_one_parent_task(monkeypatch):
+    kb_id = uuid.uuid4()
+    user_id = uuid.uuid4()
+    task_id = uuid.uuid4()
+    file_ids = [uuid.uuid4(), uuid.uuid4()]
+    skipped = [{"filename": "image.png", "reason": "不支持的文件类型"}]
+    upload_files = [MagicMock(spec=UploadFile)]
+    staged = SimpleNamespace(objects=[], skipped=skipped)
+
+    knowledge_service = SimpleNamespace(
+        uow=DummyUoW(),
+        ensure_kb_access=AsyncMock(),
+        stage_upload_batch=AsyncMock(return_value=staged),
+        record_upload_batch=AsyncMock(
+            return_value=SimpleNamespace(
+                files=[SimpleNamespace(id=file_id) for file_id in file_ids],
+                skipped=skipped,
+            )
+        ),
+        discard_staged_batch=MagicMock(),
+        set_files_status=AsyncMock(),
+    )
+    task_service = SimpleNamespace(
+        uow=DummyUoW(),
+        create_kb_batch_ingestion_task=AsyncMock(
+            return_value=SimpleNamespace(id=task_id, status="pending")
+        ),
+        mark_failed=AsyncMock(),
+    )
+    workflow = KnowledgeUploadWorkflow(
+        knowledge_service=knowledge_service,
+        task_service=task_service,
+    )
+    kiq_mock = AsyncMock()
+    monkeypatch.setattr(
+        "backend.workflow.knowledge_upload_workflow.dispatch_knowledge_batch_task.kiq",
+        kiq_mock,
+    )
+
+    result = await workflow.submit_batch_ingestion(
+        kb_id=kb_id,
+        user_id=user_id,
+        upload_files=upload_files,
+    )
+
+    task_service.create_kb_batch_ingestion_task.assert_awaited_once_with(
+        kb_id=kb_id,
+        user_id=user_id,
+        file_ids=file_ids,
+        skipped=skipped,
+    )
+    kiq_mock.assert_awaited_once_with(str(task_id))
+    knowledge_service.ensure_kb_access.assert_awaited_once_with(
+        kb_id=kb_id, user_id=user_id
+    )
+    knowledge_service.record_upload_batch.assert_awaited_once_with(
+        kb_id=kb_id, staged=staged
+    )
+    assert result.task_id == task_id
+    assert result.file_ids == file_ids
+    assert [item.filename for item in result.skipped] == ["image.png"]
+
+
+@pytest.mark.asyncio
+async def test_submit_batch_ingestion_marks_files_failed_when_dispatch_fails(
+    monkeypatch,
+):
+    task_id = uuid.uuid4()
+    file_ids = [uuid.uuid4()]
+    knowledge_service = SimpleNamespace(
+        uow=DummyUoW(),
+        ensure_kb_access=AsyncMock(),
+        stage_upload_batch=AsyncMock(return_value=SimpleNamespace()),
+        record_upload_batch=AsyncMock(
+            return_value=SimpleNamespace(
+                files=[SimpleNamespace(id=file_ids[0])], skipped=[]
+            )
+        ),
+        discard_staged_batch=MagicMock(),
+        set_files_status=AsyncMock(),
+    )
+    task_service = SimpleNamespace(
+        uow=DummyUoW(),
+        create_kb_batch_ingestion_task=AsyncMock(
+            return_value=SimpleNamespace(id=task_id, status="pending")
+        ),
+        mark_failed=AsyncMock(),
+    )
+    workflow = KnowledgeUploadWorkflow(
+        knowledge_service=knowledge_service,
+        task_service=task_service,
+    )
+    monkeypatch.setattr(
+        "backend.workflow.knowledge_upload_workflow.dispatch_knowledge_batch_task.kiq",
+        AsyncMock(side_effect=RuntimeError("redis down")),
+    )
+
+    with pytest.raises(DependencyUnavailable):
+        await workflow.submit_batch_ingestion(
+            kb_id=uuid.uuid4(),
+            user_id=uuid.uuid4(),
+            upload_files=[MagicMock(spec=UploadFile)],
+        )
+
+    task_service.mark_failed.assert_awaited_once()
+    knowledge_service.set_files_status.assert_awaited_once_with(
+        file_ids=file_ids, status=FileStatus.FAILED
+    )
+
+
+class TrackingUoW(DummyUoW):
+    def __init__(self):
+        self.active = False
+
+    async def __aenter__(self):
+        self.active = True
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.active = False
+        return False
+
+
+@pytest.mark.asyncio
+async def test_submit_batch_ingestion_extracts_outside_transaction():
+    uow = TrackingUoW()
+    staged = SimpleNamespace(objects=[], skipped=[])
+
+    async def stage_upload_batch(**kwargs):
+        # 解压落盘期间不能占着数据库事务
+        assert not uow.active
+        return staged
+
+    knowledge_service = SimpleNamespace(
+        uow=uow,
+        ensure_kb_access=AsyncMock(),
+        stage_upload_batch=stage_upload_batch,
+        record_upload_batch=AsyncMock(side_effect=RuntimeError("db down")),
+        discard_staged_batch=MagicMock(),
+    )
+    workflow = KnowledgeUploadWorkflow(
+        knowledge_service=knowledge_service,
+        task_service=SimpleNamespace(uow=DummyUoW()),
+    )
+
+    with pytest.raises(ServiceError):
+        await workflow.submit_batch_ingestion(
+            kb_id=uuid.uuid4(),
+            user_id=uuid.uuid4(),
+            upload_files=[MagicMock(spec=UploadFile)],
+        )
+
+    knowledge_service.ensure_kb_access.assert_awaited_once()
+    knowledge_service.discard_staged_batch.assert_called_once_with(staged)
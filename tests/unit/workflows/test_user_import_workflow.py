@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from fastapi import UploadFile
+
+from backend.core.exceptions import DependencyUnavailable
+from backend.workflow.user_import_workflow import UserImportWorkflow
+
+
+class DummyUoW:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+@pytest.fixture
+def workflow_ctx():
+    task_id = uuid.uuid4()
+    upload_file = MagicMock(spec=UploadFile)
+    upload_file.filename = "users.csv"
+    import_service = SimpleNamespace(
+        save_upload_file=AsyncMock(return_value=Path("/tmp/imports/abc.csv")),
+        remove_file=MagicMock(),
+    )
+    task_service = SimpleNamespace(
+        uow=DummyUoW(),
+        create_user_import_task=AsyncMock(
+            return_value=SimpleNamespace(id=task_id, status="pending")
+        ),
+        mark_failed=AsyncMock(),
+    )
+    workflow = UserImportWorkflow(
+        import_service=import_service,
+        task_service=task_service,
+    )
+    return SimpleNamespace(
+        task_id=task_id,
+        upload_file=upload_file,
+        import_service=import_service,
+        task_service=task_service,
+        workflow=workflow,
+    )
+
+
+@pytest.mark.asyncio
+async def test_submit_import_creates_task_and_dispatches_job(monkeypatch, workflow_ctx):
+    user_id = uuid.uuid4()
+    kiq_mock = AsyncMock()
+    monkeypatch.setattr(
+        "backend.workflow.user_import_workflow.import_users_task.kiq", kiq_mock
+    )
+
+    result = await workflow_ctx.workflow.submit_import(
+        user_id=user_id,
+        upload_file=workflow_ctx.upload_file,
+    )
+
+    workflow_ctx.task_service.create_user_import_task.assert_awaited_once_with(
+        file_path="/tmp/imports/abc.csv",
+        filename="users.csv",
+        user_id=user_id,
+    )
+    kiq_mock.assert_awaited_once_with(str(workflow_ctx.task_id))
+    assert result.task_id == workflow_ctx.task_id
+    assert result.task_status == "pending"
+    workflow_ctx.import_service.remove_file.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_submit_import_marks_task_failed_when_dispatch_fails(
+    monkeypatch, workflow_ctx
+):
+    monkeypatch.setattr(
+        "backend.workflow.user_import_workflow.import_users_task.kiq",
+        AsyncMock(side_effect=RuntimeError("redis down")),
+    )
+
+    with pytest.raises(DependencyUnavailable):
+        await workflow_ctx.workflow.submit_import(
+            user_id=uuid.uuid4(),
+            upload_file=workflow_ctx.upload_file,
+        )
+
+    workflow_ctx.task_service.mark_failed.assert_awaited_once()
+    workflow_ctx.import_service.remove_file.assert_called_once_with(
+        Path("/tmp/imports/abc.csv")
+    )